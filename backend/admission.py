@@ -0,0 +1,165 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import metrics
+from metrics import observe, inc
+
+# Admission control for full analyses (the ones that open a browser page and call Gemini).
+#
+# Each worker process runs at most `capacity` full analyses at once; capacity is sized from the
+# memory available per worker (ANALYSIS_MEMORY_MB per analysis) and capped by BROWSER_SLOTS, the
+# pages one shared Chromium should have open at a time. Requests beyond that wait in a FIFO queue
+# per lane, up to the lane's queue limit and maximum wait; otherwise they are rejected and app.py
+# answers 429 with a Retry-After estimate.
+#
+# Lanes: "interactive" (extension clicks, the default) is always admitted first, and "batch"
+# (bulk audits, ?priority=batch) may only use BATCH_MAX_SHARE of the slots, so a batch backlog
+# never starves interactive traffic.
+#
+# Metrics: admission_queue_depth / admission_in_flight {lane} (gauges), admission_wait_seconds
+# {lane, result} (histogram), admission_rejections_total {lane, reason}.
+
+LANES = ("interactive", "batch")
+ANALYSIS_MEMORY_MB = int(os.getenv("ANALYSIS_MEMORY_MB", "300")) # rough peak per full analysis (page + images)
+BROWSER_SLOTS = int(os.getenv("BROWSER_SLOTS", "4")) # concurrent pages per worker's shared Chromium
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "0")) # 0 = size from memory/browser slots
+BATCH_MAX_SHARE = float(os.getenv("ADMISSION_BATCH_MAX_SHARE", "0.5"))
+QUEUE_LIMITS = {
+    "interactive": int(os.getenv("ADMISSION_INTERACTIVE_QUEUE", "16")),
+    "batch": int(os.getenv("ADMISSION_BATCH_QUEUE", "256")),
+}
+MAX_WAIT_MS = {
+    "interactive": int(os.getenv("ADMISSION_INTERACTIVE_MAX_WAIT_MS", "10000")),
+    "batch": int(os.getenv("ADMISSION_BATCH_MAX_WAIT_MS", "120000")),
+}
+DEFAULT_SERVICE_SECONDS = 10.0 # initial guess for Retry-After until real analyses have been timed
+RETRY_AFTER_MAX_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_MAX_SECONDS", "120"))
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted; retry_after is in whole seconds."""
+
+    def __init__(self, lane, reason, retry_after):
+        super().__init__(f"{lane} lane overloaded ({reason})")
+        self.lane = lane
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def available_memory_mb():
+    """MemAvailable from /proc/meminfo (Linux), else free physical pages; None if unknown."""
+    try:
+        with open("/proc/meminfo") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def default_capacity():
+    """Concurrent full analyses for this worker: memory share / ANALYSIS_MEMORY_MB, capped by BROWSER_SLOTS."""
+    if ADMISSION_MAX_CONCURRENT > 0:
+        return ADMISSION_MAX_CONCURRENT
+    workers = max(1, int(os.getenv("SERVE_WORKERS", "1"))) # set by serve.py for its children
+    memory_mb = available_memory_mb()
+    by_memory = memory_mb // workers // ANALYSIS_MEMORY_MB if memory_mb else BROWSER_SLOTS
+    return max(1, min(by_memory, BROWSER_SLOTS))
+
+
+class AdmissionController:
+    """Bounded slots with per-lane FIFO queues; interactive waiters go first."""
+
+    def __init__(self, capacity, batch_max_share=BATCH_MAX_SHARE, queue_limits=None, max_wait_ms=None):
+        self.capacity = capacity
+        self.batch_limit = max(1, int(capacity * batch_max_share))
+        self.queue_limits = dict(QUEUE_LIMITS, **(queue_limits or {}))
+        self.max_wait_ms = dict(MAX_WAIT_MS, **(max_wait_ms or {}))
+        self._cond = threading.Condition()
+        self._in_flight = {lane: 0 for lane in LANES}
+        self._waiting = {lane: deque() for lane in LANES}
+        self._service_seconds = DEFAULT_SERVICE_SECONDS # moving average of slot hold times
+
+    def _can_start(self, lane, ticket):
+        if self._waiting[lane][0] is not ticket or sum(self._in_flight.values()) >= self.capacity:
+            return False
+        if lane == "batch":
+            return not self._waiting["interactive"] and self._in_flight["batch"] < self.batch_limit
+        return True
+
+    def _retry_after(self, lane):
+        # Time for the queue ahead to drain at the current service rate, rounded up
+        slots = self.capacity if lane == "interactive" else self.batch_limit
+        queued = len(self._waiting[lane]) + (len(self._waiting["interactive"]) if lane == "batch" else 0)
+        return min(RETRY_AFTER_MAX_SECONDS, max(1, math.ceil(self._service_seconds * (queued + 1) / slots)))
+
+    def _reject(self, lane, reason):
+        retry_after = self._retry_after(lane)
+        inc("admission_rejections_total", lane=lane, reason=reason)
+        return Overloaded(lane, reason, retry_after)
+
+    def acquire(self, lane, max_wait_ms=None):
+        """Blocks until a slot is free for `lane` (FIFO within the lane). Raises Overloaded."""
+        max_wait_ms = self.max_wait_ms[lane] if max_wait_ms is None else min(max_wait_ms, self.max_wait_ms[lane])
+        start = time.perf_counter()
+        deadline = start + max_wait_ms / 1000.0
+        ticket = object()
+        with self._cond:
+            if len(self._waiting[lane]) >= self.queue_limits[lane]:
+                observe("admission_wait_seconds", 0.0, lane=lane, result="rejected")
+                raise self._reject(lane, "queue_full")
+            self._waiting[lane].append(ticket)
+            try:
+                while not self._can_start(lane, ticket):
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        observe("admission_wait_seconds", time.perf_counter() - start, lane=lane, result="rejected")
+                        raise self._reject(lane, "wait_timeout")
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting[lane].remove(ticket)
+                self._cond.notify_all() # the next waiter in line may be able to start now
+            self._in_flight[lane] += 1
+        waited = time.perf_counter() - start
+        observe("admission_wait_seconds", waited, lane=lane, result="admitted")
+        return waited
+
+    def release(self, lane, held_seconds):
+        with self._cond:
+            self._in_flight[lane] -= 1
+            self._service_seconds = 0.8 * self._service_seconds + 0.2 * held_seconds
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, lane, max_wait_ms=None):
+        """with controller.slot("interactive"): ... — holds one slot for the block."""
+        waited = self.acquire(lane, max_wait_ms)
+        start = time.perf_counter()
+        try:
+            yield waited
+        finally:
+            self.release(lane, time.perf_counter() - start)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "capacity": self.capacity,
+                "batch_limit": self.batch_limit,
+                "in_flight": dict(self._in_flight),
+                "queued": {lane: len(waiting) for lane, waiting in self._waiting.items()},
+                "avg_service_seconds": round(self._service_seconds, 2),
+            }
+
+    def export_metrics(self):
+        stats = self.stats()
+        for lane in LANES:
+            metrics.set_value("admission_queue_depth", stats["queued"][lane], lane=lane)
+            metrics.set_value("admission_in_flight", stats["in_flight"][lane], lane=lane)
@@ -0,0 +1,209 @@
+import contextvars
+import importlib
+import pkgutil
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from metrics import span
+
+# Declarative registry of analysis agents and the shared intermediate stages they consume, plus a
+# small DAG scheduler that runs one request's graph with maximum parallelism.
+#
+#   @stage("screenshot_bytes", inputs=("screenshot_base64",))
+#   def decode(screenshot_base64): ...
+#
+#   @agent("design_check_results", modes=("full",), inputs=("url", "key_elements", "screenshot_bytes", ...),
+#          history=design_history_issues)
+#   def run_design(url, key_elements, screenshot_bytes, ...): ...
+#
+# Inputs are either request inputs (REQUEST_INPUTS, passed to run_agents) or stage names. For each
+# request every stage the selected agents need is computed exactly once, as soon as its own inputs
+# are ready, and shared by all consumers; independent nodes run concurrently. Agents live in the
+# agents/ package and register themselves on import (load_agents() imports every module there),
+# so adding an agent does not touch app.py. Shared stages live in analysis_stages.py.
+# An agent's optional history(result) yields the (source, criterion, severity, issue, element) rows
+# analysis_history.py stores for it; incomplete_results() tells app.py (result cache) and the history
+# which agents' results are missing, failed, timed out or partial.
+#
+# A failing stage logs and yields None (consumers fall back to computing what they need); a failing
+# agent fails only its own future. Each node is timed as span "stage.<name>" / "agent.<key>", and
+# GraphRun.timings() reports start offset and duration per node for the response.
+
+REQUEST_INPUTS = ("url", "screenshot_base64", "key_elements", "screenshot_tiles", "on_item")
+FAILED_STATUSES = ("error", "timeout") # app.py's results for an agent that raised or outlived the budget
+
+
+class Node:
+    def __init__(self, name, func, inputs, kind, modes=(), history=None):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.kind = kind # "stage" or "agent"
+        self.modes = tuple(modes)
+        self.history = history # agents only: result -> issue rows for analysis_history
+
+
+_stages = {} # name -> Node
+_agents = {} # mode -> {result key: Node}, in registration order
+_loaded = False
+_load_lock = threading.Lock()
+
+
+def stage(name, inputs=()):
+    """Registers a shared intermediate computed at most once per request."""
+    def decorator(func):
+        _stages[name] = Node(name, func, inputs, "stage")
+        return func
+    return decorator
+
+
+def agent(key, inputs=(), modes=("full",), history=None):
+    """
+    Registers an agent whose return value becomes results[key] in the given analysis modes.
+    history(result), if given, yields (source, criterion, severity, issue, element) per finding.
+    """
+    def decorator(func):
+        for mode in modes:
+            _agents.setdefault(mode, {})[key] = Node(key, func, inputs, "agent", modes, history)
+        return func
+    return decorator
+
+
+def load_agents(package="agents"):
+    """Imports analysis_stages and every module in the agents package, so their registrations run."""
+    global _loaded
+    with _load_lock:
+        if _loaded:
+            return
+        importlib.import_module("analysis_stages")
+        agents_package = importlib.import_module(package)
+        for module in pkgutil.iter_modules(agents_package.__path__):
+            importlib.import_module(f"{package}.{module.name}")
+        _loaded = True
+
+
+def agents_for(mode):
+    load_agents()
+    return dict(_agents.get(mode, {}))
+
+
+def incomplete_results(mode, results):
+    """Result keys of the `mode` agents whose result is missing, failed, timed out or partial."""
+    incomplete = []
+    for key in agents_for(mode):
+        result = results.get(key)
+        if not isinstance(result, dict) or result.get("status") in FAILED_STATUSES or result.get("partial"):
+            incomplete.append(key)
+    return incomplete
+
+
+class GraphRun:
+    """
+    One request's run of the agents registered for `mode`. With parallel=True every node is submitted
+    to the graph's own thread pool (one worker per node) as soon as its inputs are ready, and the pool
+    shuts down once the last node has finished; otherwise (fast mode) the graph runs inline in
+    dependency order. futures[key] resolves to each agent's result (or its exception).
+    """
+
+    def __init__(self, mode, inputs, parallel=False):
+        self.inputs = {name: inputs.get(name) for name in REQUEST_INPUTS}
+        self.agents = agents_for(mode)
+        self.nodes = self._resolve()
+        self.futures = {name: Future() for name in self.nodes}
+        self.values = {}
+        self._timings = {}
+        self._lock = threading.Lock()
+        self._waiting = {name: sum(1 for dep in node.inputs if dep in self.nodes) for name, node in self.nodes.items()}
+        self._dependents = {name: [] for name in self.nodes}
+        for name, node in self.nodes.items():
+            for dep in node.inputs:
+                if dep in self.nodes:
+                    self._dependents[dep].append(name)
+        self._remaining = len(self.nodes)
+        self._executor = ThreadPoolExecutor(max_workers=max(len(self.nodes), 1), thread_name_prefix="agent-graph") if parallel else None
+        self._context = contextvars.copy_context() # request context (timings, budget, archive session) for every node
+        self._start = time.perf_counter()
+
+    def _resolve(self):
+        """The selected agents plus every stage they (transitively) depend on."""
+        nodes = {}
+        pending = list(self.agents.values())
+        while pending:
+            node = pending.pop()
+            if node.name in nodes:
+                continue
+            nodes[node.name] = node
+            for dep in node.inputs:
+                if dep in _stages:
+                    pending.append(_stages[dep])
+                elif dep not in REQUEST_INPUTS:
+                    raise KeyError(f"{node.kind} '{node.name}' needs unknown input '{dep}'")
+        return nodes
+
+    def start(self):
+        ready = [name for name, count in self._waiting.items() if count == 0]
+        if self._executor is None:
+            # Inline: a simple work list in dependency order on the calling thread
+            while ready:
+                name = ready.pop(0)
+                ready.extend(self._run_node(name))
+        else:
+            for name in ready:
+                self._submit(name)
+        return self
+
+    def _submit(self, name):
+        context = self._context.copy() # a Context can only be entered by one thread at a time
+        self._executor.submit(context.run, self._run_in_executor, name)
+
+    def _run_in_executor(self, name):
+        for dependent in self._run_node(name):
+            self._submit(dependent)
+        with self._lock:
+            self._remaining -= 1
+            done = self._remaining == 0
+        if done:
+            # Nothing left to submit; an agent that outlived the caller's time budget has finished by now too
+            self._executor.shutdown(wait=False)
+
+    def _run_node(self, name):
+        """Runs one node, resolves its future and returns the dependents that became ready."""
+        node = self.nodes[name]
+        arguments = {dep: (self.values.get(dep) if dep in self.nodes else self.inputs[dep]) for dep in node.inputs}
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            with span(f"{node.kind}.{name}"):
+                value = node.func(**arguments)
+            self.values[name] = value
+            self.futures[name].set_result(value)
+        except Exception as e:
+            status = "error"
+            if node.kind == "stage":
+                print(f"Stage {name} failed, consumers fall back to their own computation: {e}")
+                self.values[name] = None
+                self.futures[name].set_result(None)
+            else:
+                self.futures[name].set_exception(e)
+        self._timings[name] = {"node": name, "kind": node.kind, "start_ms": round((start - self._start) * 1000, 1),
+                               "ms": round((time.perf_counter() - start) * 1000, 1), "status": status}
+        ready = []
+        with self._lock:
+            for dependent in self._dependents[name]:
+                self._waiting[dependent] -= 1
+                if self._waiting[dependent] == 0:
+                    ready.append(dependent)
+        return ready
+
+    def agent_futures(self):
+        return {key: self.futures[key] for key in self.agents}
+
+    def timings(self):
+        """Per-node {"node", "kind", "start_ms", "ms", "status"} for the nodes finished so far, by start time."""
+        return sorted(self._timings.values(), key=lambda timing: timing["start_ms"])
+
+
+def run_agents(mode, parallel=False, **inputs):
+    """Starts the graph for `mode` with the given request inputs; returns the started GraphRun."""
+    return GraphRun(mode, inputs, parallel).start()
@@ -5,14 +5,23 @@
 # and Responsive Design checks.
 
 
-print(f"DEBUG: I am accessibility_agent.py, loaded from: {__file__}")
-
-
 import os
-from playwright.sync_api import sync_playwright
-from lxml import html # Make sure lxml is installed: pip install lxml
+from live_page import collect_live_page
+from lazy_imports import lazy_import
 from dataclasses import dataclass, field, asdict
 from typing import List, Dict, Optional, Tuple, Any
+from style_memo import parse_color, parse_px
+from layout_checks import run_layout_checks
+from pixel_contrast import measure_elements_contrast
+from image_utils import rgb_to_css
+from utils import decode_screenshot_bytes
+import time
+from metrics import span, record_span
+import cpu_pool
+from request_budget import skipped_stages
+from agent_registry import agent
+
+html = lazy_import("lxml.html") # Make sure lxml is installed: pip install lxml
 
 
 # --- Data Models ---
@@ -122,6 +131,9 @@ class AccessibilityAnalysisOutput:
    ))
    # Branding palette is NOT part of this agent's output
    # branding_palette: Dict[str, str] = field(default_factory=dict) # REMOVED
+   # Set when optional checks were skipped to stay within the request's time budget
+   partial: bool = False
+   skipped_stages: List[str] = field(default_factory=list)
 
 
 # --- Helper functions for Color Contrast Calculation (WCAG 2.x method) ---
@@ -156,12 +168,175 @@ def get_contrast_ratio(rgb1: Tuple[int, int, int], rgb2: Tuple[int, int, int]) -
 
 
 
+# --- Summary / output construction (shared by the live-browser and fast element-based checks) ---
+def build_accessibility_output(url: str, issues: List[WCAGAccessibilityIssue], responsive_issues: List[ResponsiveDesignIssue],
+                               automated_checks: List[str], manual_reviews_needed: List[str], browser_comp: BrowserCompatibility,
+                               wcag_compliance_level: str = "AA", mobile_accessibility_score: str = "good",
+                               mobile_optimization_score: str = "good", desktop_optimization_score: str = "excellent") -> AccessibilityAnalysisOutput:
+   """Rates the findings and wraps them in an AccessibilityAnalysisOutput."""
+   if not issues and not responsive_issues:
+       overall_summary = "The website demonstrates excellent accessibility and responsive design across various devices and browsers, adhering to WCAG AA standards. No critical issues were found."
+       overall_rating = "excellent"
+       mobile_accessibility_score = "excellent"
+       mobile_optimization_score = "excellent"
+   elif len(issues) < 3 and len(responsive_issues) < 2:
+       overall_summary = "The website has good foundational accessibility and responsive design, but a few minor issues were identified. Addressing these will further enhance usability for all users."
+       overall_rating = "good"
+   else:
+       overall_summary = f"Several accessibility and responsive design issues were found ({len(issues)} accessibility, {len(responsive_issues)} responsive). Addressing these is highly recommended to improve user experience and WCAG compliance."
+       overall_rating = "fair" if (len(issues) + len(responsive_issues)) > 5 else "poor"
+       mobile_accessibility_score = "fair"
+       mobile_optimization_score = "fair"
+
+
+   # --- Construct and return the result object ---
+   analysis_output = AccessibilityAnalysisOutput(
+       accessibility_issues=issues,
+       responsive_design_issues=responsive_issues,
+       summary=overall_summary,
+       overall_rating=overall_rating,
+       wcag_compliance_level=wcag_compliance_level,
+       mobile_accessibility_score=mobile_accessibility_score,
+       automated_checks_performed=automated_checks,
+       manual_review_needed=manual_reviews_needed,
+       device_compatibility=DeviceCompatibility(
+           mobile=mobile_optimization_score,
+           tablet="good", # Mock or refine if you add tablet specific checks
+           desktop=desktop_optimization_score
+       ),
+       browser_compatibility=browser_comp,
+       mobile_optimization_score=mobile_optimization_score,
+       desktop_optimization_score=desktop_optimization_score,
+
+
+       # Mock Website Rating (as per original JS code, this would be from another agent)
+       website_rating=WebsiteRating(
+           overall_score=4.6,
+           total_reviews=2847,
+           recommendation_percentage=94,
+           rating_breakdown={"5": 1936, "4": 626, "3": 199, "2": 57, "1": 29},
+           trust_indicators=[
+               TrustIndicator(type="verified", label="Verified Business", icon="✓"),
+               TrustIndicator(type="security", label="SSL Secured", icon="🔒"),
+               TrustIndicator(type="premium", label="Premium Member", icon="⭐")
+           ],
+           recent_reviews=[
+               Review(reviewer="Sarah M.", date="3 days ago", rating=5, text="Excellent customer service and fast shipping!"),
+               Review(reviewer="Mike R.", date="1 week ago", rating=4, text="Good selection of products and reasonable prices."),
+               Review(reviewer="Jennifer L.", date="2 weeks ago", rating=5, text="Outstanding experience! Accessibility features work perfectly.")
+           ],
+           website_info=WebsiteInfo(name="Mock Website", url=url, category="General", icon="🌐")
+       )
+   )
+   return analysis_output
+
+
+
+
+# --- Static (HTML-only) WCAG Checks ---
+def run_static_wcag_checks(page_html: bytes) -> Dict[str, List[Any]]:
+   """
+   The CPU-bound, browser-free part of the WCAG checks: parses the page HTML with lxml and runs
+   the XPath-based checks (alt text, keyboard, page title, language).
+   Module-level so cpu_pool can run it in a separate process; returns
+   {"issues": [...], "automated_checks": [...], "manual_reviews_needed": [...]}.
+   """
+   issues: List[WCAGAccessibilityIssue] = []
+   automated_checks: List[str] = []
+   manual_reviews_needed: List[str] = []
+
+   with span("accessibility.html_parse"):
+       tree = html.fromstring(page_html.decode('utf-8'))
+   wcag_checks_start = time.perf_counter()
+
+
+   # WCAG 1.1.1 Non-text Content - Alt text for images
+   for img in tree.xpath('//img'):
+       alt_text = img.get('alt')
+       src = img.get('src', 'N/A')
+       if not alt_text:
+           issues.append(WCAGAccessibilityIssue(
+               issue="Missing alt text for image",
+               element_description=f"Image with src: {src}",
+               suggestion="Add descriptive `alt` text to images to convey their purpose to screen reader users (WCAG 1.1.1). If purely decorative, use `alt=\"\"`.",
+               severity="high",
+               wcag_criterion="1.1.1 Non-text Content",
+               wcag_level="A",
+               html_snippet=f'<img src="{src}">'
+           ))
+       elif not alt_text.strip(): # Empty alt text
+            issues.append(WCAGAccessibilityIssue(
+               issue="Empty alt text for image",
+               element_description=f"Image with src: {src}",
+               suggestion="If decorative, use `alt=\"\"`. If content-bearing, add descriptive `alt` text (WCAG 1.1.1).",
+               severity="medium",
+               wcag_criterion="1.1.1 Non-text Content",
+               wcag_level="A",
+               html_snippet=f'<img src="{src}" alt="">'
+           ))
+   automated_checks.append("Alt Text Check (WCAG 1.1.1)")
+
+
+   # WCAG 2.1.1 Keyboard Accessibility (conceptual check)
+   # Check for interactive elements without tabindex or role when they should have them
+   # This is a very basic check; full keyboard accessibility requires manual testing.
+   interactive_elements_no_tabindex = tree.xpath('//a[not(@tabindex) and not(@href)] | //button[not(@tabindex)] | //input[not(@tabindex)]')
+   if interactive_elements_no_tabindex:
+       issues.append(WCAGAccessibilityIssue(
+           issue="Potentially inaccessible interactive elements",
+           element_description="Some links, buttons, or form controls may not be keyboard accessible.",
+           suggestion="Ensure all interactive elements are reachable and operable via keyboard. Use semantic HTML elements or add `tabindex='0'` and appropriate ARIA roles (WCAG 2.1.1).",
+           severity="high",
+           wcag_criterion="2.1.1 Keyboard",
+           wcag_level="A",
+           html_snippet=html.tostring(interactive_elements_no_tabindex[0], encoding='unicode') if interactive_elements_no_tabindex else None
+       ))
+   manual_reviews_needed.append("Full Keyboard Navigation Testing (tab order, focus visibility, all controls operable).")
+   automated_checks.append("Basic Interactive Element Check (WCAG 2.1.1)")
+
+
+   # WCAG 2.4.2 Page Titled
+   if not tree.xpath('//head/title/text()'):
+       issues.append(WCAGAccessibilityIssue(
+           issue="Missing page title",
+           element_description="HTML head",
+           suggestion="Every web page should have a unique and descriptive title in the `<title>` tag for better navigation and context (WCAG 2.4.2).",
+           severity="high",
+           wcag_criterion="2.4.2 Page Titled",
+           wcag_level="A",
+           html_snippet="<head>\n  <title>Your Page Title</title>\n</head>"
+       ))
+   automated_checks.append("Page Title Check (WCAG 2.4.2)")
+
+
+   # WCAG 3.1.1 Language of Page
+   html_element = tree.xpath('//html')[0] if tree.xpath('//html') else None
+   if not (html_element and html_element.get('lang')):
+       issues.append(WCAGAccessibilityIssue(
+           issue="Missing page language declaration",
+           element_description="HTML tag",
+           suggestion="Declare the primary human language of the web page using the `lang` attribute on the `<html>` element (WCAG 3.1.1) for screen reader pronunciation.",
+           severity="medium",
+           wcag_criterion="3.1.1 Language of Page",
+           wcag_level="A",
+           html_snippet="<html lang=\"en\">"
+       ))
+   automated_checks.append("Language Declaration Check (WCAG 3.1.1)")
+   record_span("accessibility.wcag_checks", wcag_checks_start)
+   return {"issues": issues, "automated_checks": automated_checks, "manual_reviews_needed": manual_reviews_needed}
+
+
 # --- Primary Analysis Function ---
-def analyze_website_accessibility_and_responsive(url: str, screenshot_base64: Optional[str] = None, key_elements: Optional[List[Dict]] = None) -> AccessibilityAnalysisOutput:
+def analyze_website_accessibility_and_responsive(url: str, screenshot_base64: Optional[str] = None, key_elements: Optional[List[Dict]] = None,
+                                                 layout_report: Optional[Dict[str, Any]] = None, screenshot_bytes: Optional[bytes] = None,
+                                                 live_page: Optional[Dict[str, Any]] = None) -> AccessibilityAnalysisOutput:
    """
    Performs WCAG accessibility and responsive design checks on a given URL.
    screenshot_base64 and key_elements are accepted for consistent API with app.py's calls,
-   but this agent primarily uses Playwright for its own scraping and live browser analysis.
+   but this agent primarily uses Playwright for its own scraping and live browser analysis
+   (live_page: the shared stage's collect_live_page() data; collected here when not given).
+   key_elements (and the shared layout_report stage, when given) feed the geometry checks;
+   with the screenshot (screenshot_bytes: the shared decoded stage) they also feed the pixel contrast check.
    """
    print(f"DEBUG: accessibility_agent: Starting analysis for {url}")
    print(f"DEBUG: accessibility_agent: received screenshot_present={screenshot_base64 is not None}, elements_present={key_elements is not None}")
@@ -182,209 +357,106 @@ def analyze_website_accessibility_and_responsive(url: str, screenshot_base64: Op
    browser_comp = BrowserCompatibility(chrome=False, firefox=False, safari=False, edge=False, internet_explorer=False)
 
 
-   page_content = ""
-  
-   # --- STEP 1: Use Playwright for live browser checks and HTML content ---
-   try:
-       with sync_playwright() as p:
-           # Launch browser in headless mode (no visible UI)
-           browser = p.chromium.launch(headless=True)
-           page = browser.new_page()
-
-
-           print(f"DEBUG: accessibility_agent: Navigating Playwright to {url}")
-           page.goto(url, wait_until="networkidle", timeout=60000) # Wait for network idle, increased timeout
-           page_content = page.content() # Get the full HTML content
-           print(f"DEBUG: accessibility_agent: Playwright navigation successful for {url}.")
-
-
-           # --- Browser Compatibility Check (Conceptual) ---
-           browser_comp = BrowserCompatibility(chrome=True, firefox=True, safari=True, edge=True, internet_explorer=False)
-           automated_checks.append("Browser Compatibility Check (Conceptual for modern browsers)")
-           manual_reviews_needed.append("Cross-browser testing (Firefox, Safari, Edge, etc.) for full verification.")
-
-
-           # --- Responsive Design Checks ---
-           # Define common device viewports
-           viewports = {
-               "mobile_small": {"width": 320, "height": 568},  # iPhone 5/SE
-   "mobile_large": {"width": 414, "height": 896},  # iPhone Plus / modern large phone
-   "tablet": {"width": 768, "height": 1024},      # iPad portrait
-   "desktop_small": {"width": 1024, "height": 768}, # Small desktop/laptop
-}
-
-
-           for device_name, viewport in viewports.items():
-               page.set_viewport_size(viewport)
-               page.wait_for_timeout(500) # Give page time to reflow
-
-
-               # Check for horizontal scrollbars
-               body_scroll_width = page.evaluate("document.body.scrollWidth")
-               viewport_width = viewport['width'] # Use dictionary access for width
-               if body_scroll_width > viewport_width + 10: # Allow a small margin
-                   responsive_issues.append(ResponsiveDesignIssue(
-                       issue="Horizontal scrolling detected",
-                       element_description=f"Page body at {device_name} ({viewport.width}px)", # Use viewport['width'] here too
-                       suggestion="Ensure content reflows vertically and doesn't overflow horizontally. Use `max-width: 100%; overflow-x: hidden;` on containers, and responsive units (%, vw) for widths.",
-                       severity="high",
-                       device_type=device_name,
-                       breakpoint_issue=True,
-                       css_solution="body { overflow-x: hidden; } /* Or specific containers with max-width: 100% */"
-                   ))
-              
-               # Check for images not scaling (basic check)
-               # Looks for images that don't have max-width:100% or similar responsive properties
-               if "mobile" in device_name and page.locator("img:not([style*='max-width:100%']):not([width=''])").count() > 0:
-                   responsive_issues.append(ResponsiveDesignIssue(
-                       issue="Images may not be responsive",
-                       element_description="Some images might not scale correctly",
-                       suggestion="Ensure images use `max-width: 100%; height: auto;` in CSS to scale down on smaller screens.",
-                       severity="medium",
-                       device_type=device_name,
-                       css_solution="img { max-width: 100%; height: auto; }"
-                   ))
-              
-               # Example: Check for very small font sizes on mobile
-               if "mobile" in device_name and page.evaluate('() => parseFloat(window.getComputedStyle(document.body).fontSize)') < 14:
-                   responsive_issues.append(ResponsiveDesignIssue(
-                       issue="Small font size on mobile",
-                       element_description="Body text",
-                       suggestion="Increase base font size on mobile for better readability (e.g., at least 16px).",
-                       severity="low",
-                       device_type=device_name,
-                       css_solution="body { font-size: 16px; } @media (max-width: 768px) { body { font-size: 1rem; } }"
-                   ))
-
-
-           automated_checks.append("Responsive Design Checks (multiple viewports)")
-           manual_reviews_needed.append("Thorough visual review of all breakpoints and interactive elements on real devices.")
-          
-           print(f"DEBUG: accessibility_agent: Playwright browser closed.")
-
-
-   except Exception as e:
-       print(f"ERROR: accessibility_agent: Playwright operation failed for {url}: {e}")
-       # Print full traceback to stdout for debugging in the terminal
-       import sys, traceback
-       traceback.print_exc(file=sys.stdout)
+   # --- STEP 1: Live browser data (the shared "live_page" stage: HTML, contrast data, responsive probes) ---
+   if live_page is None:
+       live_page = collect_live_page(url)
+   page_content = live_page["page_content"]
+   contrast_data = live_page["contrast_data"] # scored in STEP 2
+   contrast_error = live_page["contrast_error"]
+
+   if live_page["error"] is not None:
        overall_rating = "poor"
        issues.append(WCAGAccessibilityIssue(
            issue="Website loading/rendering error",
            element_description="Entire page",
-           suggestion=f"Could not load or render the page for analysis: {e}. Check URL or website availability.",
+           suggestion=f"Could not load or render the page for analysis: {live_page['error']}. Check URL or website availability.",
            severity="critical" # Changed to critical as it blocks all checks
        ))
-
-
-   # --- STEP 2: Parse HTML (if available) and perform WCAG checks ---
-   if page_content:
-       tree = html.fromstring(page_content)
-
-
-       # WCAG 1.1.1 Non-text Content - Alt text for images
-       for img in tree.xpath('//img'):
-           alt_text = img.get('alt')
-           src = img.get('src', 'N/A')
-           if not alt_text:
-               issues.append(WCAGAccessibilityIssue(
-                   issue="Missing alt text for image",
-                   element_description=f"Image with src: {src}",
-                   suggestion="Add descriptive `alt` text to images to convey their purpose to screen reader users (WCAG 1.1.1). If purely decorative, use `alt=\"\"`.",
+   else:
+       # --- Browser Compatibility Check (Conceptual) ---
+       browser_comp = BrowserCompatibility(chrome=True, firefox=True, safari=True, edge=True, internet_explorer=False)
+       automated_checks.append("Browser Compatibility Check (Conceptual for modern browsers)")
+       manual_reviews_needed.append("Cross-browser testing (Firefox, Safari, Edge, etc.) for full verification.")
+
+       # --- Responsive Design Checks (probed at common device viewports, see live_page.RESPONSIVE_VIEWPORTS) ---
+       for probe in live_page["viewports"]:
+           device_name = probe["device"]
+           # Check for horizontal scrollbars
+           if probe["scroll_width"] > probe["width"] + 10: # Allow a small margin
+               responsive_issues.append(ResponsiveDesignIssue(
+                   issue="Horizontal scrolling detected",
+                   element_description=f"Page body at {device_name} ({probe['width']}px)",
+                   suggestion="Ensure content reflows vertically and doesn't overflow horizontally. Use `max-width: 100%; overflow-x: hidden;` on containers, and responsive units (%, vw) for widths.",
                    severity="high",
-                   wcag_criterion="1.1.1 Non-text Content",
-                   wcag_level="A",
-                   html_snippet=f'<img src="{src}">'
+                   device_type=device_name,
+                   breakpoint_issue=True,
+                   css_solution="body { overflow-x: hidden; } /* Or specific containers with max-width: 100% */"
                ))
-           elif not alt_text.strip(): # Empty alt text
-                issues.append(WCAGAccessibilityIssue(
-                   issue="Empty alt text for image",
-                   element_description=f"Image with src: {src}",
-                   suggestion="If decorative, use `alt=\"\"`. If content-bearing, add descriptive `alt` text (WCAG 1.1.1).",
+
+           # Check for images not scaling (basic check)
+           if probe["unscaled_images"]:
+               responsive_issues.append(ResponsiveDesignIssue(
+                   issue="Images may not be responsive",
+                   element_description="Some images might not scale correctly",
+                   suggestion="Ensure images use `max-width: 100%; height: auto;` in CSS to scale down on smaller screens.",
                    severity="medium",
-                   wcag_criterion="1.1.1 Non-text Content",
-                   wcag_level="A",
-                   html_snippet=f'<img src="{src}" alt="">'
+                   device_type=device_name,
+                   css_solution="img { max-width: 100%; height: auto; }"
                ))
-       automated_checks.append("Alt Text Check (WCAG 1.1.1)")
 
+           # Example: Check for very small font sizes on mobile
+           if probe["body_font_px"] is not None and probe["body_font_px"] < 14:
+               responsive_issues.append(ResponsiveDesignIssue(
+                   issue="Small font size on mobile",
+                   element_description="Body text",
+                   suggestion="Increase base font size on mobile for better readability (e.g., at least 16px).",
+                   severity="low",
+                   device_type=device_name,
+                   css_solution="body { font-size: 16px; } @media (max-width: 768px) { body { font-size: 1rem; } }"
+               ))
+
+       automated_checks.append("Responsive Design Checks (multiple viewports)")
+       manual_reviews_needed.append("Thorough visual review of all breakpoints and interactive elements on real devices.")
 
-       # WCAG 2.1.1 Keyboard Accessibility (conceptual check)
-       # Check for interactive elements without tabindex or role when they should have them
-       # This is a very basic check; full keyboard accessibility requires manual testing.
-       interactive_elements_no_tabindex = tree.xpath('//a[not(@tabindex) and not(@href)] | //button[not(@tabindex)] | //input[not(@tabindex)]')
-       if interactive_elements_no_tabindex:
-           issues.append(WCAGAccessibilityIssue(
-               issue="Potentially inaccessible interactive elements",
-               element_description="Some links, buttons, or form controls may not be keyboard accessible.",
-               suggestion="Ensure all interactive elements are reachable and operable via keyboard. Use semantic HTML elements or add `tabindex='0'` and appropriate ARIA roles (WCAG 2.1.1).",
-               severity="high",
-               wcag_criterion="2.1.1 Keyboard",
-               wcag_level="A",
-               html_snippet=html.tostring(interactive_elements_no_tabindex[0], encoding='unicode') if interactive_elements_no_tabindex else None
-           ))
-       manual_reviews_needed.append("Full Keyboard Navigation Testing (tab order, focus visibility, all controls operable).")
-       automated_checks.append("Basic Interactive Element Check (WCAG 2.1.1)")
+
+   # Text contrast on the extension's screenshot (pixel_contrast.py): needs no live page
+   if screenshot_bytes is None:
+       screenshot_bytes = decode_screenshot_bytes(screenshot_base64)
+   pixel_measurements = measure_pixel_contrast(key_elements or [], screenshot_bytes)
+
+
+   # --- STEP 2: Parse HTML (if available) and perform WCAG checks ---
+   if page_content:
+       # lxml parsing + XPath checks run in the CPU pool (if enabled), off this request's GIL
+       with span("accessibility.static_checks_total"):
+           static_results = cpu_pool.run(run_static_wcag_checks, shared_bytes={"page_html": page_content.encode('utf-8')})
+       issues.extend(static_results["issues"])
+       automated_checks.extend(static_results["automated_checks"])
+       manual_reviews_needed.extend(static_results["manual_reviews_needed"])
 
 
        # WCAG 1.4.3 Contrast (Minimum) - Automated check (simplified)
        # This is an improved automated check, but still simplified.
        # A comprehensive check needs to analyze *all* text against its *actual* background pixel.
        try:
-           # Evaluate JavaScript to get computed styles for text/background of main elements
-           contrast_data = page.evaluate('''
-               () => {
-                   const results = [];
-                   const selectors = 'h1, h2, h3, h4, h5, h6, p, a, span, li, button, input[type="submit"], input[type="button"]';
-                   document.querySelectorAll(selectors).forEach(el => {
-                       const style = window.getComputedStyle(el);
-                       const tagName = el.tagName;
-                       const textContent = el.textContent ? el.textContent.trim().substring(0, 100) : '';
-                      
-                       // Skip if element has no text or is invisible
-                       if (!textContent || style.display === 'none' || style.visibility === 'hidden' || parseFloat(style.opacity) < 0.05) {
-                           return;
-                       }
-
-
-                       // Get text color and computed background color
-                       const textColor = style.color;
-                       let bgColor = style.backgroundColor;
-                      
-                       // Traverse up the DOM to find a non-transparent background
-                       let currentEl = el;
-                       while (currentEl && (bgColor === 'rgba(0, 0, 0, 0)' || bgColor === 'transparent')) {
-                           currentEl = currentEl.parentElement;
-                           if (currentEl) {
-                               bgColor = window.getComputedStyle(currentEl).backgroundColor;
-                           }
-                       }
-
-
-                       results.push({
-                           tagName: tagName,
-                           textContent: textContent,
-                           textColor: textColor,
-                           bgColor: bgColor
-                       });
-                   });
-                   return results;
-               }
-           ''')
+           # Computed text/background colors of the main text elements (live_page.CONTRAST_COLLECTOR_JS, collected in STEP 1)
+           contrast_start = time.perf_counter()
+           if contrast_data is None:
+               raise RuntimeError(contrast_error or "no contrast data collected")
 
+           # Text measured on the screenshot is scored from its real background (below), not from the
+           # first opaque ancestor background found here
+           measured_texts = {key_elements[i]['text_content'].strip()[:100] for i in pixel_measurements}
 
            for item in contrast_data:
+               if item['textContent'] in measured_texts:
+                   continue
                try:
-                   # Convert 'rgb(r, g, b)' or 'rgba(r, g, b, a)' to (r, g, b) tuple
-                   def parse_rgb_string(rgb_str):
-                       if rgb_str.startswith('rgb'):
-                           parts = rgb_str.replace('rgb(', '').replace('rgba(', '').replace(')', '').split(',')
-                           return (int(parts[0].strip()), int(parts[1].strip()), int(parts[2].strip()))
-                       return (0,0,0) # Default if parsing fails or invalid color
-
-
-                   fg_rgb = parse_rgb_string(item['textColor'])
-                   bg_rgb = parse_rgb_string(item['bgColor'])
+                   # Convert 'rgb(r, g, b)' or 'rgba(r, g, b, a)' to (r, g, b) tuple (memoized, see style_memo.py)
+                   fg_parsed = parse_color(item['textColor'])
+                   bg_parsed = parse_color(item['bgColor'])
+                   fg_rgb = fg_parsed[:3] if fg_parsed else (0,0,0) # Default if parsing fails or invalid color
+                   bg_rgb = bg_parsed[:3] if bg_parsed else (0,0,0)
                   
                    contrast = get_contrast_ratio(fg_rgb, bg_rgb)
                   
@@ -402,6 +474,7 @@ def analyze_website_accessibility_and_responsive(url: str, screenshot_base64: Op
                        ))
                except Exception as ce:
                    print(f"WARNING: Could not process contrast for item {item}: {ce}")
+           record_span("accessibility.contrast", contrast_start)
            automated_checks.append("Color Contrast Check (WCAG 1.4.3 - Automated Simplified)")
            manual_reviews_needed.append("Manual verification of color contrast, especially for complex backgrounds or small text.")
        except Exception as e:
@@ -412,37 +485,6 @@ def analyze_website_accessibility_and_responsive(url: str, screenshot_base64: Op
                suggestion=f"Could not perform automated contrast checks due to script error: {e}",
                severity="low"
            ))
-
-
-
-
-       # WCAG 2.4.2 Page Titled
-       if not tree.xpath('//head/title/text()'):
-           issues.append(WCAGAccessibilityIssue(
-               issue="Missing page title",
-               element_description="HTML head",
-               suggestion="Every web page should have a unique and descriptive title in the `<title>` tag for better navigation and context (WCAG 2.4.2).",
-               severity="high",
-               wcag_criterion="2.4.2 Page Titled",
-               wcag_level="A",
-               html_snippet="<head>\n  <title>Your Page Title</title>\n</head>"
-           ))
-       automated_checks.append("Page Title Check (WCAG 2.4.2)")
-
-
-       # WCAG 3.1.1 Language of Page
-       html_element = tree.xpath('//html')[0] if tree.xpath('//html') else None
-       if not (html_element and html_element.get('lang')):
-           issues.append(WCAGAccessibilityIssue(
-               issue="Missing page language declaration",
-               element_description="HTML tag",
-               suggestion="Declare the primary human language of the web page using the `lang` attribute on the `<html>` element (WCAG 3.1.1) for screen reader pronunciation.",
-               severity="medium",
-               wcag_criterion="3.1.1 Language of Page",
-               wcag_level="A",
-               html_snippet="<html lang=\"en\">"
-           ))
-       automated_checks.append("Language Declaration Check (WCAG 3.1.1)")
    else:
        print("WARNING: No HTML content available for detailed WCAG checks.")
        manual_reviews_needed.append("No automated WCAG checks performed due to lack of HTML content.")
@@ -450,66 +492,331 @@ def analyze_website_accessibility_and_responsive(url: str, screenshot_base64: Op
 
 
 
-   # --- STEP 3: Overall Summary based on findings ---
-   if not issues and not responsive_issues:
-       overall_summary = "The website demonstrates excellent accessibility and responsive design across various devices and browsers, adhering to WCAG AA standards. No critical issues were found."
-       overall_rating = "excellent"
-       mobile_accessibility_score = "excellent"
-       mobile_optimization_score = "excellent"
-   elif len(issues) < 3 and len(responsive_issues) < 2:
-       overall_summary = "The website has good foundational accessibility and responsive design, but a few minor issues were identified. Addressing these will further enhance usability for all users."
-       overall_rating = "good"
-   else:
-       overall_summary = f"Several accessibility and responsive design issues were found ({len(issues)} accessibility, {len(responsive_issues)} responsive). Addressing these is highly recommended to improve user experience and WCAG compliance."
-       overall_rating = "fair" if (len(issues) + len(responsive_issues)) > 5 else "poor"
-       mobile_accessibility_score = "fair"
-       mobile_optimization_score = "fair"
+   # Geometry checks need no live page: run them on the extension's elements when it sent any
+   if key_elements:
+       with span("accessibility.layout"):
+           add_layout_issues(key_elements, issues, automated_checks, manual_reviews_needed, layout_report)
+   if pixel_measurements:
+       add_pixel_contrast_issues(key_elements, pixel_measurements, issues, automated_checks)
 
 
-   # --- Construct and return the result object ---
-   analysis_output = AccessibilityAnalysisOutput(
-       accessibility_issues=issues,
-       responsive_design_issues=responsive_issues,
-       summary=overall_summary,
-       overall_rating=overall_rating,
+   # --- STEP 3: Overall Summary based on findings ---
+   analysis_output = build_accessibility_output(
+       url, issues, responsive_issues, automated_checks, manual_reviews_needed, browser_comp,
        wcag_compliance_level=wcag_compliance_level,
        mobile_accessibility_score=mobile_accessibility_score,
-       automated_checks_performed=automated_checks,
-       manual_review_needed=manual_reviews_needed,
-       device_compatibility=DeviceCompatibility(
-           mobile=mobile_optimization_score,
-           tablet="good", # Mock or refine if you add tablet specific checks
-           desktop=desktop_optimization_score
-       ),
-       browser_compatibility=browser_comp,
        mobile_optimization_score=mobile_optimization_score,
        desktop_optimization_score=desktop_optimization_score,
-
-
-       # Mock Website Rating (as per original JS code, this would be from another agent)
-       website_rating=WebsiteRating(
-           overall_score=4.6,
-           total_reviews=2847,
-           recommendation_percentage=94,
-           rating_breakdown={"5": 1936, "4": 626, "3": 199, "2": 57, "1": 29},
-           trust_indicators=[
-               TrustIndicator(type="verified", label="Verified Business", icon="✓"),
-               TrustIndicator(type="security", label="SSL Secured", icon="🔒"),
-               TrustIndicator(type="premium", label="Premium Member", icon="⭐")
-           ],
-           recent_reviews=[
-               Review(reviewer="Sarah M.", date="3 days ago", rating=5, text="Excellent customer service and fast shipping!"),
-               Review(reviewer="Mike R.", date="1 week ago", rating=4, text="Good selection of products and reasonable prices."),
-               Review(reviewer="Jennifer L.", date="2 weeks ago", rating=5, text="Outstanding experience! Accessibility features work perfectly.")
-           ],
-           website_info=WebsiteInfo(name="Mock Website", url=url, category="General", icon="🌐")
-       )
    )
+   analysis_output.skipped_stages = skipped_stages("accessibility.")
+   analysis_output.partial = bool(analysis_output.skipped_stages)
    print(f"DEBUG: accessibility_agent: Analysis complete for {url}. Issues found: {len(issues) + len(responsive_issues)}")
-   browser.close()
    return analysis_output
 
 
+# --- Fast, browser-free checks over the extension's key_elements payload ---
+# Used by mode=fast / mode=tiered in app.py: no Playwright launch, no network, a few ms of work.
+TEXT_CONTRAST_TAGS = {'H1', 'H2', 'H3', 'H4', 'H5', 'H6', 'P', 'A', 'BUTTON', 'LABEL', 'LI', 'SPAN'}
+MAX_FAST_CONTRAST_ISSUES = 20
+# Where the WCAG 1.4.3 colors come from when a screenshot is available (pixel_contrast.py):
+#   auto       : computed styles for text on its own opaque background, screenshot pixels for the rest
+#                (text over images, gradients or a parent's background)
+#   screenshot : screenshot pixels for every text element (computed styles where a box can't be measured)
+#   dom        : computed styles only, as without a screenshot
+CONTRAST_SOURCE = os.getenv("CONTRAST_SOURCE", "auto")
+
+
+def is_large_text(styles: Dict[str, Any]) -> bool:
+   """WCAG 'large text': at least 24px, or at least 18.66px (14pt) and bold."""
+   font_size_px = parse_px(styles.get('fontSize'))
+   if font_size_px is None:
+       return False
+   font_weight = str(styles.get('fontWeight') or '400')
+   is_bold = font_weight == 'bold' or (font_weight.isdigit() and int(font_weight) >= 700)
+   return font_size_px >= 24 or (font_size_px >= 18.66 and is_bold)
+
+
+def missing_alt_issue(e: Dict) -> Optional[WCAGAccessibilityIssue]:
+   """WCAG 1.1.1 for one element (the collector reports a missing alt as an empty string)."""
+   if e.get('tag_name') != 'IMG' or (e.get('alt') or '').strip():
+       return None
+   src = e.get('src') or 'N/A'
+   return WCAGAccessibilityIssue(
+       issue="Missing or empty alt text for image",
+       element_description=f"Image with src: {src}",
+       suggestion="Add descriptive `alt` text to images to convey their purpose to screen reader users (WCAG 1.1.1). If purely decorative, use `alt=\"\"`.",
+       severity="medium",
+       wcag_criterion="1.1.1 Non-text Content",
+       wcag_level="A",
+       html_snippet=f'<img src="{src}">'
+   )
+
+
+def missing_name_issue(e: Dict) -> Optional[WCAGAccessibilityIssue]:
+   """WCAG 2.4.4 / 4.1.2 for one link or button without text."""
+   tag_name = e.get('tag_name')
+   if tag_name not in ('A', 'BUTTON') or (e.get('text_content') or '').strip():
+       return None
+   is_link = tag_name == 'A'
+   return WCAGAccessibilityIssue(
+       issue="Link has no discernible text" if is_link else "Button has no accessible name",
+       element_description=f"{tag_name} {('to ' + e['href']) if is_link and e.get('href') else ''}".strip(),
+       suggestion="Give every link and button visible text or an `aria-label` describing its purpose.",
+       severity="high",
+       wcag_criterion="2.4.4 Link Purpose (In Context)" if is_link else "4.1.2 Name, Role, Value",
+       wcag_level="A"
+   )
+
+
+def text_contrast(e: Dict) -> Optional[Tuple[Tuple, float, float]]:
+   """(color pair key, contrast ratio, required ratio) for text on the element's own opaque background, else None."""
+   if e.get('tag_name') not in TEXT_CONTRAST_TAGS or not (e.get('text_content') or '').strip():
+       return None
+   styles = e.get('computed_styles') or {}
+   fg = parse_color(styles.get('color'))
+   bg = parse_color(styles.get('backgroundColor'))
+   if fg is None or bg is None or bg[3] < 1.0:
+       return None
+   large_text = is_large_text(styles)
+   return (fg[:3], bg[:3], large_text), get_contrast_ratio(fg[:3], bg[:3]), 3.0 if large_text else 4.5
+
+
+def contrast_issue(e: Dict, contrast: float, required: float) -> WCAGAccessibilityIssue:
+   styles = e.get('computed_styles') or {}
+   return WCAGAccessibilityIssue(
+       issue="Insufficient color contrast",
+       element_description=f"Text: '{e['text_content'][:100]}' (Tag: {e['tag_name']})",
+       suggestion=f"WCAG 1.4.3 requires {required}:1 for {'large' if required == 3.0 else 'normal'} text. Current contrast: {contrast:.2f}:1. Adjust colors to improve readability.",
+       severity="medium",
+       wcag_criterion="1.4.3 Contrast (Minimum)",
+       wcag_level="AA",
+       css_solution=f"/* Example: increase contrast */ color: {styles.get('color')}; background-color: {styles.get('backgroundColor')};"
+   )
+
+
+def measure_pixel_contrast(key_elements: List[Dict], screenshot_bytes: Optional[bytes], source: str = CONTRAST_SOURCE) -> Dict[int, Dict[str, Any]]:
+   """Screenshot-sampled contrast for the text elements `source` selects: {position in key_elements: measurement}."""
+   if source == "dom" or not screenshot_bytes:
+       return {}
+   indices, text_colors = [], []
+   for i, e in enumerate(key_elements):
+       if e.get('tag_name') not in TEXT_CONTRAST_TAGS or not (e.get('text_content') or '').strip():
+           continue
+       if source == "auto" and text_contrast(e) is not None:
+           continue
+       indices.append(i)
+       color = parse_color((e.get('computed_styles') or {}).get('color'))
+       text_colors.append(color[:3] if color is not None and color[3] >= 1.0 else None)
+   with span("accessibility.pixel_contrast"):
+       return measure_elements_contrast(screenshot_bytes, key_elements, indices, text_colors=text_colors)
+
+
+def pixel_contrast_issue(e: Dict, measurement: Dict[str, Any], required: float) -> WCAGAccessibilityIssue:
+   foreground, background = rgb_to_css(measurement["foreground"]), rgb_to_css(measurement["background"])
+   return WCAGAccessibilityIssue(
+       issue="Insufficient color contrast",
+       element_description=f"Text: '{e['text_content'][:100]}' (Tag: {e['tag_name']}), measured on the screenshot: {foreground} over {background}",
+       suggestion=f"WCAG 1.4.3 requires {required}:1 for {'large' if required == 3.0 else 'normal'} text. Worst-case contrast against the rendered background: {measurement['contrast']:.2f}:1 (typical {measurement['typical_contrast']:.2f}:1). Darken/lighten the text, or put a solid or scrim background behind it.",
+       severity="medium",
+       wcag_criterion="1.4.3 Contrast (Minimum)",
+       wcag_level="AA",
+       css_solution="/* Example: a scrim behind text on images */ background-color: rgba(0, 0, 0, 0.6);"
+   )
+
+
+def add_pixel_contrast_issues(key_elements: List[Dict], measurements: Dict[int, Dict[str, Any]], issues: List[WCAGAccessibilityIssue],
+                              automated_checks: List[str]) -> int:
+   """Issues for the measured elements below their required ratio, lowest contrast first (capped). Returns how many failed."""
+   failing = []
+   for i, measurement in measurements.items():
+       required = 3.0 if is_large_text(key_elements[i].get('computed_styles') or {}) else 4.5
+       if measurement["contrast"] < required:
+           failing.append((measurement["contrast"], i, required))
+   failing.sort()
+   for _, i, required in failing[:MAX_FAST_CONTRAST_ISSUES]:
+       issues.append(pixel_contrast_issue(key_elements[i], measurements[i], required))
+   automated_checks.append(f"Color Contrast Check (WCAG 1.4.3 - {len(measurements)} text elements measured on the screenshot)")
+   return len(failing)
+
+
+def element_issues(e: Dict) -> List[Tuple[str, WCAGAccessibilityIssue]]:
+   """(check, issue) pairs for the per-element checks on one element, for incremental re-checking (watch_session.py)."""
+   found = []
+   issue = missing_alt_issue(e)
+   if issue is not None:
+       found.append(("alt", issue))
+   issue = missing_name_issue(e)
+   if issue is not None:
+       found.append(("name", issue))
+   contrast = text_contrast(e)
+   if contrast is not None and contrast[1] < contrast[2]:
+       found.append(("contrast", contrast_issue(e, contrast[1], contrast[2])))
+   return found
+
+
+def overlapping_text_issue(finding: Dict[str, Any]) -> WCAGAccessibilityIssue:
+   return WCAGAccessibilityIssue(
+       issue="Text overlaps other text",
+       element_description=f"{finding['element']} overlaps {finding['other']} ({finding['overlap_px']}px²)",
+       suggestion="Overlapping text is hard or impossible to read. Check absolute positioning, negative margins and fixed heights that let content spill over.",
+       severity="medium",
+       wcag_criterion="1.4.10 Reflow",
+       wcag_level="AA"
+   )
+
+
+def occluded_text_issue(finding: Dict[str, Any]) -> WCAGAccessibilityIssue:
+   return WCAGAccessibilityIssue(
+       issue="Text may be covered by another element",
+       element_description=f"{finding['element']} is {finding['covered_ratio'] * 100:.0f}% covered by {finding['other']}",
+       suggestion="Make sure overlays, sticky bars and positioned elements do not hide content; verify visually, as z-index can reverse the paint order.",
+       severity="low",
+       wcag_criterion="1.4.10 Reflow",
+       wcag_level="AA"
+   )
+
+
+def small_target_issue(finding: Dict[str, Any]) -> WCAGAccessibilityIssue:
+   width, height = finding["size_px"]
+   return WCAGAccessibilityIssue(
+       issue="Touch target too small and too close to other targets",
+       element_description=f"{finding['element']} ({width}x{height}px), next to {finding['nearest_target']}",
+       suggestion="Make interactive targets at least 24x24 CSS px (44x44 recommended for touch), or leave enough space around them.",
+       severity="medium",
+       wcag_criterion="2.5.8 Target Size (Minimum)",
+       wcag_level="AA",
+       css_solution="/* Example */ min-width: 24px; min-height: 24px; /* or padding to enlarge the hit area */"
+   )
+
+
+def order_mismatch_issue(finding: Dict[str, Any]) -> WCAGAccessibilityIssue:
+   return WCAGAccessibilityIssue(
+       issue="Focus/reading order does not match the visual order",
+       element_description=f"{finding['element']} comes after {finding['previous']} in the DOM but sits {finding['rise_px']}px above it",
+       suggestion="Keep the DOM order consistent with the visual layout instead of reordering with CSS (order, flex-direction: *-reverse, absolute positioning).",
+       severity="medium",
+       wcag_criterion="2.4.3 Focus Order",
+       wcag_level="A"
+   )
+
+
+# run_layout_checks() report key -> issue for one of its findings (also used by watch_session.py)
+LAYOUT_ISSUE_BUILDERS = (
+   ("overlapping_text", overlapping_text_issue),
+   ("occluded_text", occluded_text_issue),
+   ("small_targets", small_target_issue),
+   ("order_mismatches", order_mismatch_issue),
+)
+
+
+def add_layout_issues(key_elements: List[Dict], issues: List[WCAGAccessibilityIssue], automated_checks: List[str], manual_reviews_needed: List[str],
+                      layout: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+   """
+   Geometry checks over the extension's bounding boxes (layout_checks.py, spatial-index backed):
+   overlapping/occluded text, WCAG 2.5.8 target size and DOM-vs-visual order. Returns the raw stats.
+   `layout` is a precomputed run_layout_checks() report (the shared "layout_report" stage).
+   """
+   if layout is None:
+       layout = run_layout_checks(key_elements)
+   for check, build_issue in LAYOUT_ISSUE_BUILDERS:
+       for finding in layout[check]:
+           issues.append(build_issue(finding))
+   automated_checks.append("Layout Checks: overlapping text, target size (WCAG 2.5.8), focus order (WCAG 2.4.3) - from element geometry")
+   stats = layout["stats"]
+   if stats["targets_below_44px"]:
+       manual_reviews_needed.append(f"{stats['targets_below_44px']} of {stats['targets']} interactive targets are smaller than 44x44px (WCAG 2.5.5 AAA / touch guidelines).")
+   return stats
+
+
+def analyze_accessibility_from_elements(url: str, screenshot_base64: Optional[str] = None, key_elements: Optional[List[Dict]] = None,
+                                        layout_report: Optional[Dict[str, Any]] = None, screenshot_bytes: Optional[bytes] = None) -> AccessibilityAnalysisOutput:
+   """
+   Rule-based WCAG checks using only the DOM data (and screenshot) the extension already collected.
+   Much less thorough than analyze_website_accessibility_and_responsive (no live page, no
+   responsive viewports), but deterministic and fast enough to run on every click.
+   screenshot_bytes is the shared decoded screenshot stage; it is decoded here when not given.
+   """
+   issues: List[WCAGAccessibilityIssue] = []
+   automated_checks: List[str] = []
+   manual_reviews_needed: List[str] = ["Full live-browser accessibility and responsive checks (run the full analysis mode)."]
+   key_elements = key_elements or []
+
+   # WCAG 1.1.1 Non-text Content
+   for e in key_elements:
+       issue = missing_alt_issue(e)
+       if issue is not None:
+           issues.append(issue)
+   automated_checks.append("Alt Text Check (WCAG 1.1.1 - from extension data)")
+
+   # WCAG 2.4.4 Link Purpose / 4.1.2 Name, Role, Value - links and buttons without text
+   for e in key_elements:
+       issue = missing_name_issue(e)
+       if issue is not None:
+           issues.append(issue)
+   automated_checks.append("Link/Button Name Check (WCAG 2.4.4, 4.1.2 - from extension data)")
+
+   # WCAG 1.4.3 Contrast (Minimum) - measured on the screenshot where CONTRAST_SOURCE says so,
+   # from computed styles where the element itself has an opaque background (each color pair once)
+   if screenshot_bytes is None:
+       screenshot_bytes = decode_screenshot_bytes(screenshot_base64)
+   pixel_measurements = measure_pixel_contrast(key_elements, screenshot_bytes)
+   seen_color_pairs = set()
+   contrast_issue_count = 0
+   for i, e in enumerate(key_elements):
+       if i in pixel_measurements:
+           continue
+       contrast = text_contrast(e)
+       if contrast is None or contrast[0] in seen_color_pairs:
+           continue
+       pair_key, ratio, required = contrast
+       seen_color_pairs.add(pair_key)
+       if ratio < required and contrast_issue_count < MAX_FAST_CONTRAST_ISSUES:
+           contrast_issue_count += 1
+           issues.append(contrast_issue(e, ratio, required))
+   automated_checks.append("Color Contrast Check (WCAG 1.4.3 - elements with opaque backgrounds only)")
+   if pixel_measurements:
+       add_pixel_contrast_issues(key_elements, pixel_measurements, issues, automated_checks)
+   else:
+       manual_reviews_needed.append("Contrast of text over transparent, image or gradient backgrounds.")
+
+   with span("accessibility.layout"):
+       add_layout_issues(key_elements, issues, automated_checks, manual_reviews_needed, layout_report)
+
+   return build_accessibility_output(
+       url, issues, [], automated_checks, manual_reviews_needed,
+       BrowserCompatibility(chrome=False, firefox=False, safari=False, edge=False, internet_explorer=False),
+       mobile_accessibility_score="N/A", mobile_optimization_score="N/A", desktop_optimization_score="N/A",
+   )
+
+
+
+
+# --- Registration (agent_registry.py): results are returned as plain dicts ---
+def accessibility_history_issues(result: Dict[str, Any]):
+   """Issue rows for analysis_history: (source, criterion, severity, issue, element)."""
+   for item in result.get("accessibility_issues") or []:
+       yield "accessibility", item.get("wcag_criterion"), item.get("severity"), item.get("issue"), item.get("element_description")
+   for item in result.get("responsive_design_issues") or []:
+       yield "responsive", item.get("device_type"), item.get("severity"), item.get("issue"), item.get("element_description")
+
+
+@agent("accessibility_results", modes=("full",), inputs=("url", "screenshot_base64", "key_elements", "layout_report", "screenshot_bytes", "live_page"),
+       history=accessibility_history_issues)
+def run_accessibility_agent(url: str, screenshot_base64: Optional[str], key_elements: Optional[List[Dict]], layout_report: Optional[Dict[str, Any]],
+                            screenshot_bytes: Optional[bytes], live_page: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+   return asdict(analyze_website_accessibility_and_responsive(url, screenshot_base64, key_elements, layout_report=layout_report,
+                                                              screenshot_bytes=screenshot_bytes, live_page=live_page))
+
+
+@agent("accessibility_results", modes=("fast",), inputs=("url", "screenshot_base64", "key_elements", "layout_report", "screenshot_bytes"),
+       history=accessibility_history_issues)
+def run_accessibility_checks_fast(url: str, screenshot_base64: Optional[str], key_elements: Optional[List[Dict]], layout_report: Optional[Dict[str, Any]],
+                                  screenshot_bytes: Optional[bytes]) -> Dict[str, Any]:
+   return asdict(analyze_accessibility_from_elements(url, screenshot_base64, key_elements, layout_report=layout_report, screenshot_bytes=screenshot_bytes))
+
+
+
+
 # Example of how you would call this (for local testing purposes)
 if __name__ == '__main__':
    import json # Import here for local testing block
@@ -1,6 +1,26 @@
-import google.generativeai as genai
-from utils import get_image_parts, parse_gemini_json_response
+import gemini_client
+from utils import get_image_parts, decode_screenshot_bytes, image_format
+from llm_json import parse_structured_response, stream_llm_json
+from image_utils import extract_colors_from_screenshot, merge_color_palettes, image_from_bytes
+from llm_context import build_element_context, DESIGN_CONTEXT_TOKEN_BUDGET, FOLD_Y
+from layout_checks import LayoutChecker
 import json # Import json for better error handling during LLM response parsing
+import time
+from functools import partial
+from agent_registry import agent
+from metrics import span, record_span, record_llm_usage
+import cpu_pool
+from screenshot_tiles import select_prompt_tiles
+from style_memo import normalize_font_family, parse_px, style_fingerprint
+from request_budget import budget_allows, budget_timeout_ms, skipped_stages, LLM_ESTIMATE_MS, LLM_FOLLOWUP_ESTIMATE_MS
+
+DESIGN_PROMPT_MAX_TILES = 2 # screenshot tiles sent to Gemini: above the fold + the busiest other tile
+
+# Expected shape of Gemini's answer (see llm_json.py); invalid feedback items are dropped
+DESIGN_RESPONSE_SCHEMA = {
+    "vibe_analysis": {"type": dict, "fields": {"keywords": list, "description": str}},
+    "design_feedback": {"type": list, "item_fields": {"aspect": str, "issue": str, "recommendation": str, "severity": str}, "min_items": 1},
+}
 
 # --- Helper function for refined color palette extraction with proportions (no change) ---
 def extract_colors_from_key_elements_refined(key_elements, num_colors=5): 
@@ -39,31 +59,27 @@ def extract_colors_from_key_elements_refined(key_elements, num_colors=5):
     return dominant_palette_with_proportions
 
 
-def analyze_design(url, screenshot_base64, key_elements):
+def compute_design_heuristics(key_elements, screenshot_bytes=None, context_token_budget=DESIGN_CONTEXT_TOKEN_BUDGET, cta_ranking=None):
     """
-    Analyzes the design of a webpage using DOM data and Gemini Vision Pro,
-    extracting font guidelines, a refined color palette, the website's overall vibe,
-    and design principle insights (Hierarchy, Repetition & Consistency).
+    The CPU-bound part of the design analysis: palettes (DOM + screenshot pixels), typography,
+    hierarchy/consistency metrics, rule-based feedback and the token-budgeted element table.
+    Module-level and JSON-in/JSON-out so cpu_pool can run it in a separate process.
+    cta_ranking is the shared "layout_report" stage's full ranking; computed here when not given.
     """
-    print(f"Running Design Agent for: {url}")
-    
     # --- Existing Data Extraction ---
     unique_font_families = set()
     raw_typography_guidelines = {
         'H1': [], 'H2': [], 'P': []
     }
-    extracted_color_palette_with_proportions = extract_colors_from_key_elements_refined(key_elements, num_colors=5)
-
-    SYSTEM_FONTS = [
-        'sans-serif', 'serif', 'monospace', 'cursive', 'fantasy', 
-        '-apple-system', 'BlinkMacSystemFont', 'system-ui', 
-        'Segoe UI Symbol', 'Segoe UI Emoji', 'Twemoji Mozilla', 
-        'Roboto', 'Noto Sans', 
-        'Arial', 'Helvetica', 'Verdana', 'Tahoma', 'Trebuchet MS', 'Georgia', 'Times New Roman', 'Courier New',
-        'Meiryo', 'Yu Gothic', 'Microsoft YaHei', 'Apple Color Emoji' 
-    ]
+    with span("design.dom_palette"):
+        dom_color_palette = extract_colors_from_key_elements_refined(key_elements, num_colors=5)
+    # Pixel-accurate palette from the rendered screenshot (sees images, gradients, real area)
+    with span("design.screenshot_palette"):
+        screenshot_color_palette = extract_colors_from_screenshot(None, num_colors=5, image=image_from_bytes(screenshot_bytes))
+    extracted_color_palette_with_proportions = merge_color_palettes(dom_color_palette, screenshot_color_palette, num_colors=5)
 
     # --- Metrics Collection for Hierarchy & Consistency ---
+    heuristics_start = time.perf_counter()
     h1_font_sizes = []
     h2_font_sizes = []
     p_font_sizes = []
@@ -75,25 +91,21 @@ def analyze_design(url, screenshot_base64, key_elements):
     p_styles_found = {}
     button_styles_found = {} # {bg_color_text_color_font_size_font_weight: count}
     link_styles_found = {} # For A tags acting as links
+    # Fold-relative CTA ranking (size, screens from the top, competing CTAs nearby) via the spatial index
+    if cta_ranking is None:
+        with span("design.cta_ranking"):
+            cta_ranking = LayoutChecker(key_elements).rank_ctas(limit=None)
+    cta_ranks = {item["index"]: item for item in cta_ranking}
 
-    for e in key_elements:
+    for element_index, e in enumerate(key_elements):
         if e.get('text_content') and e.get('computed_styles'):
             styles = e['computed_styles']
             
             # Existing: Collect unique font families and raw guidelines
+            # (font stacks repeat across elements and requests: normalization is memoized, see style_memo.py)
             font_family_raw = styles.get('fontFamily')
             if font_family_raw:
-                individual_fonts = [f.strip().strip("'\"") for f in font_family_raw.split(',') if f.strip().strip("'\"")]
-                found_primary_font = False
-                for font in individual_fonts:
-                    font_lower = font.lower()
-                    if font in SYSTEM_FONTS: continue
-                    if "segoe ui" in font_lower:
-                        if "segoe ui emoji" in font_lower or "segoe ui symbol" in font_lower:
-                            if "segoe ui" in [f.lower() for f in individual_fonts if f not in SYSTEM_FONTS]: continue
-                            else: unique_font_families.add("Segoe UI"); found_primary_font = True; break
-                        else: unique_font_families.add("Segoe UI"); found_primary_font = True; break
-                    if not found_primary_font: unique_font_families.add(font); found_primary_font = True 
+                unique_font_families.update(normalize_font_family(font_family_raw))
 
             tag_name = e['tag_name']
             
@@ -111,15 +123,13 @@ def analyze_design(url, screenshot_base64, key_elements):
                     raw_typography_guidelines[tag_name].append(guideline_entry)
 
                 # Collect font sizes for hierarchy check
-                try:
-                    font_size_px = float(styles.get('fontSize', '0px').replace('px', ''))
-                    if tag_name == 'H1' and font_size_px > 0: h1_font_sizes.append(font_size_px)
-                    elif tag_name == 'H2' and font_size_px > 0: h2_font_sizes.append(font_size_px)
-                    elif tag_name == 'P' and font_size_px > 0: p_font_sizes.append(font_size_px)
-                except ValueError: pass
+                font_size_px = parse_px(styles.get('fontSize')) or 0
+                if tag_name == 'H1' and font_size_px > 0: h1_font_sizes.append(font_size_px)
+                elif tag_name == 'H2' and font_size_px > 0: h2_font_sizes.append(font_size_px)
+                elif tag_name == 'P' and font_size_px > 0: p_font_sizes.append(font_size_px)
 
                 # For Consistency: store a unique key for the style
-                style_key = f"{styles.get('fontSize')}_{styles.get('fontWeight')}_{font_family_raw}"
+                style_key = style_fingerprint(styles.get('fontSize'), styles.get('fontWeight'), font_family_raw)
                 if tag_name == 'H1': h1_styles_found[style_key] = h1_styles_found.get(style_key, 0) + 1
                 elif tag_name == 'H2': h2_styles_found[style_key] = h2_styles_found.get(style_key, 0) + 1
                 elif tag_name == 'P': p_styles_found[style_key] = p_styles_found.get(style_key, 0) + 1
@@ -135,7 +145,8 @@ def analyze_design(url, screenshot_base64, key_elements):
                 is_distinct_bg_color = bg_color not in ['transparent', 'rgba(0, 0, 0, 0)', 'rgb(255, 255, 255)', 'rgb(240, 240, 240)', 'initial'] and len(bg_color) > 0
                 is_distinct_text_color = text_color not in ['rgb(0, 0, 0)', 'rgb(51, 51, 51)', 'rgb(102, 102, 102)'] and len(text_color) > 0
                 
-                is_above_fold = e['bounding_box']['y'] < 800
+                cta_rank = cta_ranks.get(element_index) or {}
+                is_above_fold = cta_rank.get("above_fold", e['bounding_box']['y'] < FOLD_Y)
 
                 if is_prominent_size or is_bold or is_distinct_bg_color or is_distinct_text_color or is_above_fold:
                     cta_elements_for_llm.append({
@@ -143,16 +154,21 @@ def analyze_design(url, screenshot_base64, key_elements):
                         "text": e['text_content'][:50], # Truncate for prompt
                         "bbox": {'x': e['bounding_box']['x'], 'y': e['bounding_box']['y']}, # Simplify bbox for prompt
                         "styles": {k: styles.get(k) for k in ['fontSize', 'fontWeight', 'color', 'backgroundColor']},
-                        "above_fold": is_above_fold 
+                        "above_fold": is_above_fold,
+                        "fold": cta_rank.get("fold"), # screens from the top (0 = first screen)
+                        "rank": cta_rank.get("rank"),
+                        "competing_ctas": cta_rank.get("competing_ctas"), # other CTAs within 48px
                     })
                 
                 # For Consistency: store a unique key for button/link style
-                cta_style_key = f"{bg_color}_{text_color}_{styles.get('fontSize')}_{styles.get('fontWeight')}"
+                cta_style_key = style_fingerprint(bg_color, text_color, styles.get('fontSize'), styles.get('fontWeight'))
                 if tag_name == 'BUTTON': button_styles_found[cta_style_key] = button_styles_found.get(cta_style_key, 0) + 1
                 elif tag_name == 'A': link_styles_found[cta_style_key] = link_styles_found.get(cta_style_key, 0) + 1 # For general links
 
 
     unique_font_families_list = sorted(list(unique_font_families))
+    # Most prominent CTAs first, so the examples in the prompt are the ones a visitor actually sees
+    cta_elements_for_llm.sort(key=lambda cta: cta["rank"] or len(key_elements) + 1)
 
     # Calculate average font sizes for hierarchy
     avg_h1_size = sum(h1_font_sizes) / len(h1_font_sizes) if h1_font_sizes else 0
@@ -204,27 +220,104 @@ def analyze_design(url, screenshot_base64, key_elements):
         hierarchy_consistency_insights_text += " WARNING: Multiple link styles detected."
 
 
-    # --- LLM Vibe Analysis & Design Principles Assessment ---
-    llm_output_data = {} 
+    # --- Rule-based feedback from the same metrics (returned as-is when the LLM is skipped) ---
+    heuristic_design_feedback = []
+    if avg_h1_size > 0 and avg_h2_size > 0 and avg_h1_size <= avg_h2_size:
+        heuristic_design_feedback.append({"aspect": "Visual Hierarchy", "issue": "H1 is not clearly larger than H2.", "recommendation": "Increase H1 font size or weight so it stands above H2.", "severity": "Major"})
+    if avg_h2_size > 0 and avg_p_size > 0 and avg_h2_size <= avg_p_size:
+        heuristic_design_feedback.append({"aspect": "Visual Hierarchy", "issue": "H2 is not clearly larger than body text.", "recommendation": "Make H2 headings larger or bolder than paragraphs.", "severity": "Moderate"})
+    for tag_label, styles_found in (('H1', h1_styles_found), ('H2', h2_styles_found), ('P', p_styles_found)):
+        if len(styles_found) > 1 and sum(styles_found.values()) > 1:
+            heuristic_design_feedback.append({"aspect": "Repetition & Consistency", "issue": f"{len(styles_found)} different {tag_label} styles detected.", "recommendation": f"Use one consistent {tag_label} style across the page.", "severity": "Minor"})
+    if len(button_styles_found) > 1 and sum(button_styles_found.values()) > 1:
+        heuristic_design_feedback.append({"aspect": "CTA Consistency", "issue": f"{len(button_styles_found)} different button styles detected.", "recommendation": "Establish a consistent style guide for all buttons.", "severity": "Minor"})
+    if not cta_elements_for_llm:
+        heuristic_design_feedback.append({"aspect": "CTA Prominence", "issue": "No prominent call-to-action found.", "recommendation": "Add a clearly styled primary CTA above the fold.", "severity": "Moderate"})
+    elif not cta_elements_for_llm[0]["above_fold"]:
+        heuristic_design_feedback.append({"aspect": "CTA Prominence", "issue": f"The most prominent call-to-action ('{cta_elements_for_llm[0]['text']}') is below the fold.", "recommendation": "Move the primary CTA (or a copy of it) into the first screen.", "severity": "Moderate"})
+    elif (cta_elements_for_llm[0]["competing_ctas"] or 0) >= 3:
+        heuristic_design_feedback.append({"aspect": "CTA Prominence", "issue": "The primary call-to-action is crowded by several other buttons/links nearby.", "recommendation": "Give the primary CTA more space or fewer competing actions around it.", "severity": "Minor"})
+
+
+    record_span("design.heuristics", heuristics_start)
 
     typography_summary_text = f"Detected Fonts: {', '.join(unique_font_families_list)}. Main H1/H2/P guidelines are available." if unique_font_families_list else "No distinct font families identified."
     color_summary_text = "Dominant Color Palette: " + ", ".join([f"{c['color']} ({c['proportion']*100:.0f}%)" for c in extracted_color_palette_with_proportions]) + "." if extracted_color_palette_with_proportions else "No dominant color palette identified."
     
-    design_elements_context_for_llm = []
-    for i, e in enumerate(key_elements):
-        if i >= 50: break # Process max 50 elements for LLM context
-        if e['tag_name'] in ['H1', 'H2', 'P', 'BUTTON', 'A', 'IMG'] and e['bounding_box']['width'] > 0 and e['bounding_box']['height'] > 0:
-            styles = e['computed_styles']
-            element_detail = (
-                f"- Tag: {e['tag_name']}, Text: '{e['text_content'] or ''}', "
-                f"BBox: ({e['bounding_box']['x']},{e['bounding_box']['y']},{e['bounding_box']['width']}x{e['bounding_box']['height']}), "
-                f"Styles: {{font: {styles.get('fontSize')}/{styles.get('lineHeight')} {styles.get('fontFamily')}, color: {styles.get('color')}, bg: {styles.get('backgroundColor')}}}"
-            )
-            if e['tag_name'] == 'IMG' and e.get('src'):
-                element_detail += f", ImgSrc: {e['src'][:50]}..."
-            design_elements_context_for_llm.append(element_detail)
+    # Most prominent elements first, deduplicated, within the token budget
+    with span("design.llm_context"):
+        design_elements_context_for_llm, llm_context_stats = build_element_context(
+            key_elements,
+            context_token_budget,
+            tags=['H1', 'H2', 'P', 'BUTTON', 'A', 'IMG'],
+            columns=('tag', 'text', 'bbox', 'font', 'color', 'bg', 'src'),
+        )
+
+    return {
+        "unique_font_families": unique_font_families_list,
+        "typography_guidelines_raw": raw_typography_guidelines,
+        "brand_typography_summary": brand_typography_summary,
+        "extracted_color_palette": extracted_color_palette_with_proportions,
+        "dom_color_palette": dom_color_palette,
+        "screenshot_color_palette": screenshot_color_palette,
+        "heuristic_feedback": heuristic_design_feedback,
+        "hierarchy_consistency_insights_text": hierarchy_consistency_insights_text,
+        "typography_summary_text": typography_summary_text,
+        "color_summary_text": color_summary_text,
+        "elements_context": design_elements_context_for_llm,
+        "llm_context": llm_context_stats,
+    }
 
 
+def analyze_design(url, screenshot_base64, key_elements, context_token_budget=DESIGN_CONTEXT_TOKEN_BUDGET, use_llm=True, screenshot_tiles=None, on_item=None,
+                   screenshot_bytes=None, image_parts=None, cta_ranking=None):
+    """
+    Analyzes the design of a webpage using DOM data and Gemini Vision Pro,
+    extracting font guidelines, a refined color palette, the website's overall vibe,
+    and design principle insights (Hierarchy, Repetition & Consistency).
+    context_token_budget caps the (approximate) tokens spent on the DOM element table in the prompt.
+    use_llm=False skips Gemini entirely (fast mode): design_feedback then holds the rule-based findings.
+    screenshot_tiles (a ScreenshotTiles from the Playwright collector) replaces screenshot_base64:
+    the palette uses the above-the-fold tile and Gemini only gets the tiles select_prompt_tiles picks.
+    on_item(field, item) is called with each "design_feedback" item as soon as Gemini has streamed it.
+    screenshot_bytes, image_parts and cta_ranking take the request's shared stages (agent_registry.py)
+    instead of recomputing them.
+    """
+    print(f"Running Design Agent for: {url}")
+
+    if screenshot_tiles is not None and len(screenshot_tiles):
+        prompt_tile_indices = select_prompt_tiles(screenshot_tiles, key_elements, max_tiles=DESIGN_PROMPT_MAX_TILES)
+        screenshot_bytes = screenshot_tiles.tile_bytes(0)
+        image_parts = [{"mime_type": f"image/{image_format(screenshot_tiles.tile_bytes(i)) or 'png'}", "data": screenshot_tiles.tile_bytes(i)}
+                       for i in prompt_tile_indices]
+        tiles_info = dict(screenshot_tiles.summary(), sent_to_llm=prompt_tile_indices)
+    else:
+        # Decode once: the same bytes feed the pixel palette and the Gemini image part
+        if screenshot_bytes is None:
+            screenshot_bytes = decode_screenshot_bytes(screenshot_base64)
+        if image_parts is None:
+            image_parts = get_image_parts(screenshot_base64, image_bytes=screenshot_bytes)
+        tiles_info = None
+
+    # Heuristics run in the CPU pool (if enabled); the Gemini call below stays on this thread
+    with span("design.heuristics_total"):
+        heuristics = cpu_pool.run(
+            compute_design_heuristics,
+            shared_bytes={"screenshot_bytes": screenshot_bytes},
+            shared_json={"key_elements": key_elements},
+            context_token_budget=context_token_budget,
+            cta_ranking=cta_ranking,
+        )
+    extracted_color_palette_with_proportions = heuristics["extracted_color_palette"]
+    heuristic_design_feedback = heuristics["heuristic_feedback"]
+    typography_summary_text = heuristics["typography_summary_text"]
+    color_summary_text = heuristics["color_summary_text"]
+    hierarchy_consistency_insights_text = heuristics["hierarchy_consistency_insights_text"]
+    design_elements_context_for_llm = heuristics["elements_context"]
+    llm_context_stats = heuristics["llm_context"]
+    print(f"Design Agent: LLM context uses ~{llm_context_stats['tokens_used']}/{context_token_budget} tokens ({llm_context_stats['elements_included']} elements).")
+
+    # --- LLM Vibe Analysis & Design Principles Assessment ---
     prompt_parts = [
         """
         You are an expert brand and UI/UX analyst. Analyze the provided webpage screenshot and its DOM details.
@@ -244,9 +337,9 @@ def analyze_design(url, screenshot_base64, key_elements):
         """, # This first part is crucial for setting the tone and conciseness
         f"Webpage URL: {url}\n",
         "Here is the visual context:",
-        *get_image_parts(screenshot_base64), 
-        "\nHere are details of key elements from the page's DOM structure (max 50 elements for brevity):\n",
-        "\n".join(design_elements_context_for_llm) if design_elements_context_for_llm else "No specific elements provided or elements filtered for detailed analysis.",
+        *image_parts, 
+        "\nHere are the most visually prominent elements from the page's DOM structure, one per row (bbox is x,y,WxH; font is size/weight):\n",
+        design_elements_context_for_llm or "No specific elements provided or elements filtered for detailed analysis.",
         f"\nBased on extracted data, we found: {typography_summary_text}. {color_summary_text}.",
         f"\nSpecific Hierarchy and Consistency Metrics: {hierarchy_consistency_insights_text}",
         """
@@ -283,45 +376,96 @@ def analyze_design(url, screenshot_base64, key_elements):
         """
     ]
 
-    try:
-        model = genai.GenerativeModel('gemini-1.5-flash-latest')
-        response = model.generate_content(prompt_parts, generation_config={"response_mime_type": "application/json"}, request_options={"timeout": 120})
-        
-        parsed_llm_data = {} 
-        if response and response.text:
-            try:
-                parsed_llm_data = parse_gemini_json_response(response.text)
-            except json.JSONDecodeError as e:
-                print(f"JSON parsing error from LLM response: {e}")
-                print(f"Raw LLM response: {response.text}")
-                parsed_llm_data = {} 
-
-            if parsed_llm_data and 'vibe_analysis' in parsed_llm_data:
-                llm_vibe_analysis = parsed_llm_data['vibe_analysis']
-            else:
-                print(f"LLM did not return 'vibe_analysis' in the expected format: {response.text}")
-                llm_vibe_analysis = {"keywords": [], "description": "LLM response format error or missing 'vibe_analysis'."}
+    llm_parse_info = None
+    llm_stream_info = None
+    if not use_llm:
+        # Fast mode: deterministic, local-only results
+        llm_vibe_analysis = {"keywords": [], "description": "Skipped (fast mode: no LLM call)."}
+        llm_design_feedback = heuristic_design_feedback
+    elif not budget_allows("design.llm", LLM_ESTIMATE_MS):
+        # Not enough of the request's time budget left for Gemini: rule-based findings only
+        llm_vibe_analysis = {"keywords": [], "description": "Skipped (time budget exhausted before the LLM call)."}
+        llm_design_feedback = heuristic_design_feedback
+    else:
+        try:
+            model = gemini_client.generative_model('gemini-1.5-flash-latest')
+            generation_config = {"response_mime_type": "application/json"}
+            # Streamed: finished feedback items reach on_item while the rest is still generating
+            with span("design.llm"):
+                response, llm_stream_info = stream_llm_json(model, prompt_parts, "design", DESIGN_RESPONSE_SCHEMA, on_item=on_item, generation_config=generation_config, request_options={"timeout": budget_timeout_ms(120000) / 1000})
+            record_llm_usage(response, "design")
+
+            # Second (small) call only if fields are still missing after tolerant parsing/repair
+            def request_missing_fields(instruction):
+                if not budget_allows("design.llm_missing_fields", LLM_FOLLOWUP_ESTIMATE_MS):
+                    return None # keep what the first answer had
+                with span("design.llm_missing_fields"):
+                    followup = model.generate_content(prompt_parts + [instruction], generation_config=generation_config, request_options={"timeout": budget_timeout_ms(120000) / 1000})
+                record_llm_usage(followup, "design")
+                return followup.text
+
+            if response and response.text:
+                with span("design.parse"):
+                    parsed_llm_data, llm_parse_info = parse_structured_response(response.text, DESIGN_RESPONSE_SCHEMA, "design", reprompt=request_missing_fields)
+
+                if 'vibe_analysis' in parsed_llm_data:
+                    llm_vibe_analysis = parsed_llm_data['vibe_analysis']
+                else:
+                    print(f"LLM did not return 'vibe_analysis' in the expected format: {response.text}")
+                    llm_vibe_analysis = {"keywords": [], "description": "LLM response format error or missing 'vibe_analysis'."}
             
-            llm_design_feedback = parsed_llm_data.get('design_feedback', [])
-        else:
-            print("LLM returned an empty or invalid response text.")
-            llm_vibe_analysis = {"keywords": [], "description": "LLM returned an empty response."}
-            llm_design_feedback = []
+                llm_design_feedback = parsed_llm_data.get('design_feedback', [])
+            else:
+                print("LLM returned an empty or invalid response text.")
+                llm_vibe_analysis = {"keywords": [], "description": "LLM returned an empty response."}
+                llm_design_feedback = []
 
-    except Exception as e:
-        print(f"Error in LLM Analysis: {e}")
-        llm_vibe_analysis = {"keywords": [], "description": f"Failed to generate analysis due to error: {str(e)}"}
-        llm_design_feedback = []
+        except Exception as e:
+            print(f"Error in LLM Analysis: {e}")
+            llm_vibe_analysis = {"keywords": [], "description": f"Failed to generate analysis due to error: {str(e)}"}
+            llm_design_feedback = []
 
 
     # --- Final Output Structure ---
     design_analysis_output = {
-        "unique_font_families": unique_font_families_list,
-        "typography_guidelines_raw": raw_typography_guidelines, 
-        "brand_typography_summary": brand_typography_summary, 
+        "unique_font_families": heuristics["unique_font_families"],
+        "typography_guidelines_raw": heuristics["typography_guidelines_raw"], 
+        "brand_typography_summary": heuristics["brand_typography_summary"], 
         "extracted_color_palette": extracted_color_palette_with_proportions,
+        "dom_color_palette": heuristics["dom_color_palette"],
+        "screenshot_color_palette": heuristics["screenshot_color_palette"],
         "vibe_analysis": llm_vibe_analysis,
-        "design_feedback": llm_design_feedback 
+        "design_feedback": llm_design_feedback,
+        "heuristic_feedback": heuristic_design_feedback,
+        "llm_context": llm_context_stats,
+        "llm_used": use_llm,
+        "llm_parse": llm_parse_info,
+        "llm_stream": llm_stream_info,
+        "partial": bool(skipped_stages("design.")),
+        "skipped_stages": skipped_stages("design."),
+        "screenshot_tiles": tiles_info
     }
     print('design vibe', llm_design_feedback)
-    return {"status": "success", "data": design_analysis_output}
\ No newline at end of file
+    return {"status": "success", "data": design_analysis_output}
+
+
+# --- Registration (agent_registry.py): shared stages arrive precomputed, once per request ---
+def design_history_issues(result):
+    """Issue rows for analysis_history: (source, criterion, severity, issue, element)."""
+    for item in (result.get("data") or {}).get("design_feedback") or []:
+        if isinstance(item, dict):
+            yield "design", item.get("aspect"), item.get("severity"), item.get("issue"), None
+
+
+@agent("design_check_results", modes=("full",), inputs=("url", "screenshot_base64", "key_elements", "screenshot_tiles", "screenshot_bytes", "image_parts", "layout_report", "on_item"),
+       history=design_history_issues)
+def run_design_agent(url, screenshot_base64, key_elements, screenshot_tiles, screenshot_bytes, image_parts, layout_report, on_item):
+    return analyze_design(url, screenshot_base64, key_elements, screenshot_tiles=screenshot_tiles, screenshot_bytes=screenshot_bytes, image_parts=image_parts,
+                          cta_ranking=(layout_report or {}).get("cta_ranking"), on_item=partial(on_item, "design_check_results") if on_item else None)
+
+
+@agent("design_check_results", modes=("fast",), inputs=("url", "screenshot_base64", "key_elements", "screenshot_bytes", "layout_report"),
+       history=design_history_issues)
+def run_design_checks_fast(url, screenshot_base64, key_elements, screenshot_bytes, layout_report):
+    return analyze_design(url, screenshot_base64, key_elements, use_llm=False, screenshot_bytes=screenshot_bytes,
+                          cta_ranking=(layout_report or {}).get("cta_ranking"))
@@ -0,0 +1,394 @@
+import os
+from dataclasses import dataclass, field, asdict
+from typing import List, Dict, Optional, Any
+from urllib.parse import urlparse
+
+from agent_registry import agent
+from live_page import collect_live_page
+from metrics import span
+
+# Web performance audit on the live_page stage (live_page.py): the same Playwright visit the
+# accessibility agent uses, plus one init script (LCP / layout-shift / long-task observers) and one
+# page.evaluate (Navigation + Resource Timing, paint timings, every <img>). Everything below is
+# arithmetic on that data, so the audit adds a few milliseconds to a full analysis.
+#
+# Findings use the same fields as WCAGAccessibilityIssue (issue, element_description, suggestion,
+# severity, html_snippet, css_solution) plus the metric they are about and, where it can be
+# estimated, the bytes a fix would save. They are sorted by severity, then by savings.
+#
+# Thresholds are the Core Web Vitals / Lighthouse ones: (good up to, poor from).
+METRIC_THRESHOLDS = {
+    "lcp_ms": (2500, 4000),
+    "cls": (0.1, 0.25),
+    "tbt_ms": (200, 600),
+    "fcp_ms": (1800, 3000),
+    "ttfb_ms": (800, 1800),
+}
+LONG_TASK_BLOCKING_MS = 50 # the part of a long task beyond 50ms counts as blocking time
+CLS_SESSION_GAP_MS = 1000 # layout shifts are grouped in session windows (gap < 1s, window < 5s)
+CLS_SESSION_MAX_MS = 5000
+
+# Images: the headless page renders at DPR 1, but 2x sources for high-density screens are legitimate
+ASSUMED_MAX_DPR = 2
+OVERSIZED_MIN_WASTE_RATIO = 0.5 # at least half of the decoded pixels are never shown
+MIN_IMAGE_SAVINGS_BYTES = 4096
+LEGACY_FORMAT_MIN_BYTES = 100 * 1024
+# Rough WebP/AVIF savings per legacy format (re-encoding at a comparable quality)
+MODERN_FORMAT_SAVINGS = {"jpg": 0.3, "jpeg": 0.3, "png": 0.5, "gif": 0.6, "bmp": 0.8}
+
+PAGE_WEIGHT_BYTES = (2500 * 1024, 5000 * 1024) # (medium, high)
+SCRIPT_WEIGHT_BYTES = (500 * 1024, 1000 * 1024)
+MAX_LISTED_URLS = 5
+
+SEVERITY_RANK = {"critical": 0, "high": 1, "medium": 2, "low": 3}
+RESOURCE_TYPES = ("document", "script", "stylesheet", "image", "font", "fetch", "other")
+EXTENSION_TYPES = {
+    "js": "script", "mjs": "script",
+    "css": "stylesheet",
+    "png": "image", "jpg": "image", "jpeg": "image", "gif": "image", "webp": "image", "avif": "image", "svg": "image", "ico": "image", "bmp": "image",
+    "woff": "font", "woff2": "font", "ttf": "font", "otf": "font", "eot": "font",
+    "json": "fetch",
+}
+INITIATOR_TYPES = {"script": "script", "css": "stylesheet", "img": "image", "image": "image", "fetch": "fetch",
+                   "xmlhttprequest": "fetch", "beacon": "fetch", "iframe": "document", "navigation": "document"}
+
+
+@dataclass
+class PerformanceIssue:
+    """A single performance finding (same core fields as WCAGAccessibilityIssue)."""
+    issue: str
+    element_description: str
+    suggestion: str
+    severity: str # 'critical', 'high', 'medium', 'low'
+    metric: Optional[str] = None # e.g. "lcp_ms", "transfer_bytes"
+    value: Optional[float] = None # measured value of that metric
+    threshold: Optional[float] = None # value it should stay under
+    estimated_savings_bytes: Optional[int] = None
+    html_snippet: Optional[str] = None
+    css_solution: Optional[str] = None
+
+
+@dataclass
+class PerformanceAnalysisOutput:
+    url: str
+    summary: str = "Analysis complete."
+    overall_rating: str = "good" # "excellent", "good", "fair", "poor"
+    metrics: Dict[str, Any] = field(default_factory=dict)
+    metric_ratings: Dict[str, str] = field(default_factory=dict) # "good", "needs-improvement", "poor"
+    transfer_bytes_by_type: Dict[str, int] = field(default_factory=dict)
+    performance_issues: List[PerformanceIssue] = field(default_factory=list)
+    automated_checks_performed: List[str] = field(default_factory=list)
+    manual_review_needed: List[str] = field(default_factory=list)
+
+
+# --- Metrics ---
+def cumulative_layout_shift(layout_shifts: List[Dict[str, float]]) -> float:
+    """CLS as Chrome defines it: the largest session window of shifts (not caused by input)."""
+    largest = current = 0.0
+    window_start = previous = None
+    for shift in sorted(layout_shifts or [], key=lambda s: s["time"]):
+        if previous is None or shift["time"] - previous > CLS_SESSION_GAP_MS or shift["time"] - window_start > CLS_SESSION_MAX_MS:
+            window_start, current = shift["time"], 0.0
+        current += shift["value"]
+        previous = shift["time"]
+        largest = max(largest, current)
+    return largest
+
+
+def total_blocking_time(long_tasks: List[Dict[str, float]], fcp_ms: Optional[float]) -> float:
+    """Blocking part of the long tasks after first contentful paint (up to when the data was read)."""
+    start = fcp_ms or 0
+    return sum(max(0.0, task["duration"] - LONG_TASK_BLOCKING_MS) for task in long_tasks or [] if task["time"] + task["duration"] > start)
+
+
+def rate_metric(name: str, value: Optional[float]) -> Optional[str]:
+    if value is None:
+        return None
+    good, poor = METRIC_THRESHOLDS[name]
+    return "good" if value <= good else "poor" if value > poor else "needs-improvement"
+
+
+# --- Resources ---
+def url_extension(url: str) -> str:
+    path = urlparse(url).path
+    return os.path.splitext(path)[1][1:].lower() if path else ""
+
+
+def resource_type(resource: Dict[str, Any]) -> str:
+    ext = url_extension(resource["url"])
+    if ext in EXTENSION_TYPES:
+        return EXTENSION_TYPES[ext]
+    if resource.get("initiator") == "link":
+        return "stylesheet" if ext == "css" else "other" # preloads/prefetches of unknown type
+    return INITIATOR_TYPES.get(resource.get("initiator"), "other")
+
+
+def resource_bytes(resource: Dict[str, Any]) -> int:
+    # transferSize is 0 for cache hits and for cross-origin responses without Timing-Allow-Origin
+    return resource.get("transfer") or resource.get("encoded") or 0
+
+
+def short_url(url: str, limit: int = 80) -> str:
+    return url if len(url) <= limit else url[:limit - 3] + "..."
+
+
+def format_kb(size: float) -> str:
+    return f"{size / 1024:.0f} KB"
+
+
+# --- Findings ---
+def metric_issues(metrics: Dict[str, Any], ratings: Dict[str, str]) -> List[PerformanceIssue]:
+    issues = []
+    lcp = metrics.get("lcp_element") or {}
+    lcp_description = lcp.get("url") or (f"{lcp.get('tag')} '{lcp.get('text')}'" if lcp.get("text") else lcp.get("tag")) or "Largest contentful element"
+    texts = {
+        "lcp_ms": ("Largest Contentful Paint is slow", lcp_description,
+                   "Make the LCP resource discoverable in the HTML (no lazy-loading, fetchpriority=\"high\" or a preload), compress it and cut render-blocking CSS/JS before it."),
+        "cls": ("Layout shifts while the page loads (Cumulative Layout Shift)", "Elements that move after first render",
+                "Reserve space for images, embeds and ads (width/height or aspect-ratio), and avoid inserting content above existing content."),
+        "tbt_ms": ("Long main-thread tasks block input (Total Blocking Time)", f"{metrics.get('long_tasks', 0)} long tasks",
+                   "Split long JavaScript tasks, defer non-critical scripts and remove unused code."),
+        "fcp_ms": ("First Contentful Paint is slow", "Initial render",
+                   "Reduce render-blocking resources and server response time; inline the critical CSS."),
+        "ttfb_ms": ("Slow server response (Time to First Byte)", "Main document",
+                    "Cache the HTML at the edge/CDN, reduce server-side work and redirects."),
+    }
+    for name, rating in ratings.items():
+        if rating in (None, "good"):
+            continue
+        title, element, suggestion = texts[name]
+        issues.append(PerformanceIssue(
+            issue=f"{title}: {metrics[name]}{'' if name == 'cls' else 'ms'}",
+            element_description=element,
+            suggestion=suggestion,
+            severity="high" if rating == "poor" else "medium",
+            metric=name, value=metrics[name], threshold=METRIC_THRESHOLDS[name][0],
+            html_snippet='<img src="..." width="640" height="360">' if name == "cls" else None,
+            css_solution="img, video { max-width: 100%; height: auto; } /* keeps the width/height aspect ratio */" if name == "cls" else None,
+        ))
+    return issues
+
+
+def rendered_sizes_from_elements(key_elements: Optional[List[Dict]]) -> Dict[str, tuple]:
+    """src -> largest (width, height) an IMG has in the extension's snapshot (the user's real viewport)."""
+    sizes = {}
+    for e in key_elements or []:
+        box = e.get("bounding_box") or {}
+        if e.get("tag_name") == "IMG" and e.get("src") and box.get("width"):
+            width, height = sizes.get(e["src"], (0, 0))
+            sizes[e["src"]] = (max(width, box["width"]), max(height, box.get("height") or 0))
+    return sizes
+
+
+def image_issues(performance: Dict[str, Any], bytes_by_url: Dict[str, int], key_elements: Optional[List[Dict]]) -> List[PerformanceIssue]:
+    issues = []
+    viewport = performance.get("viewport") or {}
+    dpr = max(viewport.get("dpr") or 1, ASSUMED_MAX_DPR)
+    fold = viewport.get("height") or 0
+    extension_sizes = rendered_sizes_from_elements(key_elements)
+    lcp_url = (performance.get("lcp") or {}).get("url")
+    offscreen_eager, offscreen_bytes = [], 0
+    seen = set()
+
+    for image in performance.get("images") or []:
+        src = image.get("src") or ""
+        if not src or src.startswith("data:") or src in seen:
+            continue
+        seen.add(src)
+        ext = url_extension(src)
+        size = bytes_by_url.get(src, 0)
+        natural_w, natural_h = image.get("natural") or (0, 0)
+        live_w, live_h = image.get("rendered") or (0, 0)
+        ext_w, ext_h = extension_sizes.get(src, (0, 0))
+        # The larger display decides what resolution the file needs
+        shown_w, shown_h = max(live_w, ext_w), max(live_h, ext_h)
+
+        if lcp_url and src == lcp_url and image.get("loading") == "lazy":
+            issues.append(PerformanceIssue(
+                issue="The Largest Contentful Paint image is lazy-loaded",
+                element_description=short_url(src),
+                suggestion="Load the LCP image eagerly (remove loading=\"lazy\") and give it fetchpriority=\"high\".",
+                severity="high", metric="lcp_ms",
+                html_snippet=f'<img src="{short_url(src)}" fetchpriority="high">',
+            ))
+
+        if ext != "svg" and natural_w and natural_h and shown_w and shown_h:
+            needed = min(shown_w * dpr, natural_w) * min(shown_h * dpr, natural_h)
+            waste_ratio = 1 - needed / (natural_w * natural_h)
+            savings = int(size * waste_ratio) if size else None
+            if waste_ratio >= OVERSIZED_MIN_WASTE_RATIO and (savings is None or savings >= MIN_IMAGE_SAVINGS_BYTES):
+                issues.append(PerformanceIssue(
+                    issue=f"Image is much larger than it is displayed ({natural_w}x{natural_h} shown at {round(shown_w)}x{round(shown_h)})",
+                    element_description=short_url(src),
+                    suggestion=f"Serve a version sized for its display (about {round(shown_w * dpr)}px wide at {dpr}x) with srcset/sizes.",
+                    severity="medium" if (savings or 0) >= LEGACY_FORMAT_MIN_BYTES else "low",
+                    metric="image_bytes", value=size or None, estimated_savings_bytes=savings,
+                    html_snippet=None if image.get("srcset") else f'<img src="{short_url(src)}" srcset="... {round(shown_w)}w, ... {round(shown_w * dpr)}w" sizes="{round(shown_w)}px">',
+                ))
+
+        if ext in MODERN_FORMAT_SAVINGS and size >= LEGACY_FORMAT_MIN_BYTES:
+            savings = int(size * MODERN_FORMAT_SAVINGS[ext])
+            issues.append(PerformanceIssue(
+                issue=f"Large {ext.upper()} image ({format_kb(size)}) could use a modern format",
+                element_description=short_url(src),
+                suggestion="Re-encode as WebP or AVIF (with a <picture> fallback if older browsers matter).",
+                severity="medium" if savings >= LEGACY_FORMAT_MIN_BYTES else "low",
+                metric="image_bytes", value=size, estimated_savings_bytes=savings,
+                html_snippet=f'<picture><source srcset="{os.path.splitext(short_url(src))[0]}.avif" type="image/avif"><img src="{short_url(src)}"></picture>',
+            ))
+
+        if fold and (image.get("top") or 0) > fold and image.get("loading") != "lazy" and src != lcp_url:
+            offscreen_eager.append(src)
+            offscreen_bytes += size
+
+    if offscreen_eager and offscreen_bytes >= MIN_IMAGE_SAVINGS_BYTES:
+        issues.append(PerformanceIssue(
+            issue=f"{len(offscreen_eager)} images below the fold load eagerly ({format_kb(offscreen_bytes)})",
+            element_description=", ".join(short_url(src, 60) for src in offscreen_eager[:MAX_LISTED_URLS]),
+            suggestion="Add loading=\"lazy\" to images that start below the first screen.",
+            severity="medium" if offscreen_bytes >= LEGACY_FORMAT_MIN_BYTES else "low",
+            metric="image_bytes", value=offscreen_bytes, estimated_savings_bytes=offscreen_bytes,
+            html_snippet='<img src="..." loading="lazy" width="..." height="...">',
+        ))
+    return issues
+
+
+def render_blocking_issue(performance: Dict[str, Any], resources: List[Dict[str, Any]], fcp_rating: Optional[str]) -> Optional[PerformanceIssue]:
+    if any(r.get("blocking") for r in resources):
+        blocking = [r for r in resources if r.get("blocking") == "blocking"]
+    else:
+        # No renderBlockingStatus in this engine: classic <head> scripts and matching stylesheets from the DOM
+        candidates = set(performance.get("render_blocking_candidates") or [])
+        blocking = [r for r in resources if r["url"] in candidates]
+    if not blocking:
+        return None
+    total = sum(resource_bytes(r) for r in blocking)
+    finished_ms = max(r["start"] + r["duration"] for r in blocking)
+    return PerformanceIssue(
+        issue=f"{len(blocking)} render-blocking resources ({format_kb(total)}, loaded by {round(finished_ms)}ms) delay the first paint",
+        element_description=", ".join(short_url(r["url"], 60) for r in blocking[:MAX_LISTED_URLS]),
+        suggestion="Add defer/async to scripts, inline the critical CSS and load the rest with media queries or after first render.",
+        severity="high" if fcp_rating == "poor" else "medium" if fcp_rating == "needs-improvement" or len(blocking) > 2 else "low",
+        metric="render_blocking", value=len(blocking), estimated_savings_bytes=total or None,
+        html_snippet='<script src="app.js" defer></script>\n<link rel="preload" href="rest.css" as="style" onload="this.rel=\'stylesheet\'">',
+    )
+
+
+def weight_issues(bytes_by_type: Dict[str, int]) -> List[PerformanceIssue]:
+    issues = []
+    total = sum(bytes_by_type.values())
+    if total >= PAGE_WEIGHT_BYTES[0]:
+        largest = max(bytes_by_type, key=bytes_by_type.get)
+        issues.append(PerformanceIssue(
+            issue=f"Heavy page: {format_kb(total)} transferred",
+            element_description=f"Largest share: {largest} ({format_kb(bytes_by_type[largest])})",
+            suggestion="Compress and resize images, drop unused scripts and fonts, and lazy-load what is not needed for the first screen.",
+            severity="high" if total >= PAGE_WEIGHT_BYTES[1] else "medium",
+            metric="transfer_bytes", value=total, threshold=PAGE_WEIGHT_BYTES[0],
+        ))
+    script = bytes_by_type.get("script", 0)
+    if script >= SCRIPT_WEIGHT_BYTES[0]:
+        issues.append(PerformanceIssue(
+            issue=f"Large JavaScript payload: {format_kb(script)} transferred",
+            element_description="Scripts",
+            suggestion="Code-split by route, remove unused dependencies and defer third-party scripts.",
+            severity="high" if script >= SCRIPT_WEIGHT_BYTES[1] else "medium",
+            metric="script_bytes", value=script, threshold=SCRIPT_WEIGHT_BYTES[0],
+        ))
+    return issues
+
+
+def audit_performance(url: str, performance: Dict[str, Any], key_elements: Optional[List[Dict]] = None) -> PerformanceAnalysisOutput:
+    """Scores the data collected by live_page.PERFORMANCE_COLLECTOR_JS."""
+    navigation = performance.get("navigation") or {}
+    resources = performance.get("resources") or []
+
+    bytes_by_type = {kind: 0 for kind in RESOURCE_TYPES}
+    bytes_by_type["document"] = navigation.get("transfer") or navigation.get("encoded") or 0
+    bytes_by_url = {}
+    for resource in resources:
+        size = resource_bytes(resource)
+        bytes_by_type[resource_type(resource)] += size
+        bytes_by_url[resource["url"]] = size
+
+    fcp = performance.get("fcp")
+    lcp = performance.get("lcp") or {}
+    metrics = {
+        "lcp_ms": round(lcp["time"]) if lcp.get("time") is not None else None,
+        "cls": round(cumulative_layout_shift(performance.get("layout_shifts")), 3),
+        "tbt_ms": round(total_blocking_time(performance.get("long_tasks"), fcp)),
+        "fcp_ms": round(fcp) if fcp is not None else None,
+        "ttfb_ms": round(navigation["ttfb"]) if navigation.get("ttfb") is not None else None,
+        "dom_content_loaded_ms": round(navigation["dom_content_loaded"]) if navigation.get("dom_content_loaded") else None,
+        "load_ms": round(navigation["load"]) if navigation.get("load") else None,
+        "long_tasks": len(performance.get("long_tasks") or []),
+        "requests": len(resources) + 1,
+        "images": performance.get("image_count", 0),
+        "lcp_element": {key: lcp.get(key) for key in ("tag", "url", "text")} if lcp else None,
+    }
+    ratings = {name: rate_metric(name, metrics[name]) for name in METRIC_THRESHOLDS}
+
+    issues = metric_issues(metrics, ratings)
+    issues += image_issues(performance, bytes_by_url, key_elements)
+    blocking = render_blocking_issue(performance, resources, ratings["fcp_ms"])
+    if blocking:
+        issues.append(blocking)
+    issues += weight_issues(bytes_by_type)
+    issues.sort(key=lambda i: (SEVERITY_RANK.get(i.severity, 4), -(i.estimated_savings_bytes or 0)))
+
+    automated_checks = [
+        "Core Web Vitals (LCP, CLS) and TBT/FCP/TTFB from the live page load",
+        "Transfer size by resource type (Resource Timing)",
+        "Oversized, legacy-format and eagerly loaded offscreen images",
+        "Render-blocking scripts and stylesheets",
+    ]
+    manual_reviews_needed = [
+        "These are lab numbers from one headless Chromium load on the server's network (no throttling, DPR 1); field data (CrUX/RUM) is what users experience.",
+    ]
+    if not any(r.get("transfer") for r in resources) and resources:
+        manual_reviews_needed.append("Cross-origin resources without Timing-Allow-Origin report no sizes; byte totals and savings are lower bounds.")
+
+    rated = [rating for rating in ratings.values() if rating]
+    poor = rated.count("poor")
+    if not issues:
+        overall_rating, summary = "excellent", "The page loads fast and lean: all measured metrics are in the good range and no resource problems were found."
+    elif poor == 0 and not any(i.severity in ("critical", "high") for i in issues):
+        overall_rating, summary = "good", f"The page performs well overall; {len(issues)} improvement(s) would make it faster or lighter."
+    else:
+        overall_rating = "fair" if poor <= 1 else "poor"
+        summary = f"{poor} metric(s) in the poor range and {len(issues)} performance finding(s). Fixing the high-severity ones first gives the largest gains."
+
+    return PerformanceAnalysisOutput(
+        url=url, summary=summary, overall_rating=overall_rating, metrics=metrics,
+        metric_ratings={name: rating for name, rating in ratings.items() if rating},
+        transfer_bytes_by_type=bytes_by_type, performance_issues=issues,
+        automated_checks_performed=automated_checks, manual_review_needed=manual_reviews_needed,
+    )
+
+
+# --- Registration (agent_registry.py) ---
+def performance_history_issues(result: Dict[str, Any]):
+    """Issue rows for analysis_history: (source, criterion, severity, issue, element)."""
+    for item in result.get("performance_issues") or []:
+        yield "performance", item.get("metric"), item.get("severity"), item.get("issue"), item.get("element_description")
+
+
+@agent("performance_results", modes=("full",), inputs=("url", "key_elements", "live_page"), history=performance_history_issues)
+def run_performance_agent(url: str, key_elements: Optional[List[Dict]], live_page: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if live_page is None: # the shared stage failed; visit the page ourselves
+        live_page = collect_live_page(url)
+    if live_page.get("error") or not live_page.get("performance"):
+        message = live_page.get("error") or live_page.get("performance_error") or "No performance data was collected."
+        return {"status": "error", "message": f"Performance audit needs the live page: {message}", "data": {}}
+    with span("performance.audit"):
+        return asdict(audit_performance(url, live_page["performance"], key_elements))
+
+
+@agent("performance_results", modes=("fast",), inputs=())
+def skip_performance_fast():
+    # Timing data only exists for a real page load, which fast mode never does
+    return {
+        "status": "skipped", "mode": "fast",
+        "message": "Performance audit needs the live browser visit. Use the full mode for performance findings.",
+        "data": {}
+    }
@@ -1,26 +1,42 @@
-import google.generativeai as genai
-from playwright.sync_api import sync_playwright
+import gemini_client
+from browser_pool import browser_page
 import time
-from utils import get_image_parts, parse_gemini_json_response
-
-
-def run_gemini_workflow_analysis(url, screenshot_base64, key_elements):
+from utils import get_image_parts
+from llm_json import parse_structured_response, stream_llm_json
+from llm_context import build_element_context, WORKFLOW_CONTEXT_TOKEN_BUDGET
+from metrics import span, record_llm_usage
+from request_budget import budget_allows, budget_timeout_ms, skipped_stages, LLM_ESTIMATE_MS, LLM_FOLLOWUP_ESTIMATE_MS
+from functools import partial
+from agent_registry import agent
+
+# Expected shape of Gemini's answer (see llm_json.py); invalid items are dropped
+WORKFLOW_RESPONSE_SCHEMA = {
+   "workflow_analysis": {"type": list, "item_fields": {"workflow_path": str, "issue": str, "recommendation": str}, "min_items": 1},
+}
+
+def run_gemini_workflow_analysis(url, screenshot_base64, key_elements, context_token_budget=WORKFLOW_CONTEXT_TOKEN_BUDGET, on_item=None, image_parts=None):
    """
    Gemini-based analysis of user workflow and CTA clarity.
+   context_token_budget caps the (approximate) tokens spent on the DOM element table in the prompt.
+   on_item(field, item) is called with each "workflow_analysis" item as soon as Gemini has streamed it.
+   image_parts is the request's shared "image_parts" stage; the screenshot is decoded here when not given.
    """
    print(f"Running Gemini Workflow Agent for: {url}")
   
-   image_parts = get_image_parts(screenshot_base64)
+   if image_parts is None:
+       image_parts = get_image_parts(screenshot_base64)
 
 
-   workflow_elements_context = []
-   for e in key_elements:
-       if e['tag_name'] in ['A', 'BUTTON', 'INPUT', 'FORM', 'H1', 'H2', 'P'] or (e.get('role') in ['button', 'link', 'navigation'] and e['bounding_box']['width'] > 0 and e['bounding_box']['height'] > 0):
-           workflow_elements_context.append(
-               f"- Tag: {e['tag_name']}, Text: '{e['text_content'] or ''}', "
-               f"Type: {e.get('type', 'N/A')}, BBox: ({e['bounding_box']['x']},{e['bounding_box']['y']},{e['bounding_box']['width']}x{e['bounding_box']['height']}), "
-               f"Href: {e['href'] or 'N/A'}"
-           )
+   # Most prominent interactive/content elements first, deduplicated, within the token budget
+   with span("workflow.llm_context"):
+       workflow_elements_context, llm_context_stats = build_element_context(
+           key_elements,
+           context_token_budget,
+           tags=['A', 'BUTTON', 'INPUT', 'FORM', 'H1', 'H2', 'P'],
+           columns=('tag', 'text', 'bbox', 'href'),
+           include=lambda e: e.get('role') in ['button', 'link', 'navigation'],
+       )
+   print(f"Workflow Agent: LLM context uses ~{llm_context_stats['tokens_used']}/{context_token_budget} tokens ({llm_context_stats['elements_included']} elements).")
 
 
    prompt_parts = [
@@ -28,8 +44,8 @@ def run_gemini_workflow_analysis(url, screenshot_base64, key_elements):
        f"Webpage URL: {url}\n",
        "Here is the visual context:",
        *image_parts,
-       "Here are details of key interactive and content elements from the page's DOM structure:\n",
-       "\n".join(workflow_elements_context) if workflow_elements_context else "No specific elements provided or elements filtered.",
+       "Here are the most prominent interactive and content elements from the page's DOM structure, one per row (bbox is x,y,WxH):\n",
+       workflow_elements_context or "No specific elements provided or elements filtered.",
        "\nProvide your analysis in a structured JSON format. For each issue, provide a specific recommendation. Example structure:",
        """
        ```json
@@ -46,14 +62,33 @@ def run_gemini_workflow_analysis(url, screenshot_base64, key_elements):
    ]
 
 
+   if not budget_allows("workflow.llm", LLM_ESTIMATE_MS):
+       return {"status": "skipped", "mode": "gemini", "message": "Time budget exhausted before the LLM call.", "data": {},
+               "llm_context": llm_context_stats, "partial": True, "skipped_stages": skipped_stages("workflow.")}
+
    try:
-       model = genai.GenerativeModel('gemini-1.5-flash')
-       response = model.generate_content(prompt_parts, generation_config={"response_mime_type": "application/json"})
-       parsed_data = parse_gemini_json_response(response.text)
-       return {"status": "success", "mode": "gemini", "data": parsed_data}
+       model = gemini_client.generative_model('gemini-1.5-flash')
+       generation_config = {"response_mime_type": "application/json"}
+       with span("workflow.llm"):
+           response, llm_stream_info = stream_llm_json(model, prompt_parts, "workflow", WORKFLOW_RESPONSE_SCHEMA, on_item=on_item, generation_config=generation_config, request_options={"timeout": budget_timeout_ms(120000) / 1000})
+       record_llm_usage(response, "workflow")
+
+       # Second (small) call only if "workflow_analysis" is still missing after tolerant parsing/repair
+       def request_missing_fields(instruction):
+           if not budget_allows("workflow.llm_missing_fields", LLM_FOLLOWUP_ESTIMATE_MS):
+               return None # keep what the first answer had
+           with span("workflow.llm_missing_fields"):
+               followup = model.generate_content(prompt_parts + [instruction], generation_config=generation_config, request_options={"timeout": budget_timeout_ms(120000) / 1000})
+           record_llm_usage(followup, "workflow")
+           return followup.text
+
+       with span("workflow.parse"):
+           parsed_data, llm_parse_info = parse_structured_response(response.text, WORKFLOW_RESPONSE_SCHEMA, "workflow", reprompt=request_missing_fields)
+       return {"status": "success", "mode": "gemini", "data": parsed_data, "llm_context": llm_context_stats, "llm_parse": llm_parse_info, "llm_stream": llm_stream_info,
+               "partial": bool(skipped_stages("workflow.")), "skipped_stages": skipped_stages("workflow.")}
    except Exception as e:
        print(f"Error in Workflow Agent (Gemini): {e}")
-       return {"status": "error", "mode": "gemini", "message": str(e), "data": {}}
+       return {"status": "error", "mode": "gemini", "message": str(e), "data": {}, "llm_context": llm_context_stats}
 
 
 
@@ -76,9 +111,7 @@ def run_playwright_workflow_analysis(url):
 
 
    try:
-       with sync_playwright() as p:
-           browser = p.chromium.launch()
-           page = browser.new_page()
+       with browser_page() as page:
 
 
            for workflow in workflows:
@@ -118,9 +151,6 @@ def run_playwright_workflow_analysis(url):
                    issues_found = True
 
 
-           browser.close()
-
-
    except Exception as e:
        suggestions.append(f"Error during workflow analysis: {e}")
        issues_found = True
@@ -132,12 +162,37 @@ def run_playwright_workflow_analysis(url):
 
 
 
-def check_user_workflow(url, screenshot_base64=None, key_elements=None, mode="gemini"):
+def check_user_workflow(url, screenshot_base64=None, key_elements=None, mode="gemini", on_item=None, image_parts=None):
    """
    Unified entry point for workflow analysis.
-   Use mode='gemini' or mode='playwright'.
+   Use mode='gemini' or mode='playwright'. on_item streams Gemini's items (gemini mode only).
    """
    if mode == "playwright":
        return run_playwright_workflow_analysis(url)
    else:
-       return run_gemini_workflow_analysis(url, screenshot_base64, key_elements or [])
+       return run_gemini_workflow_analysis(url, screenshot_base64, key_elements or [], on_item=on_item, image_parts=image_parts)
+
+
+# --- Registration (agent_registry.py) ---
+def workflow_history_issues(result):
+   """Issue rows for analysis_history: (source, criterion, severity, issue, element)."""
+   for item in (result.get("data") or {}).get("workflow_analysis") or []:
+       if isinstance(item, dict):
+           yield "workflow", item.get("workflow_path"), None, item.get("issue"), None
+
+
+@agent("user_workflow_results", modes=("full",), inputs=("url", "screenshot_base64", "key_elements", "image_parts", "on_item"),
+       history=workflow_history_issues)
+def run_workflow_agent(url, screenshot_base64, key_elements, image_parts, on_item):
+   return check_user_workflow(url, screenshot_base64, key_elements, image_parts=image_parts,
+                              on_item=partial(on_item, "user_workflow_results") if on_item else None)
+
+
+@agent("user_workflow_results", modes=("fast",), inputs=())
+def skip_workflow_fast():
+   # The workflow agent is entirely LLM/browser driven, so there is nothing to run locally
+   return {
+       "status": "skipped", "mode": "fast",
+       "message": "Workflow analysis needs the LLM. Use the full or tiered mode for workflow feedback.",
+       "data": {}
+   }
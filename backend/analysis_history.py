@@ -0,0 +1,309 @@
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+import agent_registry
+import metrics
+from metrics import inc
+
+# Append-only history of analysis results (SQLite), for per-URL trends and run-to-run diffs.
+#
+# record() hands the finished result to a background writer thread (one per worker process), which
+# compacts it and inserts it in batches, so the request never waits on disk. Each run keeps:
+#   runs          one row per analysis: url, time, mode and a small summary (ratings, counts)
+#   run_criteria  issue counts per (source, criterion): what trend queries read
+#   run_issues    one row per issue with a stable issue_key: what diffs read
+# Every HISTORY_COMPACT_EVERY runs the writer compacts: runs older than the newest
+# HISTORY_DETAILED_RUNS per URL lose their run_issues rows (trends still cover them), and runs
+# beyond HISTORY_MAX_RUNS per URL are deleted.
+#
+# A partial run (budget-skipped stages, or an agent that timed out or failed) is recorded with
+# summary.partial set but left out of trends and diffs: its missing issues would otherwise show up
+# as fixes, followed by regressions on the next complete run.
+
+ANALYSIS_HISTORY_ENABLED = os.getenv("ANALYSIS_HISTORY_ENABLED", "1") != "0"
+ANALYSIS_HISTORY_PATH = os.getenv(
+    "ANALYSIS_HISTORY_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "analysis_history.sqlite3"),
+)
+HISTORY_DETAILED_RUNS = int(os.getenv("HISTORY_DETAILED_RUNS", "50")) # per URL, kept with per-issue rows
+HISTORY_MAX_RUNS = int(os.getenv("HISTORY_MAX_RUNS", "1000")) # per URL, older runs are deleted
+HISTORY_COMPACT_EVERY = 200 # runs written between compactions
+HISTORY_QUEUE_MAX = 1000 # pending writes; beyond this, results are dropped (and counted)
+HISTORY_WRITE_BATCH = 50 # runs per write transaction
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    mode TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    detailed INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS runs_by_url ON runs (url, created_at);
+CREATE TABLE IF NOT EXISTS run_criteria (
+    run_id INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    criterion TEXT NOT NULL,
+    issue_count INTEGER NOT NULL,
+    PRIMARY KEY (run_id, source, criterion)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS run_issues (
+    run_id INTEGER NOT NULL,
+    issue_key TEXT NOT NULL,
+    source TEXT NOT NULL,
+    criterion TEXT NOT NULL,
+    severity TEXT,
+    issue TEXT NOT NULL,
+    element TEXT,
+    PRIMARY KEY (run_id, issue_key)
+) WITHOUT ROWID;
+"""
+
+
+class PartialRun(ValueError):
+    """Raised by diff() when a run is partial, so its issue list is not comparable."""
+
+    def __init__(self, run_ids):
+        super().__init__(f"run(s) {', '.join(map(str, run_ids))} are partial")
+        self.run_ids = run_ids
+
+
+# SQL condition for runs not marked partial (see compact_result)
+_COMPLETE_RUN = "NOT coalesce(json_extract(summary, '$.partial'), 0)"
+
+
+def _issue_row(source, criterion, severity, issue, element):
+    # Same issue on the same element -> same key in every run, which is what makes diffs cheap
+    key = hashlib.sha1(f"{source}\0{criterion}\0{issue}\0{element}".encode("utf-8")).hexdigest()[:16]
+    return (key, source, criterion or "unspecified", severity, issue or "", element)
+
+
+def compact_result(results):
+    """
+    Reduces a full/fast analysis response to (summary, issue_rows). issue_rows are
+    (issue_key, source, criterion, severity, issue, element) tuples, taken from each registered
+    agent's history extractor (agent_registry.agent(history=...)).
+    """
+    mode = results.get("mode") or "full"
+    rows = []
+    for key, node in agent_registry.agents_for(mode).items():
+        result = results.get(key)
+        if node.history is None or not isinstance(result, dict):
+            continue
+        for source, criterion, severity, issue, element in node.history(result):
+            rows.append(_issue_row(source, criterion, severity, issue, element))
+
+    issue_counts = {}
+    for row in rows:
+        issue_counts[row[1]] = issue_counts.get(row[1], 0) + 1
+    incomplete = agent_registry.incomplete_results(mode, results)
+    accessibility = results.get("accessibility_results") or {}
+    design_data = (results.get("design_check_results") or {}).get("data") or {}
+    summary = {
+        "overall_rating": accessibility.get("overall_rating"),
+        "wcag_compliance_level": accessibility.get("wcag_compliance_level"),
+        "issue_counts": issue_counts,
+        "vibe_keywords": (design_data.get("vibe_analysis") or {}).get("keywords"),
+        "partial": bool((results.get("budget") or {}).get("partial")) or bool(incomplete),
+        "incomplete_results": incomplete,
+    }
+    return summary, rows
+
+
+class AnalysisHistory:
+    """Append-only run history with a per-process background writer."""
+
+    def __init__(self, path=ANALYSIS_HISTORY_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._writer_lock = threading.Lock()
+        self._writer_pid = None
+        self._queue = None
+        self._writes_since_compaction = 0
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self):
+        # Same rules as SharedStore: one connection per (thread, pid), WAL for concurrent readers
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    # --- Writing ---
+    def record(self, url, results, mode="full"):
+        """Queues one finished analysis for the background writer; never blocks the caller."""
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((url, mode, time.time(), results))
+        except queue.Full:
+            inc("history_writes_total", result="dropped")
+
+    def _ensure_writer(self):
+        # The thread does not survive a fork (serve.py), so each worker process starts its own
+        if self._writer_pid == os.getpid():
+            return
+        with self._writer_lock:
+            if self._writer_pid != os.getpid():
+                self._queue = queue.Queue(maxsize=HISTORY_QUEUE_MAX)
+                threading.Thread(target=self._writer_loop, name="analysis-history-writer", daemon=True).start()
+                self._writer_pid = os.getpid()
+
+    def _writer_loop(self):
+        pending = self._queue
+        while True:
+            batch = [pending.get()]
+            while len(batch) < HISTORY_WRITE_BATCH:
+                try:
+                    batch.append(pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.write_runs(batch)
+            except Exception as e:
+                print(f"Analysis history write failed: {e}")
+                inc("history_writes_total", amount=len(batch), result="error")
+            finally:
+                for _ in batch:
+                    pending.task_done()
+
+    def flush(self):
+        """Blocks until every queued run is written (tests/benchmarks and shutdown)."""
+        if self._queue is not None and self._writer_pid == os.getpid():
+            self._queue.join()
+
+    def write_runs(self, runs):
+        """Synchronously compacts and inserts [(url, mode, created_at, results)] in one transaction."""
+        compacted = [(url, mode, created_at) + compact_result(results) for url, mode, created_at, results in runs]
+        conn = self._conn()
+        with metrics.span("history.write"):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for url, mode, created_at, summary, rows in compacted:
+                    run_id = conn.execute(
+                        "INSERT INTO runs (url, created_at, mode, summary) VALUES (?, ?, ?, ?)",
+                        (url, created_at, mode, json.dumps(summary)),
+                    ).lastrowid
+                    counts = {}
+                    for row in rows:
+                        counts[(row[1], row[2])] = counts.get((row[1], row[2]), 0) + 1
+                    conn.executemany(
+                        "INSERT INTO run_criteria (run_id, source, criterion, issue_count) VALUES (?, ?, ?, ?)",
+                        [(run_id, source, criterion, count) for (source, criterion), count in counts.items()],
+                    )
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO run_issues (run_id, issue_key, source, criterion, severity, issue, element) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        [(run_id,) + row for row in rows],
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        inc("history_writes_total", amount=len(compacted), result="written")
+        self._writes_since_compaction += len(compacted)
+        if self._writes_since_compaction >= HISTORY_COMPACT_EVERY:
+            self._writes_since_compaction = 0
+            self.compact()
+
+    def compact(self, detailed_runs=HISTORY_DETAILED_RUNS, max_runs=HISTORY_MAX_RUNS):
+        """Drops per-issue rows of older runs and deletes runs beyond max_runs (both per URL)."""
+        conn = self._conn()
+        with metrics.span("history.compact"):
+            ranked = conn.execute(
+                "SELECT id, detailed, ROW_NUMBER() OVER (PARTITION BY url ORDER BY created_at DESC) FROM runs"
+            ).fetchall()
+            to_summarize = [(run_id,) for run_id, detailed, rank in ranked if detailed and detailed_runs < rank <= max_runs]
+            to_delete = [(run_id,) for run_id, _, rank in ranked if rank > max_runs]
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany("DELETE FROM run_issues WHERE run_id = ?", to_summarize + to_delete)
+                conn.executemany("UPDATE runs SET detailed = 0 WHERE id = ?", to_summarize)
+                conn.executemany("DELETE FROM run_criteria WHERE run_id = ?", to_delete)
+                conn.executemany("DELETE FROM runs WHERE id = ?", to_delete)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return {"runs_summarized": len(to_summarize), "runs_deleted": len(to_delete)}
+
+    # --- Queries ---
+    def list_runs(self, url, limit=30):
+        """Newest runs for url: [{"run_id", "created_at", "mode", "detailed", "summary"}]."""
+        rows = self._conn().execute(
+            "SELECT id, created_at, mode, detailed, summary FROM runs WHERE url = ? ORDER BY created_at DESC LIMIT ?",
+            (url, limit),
+        ).fetchall()
+        return [{"run_id": run_id, "created_at": created_at, "mode": mode, "detailed": bool(detailed), "summary": json.loads(summary)}
+                for run_id, created_at, mode, detailed, summary in rows]
+
+    def trend(self, url, runs=30, source="accessibility"):
+        """
+        Issue counts per criterion over the last `runs` complete runs of url, oldest first:
+        {"runs": [{"run_id", "created_at"}], "criteria": {criterion: [count per run]}}.
+        source=None covers every source, with criteria keyed "source:criterion".
+        """
+        source_filter = "AND c.source = ?" if source else ""
+        params = (url, runs) + ((source,) if source else ())
+        rows = self._conn().execute(
+            f"WITH recent AS (SELECT id, created_at FROM runs WHERE url = ? AND {_COMPLETE_RUN} ORDER BY created_at DESC LIMIT ?) "
+            "SELECT recent.id, recent.created_at, c.source, c.criterion, c.issue_count "
+            f"FROM recent LEFT JOIN run_criteria c ON c.run_id = recent.id {source_filter} "
+            "ORDER BY recent.created_at, recent.id",
+            params,
+        ).fetchall()
+        run_positions = {}
+        run_list = []
+        for run_id, created_at, *_ in rows:
+            if run_id not in run_positions:
+                run_positions[run_id] = len(run_list)
+                run_list.append({"run_id": run_id, "created_at": created_at})
+        criteria = {}
+        for run_id, _, row_source, criterion, count in rows:
+            if criterion is None:
+                continue # a run without matching issues
+            name = criterion if source else f"{row_source}:{criterion}"
+            series = criteria.setdefault(name, [0] * len(run_list))
+            series[run_positions[run_id]] = count
+        return {"url": url, "source": source, "runs": run_list, "criteria": criteria}
+
+    def diff(self, from_run_id, to_run_id):
+        """
+        Issues added and resolved between two detailed runs, or None if either run is unknown
+        or already compacted: {"added": [...], "resolved": [...], "unchanged": n}.
+        Raises PartialRun if either run is partial.
+        """
+        conn = self._conn()
+        detailed, complete = {}, {}
+        for run_id, is_detailed, is_complete in conn.execute(
+            f"SELECT id, detailed, {_COMPLETE_RUN} FROM runs WHERE id IN (?, ?)", (from_run_id, to_run_id)
+        ):
+            detailed[run_id], complete[run_id] = is_detailed, is_complete
+        if not detailed.get(from_run_id) or not detailed.get(to_run_id):
+            return None
+        partial = [run_id for run_id in (from_run_id, to_run_id) if not complete[run_id]]
+        if partial:
+            raise PartialRun(partial)
+        only_in = (
+            "SELECT source, criterion, severity, issue, element FROM run_issues WHERE run_id = ? "
+            "AND issue_key NOT IN (SELECT issue_key FROM run_issues WHERE run_id = ?)"
+        )
+        columns = ("source", "criterion", "severity", "issue", "element")
+        added = [dict(zip(columns, row)) for row in conn.execute(only_in, (to_run_id, from_run_id))]
+        resolved = [dict(zip(columns, row)) for row in conn.execute(only_in, (from_run_id, to_run_id))]
+        unchanged = conn.execute(
+            "SELECT COUNT(*) FROM run_issues a JOIN run_issues b ON b.run_id = ? AND b.issue_key = a.issue_key WHERE a.run_id = ?",
+            (to_run_id, from_run_id),
+        ).fetchone()[0]
+        return {"from_run": from_run_id, "to_run": to_run_id, "added": added, "resolved": resolved, "unchanged": unchanged}
+
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
@@ -0,0 +1,30 @@
+from agent_registry import stage
+from layout_checks import run_layout_checks
+from live_page import collect_live_page
+from utils import decode_screenshot_bytes, get_image_parts
+
+# Shared intermediate stages for agent_registry.py: computed once per request, as soon as their
+# inputs are available, and handed to every agent that lists them as an input.
+
+@stage("screenshot_bytes", inputs=("screenshot_base64",))
+def screenshot_bytes_stage(screenshot_base64):
+    """The extension's base64 screenshot decoded once (pixel palette + Gemini image parts)."""
+    return decode_screenshot_bytes(screenshot_base64)
+
+
+@stage("image_parts", inputs=("screenshot_bytes",))
+def image_parts_stage(screenshot_bytes):
+    """Gemini image parts for the screenshot ([] when there is none)."""
+    return get_image_parts(None, image_bytes=screenshot_bytes)
+
+
+@stage("layout_report", inputs=("key_elements",))
+def layout_report_stage(key_elements):
+    """Spatial-index layout checks (layout_checks.py) with the full CTA ranking, shared by design and accessibility."""
+    return run_layout_checks(key_elements or [], cta_limit=None)
+
+
+@stage("live_page", inputs=("url",))
+def live_page_stage(url):
+    """One Playwright visit (live_page.py) shared by the accessibility and performance agents (full mode)."""
+    return collect_live_page(url)
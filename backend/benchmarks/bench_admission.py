@@ -0,0 +1,96 @@
+"""
+Benchmark: admission control under a bulk audit (admission.py).
+
+    python backend/benchmarks/bench_admission.py --capacity 4 --batch 200 --interactive 40
+
+Simulates full analyses with a sleep (--service-ms, jittered) instead of a browser and Gemini. A
+bulk audit submits --batch requests at once while extension clicks arrive one at a time. The
+scenario runs twice: with lanes (clicks "interactive", audit "batch") and with every request in a
+single lane, which is how a plain bounded pool behaves. Reports queue wait p50/p95 per lane and the
+429s (with their Retry-After) for each run.
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+
+from synthetic import percentile
+
+import admission
+
+
+def run_scenario(args, use_lanes):
+    controller = admission.AdmissionController(
+        args.capacity,
+        queue_limits={"interactive": args.batch + args.interactive, "batch": args.batch_queue},
+        max_wait_ms={"interactive": args.max_wait_ms, "batch": args.max_wait_ms},
+    )
+    rng = random.Random(0)
+    lock = threading.Lock()
+    waits = {"interactive": [], "batch": []}
+    rejected = {"interactive": [], "batch": []}
+
+    def analysis(kind):
+        lane = kind if use_lanes else "interactive"
+        try:
+            with controller.slot(lane) as waited:
+                with lock:
+                    waits[kind].append(waited * 1000)
+                    service = args.service_ms * rng.uniform(0.5, 1.5)
+                time.sleep(service / 1000)
+        except admission.Overloaded as e:
+            with lock:
+                rejected[kind].append(e.retry_after)
+
+    threads = [threading.Thread(target=analysis, args=("batch",)) for _ in range(args.batch)]
+    for thread in threads:
+        thread.start()
+    start = time.perf_counter()
+    for _ in range(args.interactive):
+        thread = threading.Thread(target=analysis, args=("interactive",))
+        thread.start()
+        threads.append(thread)
+        time.sleep(args.click_interval_ms / 1000)
+    for thread in threads:
+        thread.join()
+
+    report = {"wall_s": round(time.perf_counter() - start, 2)}
+    for kind in ("interactive", "batch"):
+        values = sorted(waits[kind])
+        report[kind] = {
+            "admitted": len(values),
+            "wait_p50_ms": round(percentile(values, 50), 1) if values else None,
+            "wait_p95_ms": round(percentile(values, 95), 1) if values else None,
+            "rejected": len(rejected[kind]),
+            "retry_after_max_s": max(rejected[kind]) if rejected[kind] else None,
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--capacity", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=200)
+    parser.add_argument("--batch-queue", type=int, default=150)
+    parser.add_argument("--interactive", type=int, default=40)
+    parser.add_argument("--click-interval-ms", type=float, default=50)
+    parser.add_argument("--service-ms", type=float, default=40)
+    parser.add_argument("--max-wait-ms", type=int, default=3000)
+    args = parser.parse_args()
+
+    results = {
+        "config": vars(args),
+        "single_lane": run_scenario(args, use_lanes=False),
+        "priority_lanes": run_scenario(args, use_lanes=True),
+    }
+    for name in ("single_lane", "priority_lanes"):
+        interactive = results[name]["interactive"]
+        print(f"{name}: interactive wait p95={interactive['wait_p95_ms']}ms, rejected={interactive['rejected']}; "
+              f"batch rejected={results[name]['batch']['rejected']}", file=sys.stderr)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark: fast-mode agents through the agent registry's DAG (agent_registry.py) vs each agent on its own.
+
+    python backend/benchmarks/bench_agent_graph.py --sizes 500,2000,10000 --runs 7
+
+"standalone" calls the fast design and accessibility checks the way app.py used to, so each one
+decodes the screenshot / runs the layout checks itself; "graph" runs the registered "fast" agents,
+which get the shared stages (screenshot_bytes, layout_report) computed once. Reports p50 wall time
+for both and the per-node timings of the last graph run.
+"""
+import argparse
+import base64
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+from synthetic import make_key_elements, percentile
+
+import agent_registry
+from agents.design_agent import analyze_design
+from agents.accessibility_agent import analyze_accessibility_from_elements
+
+
+def make_screenshot_base64(width=1280, height=800):
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (245, 245, 245)).save(buffer, "PNG")
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def run_standalone(url, screenshot_base64, key_elements):
+    analyze_design(url, screenshot_base64, key_elements, use_llm=False)
+    analyze_accessibility_from_elements(url, screenshot_base64, key_elements)
+
+
+def run_graph(url, screenshot_base64, key_elements):
+    graph = agent_registry.run_agents("fast", url=url, screenshot_base64=screenshot_base64, key_elements=key_elements)
+    for future in graph.agent_futures().values():
+        future.result()
+    return graph
+
+
+def time_runs(func, runs):
+    times = []
+    result = None
+    for _ in range(runs):
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull): # the agents print a lot
+            start = time.perf_counter()
+            result = func()
+            times.append((time.perf_counter() - start) * 1000)
+    return sorted(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="500,2000,10000")
+    parser.add_argument("--runs", type=int, default=7)
+    args = parser.parse_args()
+
+    agent_registry.load_agents()
+    screenshot_base64 = make_screenshot_base64()
+    results = []
+    for size in [int(size) for size in args.sizes.split(",")]:
+        key_elements = make_key_elements(size)
+        standalone, _ = time_runs(lambda: run_standalone("http://bench.local", screenshot_base64, key_elements), args.runs)
+        graph_times, graph = time_runs(lambda: run_graph("http://bench.local", screenshot_base64, key_elements), args.runs)
+        result = {
+            "elements": size,
+            "standalone_p50_ms": round(percentile(standalone, 50), 1),
+            "graph_p50_ms": round(percentile(graph_times, 50), 1),
+            "pipeline": graph.timings(),
+        }
+        results.append(result)
+        print(f"{size} elements: standalone p50={result['standalone_p50_ms']}ms, graph p50={result['graph_p50_ms']}ms", file=sys.stderr)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
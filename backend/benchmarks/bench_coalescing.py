@@ -0,0 +1,100 @@
+"""
+Benchmark: in-flight coalescing of identical full analyses (single_flight.py) during team review.
+
+    python backend/benchmarks/bench_coalescing.py --pages 3 --clicks 24 --window-ms 3000 --capacity 4
+
+Simulates full analyses with a sleep (--service-ms, jittered) instead of a browser and Gemini, behind
+the admission controller like app.analyze_website. --clicks requests for --pages staging pages
+arrive at random within --window-ms, as when a team opens the same URLs and clicks Analyze within
+seconds. The scenario runs with and without coalescing (followers skip admission, as in app.py)
+and reports pipeline runs (browser visits + LLM calls avoided), per-click latency p50/p95 and the
+fan-out per run.
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+
+from synthetic import percentile
+
+import admission
+from single_flight import SingleFlight
+
+
+def run_scenario(args, coalesce):
+    controller = admission.AdmissionController(args.capacity, queue_limits={"interactive": args.clicks, "batch": 1},
+                                               max_wait_ms={"interactive": 600000, "batch": 600000})
+    flights = SingleFlight("bench")
+    rng = random.Random(args.seed)
+    arrivals = sorted((rng.uniform(0, args.window_ms), rng.randrange(args.pages)) for _ in range(args.clicks))
+    lock = threading.Lock()
+    latencies, fanouts = [], []
+    runs = [0]
+
+    def pipeline(page):
+        with lock:
+            runs[0] += 1
+            service = args.service_ms * rng.uniform(0.8, 1.2)
+        time.sleep(service / 1000)
+        return {"page": page}
+
+    def click(page):
+        start = time.perf_counter()
+        key = f"page-{page}"
+        if coalesce and flights.in_flight(key):
+            _, info = flights.run(key, lambda publish: pipeline(page))
+        else:
+            with controller.slot("interactive"):
+                if coalesce:
+                    _, info = flights.run(key, lambda publish: pipeline(page))
+                else:
+                    pipeline(page)
+                    info = {"role": "leader", "shared_with": 0}
+        with lock:
+            latencies.append((time.perf_counter() - start) * 1000)
+            if info["role"] == "leader":
+                fanouts.append(1 + info["shared_with"])
+
+    threads = []
+    start = time.perf_counter()
+    for offset_ms, page in arrivals:
+        time.sleep(max(0.0, offset_ms / 1000 - (time.perf_counter() - start)))
+        thread = threading.Thread(target=click, args=(page,))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    return {
+        "pipeline_runs": runs[0],
+        "wall_s": round(time.perf_counter() - start, 2),
+        "latency_ms_p50": round(percentile(latencies, 50)),
+        "latency_ms_p95": round(percentile(latencies, 95)),
+        "fanout_max": max(fanouts),
+        "fanout_mean": round(sum(fanouts) / len(fanouts), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--clicks", type=int, default=24)
+    parser.add_argument("--window-ms", type=float, default=3000)
+    parser.add_argument("--service-ms", type=float, default=4000, help="simulated full-analysis time (browser + Gemini)")
+    parser.add_argument("--capacity", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    results = {"clicks": args.clicks, "pages": args.pages, "independent": run_scenario(args, coalesce=False),
+               "coalesced": run_scenario(args, coalesce=True)}
+    independent, coalesced = results["independent"], results["coalesced"]
+    print(f"pipeline runs {independent['pipeline_runs']} -> {coalesced['pipeline_runs']}, "
+          f"p95 {independent['latency_ms_p95']}ms -> {coalesced['latency_ms_p95']}ms", file=sys.stderr)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmark: LLM context builder latency and prompt size versus token budget.
+
+    python backend/benchmarks/bench_context_budget.py [--elements 5000] [--gemini]
+
+With --gemini, each budget is also sent to Gemini (needs GEMINI_API_KEY) to measure
+end-to-end model latency versus budget. Output is JSON on stdout.
+"""
+import argparse
+import json
+import time
+
+from synthetic import make_key_elements, percentile
+from llm_context import build_element_context
+
+BUDGETS = [250, 500, 1000, 1500, 2000, 4000, 8000]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--elements', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--gemini', action='store_true', help="also time a Gemini call per budget")
+    args = parser.parse_args()
+
+    key_elements = make_key_elements(args.elements)
+
+    # Baseline: the old "every matching element, full text" workflow prompt
+    full_context = "\n".join(
+        f"- Tag: {e['tag_name']}, Text: '{e['text_content'] or ''}', Href: {e['href'] or 'N/A'}"
+        for e in key_elements if e['tag_name'] in ['A', 'BUTTON', 'INPUT', 'FORM', 'H1', 'H2', 'P']
+    )
+
+    results = {"elements": args.elements, "unbudgeted_chars": len(full_context), "budgets": []}
+    for budget in BUDGETS:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            context, stats = build_element_context(key_elements, budget, tags=['H1', 'H2', 'P', 'BUTTON', 'A', 'IMG'])
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        row = {
+            "token_budget": budget,
+            "tokens_used": stats["tokens_used"],
+            "elements_included": stats["elements_included"],
+            "build_ms_p50": round(percentile(timings, 50), 3),
+            "build_ms_p95": round(percentile(timings, 95), 3),
+        }
+        if args.gemini:
+            import gemini_client
+            model = gemini_client.generative_model('gemini-1.5-flash')
+            start = time.perf_counter()
+            model.generate_content(["Summarize the layout of this page in one sentence.", context])
+            row["gemini_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        results["budgets"].append(row)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
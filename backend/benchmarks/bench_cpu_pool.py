@@ -0,0 +1,110 @@
+"""
+Benchmark: CPU-bound agent stages inline (threads only) versus offloaded to cpu_pool.
+
+    python backend/benchmarks/bench_cpu_pool.py --concurrency 1,4,16 --pool-workers 4
+
+Each "request" runs the design heuristics (DOM metrics + screenshot palette + element context)
+and the static lxml WCAG checks on a synthetic page, exactly as the agents call them.
+Requests are issued from N threads at once; reports p50/p95 latency and throughput per
+(mode, concurrency) as JSON. The pool only helps on a multi-core machine.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+from PIL import Image, ImageDraw
+
+from synthetic import make_key_elements, percentile
+
+import cpu_pool
+from agents.design_agent import compute_design_heuristics
+from agents.accessibility_agent import run_static_wcag_checks
+
+
+def make_screenshot_bytes(width=1280, height=4000):
+    image = Image.new('RGB', (width, height), (245, 245, 245))
+    draw = ImageDraw.Draw(image)
+    for i in range(0, height, 200):
+        draw.rectangle([0, i, width, i + 80], fill=(0, 102, 204) if (i // 200) % 2 else (33, 33, 33))
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def make_page_html(elements):
+    rows = []
+    for e in elements:
+        tag = e['tag_name'].lower()
+        if tag == 'img':
+            rows.append('<img src="/img.png">')
+        elif tag == 'input':
+            rows.append('<input type="text">')
+        else:
+            rows.append(f"<{tag}>{e['text_content']}</{tag}>")
+    return "<html><head></head><body>" + "".join(rows) + "</body></html>"
+
+
+def one_request(key_elements, screenshot_bytes, page_html):
+    cpu_pool.run(compute_design_heuristics, shared_bytes={"screenshot_bytes": screenshot_bytes}, shared_json={"key_elements": key_elements})
+    cpu_pool.run(run_static_wcag_checks, shared_bytes={"page_html": page_html})
+
+
+def drive(concurrency, requests_per_thread, payload):
+    latencies = []
+    lock = threading.Lock()
+
+    def loop():
+        for _ in range(requests_per_thread):
+            start = time.perf_counter()
+            one_request(*payload)
+            with lock:
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=loop) for _ in range(concurrency)]
+    wall_start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - wall_start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / wall, 2),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--pool-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--elements", type=int, default=3000)
+    parser.add_argument("--requests", type=int, default=4, help="requests per thread")
+    args = parser.parse_args()
+
+    key_elements = make_key_elements(args.elements)
+    payload = (key_elements, make_screenshot_bytes(), make_page_html(key_elements).encode('utf-8'))
+    results = {"cpu_count": os.cpu_count(), "elements": args.elements, "pool_workers": args.pool_workers, "runs": []}
+
+    for mode, workers in (("inline", 0), ("pool", args.pool_workers)):
+        cpu_pool.configure(workers)
+        if workers:
+            one_request(*payload) # start the pool processes outside the measurement
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            stats = drive(concurrency, args.requests, payload)
+            stats.update(mode=mode, concurrency=concurrency)
+            results["runs"].append(stats)
+            print(f"{mode} c={concurrency}: {stats['throughput_rps']} req/s, p50={stats['p50_ms']}ms, p95={stats['p95_ms']}ms", file=sys.stderr)
+    cpu_pool.configure(0)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark: legacy key_elements payload versus the compact element graph.
+
+    python backend/benchmarks/bench_element_graph.py --sections 200
+
+Builds a synthetic nested page (section > div > li > a > span, plus paragraphs) the way the
+old collector serialized it (every element carries its full textContent and its own style
+object) and the way the new one does (own text + parent index, interned styles), then reports
+JSON size, json.loads time, normalization time and design-heuristics time for each as JSON.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+from synthetic import FONTS, COLORS, NAV_ITEMS
+
+from element_graph import ELEMENT_GRAPH_FORMAT, expand_element_graph, load_key_elements, MAX_TEXT_LENGTH
+from agents.design_agent import compute_design_heuristics
+
+
+def make_element_graph(sections, seed=0):
+    rng = random.Random(seed)
+    styles = [
+        {"fontFamily": rng.choice(FONTS), "fontSize": f"{size}px", "fontWeight": weight, "color": color,
+         "backgroundColor": rng.choice(COLORS), "lineHeight": "normal"}
+        for size in (14, 16, 24) for weight in ('400', '700') for color in COLORS[:3]
+    ]
+    nodes = []
+
+    def add(tag, parent, text=None, y=0.0):
+        node = {"tag": tag, "parent": parent, "style": rng.randrange(len(styles)), "bbox": [rng.uniform(0, 1200), y, rng.uniform(20, 600), rng.uniform(10, 80)]}
+        if text:
+            node["text"] = text
+        if tag == 'A':
+            node["href"] = "https://example.com/page"
+        nodes.append(node)
+        return len(nodes) - 1
+
+    for s in range(sections):
+        y = s * 600.0
+        section = add('DIV', None, y=y)
+        inner = add('DIV', section, y=y)
+        add('H2', inner, f"Section {s} " + ' '.join(f"word{rng.randrange(500)}" for _ in range(4)), y=y)
+        for _ in range(3):
+            add('P', inner, ' '.join(f"word{rng.randrange(500)}" for _ in range(rng.randrange(10, 60))), y=y + 80)
+        menu = add('DIV', inner, y=y + 300)
+        for item in NAV_ITEMS:
+            li = add('LI', menu, y=y + 300)
+            link = add('A', li, y=y + 300)
+            add('SPAN', link, item, y=y + 300)
+    return {"format": ELEMENT_GRAPH_FORMAT, "styles": styles, "nodes": nodes}
+
+
+def to_legacy_payload(graph):
+    """What the old collectors sent for the same page: full textContent and a style copy per element."""
+    nodes = graph["nodes"]
+    children = [[] for _ in nodes]
+    for index, node in enumerate(nodes):
+        if node["parent"] is not None:
+            children[node["parent"]].append(index)
+    full_text = [None] * len(nodes)
+    for index in range(len(nodes) - 1, -1, -1):
+        parts = [nodes[index].get("text")] + [full_text[child] for child in children[index]]
+        full_text[index] = " ".join(p for p in parts if p)[:MAX_TEXT_LENGTH] or None
+    legacy = []
+    for element, text in zip(expand_element_graph(graph), full_text):
+        element = dict(element, text_content=text, computed_styles=dict(element["computed_styles"]))
+        element.pop("parent_index")
+        legacy.append(element)
+    return legacy
+
+
+def timed_ms(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, (time.perf_counter() - start) * 1000)
+    return result, round(best, 2)
+
+
+def measure(label, body_bytes, repeat):
+    data, loads_ms = timed_ms(lambda: json.loads(body_bytes), repeat)
+    (key_elements, stats), normalize_ms = timed_ms(lambda: load_key_elements(data), repeat)
+    _, heuristics_ms = timed_ms(lambda: compute_design_heuristics(key_elements), repeat)
+    text_chars = sum(len(e["text_content"] or "") for e in key_elements)
+    return {
+        "payload": label,
+        "json_bytes": len(body_bytes),
+        "json_loads_ms": loads_ms,
+        "normalize_ms": normalize_ms,
+        "design_heuristics_ms": heuristics_ms,
+        "elements": len(key_elements),
+        "text_chars_seen_by_agents": text_chars,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sections", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    graph = make_element_graph(args.sections)
+    legacy_body = json.dumps({"url": "http://bench.local/", "key_elements": to_legacy_payload(graph)}).encode("utf-8")
+    graph_body = json.dumps({"url": "http://bench.local/", "element_graph": graph}).encode("utf-8")
+
+    results = [measure("legacy", legacy_body, args.repeat), measure("element_graph", graph_body, args.repeat)]
+    for r in results:
+        print(f"{r['payload']}: {r['json_bytes'] / 1024:.0f} KiB, loads {r['json_loads_ms']}ms, normalize {r['normalize_ms']}ms, heuristics {r['design_heuristics_ms']}ms", file=sys.stderr)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark: the analysis history store (analysis_history.py).
+
+    python backend/benchmarks/bench_history.py --urls 20 --runs-per-url 200
+
+Records synthetic full-analysis results for several URLs and reports: the cost of record() on the
+request thread, background write throughput, trend and diff query latency, and compaction time
+and file size before/after. Uses a temporary database.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from synthetic import percentile
+
+from analysis_history import AnalysisHistory
+
+CRITERIA = ["1.1.1 Non-text Content", "1.4.3 Contrast (Minimum)", "2.4.4 Link Purpose (In Context)", "4.1.2 Name, Role, Value", "3.1.1 Language of Page"]
+
+
+def make_result(rng, run_index):
+    # Issues drift slowly between runs, like a site being fixed and regressing
+    issues = []
+    for criterion in CRITERIA:
+        for element in range(rng.randint(0, 12)):
+            issues.append({"issue": f"{criterion} issue", "element_description": f"element {element + run_index // 50}",
+                           "severity": rng.choice(["low", "medium", "high"]), "wcag_criterion": criterion})
+    return {
+        "mode": "full",
+        "accessibility_results": {"accessibility_issues": issues, "responsive_design_issues": [], "overall_rating": "fair", "wcag_compliance_level": "AA"},
+        "design_check_results": {"status": "success", "data": {"design_feedback": [{"aspect": "Visual Hierarchy", "issue": "H1 too small", "severity": "Minor"}], "vibe_analysis": {"keywords": ["Modern"]}}},
+        "user_workflow_results": {"status": "success", "data": {"workflow_analysis": [{"workflow_path": "Primary CTA", "issue": "Below the fold"}]}},
+        "performance_results": {"status": "success", "performance_issues": [{"issue": "Largest Contentful Paint is slow", "metric": "lcp_ms", "severity": "medium", "element_description": "hero.jpg"}]},
+    }
+
+
+def file_mb(history, path):
+    history._conn().execute("PRAGMA wal_checkpoint(TRUNCATE)") # count WAL contents too
+    return round(os.path.getsize(path) / (1024 * 1024), 2)
+
+
+def timed_ms(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return sorted(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--urls", type=int, default=20)
+    parser.add_argument("--runs-per-url", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    urls = [f"https://site{i}.example/" for i in range(args.urls)]
+    results = {"urls": args.urls, "runs_per_url": args.runs_per_url}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "history.sqlite3")
+        history = AnalysisHistory(path)
+        payloads = [(url, make_result(rng, run)) for run in range(args.runs_per_url) for url in urls]
+
+        record_times = []
+        start = time.perf_counter()
+        for url, result in payloads:
+            call_start = time.perf_counter()
+            history.record(url, result)
+            record_times.append((time.perf_counter() - call_start) * 1000)
+        history.flush()
+        total_s = time.perf_counter() - start
+        record_times.sort()
+        results["record_call_p50_ms"] = round(percentile(record_times, 50), 4)
+        results["record_call_p99_ms"] = round(percentile(record_times, 99), 4)
+        results["writes_per_second"] = round(len(payloads) / total_s, 1)
+        results["runs_dropped"] = len(payloads) - history._conn().execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+        url = urls[0]
+        trend_times = timed_ms(lambda: history.trend(url, runs=30), args.repeat)
+        results["trend_30_runs_p50_ms"] = round(percentile(trend_times, 50), 3)
+        recent = history.list_runs(url, limit=2)
+        diff_times = timed_ms(lambda: history.diff(recent[1]["run_id"], recent[0]["run_id"]), args.repeat)
+        results["diff_p50_ms"] = round(percentile(diff_times, 50), 3)
+
+        results["file_mb_before_compaction"] = file_mb(history, path)
+        start = time.perf_counter()
+        results["compaction"] = history.compact(detailed_runs=20, max_runs=args.runs_per_url // 2)
+        results["compaction_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        history._conn().execute("VACUUM")
+        results["file_mb_after_compaction"] = file_mb(history, path)
+
+    print(f"record() p50={results['record_call_p50_ms']}ms, {results['writes_per_second']} runs/s written, "
+          f"trend p50={results['trend_30_runs_p50_ms']}ms, diff p50={results['diff_p50_ms']}ms", file=sys.stderr)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Benchmark: spatial index + layout checks (spatial_index.py, layout_checks.py).
+
+    python backend/benchmarks/bench_layout_checks.py --sizes 1000,10000,50000 --brute-force-max 5000
+
+Builds card-grid pages shaped like the element graph (sections > cards > heading/text/links, with
+parent_index) plus a few injected defects (overlapping text, tiny adjacent icons, a card whose
+DOM order runs upward, a promo box over card text). Per size: index build and per-check times. Up to --brute-force-max elements
+it also times the O(n^2) all-pairs overlap scan the index replaces and checks that index queries
+return exactly what a linear scan finds.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+from synthetic import percentile
+
+from layout_checks import LayoutChecker, run_layout_checks
+from spatial_index import SpatialIndex, element_box, intersection_area
+
+STYLE = {"fontSize": "16px", "fontWeight": "400", "color": "rgb(33, 33, 33)", "backgroundColor": "rgba(0, 0, 0, 0)"}
+CARD_STYLE = dict(STYLE, backgroundColor="rgb(255, 255, 255)")
+
+
+def add(elements, tag, parent, x, y, width, height, text=None, styles=STYLE, **attributes):
+    elements.append({"tag_name": tag, "text_content": text, "parent_index": parent, "computed_styles": styles,
+                     "bounding_box": {"x": x, "y": y, "width": width, "height": height}, **attributes})
+    return len(elements) - 1
+
+
+def make_layout_page(count, seed=0):
+    rng = random.Random(seed)
+    elements = []
+    page = add(elements, 'MAIN', None, 0, 0, 1280, 0)
+    y = 0
+    while len(elements) < count:
+        section = add(elements, 'SECTION', page, 0, y, 1280, 0)
+        add(elements, 'H2', section, 40, y + 20, 800, 40, f"Section {len(elements)}")
+        card_y = y + 80
+        for row in range(4):
+            for column in range(3):
+                x = 40 + column * 400
+                card = add(elements, 'DIV', section, x, card_y, 380, 260, styles=CARD_STYLE)
+                add(elements, 'H3', card, x + 16, card_y + 16, 300, 28, f"Card {len(elements)}")
+                for line in range(4):
+                    add(elements, 'P', card, x + 16, card_y + 56 + line * 24, 340, 20, f"line {line} of card text")
+                add(elements, 'A', card, x + 16, card_y + 200, 120, 40, "Learn more", href="/more")
+                defect = rng.random()
+                if defect < 0.02: # icon buttons squeezed together
+                    add(elements, 'BUTTON', card, x + 300, card_y + 210, 16, 16, None, role='button')
+                    add(elements, 'BUTTON', card, x + 320, card_y + 210, 16, 16, None, role='button')
+                elif defect < 0.04: # positioned badge on top of the heading
+                    add(elements, 'SPAN', card, x + 100, card_y + 30, 120, 24, "New!")
+                elif defect < 0.05: # CSS order: the last link is shown at the top of the card
+                    add(elements, 'A', card, x + 16, card_y + 2, 200, 12, "Top action", href="/top")
+                elif defect < 0.06: # promo box positioned over the card text
+                    add(elements, 'DIV', section, x + 8, card_y + 50, 370, 100, styles=CARD_STYLE)
+            card_y += 280
+        elements[section]["bounding_box"]["height"] = card_y - y
+        y = card_y + 40
+    elements[page]["bounding_box"]["height"] = y
+    return elements[:count]
+
+
+def brute_force_overlaps(boxes):
+    pairs = 0
+    for i in range(len(boxes)):
+        for j in range(i + 1, len(boxes)):
+            if boxes[i] and boxes[j] and intersection_area(boxes[i], boxes[j]):
+                pairs += 1
+    return pairs
+
+
+def check_queries(elements, samples, rng):
+    index = SpatialIndex.from_elements(elements)
+    boxes = index.boxes
+    height = max(box[3] for box in boxes if box)
+    for _ in range(samples):
+        x, y = rng.uniform(0, 1280), rng.uniform(0, height)
+        query = (x, y, x + rng.uniform(1, 800), y + rng.uniform(1, 800))
+        expected = [i for i, box in enumerate(boxes) if box and box[0] <= query[2] and query[0] <= box[2] and box[1] <= query[3] and query[1] <= box[3]]
+        if index.query(query) != expected:
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,10000,50000")
+    parser.add_argument("--brute-force-max", type=int, default=5000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    results = []
+    for size in (int(value) for value in args.sizes.split(',')):
+        elements = make_layout_page(size)
+        totals, builds = [], []
+        checks = {}
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            checker = LayoutChecker(elements)
+            builds.append((time.perf_counter() - start) * 1000)
+            for name in ("overlapping_text", "occluded_text", "touch_targets", "reading_order", "rank_ctas"):
+                check_start = time.perf_counter()
+                getattr(checker, name)()
+                checks.setdefault(name, []).append((time.perf_counter() - check_start) * 1000)
+            start = time.perf_counter()
+            report = run_layout_checks(elements)
+            totals.append((time.perf_counter() - start) * 1000)
+        row = {
+            "elements": size,
+            "index_build_ms": round(percentile(sorted(builds), 50), 1),
+            "checks_ms": {name: round(percentile(sorted(times), 50), 1) for name, times in checks.items()},
+            "run_layout_checks_ms": round(percentile(sorted(totals), 50), 1),
+            "findings": {key: value for key, value in report["stats"].items() if key not in ("elements",)},
+        }
+        if size <= args.brute_force_max:
+            start = time.perf_counter()
+            brute_force_overlaps([element_box(e) for e in elements])
+            row["brute_force_pairs_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            row["index_matches_linear_scan"] = check_queries(elements, 200, rng)
+        results.append(row)
+        print(f"{size} elements: layout checks {row['run_layout_checks_ms']}ms"
+              + (f", all-pairs overlap scan {row['brute_force_pairs_ms']}ms" if "brute_force_pairs_ms" in row else ""), file=sys.stderr)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Benchmark: time to first feedback item with streamed versus blocking Gemini calls.
+
+    python backend/benchmarks/bench_llm_streaming.py --latency-ms 400 --chunk-delay-ms 40 --iterations 5
+
+Runs the design and workflow agents against the local fake Gemini (fake_gemini.py), which sends
+its answer in small chunks, once with llm_json.LLM_STREAMING on and once off. Reports p50 time to
+first chunk, time to first complete item (what a ?stream=1 client sees first) and total LLM time.
+"""
+import argparse
+import json
+import sys
+
+from synthetic import make_key_elements, percentile
+from fake_gemini import FakeGeminiServer
+
+import llm_json
+from agents.design_agent import analyze_design
+from agents.workflow_agent import run_gemini_workflow_analysis
+
+
+def run_agent(agent, key_elements):
+    if agent == "design":
+        return analyze_design("http://bench.local", None, key_elements)["data"]["llm_stream"]
+    return run_gemini_workflow_analysis("http://bench.local", None, key_elements)["llm_stream"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--elements", type=int, default=500)
+    parser.add_argument("--latency-ms", type=int, default=400)
+    parser.add_argument("--chunk-delay-ms", type=int, default=40)
+    parser.add_argument("--chunk-chars", type=int, default=48)
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+
+    key_elements = make_key_elements(args.elements)
+    results = []
+    with FakeGeminiServer(latency_ms=args.latency_ms, stream_chunk_chars=args.chunk_chars, stream_chunk_delay_ms=args.chunk_delay_ms) as fake:
+        fake.configure_genai()
+        for agent in ("design", "workflow"):
+            for streaming in (False, True):
+                llm_json.LLM_STREAMING = streaming
+                runs = [run_agent(agent, key_elements) for _ in range(args.iterations)]
+                stats = {"agent": agent, "streaming": streaming}
+                for field in ("time_to_first_chunk_ms", "time_to_first_item_ms", "total_ms"):
+                    values = sorted(run[field] for run in runs if run[field] is not None)
+                    stats[f"p50_{field}"] = round(percentile(values, 50), 1) if values else None
+                results.append(stats)
+                print(f"{agent:<9} streaming={streaming!s:<5} first_item={stats['p50_time_to_first_item_ms']}ms total={stats['p50_total_ms']}ms", file=sys.stderr)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
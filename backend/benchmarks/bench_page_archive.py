@@ -0,0 +1,67 @@
+"""
+Benchmark: live vs archived (record/replay) accessibility runs (page_archive.py).
+
+    python backend/benchmarks/bench_page_archive.py --url https://example.com --runs 5
+
+Records the URL once through the accessibility agent (archive=record), then runs the agent --runs
+times live and --runs times in replay mode. Reports p50/max wall time for both, how many distinct
+issue lists each produced (1 = reproducible) and the archive store's deduplication stats.
+Uses a temporary PAGE_ARCHIVE_DIR unless --archive-dir is given. Needs Playwright's Chromium.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from synthetic import percentile
+
+import page_archive
+from agents.accessibility_agent import analyze_website_accessibility_and_responsive
+
+
+def run_agent(url, mode, archive):
+    session = page_archive.start_session(mode, url, archive)
+    start = time.perf_counter()
+    output = analyze_website_accessibility_and_responsive(url, None, None)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    summary = session.finish() if session is not None else None
+    page_archive.start_session("off", url)
+    issues = tuple(sorted((issue.issue, issue.element_description) for issue in output.accessibility_issues))
+    return elapsed_ms, issues, summary
+
+
+def summarize(runs):
+    times = sorted(elapsed for elapsed, _, _ in runs)
+    return {"p50_ms": round(percentile(times, 50), 1), "max_ms": round(times[-1], 1), "distinct_issue_lists": len({issues for _, issues, _ in runs})}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="https://example.com")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--archive-dir", default=None)
+    args = parser.parse_args()
+
+    archive = page_archive.PageArchive(args.archive_dir or tempfile.mkdtemp(prefix="page_archive_bench_"))
+    _, _, recorded = run_agent(args.url, "record", archive)
+    live = [run_agent(args.url, "off", archive) for _ in range(args.runs)]
+    replay = [run_agent(args.url, "replay", archive) for _ in range(args.runs)]
+
+    results = {
+        "url": args.url,
+        "archive_dir": archive.root,
+        "recorded": recorded,
+        "live": summarize(live),
+        "replay": summarize(replay),
+        "replay_requests": replay[-1][2],
+        "store": archive.stats(),
+    }
+    print(f"live p50={results['live']['p50_ms']}ms ({results['live']['distinct_issue_lists']} distinct results), "
+          f"replay p50={results['replay']['p50_ms']}ms ({results['replay']['distinct_issue_lists']} distinct results)", file=sys.stderr)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Benchmark: screenshot-sampled text contrast (pixel_contrast.py) vs the computed-style estimate.
+
+    python backend/benchmarks/bench_pixel_contrast.py --boxes 2000 --runs 7 --scale 1
+
+Renders a page of text labels with Pillow: dark/light text on solid colors, on gradients and on a
+noisy "photo" background, each box with a known worst-case contrast (text color vs the background
+pixels under it). Reports the p50 time to measure every box at once (screenshot decode counted
+separately), how often the pixel measurement and the DOM-style estimate (text color vs the page
+background, which is what walking up to the first opaque backgroundColor gives for text over an
+image or gradient) agree with the real pass/fail at 4.5:1, and the measurement error on solid boxes.
+"""
+import argparse
+import io
+import json
+import math
+import random
+import sys
+import time
+
+from synthetic import percentile
+
+from PIL import Image, ImageDraw, ImageFont
+
+import pixel_contrast
+from agents.accessibility_agent import get_contrast_ratio
+
+PAGE_WIDTH = 1280
+BOX_WIDTH, BOX_HEIGHT = 120, 22
+PAGE_BACKGROUND = (255, 255, 255)
+TEXT_COLORS = [(33, 33, 33), (118, 118, 118), (160, 160, 160), (255, 255, 255), (0, 102, 204)]
+BACKGROUNDS = [(255, 255, 255), (240, 240, 240), (20, 20, 60), (0, 102, 204), (200, 200, 200)]
+
+
+def render_page(count, scale, seed):
+    """Returns (PNG bytes, key_elements, [(kind, text rgb, true worst contrast)] per text element)."""
+    rng = random.Random(seed)
+    columns = PAGE_WIDTH // (BOX_WIDTH + 8)
+    rows = math.ceil(count / columns)
+    height = 40 + rows * (BOX_HEIGHT + 8)
+    image = Image.new("RGB", (int(PAGE_WIDTH * scale), int(height * scale)), PAGE_BACKGROUND)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=int(13 * scale))
+    key_elements = [{"tag_name": "HEADER", "text_content": None, "parent_index": None, "computed_styles": {},
+                     "bounding_box": {"x": 0, "y": 0, "width": PAGE_WIDTH, "height": 32}}]
+    truth = [None]
+    for i in range(count):
+        x = 4 + (i % columns) * (BOX_WIDTH + 8)
+        y = 40 + (i // columns) * (BOX_HEIGHT + 8)
+        left, top, right, bottom = int(x * scale), int(y * scale), int((x + BOX_WIDTH) * scale), int((y + BOX_HEIGHT) * scale)
+        fg = rng.choice(TEXT_COLORS)
+        kind = rng.choice(("solid", "gradient", "photo"))
+        if kind == "solid":
+            bg = rng.choice([color for color in BACKGROUNDS if color != fg])
+            draw.rectangle([left, top, right - 1, bottom - 1], fill=bg)
+            under = [bg]
+        elif kind == "gradient":
+            start, end = rng.sample(BACKGROUNDS, 2)
+            under = []
+            for column in range(left, right):
+                t = (column - left) / max(right - left - 1, 1)
+                color = tuple(round(a + (b - a) * t) for a, b in zip(start, end))
+                draw.line([(column, top), (column, bottom - 1)], fill=color)
+                under.append(color)
+        else:
+            base = rng.choice(BACKGROUNDS)
+            under = []
+            block = max(int(6 * scale), 1)
+            for by in range(top, bottom, block):
+                for bx in range(left, right, block):
+                    color = tuple(max(0, min(255, value + rng.randint(-40, 40))) for value in base)
+                    draw.rectangle([bx, by, min(bx + block, right) - 1, min(by + block, bottom) - 1], fill=color)
+                    under.append(color)
+        draw.text((left + 4 * scale, top + 3 * scale), f"Label {i:04d}", fill=fg, font=font)
+        worst = min(get_contrast_ratio(fg, color) for color in under)
+        # The computed-style estimate: text color vs the element's background, or the page's for images/gradients
+        dom_background = under[0] if kind == "solid" else PAGE_BACKGROUND
+        key_elements.append({"tag_name": "P", "text_content": f"Label {i:04d}", "parent_index": None,
+                             "computed_styles": {"color": f"rgb{fg}", "backgroundColor": "rgba(0, 0, 0, 0)"},
+                             "bounding_box": {"x": x, "y": y, "width": BOX_WIDTH, "height": BOX_HEIGHT}})
+        truth.append((kind, fg, worst, get_contrast_ratio(fg, dom_background)))
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue(), key_elements, truth
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--boxes", type=int, default=2000)
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--scale", type=float, default=1.0, help="device pixel ratio of the rendered screenshot")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    png, key_elements, truth = render_page(args.boxes, args.scale, args.seed)
+    indices = list(range(1, len(key_elements)))
+    text_colors = [truth[i][1] for i in indices]
+    boxes = [[key_elements[i]["bounding_box"][field] for field in ("x", "y", "width", "height")] for i in indices]
+
+    decode_times, measure_times = [], []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        image = pixel_contrast.image_from_bytes(png)
+        decode_times.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        scale = pixel_contrast.screenshot_scale(image.size[0], key_elements)
+        measurements = pixel_contrast.measure_text_contrast(image, boxes, text_colors=text_colors, scale=scale)
+        measure_times.append((time.perf_counter() - start) * 1000)
+
+    by_kind = {}
+    solid_errors = []
+    for i, measurement in zip(indices, measurements):
+        kind, _, worst, dom_estimate = truth[i]
+        stats = by_kind.setdefault(kind, {"boxes": 0, "measured": 0, "pixel_verdict_agrees": 0, "dom_verdict_agrees": 0})
+        stats["boxes"] += 1
+        stats["dom_verdict_agrees"] += (dom_estimate < 4.5) == (worst < 4.5)
+        if measurement is None:
+            continue
+        stats["measured"] += 1
+        stats["pixel_verdict_agrees"] += (measurement["contrast"] < 4.5) == (worst < 4.5)
+        if kind == "solid":
+            solid_errors.append(abs(math.log(measurement["contrast"] / worst)))
+
+    results = {
+        "boxes": args.boxes,
+        "screenshot_px": list(image.size),
+        "inferred_scale": scale,
+        "decode_ms_p50": round(percentile(sorted(decode_times), 50), 1),
+        "measure_ms_p50": round(percentile(sorted(measure_times), 50), 1),
+        "by_background": by_kind,
+        "solid_contrast_error_p50": round(math.exp(percentile(sorted(solid_errors), 50)) - 1, 3),
+        "solid_contrast_error_p95": round(math.exp(percentile(sorted(solid_errors), 95)) - 1, 3),
+    }
+    print(f"{args.boxes} boxes: measure p50 {results['measure_ms_p50']}ms (+ decode {results['decode_ms_p50']}ms)", file=sys.stderr)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark: full-page screenshot versus viewport-tiled capture (screenshot_tiles.py).
+
+    python backend/benchmarks/bench_screenshot_capture.py --fixtures small,huge_dom --iterations 3
+
+For each fixture page and capture mode it measures capture time, encoded bytes held in Python,
+and the Python-side peak memory (tracemalloc) of capturing plus decoding what the design agent
+actually uses (the full image, or the above-the-fold tile). Needs a working Playwright Chromium.
+"""
+import argparse
+import base64
+import json
+import sys
+import time
+import tracemalloc
+
+from synthetic import percentile
+from fixtures import FixtureServer
+
+from browser_pool import browser_page
+from image_utils import image_from_bytes
+from screenshot_tiles import capture_screenshot_tiles
+
+
+def capture_once(url, mode):
+    with browser_page() as page:
+        page.goto(url, wait_until="domcontentloaded", timeout=60000)
+        tracemalloc.start()
+        start = time.perf_counter()
+        if mode == "tiles":
+            tiles = capture_screenshot_tiles(page)
+            screenshot_base64 = tiles.tile_base64(0)
+            image = tiles.image(0)
+            encoded_bytes, page_height = tiles.encoded_bytes, tiles.page_height
+        else:
+            png_bytes = page.screenshot(full_page=True)
+            screenshot_base64 = base64.b64encode(png_bytes).decode('utf-8')
+            image = image_from_bytes(png_bytes)
+            encoded_bytes, page_height = len(png_bytes), image.size[1] if image else 0
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {"ms": elapsed_ms, "encoded_bytes": encoded_bytes, "base64_chars": len(screenshot_base64),
+            "decoded_pixels": image.size[0] * image.size[1] if image else 0, "peak_python_mb": peak / (1024 * 1024), "page_height": page_height}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", default="small,huge_dom")
+    parser.add_argument("--iterations", type=int, default=3)
+    args = parser.parse_args()
+
+    results = []
+    with FixtureServer() as fixture_server:
+        for fixture in args.fixtures.split(","):
+            for mode in ("full_page", "tiles"):
+                runs = [capture_once(fixture_server.url_for(fixture), mode) for _ in range(args.iterations)]
+                times = sorted(run["ms"] for run in runs)
+                stats = {
+                    "fixture": fixture, "mode": mode,
+                    "p50_ms": round(percentile(times, 50), 1),
+                    "encoded_bytes": runs[-1]["encoded_bytes"],
+                    "base64_chars": runs[-1]["base64_chars"],
+                    "decoded_pixels": runs[-1]["decoded_pixels"],
+                    "peak_python_mb": round(max(run["peak_python_mb"] for run in runs), 1),
+                    "page_height": runs[-1]["page_height"],
+                }
+                results.append(stats)
+                print(f"{fixture:<10} {mode:<9} p50={stats['p50_ms']}ms encoded={stats['encoded_bytes'] / 1024:.0f}KiB peak={stats['peak_python_mb']}MB", file=sys.stderr)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark: content-addressed screenshot store (screenshot_store.py) over repeated analyses.
+
+    python backend/benchmarks/bench_screenshot_store.py --pages 20 --analyses 200 --changed 0.3
+
+Renders --pages synthetic 1280x800 screenshots (text, buttons, a photo-like block) and replays
+--analyses requests over them; each request is a re-analysis of a random page whose capture changed
+with probability --changed (a new screenshot) or is identical to the page's last one. Compares:
+  - upload bytes: base64 on every request vs a hash once the backend has the capture;
+  - disk bytes: one PNG per analysis (the old screenshots/ folder) vs the store (deduplicated, with
+    lossless WebP derivatives);
+and reports the store's put/get latency and the background derivative encoding time.
+"""
+import argparse
+import base64
+import hashlib
+import io
+import json
+import random
+import sys
+import tempfile
+import time
+
+from synthetic import percentile
+
+from PIL import Image, ImageDraw
+
+from screenshot_store import ScreenshotStore
+from utils import image_format
+
+
+def render_screenshot(rng, width=1280, height=800):
+    image = Image.new("RGB", (width, height), rng.choice([(255, 255, 255), (246, 247, 249), (18, 18, 28)]))
+    draw = ImageDraw.Draw(image)
+    ink = (30, 30, 30) if image.getpixel((0, 0))[0] > 128 else (230, 230, 230)
+    draw.rectangle([0, 0, width, 64], fill=rng.choice([(0, 102, 204), (33, 33, 33), (120, 40, 160)]))
+    for row in range(24):
+        draw.text((40, 90 + row * 24), " ".join(rng.choice(["lorem", "ipsum", "design", "pixel", "contrast", "layout"]) for _ in range(12)), fill=ink)
+    for button in range(4):
+        x = 40 + button * 160
+        draw.rounded_rectangle([x, 700, x + 140, 740], radius=8, fill=(0, 120, 80))
+        draw.text((x + 20, 712), f"Action {button}", fill=(255, 255, 255))
+    # Photo-like block: smooth gradient plus noise, the part PNG compresses worst
+    for y in range(120, 420, 4):
+        for x in range(760, 1220, 4):
+            value = (x - 760) // 3 + (y - 120) // 4 + rng.randint(-12, 12)
+            draw.rectangle([x, y, x + 3, y + 3], fill=(max(0, min(255, value)), max(0, min(255, 200 - value // 2)), 140))
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--analyses", type=int, default=200)
+    parser.add_argument("--changed", type=float, default=0.3, help="probability that a re-analysed page's capture changed")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    current = [render_screenshot(rng) for _ in range(args.pages)]
+    store = ScreenshotStore(root=tempfile.mkdtemp(prefix="screenshot_store_"), max_bytes=0, store_format="webp")
+    known = set() # hashes the client saw the backend confirm
+    inline_upload = referenced_upload = legacy_disk = 0
+    put_times, get_times = [], []
+
+    for _ in range(args.analyses):
+        page = rng.randrange(args.pages)
+        if rng.random() < args.changed:
+            current[page] = render_screenshot(rng)
+        png = current[page]
+        encoded = base64.b64encode(png).decode("ascii")
+        inline_upload += len(encoded)
+        legacy_disk += len(png)
+        digest = hashlib.sha256(png).hexdigest()
+        if digest in known:
+            referenced_upload += len(digest)
+            start = time.perf_counter()
+            assert store.get(digest) is not None
+            get_times.append((time.perf_counter() - start) * 1000)
+        else:
+            referenced_upload += len(encoded)
+            start = time.perf_counter()
+            store.put_base64(encoded)
+            put_times.append((time.perf_counter() - start) * 1000)
+            known.add(digest)
+
+    # Derivatives are written in the background; time them by waiting for the queue to drain
+    start = time.perf_counter()
+    if store._executor is not None:
+        store._executor.shutdown(wait=True)
+    drain_ms = (time.perf_counter() - start) * 1000
+    sample = current[0]
+    encode_times = []
+    for _ in range(5):
+        start = time.perf_counter()
+        _, derivative = store.encode_derivative(sample)
+        encode_times.append((time.perf_counter() - start) * 1000)
+    stats = store.stats()
+
+    results = {
+        "analyses": args.analyses,
+        "unique_captures": len(known),
+        "upload_bytes_inline": inline_upload,
+        "upload_bytes_with_references": referenced_upload,
+        "upload_reduction": round(1 - referenced_upload / inline_upload, 3),
+        "disk_bytes_png_per_analysis": legacy_disk,
+        "disk_bytes_store": stats["bytes"],
+        "disk_reduction": round(1 - stats["bytes"] / legacy_disk, 3),
+        "store_formats": stats["by_format"],
+        "webp_vs_png_size": round(len(derivative) / len(sample), 3),
+        "derivative_format": image_format(derivative),
+        "put_ms_p50": round(percentile(sorted(put_times), 50), 2),
+        "get_ms_p50": round(percentile(sorted(get_times), 50), 2) if get_times else None,
+        "derivative_encode_ms_p50": round(percentile(sorted(encode_times), 50), 1),
+        "derivative_queue_drain_ms": round(drain_ms, 1),
+    }
+    print(f"upload -{results['upload_reduction']:.0%}, disk -{results['disk_reduction']:.0%} over {args.analyses} analyses", file=sys.stderr)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark: worker cold start (import time, time to first health check, time to ready).
+
+    python backend/benchmarks/bench_startup.py --iterations 5
+
+Each iteration uses a fresh interpreter:
+  - "import app" wall time, plus the slowest modules from `python -X importtime`;
+  - `serve.py --workers 1` started from scratch: time until GET /healthz answers and until
+    GET /readyz returns 200 (background warmup done; browser steps may fail without Chromium).
+Prints JSON; compare runs to catch import-time regressions.
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from synthetic import percentile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app; print((time.perf_counter() - t) * 1000)"
+
+
+def import_app_ms():
+    output = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def slowest_imports(top):
+    # -X importtime lines: "import time: self_us | cumulative_us | module" (indentation = depth)
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=BACKEND_DIR, capture_output=True, text=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)", line)
+        if match and len(match.group(3)) <= 3: # direct imports of app.py (and app itself)
+            rows.append({"module": match.group(4), "cumulative_ms": round(int(match.group(2)) / 1000, 1)})
+    return sorted(rows, key=lambda row: -row["cumulative_ms"])[:top]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url, expect_status, deadline):
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == expect_status:
+                    return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            if e.code == expect_status:
+                return json.loads(e.read())
+        except OSError:
+            pass
+        time.sleep(0.01)
+    return None
+
+
+def serve_cold_start(timeout_s):
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(BACKEND_DIR, "serve.py"), "--workers", "1", "--port", str(port)],
+                               cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        base = f"http://127.0.0.1:{port}"
+        health = wait_for(base + "/healthz", 200, start + timeout_s)
+        healthz_ms = (time.perf_counter() - start) * 1000 if health else None
+        ready = wait_for(base + "/readyz", 200, start + timeout_s)
+        readyz_ms = (time.perf_counter() - start) * 1000 if ready else None
+        steps = {name: step.get("status") for name, step in (ready or {}).get("warmup", {}).get("steps", {}).items()}
+        return {"healthz_ms": healthz_ms, "readyz_ms": readyz_ms, "warmup_steps": steps}
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=90)
+    args = parser.parse_args()
+
+    import_times = sorted(import_app_ms() for _ in range(args.iterations))
+    cold_starts = [serve_cold_start(args.timeout) for _ in range(args.iterations)]
+    healthz = sorted(run["healthz_ms"] for run in cold_starts if run["healthz_ms"] is not None)
+    readyz = sorted(run["readyz_ms"] for run in cold_starts if run["readyz_ms"] is not None)
+
+    results = {
+        "import_app_p50_ms": round(percentile(import_times, 50), 1),
+        "import_app_max_ms": round(import_times[-1], 1),
+        "slowest_imports": slowest_imports(args.top),
+        "serve_first_healthz_p50_ms": round(percentile(healthz, 50), 1) if healthz else None,
+        "serve_ready_p50_ms": round(percentile(readyz, 50), 1) if readyz else None,
+        "warmup_steps": cold_starts[-1]["warmup_steps"],
+    }
+    print(f"import app p50={results['import_app_p50_ms']}ms, first /healthz p50={results['serve_first_healthz_p50_ms']}ms, "
+          f"ready p50={results['serve_ready_p50_ms']}ms", file=sys.stderr)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Microbenchmark: the shared style memo (style_memo.py) on large, repetitive element sets.
+
+    python backend/benchmarks/bench_style_memo.py --elements 20000
+
+For each memoized helper (font-family normalization, color parsing, px parsing, style
+fingerprints) it times one pass over every element's values with the raw function and with the
+memo, then times compute_design_heuristics with a cold and a warm memo. Prints JSON including
+the memo hit rates.
+"""
+import argparse
+import json
+import sys
+import time
+
+from synthetic import make_key_elements
+
+import style_memo
+from agents.design_agent import compute_design_heuristics
+
+
+def best_of_ms(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, (time.perf_counter() - start) * 1000)
+    return round(best, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--elements", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    key_elements = make_key_elements(args.elements)
+    styles = [e["computed_styles"] for e in key_elements]
+    workloads = {
+        "font_family": (style_memo.normalize_font_family, [(s["fontFamily"],) for s in styles]),
+        "css_color": (style_memo.parse_color, [(s["color"],) for s in styles] + [(s["backgroundColor"],) for s in styles]),
+        "css_px": (style_memo.parse_px, [(s["fontSize"],) for s in styles]),
+        "style_fingerprint": (style_memo.style_fingerprint, [(s["fontSize"], s["fontWeight"], s["fontFamily"]) for s in styles]),
+    }
+
+    results = {"elements": args.elements, "helpers": [], "design_heuristics": {}}
+    for name, (memoized_fn, calls) in workloads.items():
+        raw_fn = memoized_fn.__wrapped__
+        raw_ms = best_of_ms(lambda: [raw_fn(*call) for call in calls], args.repeat)
+        memo_ms = best_of_ms(lambda: [memoized_fn(*call) for call in calls], args.repeat)
+        results["helpers"].append({"memo": name, "calls": len(calls), "raw_ms": raw_ms, "memoized_ms": memo_ms, "speedup": round(raw_ms / memo_ms, 2) if memo_ms else None})
+        print(f"{name:<18} raw={raw_ms}ms memoized={memo_ms}ms", file=sys.stderr)
+
+    style_memo.clear_memos()
+    start = time.perf_counter()
+    compute_design_heuristics(key_elements)
+    results["design_heuristics"]["cold_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    results["design_heuristics"]["warm_ms"] = best_of_ms(lambda: compute_design_heuristics(key_elements), args.repeat)
+    results["memo_stats"] = style_memo.memo_stats()
+    print(f"design heuristics cold={results['design_heuristics']['cold_ms']}ms warm={results['design_heuristics']['warm_ms']}ms", file=sys.stderr)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
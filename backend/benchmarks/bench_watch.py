@@ -0,0 +1,233 @@
+"""
+Benchmark: live watch mode (watch_session.py over websocket_server.py) vs re-running the analysis.
+
+    python backend/benchmarks/bench_watch.py --elements 3000 --updates 200
+
+Serves app.py on a local Werkzeug server, opens /api/watch with a minimal WebSocket client, sends
+a card-grid page (bench_layout_checks.make_layout_page) as the start snapshot and then --updates
+small edits shaped like a designer's: a text change, a low-contrast color, a card nudged down,
+an image inserted without alt text, an element removed. Per update it reports the bytes sent and
+received and the server's processing time, next to the size of the page's element graph (what
+every click of "Analyze" uploads, screenshot not counted) and one fast-mode analysis of the page
+(the cheapest full re-run). At the end a second connection sends the final page as one snapshot
+and the findings must be identical to the ones built up incrementally.
+"""
+import argparse
+import base64
+import contextlib
+import json
+import os
+import random
+import socket
+import struct
+import sys
+import threading
+import time
+
+from synthetic import percentile
+from bench_layout_checks import make_layout_page
+
+from werkzeug.serving import make_server
+
+import app as backend_app
+from element_graph import OPTIONAL_ATTRIBUTES
+
+
+class WatchClient:
+    """Just enough of a WebSocket client: masked text frames out, unmasked frames in."""
+
+    def __init__(self, port):
+        self.sock = socket.create_connection(("127.0.0.1", port))
+        key = base64.b64encode(os.urandom(16)).decode("ascii")
+        self.sock.sendall((f"GET /api/watch HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                           f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n").encode("ascii"))
+        response = b""
+        while b"\r\n\r\n" not in response:
+            response += self.sock.recv(4096)
+        if not response.startswith(b"HTTP/1.1 101"):
+            raise RuntimeError(response.decode("latin-1"))
+        self.findings = {}
+
+    def send(self, message):
+        payload = json.dumps(message, separators=(",", ":")).encode("utf-8")
+        mask = os.urandom(4)
+        length = len(payload)
+        header = struct.pack("!BB", 0x81, 0x80 | length) if length < 126 else (
+            struct.pack("!BBH", 0x81, 0x80 | 126, length) if length < 1 << 16 else struct.pack("!BBQ", 0x81, 0x80 | 127, length))
+        masked = (int.from_bytes(payload, "little") ^ int.from_bytes((mask * (length // 4 + 1))[:length], "little")).to_bytes(length, "little")
+        self.sock.sendall(header + mask + masked)
+        return len(header) + 4 + length
+
+    def _recv_exact(self, size):
+        data = b""
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("server closed the connection")
+            data += chunk
+        return data
+
+    def receive(self):
+        """Next message and its size on the wire; applies "findings" diffs to self.findings."""
+        first, second = self._recv_exact(2)
+        length, header = second & 0x7F, 2
+        if length == 126:
+            length, header = struct.unpack("!H", self._recv_exact(2))[0], 4
+        elif length == 127:
+            length, header = struct.unpack("!Q", self._recv_exact(8))[0], 10
+        message = json.loads(self._recv_exact(length))
+        if message.get("type") == "findings":
+            for finding_id in message["removed"]:
+                self.findings.pop(finding_id, None)
+            for finding in message["added"]:
+                self.findings[finding["id"]] = finding
+        return message, header + length
+
+    def close(self):
+        self.send({"type": "stop"})
+        self.sock.close()
+
+
+class Page:
+    """The client-side mirror of the watched page: keyed nodes in document order plus the style table."""
+
+    def __init__(self, elements):
+        self.styles, self._style_index = [], {}
+        self.nodes, self.order = {}, []
+        for key, e in enumerate(elements):
+            box = e["bounding_box"]
+            node = {"key": key, "parent": e.get("parent_index"), "tag": e["tag_name"], "style": self.style(e["computed_styles"]),
+                    "bbox": [box["x"], box["y"], box["width"], box["height"]]}
+            if e.get("text_content"):
+                node["text"] = e["text_content"]
+            for attribute in OPTIONAL_ATTRIBUTES:
+                if e.get(attribute):
+                    node[attribute] = e[attribute]
+            self.nodes[key] = node
+            self.order.append(key)
+        self.next_key = len(elements)
+        self.sent_styles = len(self.styles)
+
+    def style(self, styles):
+        style_key = json.dumps(styles, sort_keys=True)
+        if style_key not in self._style_index:
+            self._style_index[style_key] = len(self.styles)
+            self.styles.append(styles)
+        return self._style_index[style_key]
+
+    def snapshot(self, url):
+        self.sent_styles = len(self.styles)
+        return {"type": "start", "url": url, "element_graph": {"format": "element_graph/1", "styles": self.styles,
+                                                               "nodes": [self.nodes[key] for key in self.order]}}
+
+    def delta(self, seq, upserts, removes):
+        new_styles = self.styles[self.sent_styles:]
+        self.sent_styles = len(self.styles)
+        return {"type": "delta", "seq": seq, "styles": new_styles, "upsert": upserts, "remove": removes}
+
+
+def random_edit(page, rng):
+    """One designer-style edit applied to the mirror; returns (kind, upserts, removes)."""
+    kind = rng.choice(("text", "color", "move", "insert", "remove"))
+    keys_by_tag = lambda tags: [key for key in page.order if page.nodes[key]["tag"] in tags]
+    if kind == "text":
+        key = rng.choice(keys_by_tag({"P"}))
+        page.nodes[key]["text"] = f"edited copy {rng.randrange(10000)}"
+        return kind, [{"key": key, "text": page.nodes[key]["text"]}], []
+    if kind == "color":
+        key = rng.choice(keys_by_tag({"P", "H3"}))
+        styles = dict(page.styles[page.nodes[key]["style"]], color=rng.choice(["rgb(200, 200, 200)", "rgb(33, 33, 33)"]),
+                      backgroundColor="rgb(255, 255, 255)")
+        page.nodes[key]["style"] = page.style(styles)
+        return kind, [{"key": key, "style": page.nodes[key]["style"]}], []
+    if kind == "move":
+        card = rng.choice([key for key in keys_by_tag({"DIV"}) if page.nodes[key]["bbox"][2] == 380])
+        upserts = []
+        for key in [card] + [key for key in page.order if page.nodes[key].get("parent") == card]:
+            page.nodes[key]["bbox"][1] += 12
+            upserts.append({"key": key, "bbox": page.nodes[key]["bbox"]})
+        return kind, upserts, []
+    if kind == "insert":
+        prev = rng.choice(keys_by_tag({"A"}))
+        key, page.next_key = page.next_key, page.next_key + 1
+        x, y = page.nodes[prev]["bbox"][:2]
+        node = {"key": key, "parent": page.nodes[prev].get("parent"), "tag": "IMG", "style": page.nodes[prev]["style"],
+                "bbox": [x + 200, y, 48, 48], "src": f"/icons/{key}.svg", "alt": ""}
+        page.nodes[key] = node
+        page.order.insert(page.order.index(prev) + 1, key)
+        return kind, [dict(node, prev=prev)], []
+    key = rng.choice(keys_by_tag({"P", "IMG"}))
+    children = [child for child in page.order if page.nodes[child].get("parent") == key]
+    if children:
+        return random_edit(page, rng)
+    del page.nodes[key]
+    page.order.remove(key)
+    return kind, [], [key]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--elements", type=int, default=3000)
+    parser.add_argument("--updates", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    server = make_server("127.0.0.1", 0, backend_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    rng = random.Random(args.seed)
+    elements = make_layout_page(args.elements, seed=args.seed)
+    page = Page(elements)
+    url = "http://bench.local/watch"
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        backend_app.run_fast_analysis(url, None, elements)
+        fast_ms = (time.perf_counter() - start) * 1000
+        graph_bytes = len(json.dumps(page.snapshot(url)["element_graph"], separators=(",", ":")))
+
+        client = WatchClient(server.server_port)
+        snapshot_sent = client.send(page.snapshot(url))
+        message, _ = client.receive()
+        initial = {"bytes_sent": snapshot_sent, "process_ms": message["stats"]["process_ms"], "findings": message["total"]}
+
+        sent, received, process_ms, by_kind = [], [], [], {}
+        for seq in range(1, args.updates + 1):
+            kind, upserts, removes = random_edit(page, rng)
+            sent.append(client.send(page.delta(seq, upserts, removes)))
+            message, size = client.receive()
+            assert message["type"] == "findings" and message["seq"] == seq, message
+            received.append(size)
+            process_ms.append(message["stats"]["process_ms"])
+            by_kind.setdefault(kind, []).append(message["stats"]["process_ms"])
+
+        # The same final page as one snapshot must give exactly the incrementally maintained findings
+        check = WatchClient(server.server_port)
+        check.send(page.snapshot(url))
+        check.receive()
+        consistent = check.findings == client.findings
+        client.close()
+        check.close()
+    server.shutdown()
+
+    results = {
+        "elements": args.elements,
+        "updates": args.updates,
+        "element_graph_bytes": graph_bytes,
+        "fast_analysis_ms": round(fast_ms, 1),
+        "initial_snapshot": initial,
+        "update_bytes_sent_p50": percentile(sorted(sent), 50),
+        "update_bytes_received_p50": percentile(sorted(received), 50),
+        "update_process_ms_p50": round(percentile(sorted(process_ms), 50), 2),
+        "update_process_ms_p95": round(percentile(sorted(process_ms), 95), 2),
+        "process_ms_p50_by_edit": {kind: round(percentile(sorted(times), 50), 2) for kind, times in sorted(by_kind.items())},
+        "findings": len(client.findings),
+        "consistent_with_fresh_snapshot": consistent,
+    }
+    print(f"update: {results['update_bytes_sent_p50']}B up / {results['update_bytes_received_p50']}B down, "
+          f"{results['update_process_ms_p50']}ms p50 (element graph {graph_bytes}B, fast analysis {results['fast_analysis_ms']}ms), "
+          f"consistent={consistent}", file=sys.stderr)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark: throughput versus worker count for the pre-fork server (serve.py).
+
+    python backend/benchmarks/bench_workers.py --workers 1,2,4,8 --elements 3000
+
+Starts serve.py with each worker count, then drives CPU-bound mode=fast requests
+(no LLM, no browser) at 2 x workers concurrency for a fixed duration and reports
+throughput and latency percentiles as JSON. Run it on a multi-core box; on one core
+the numbers will (correctly) stay flat.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+from synthetic import BACKEND_DIR, make_key_elements, percentile
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_until_up(base_url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(base_url + "/metrics", timeout=5).read()
+            return
+        except OSError: # refused, reset or timed out while workers are still importing
+            time.sleep(0.2)
+    raise RuntimeError(f"server at {base_url} did not come up")
+
+
+def drive(url, body, concurrency, duration_seconds):
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    deadline = time.time() + duration_seconds
+
+    def loop():
+        while time.time() < deadline:
+            start = time.perf_counter()
+            try:
+                request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"}, method="POST")
+                urllib.request.urlopen(request, timeout=120).read()
+                with lock:
+                    latencies.append((time.perf_counter() - start) * 1000)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=loop) for _ in range(concurrency)]
+    wall_start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - wall_start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "throughput_rps": round(len(latencies) / wall, 2),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--elements", type=int, default=3000)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per worker count")
+    args = parser.parse_args()
+
+    body = json.dumps({"url": "http://bench.local/", "key_elements": make_key_elements(args.elements)}).encode("utf-8")
+    results = {"cpu_count": os.cpu_count(), "elements": args.elements, "runs": []}
+
+    for workers in [int(w) for w in args.workers.split(",")]:
+        port = _free_port()
+        env = dict(
+            os.environ,
+            ANALYSIS_CACHE_TTL_SECONDS="0",
+            RATE_LIMIT_PER_MINUTE="0",
+            SHARED_STORE_PATH=os.path.join(tempfile.gettempdir(), f"bench_workers_{port}.sqlite3"),
+        )
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(BACKEND_DIR, "serve.py"), "--workers", str(workers), "--port", str(port)],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            _wait_until_up(base_url)
+            stats = drive(base_url + "/api/analyze-website?mode=fast", body, concurrency=2 * workers, duration_seconds=args.duration)
+            stats["workers"] = workers
+            results["runs"].append(stats)
+            print(f"workers={workers}: {stats['throughput_rps']} req/s, p50={stats['p50_ms']}ms, p95={stats['p95_ms']}ms", file=sys.stderr)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
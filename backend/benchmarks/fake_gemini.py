@@ -0,0 +1,121 @@
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# A local stand-in for the Gemini REST API (generateContent / streamGenerateContent), with
+# configurable latency. configure_genai() points the Gemini client (gemini_client.py) at it, so the agents run
+# unmodified. truncate_chars cuts every answer to that many characters, to exercise llm_json's
+# repair path. Streamed answers arrive as a JSON array of partial responses, stream_chunk_chars
+# of text each, stream_chunk_delay_ms apart (latency_ms is the time to the first chunk); a
+# blocking call waits for the same total generation time before answering.
+
+FAKE_ANALYSIS = {
+    "vibe_analysis": {"keywords": ["Modern", "Clean"], "description": "Fixture page with a clean, modern feel."},
+    "design_feedback": [
+        {"aspect": "Visual Hierarchy", "issue": "H1/H2 differentiation unclear.", "recommendation": "Increase H1 size.", "severity": "Moderate"},
+        {"aspect": "CTA Consistency", "issue": "Inconsistent button styles.", "recommendation": "Unify button styles.", "severity": "Minor"},
+    ],
+    "workflow_analysis": [
+        {"workflow_path": "Primary CTA", "issue": "CTA is below the fold.", "recommendation": "Move the CTA above the fold."},
+    ],
+}
+
+
+class _FakeGeminiHandler(BaseHTTPRequestHandler):
+    latency_seconds = 0.0
+    truncate_chars = None
+    stream_chunk_chars = 48
+    stream_chunk_delay_seconds = 0.0
+    calls = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        request_body = self.rfile.read(length)
+        with self.lock:
+            type(self).calls += 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        text = json.dumps(FAKE_ANALYSIS)
+        if self.truncate_chars:
+            text = text[:self.truncate_chars]
+        usage = {
+            "promptTokenCount": len(request_body) // 4,
+            "candidatesTokenCount": len(text) // 4,
+            "totalTokenCount": len(request_body) // 4 + len(text) // 4,
+        }
+        pieces = [text[i:i + self.stream_chunk_chars] for i in range(0, len(text), self.stream_chunk_chars)] or [""]
+        if ":streamGenerateContent" in self.path:
+            self._stream_response(pieces, usage)
+            return
+        if self.stream_chunk_delay_seconds:
+            time.sleep(self.stream_chunk_delay_seconds * (len(pieces) - 1))
+        payload = {
+            "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP", "index": 0}],
+            "usageMetadata": usage,
+        }
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream_response(self, pieces, usage):
+        # No Content-Length: the HTTP/1.0 response ends when the connection closes
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(b"[")
+        for position, piece in enumerate(pieces):
+            last = position == len(pieces) - 1
+            candidate = {"content": {"parts": [{"text": piece}], "role": "model"}, "index": 0}
+            if last:
+                candidate["finishReason"] = "STOP"
+            chunk = {"candidates": [candidate]}
+            if last:
+                chunk["usageMetadata"] = usage
+            self.wfile.write((("," if position else "") + json.dumps(chunk) + "\n").encode("utf-8"))
+            self.wfile.flush()
+            if self.stream_chunk_delay_seconds and not last:
+                time.sleep(self.stream_chunk_delay_seconds)
+        self.wfile.write(b"]")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeGeminiServer:
+    """Local fake for POST /v1beta/models/<model>:generateContent and :streamGenerateContent."""
+
+    def __init__(self, latency_ms=0, port=0, truncate_chars=None, stream_chunk_chars=48, stream_chunk_delay_ms=0):
+        handler = type("FakeGeminiHandler", (_FakeGeminiHandler,), {
+            "latency_seconds": latency_ms / 1000.0, "truncate_chars": truncate_chars, "calls": 0,
+            "stream_chunk_chars": stream_chunk_chars, "stream_chunk_delay_seconds": stream_chunk_delay_ms / 1000.0,
+        })
+        self.handler = handler
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def endpoint(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    @property
+    def calls(self):
+        return self.handler.calls
+
+    def configure_genai(self):
+        """Points the Gemini client at this server (REST transport, fake key)."""
+        import gemini_client
+        gemini_client.configure(api_key="fake-benchmark-key", transport="rest", client_options={"api_endpoint": self.endpoint})
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
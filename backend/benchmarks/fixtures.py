@@ -0,0 +1,141 @@
+import base64
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Local fixture sites for benchmarks: generated in-process (nothing large is committed)
+# and served over a local HTTP server, so runs never touch the network.
+
+# 1x1 PNGs in a few colors, reused for the image-heavy page
+_PIXEL_PNGS = {
+    "red": base64.b64decode("iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1PeAAAADElEQVR4nGP4z8AAAAMBAQDJ/pLvAAAAAElFTkSuQmCC"),
+    "blue": base64.b64decode("iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1PeAAAADElEQVR4nGNgYPgPAAEDAQAIicLsAAAAAElFTkSuQmCC"),
+}
+
+
+def _page(title, body, head_extra="", lang="en"):
+    lang_attr = f' lang="{lang}"' if lang else ""
+    return f"<!DOCTYPE html><html{lang_attr}><head><title>{title}</title>{head_extra}</head><body>{body}</body></html>"
+
+
+def _nav():
+    items = "".join(f'<li><a href="/{name.lower()}">{name}</a></li>' for name in ["Home", "About", "Pricing", "Blog", "Contact"])
+    return f"<nav><ul>{items}</ul></nav>"
+
+
+def small_page():
+    return _page("Small fixture", _nav() + """
+        <h1>Welcome to the fixture</h1>
+        <h2>A small, well-behaved page</h2>
+        <p>Short paragraph of body copy used to exercise the agents.</p>
+        <button style="background:#0066cc;color:#fff;padding:12px 24px">Get started</button>
+        <img src="/img/red.png" alt="Red square" width="100" height="100">
+    """)
+
+
+def huge_dom_page(sections=400):
+    blocks = []
+    for i in range(sections):
+        blocks.append(
+            f'<section><div class="card"><div><span>Item {i}</span></div>'
+            f'<h3>Section heading {i}</h3><p>Paragraph {i} with some representative body text that repeats.</p>'
+            f'<ul><li><a href="/item/{i}">Read more</a></li><li><a href="/share/{i}">Share</a></li></ul>'
+            f'<button>Buy {i}</button></div></section>'
+        )
+    return _page("Huge DOM fixture", _nav() + "<h1>Catalogue</h1>" + "".join(blocks) + "<footer>" + _nav() + "</footer>")
+
+
+def spa_page():
+    # Content only appears after JS runs, like a client-rendered app
+    script = """
+    <script>
+      setTimeout(() => {
+        const root = document.getElementById('root');
+        let html = '<h1>Dashboard</h1><h2>Overview</h2>';
+        for (let i = 0; i < 150; i++) {
+          html += '<div class="row"><span>Metric ' + i + '</span><p>Value ' + (i * 7) + '</p><a href="#/m/' + i + '">Details</a></div>';
+        }
+        html += '<button>Export</button>';
+        root.innerHTML = html;
+      }, 200);
+    </script>
+    """
+    return _page("SPA fixture", '<div id="root">Loading...</div>' + script)
+
+
+def image_heavy_page(images=120):
+    imgs = []
+    for i in range(images):
+        color = "red" if i % 2 else "blue"
+        alt = f' alt="Photo {i}"' if i % 3 else "" # every third image has no alt text
+        imgs.append(f'<img src="/img/{color}.png?{i}"{alt} width="320" height="200">')
+    imgs = "".join(imgs)
+    return _page("Image-heavy fixture", _nav() + "<h1>Gallery</h1>" + f"<div>{imgs}</div>")
+
+
+def low_contrast_page():
+    body = """
+        <div style="background: linear-gradient(90deg, #eee, #ccc); padding: 40px">
+          <h1 style="color:#ddd">Barely visible heading</h1>
+          <p style="color:#bbb;background:#fff">Light grey text on white.</p>
+          <a href="/signup" style="color:#9cf">Sign up</a>
+          <button style="background:#eee;color:#ccc">Submit</button>
+        </div>
+        <p style="color:#777;background:#666">Grey on grey.</p>
+    """
+    return _page("Low-contrast fixture", body, lang=None)
+
+
+FIXTURES = {
+    "small": small_page,
+    "huge_dom": huge_dom_page,
+    "spa": spa_page,
+    "image_heavy": image_heavy_page,
+    "low_contrast": low_contrast_page,
+}
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    pages = {}
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path.startswith('/img/'):
+            body = _PIXEL_PNGS.get(path[len('/img/'):].replace('.png', ''), _PIXEL_PNGS["red"])
+            content_type = "image/png"
+        else:
+            name = path.strip('/').split('/', 1)[0] or "small"
+            html = self.pages.get(name, self.pages["small"])
+            body = html.encode('utf-8')
+            content_type = "text/html; charset=utf-8"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # keep benchmark output clean
+
+
+class FixtureServer:
+    """Serves every fixture at http://127.0.0.1:<port>/<fixture_name>."""
+
+    def __init__(self, port=0):
+        handler = type("FixtureHandler", (_FixtureHandler,), {"pages": {name: build() for name, build in FIXTURES.items()}})
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def url_for(self, fixture_name):
+        return f"{self.base_url}/{fixture_name}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,235 @@
+"""
+End-to-end benchmark suite: local fixture sites + a fake Gemini server, no network needed.
+
+    python backend/benchmarks/run_suite.py --output bench.json
+    python backend/benchmarks/run_suite.py --output new.json --baseline bench.json
+
+For every fixture page (small, huge DOM, SPA, image-heavy, low-contrast) it measures:
+  - the browser-data path (get_page_data_with_playwright)
+  - each agent function called directly
+  - POST /api/analyze-website (full and fast modes) against a real local HTTP server
+at each concurrency level, reporting p50/p95/p99 latency, throughput and peak RSS as JSON.
+The API cases run with the result cache, rate limit and request coalescing off and admission
+sized to the highest concurrency level, so they measure real pipeline work (not cache hits, 429s
+or requests waiting on an identical one); the shared store and history go to a temp directory.
+With --baseline, cases whose p50 regressed by more than --fail-threshold exit non-zero.
+"""
+import argparse
+import io
+import json
+import base64
+import os
+import platform
+import resource
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from synthetic import make_key_elements, percentile
+from fixtures import FIXTURES, FixtureServer
+from fake_gemini import FakeGeminiServer
+
+# Synthetic payload sizes used when Playwright cannot launch a browser in this environment
+SYNTHETIC_ELEMENT_COUNTS = {"small": 40, "huge_dom": 5000, "spa": 600, "image_heavy": 300, "low_contrast": 20}
+
+
+def isolate_backend(concurrency_levels):
+    """Environment for the in-process backend; must run before `import app` (settings are read at import)."""
+    highest = str(max(concurrency_levels))
+    state_dir = tempfile.mkdtemp(prefix="bench_suite_")
+    os.environ.update({
+        "ANALYSIS_CACHE_TTL_SECONDS": "0",
+        "RATE_LIMIT_PER_MINUTE": "0",
+        "COALESCE_ANALYSES": "0",
+        "ADMISSION_MAX_CONCURRENT": highest,
+        "BROWSER_SLOTS": highest,
+        "ADMISSION_INTERACTIVE_QUEUE": highest,
+        "ADMISSION_INTERACTIVE_MAX_WAIT_MS": "600000",
+        "SHARED_STORE_PATH": os.path.join(state_dir, "shared_store.sqlite3"),
+        "ANALYSIS_HISTORY_PATH": os.path.join(state_dir, "analysis_history.sqlite3"),
+        "SCREENSHOT_STORE_DIR": os.path.join(state_dir, "screenshot_store"),
+    })
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of reaped child processes, in MB (Linux: KB units)."""
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    divisor = 1024 * 1024 if platform.system() == "Darwin" else 1024 # macOS reports bytes
+    return {"self": round(self_kb / divisor, 1), "children": round(children_kb / divisor, 1)}
+
+
+def measure(fn, concurrency, iterations):
+    """Runs fn `iterations` times with `concurrency` workers; returns latency/throughput stats."""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def timed_call():
+        start = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+        with lock:
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(timed_call) for _ in range(iterations)]:
+            future.result()
+    wall_seconds = time.perf_counter() - wall_start
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": iterations,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "throughput_rps": round(iterations / wall_seconds, 2) if wall_seconds > 0 else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def synthetic_screenshot_base64(width=1280, height=2400):
+    from PIL import Image, ImageDraw
+    image = Image.new("RGB", (width, height), (250, 250, 250))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([0, 0, width, 400], fill=(0, 102, 204))
+    draw.rectangle([100, 600, 500, 680], fill=(220, 53, 69))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def collect_payloads(fixture_server, get_page_data_with_playwright):
+    """Captures screenshot + key_elements for each fixture (falls back to synthetic data)."""
+    payloads = {}
+    for name in FIXTURES:
+        url = fixture_server.url_for(name)
+        try:
+            if get_page_data_with_playwright is None:
+                raise RuntimeError("browser cases skipped")
+            screenshot_base64, key_elements, screenshot_tiles = get_page_data_with_playwright(url)
+            payloads[name] = {"url": url, "screenshot_base64": screenshot_base64, "key_elements": key_elements, "screenshot_tiles": screenshot_tiles, "source": "playwright"}
+        except Exception as e:
+            print(f"Benchmark: Playwright capture failed for {name} ({e}); using a synthetic payload.")
+            payloads[name] = {
+                "url": url,
+                "screenshot_base64": synthetic_screenshot_base64(),
+                "key_elements": make_key_elements(SYNTHETIC_ELEMENT_COUNTS[name], seed=len(name)),
+                "screenshot_tiles": None,
+                "source": "synthetic",
+            }
+    return payloads
+
+
+def post_json(url, payload):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"), headers={"Content-Type": "application/json"}, method="POST")
+    with urllib.request.urlopen(request, timeout=600) as response:
+        return response.read()
+
+
+def compare_with_baseline(results, baseline, fail_threshold):
+    """Prints p50 deltas against a previous run. Returns the list of regressed cases."""
+    previous = {(c["case"], c["fixture"], c["concurrency"]): c for c in baseline.get("cases", [])}
+    regressions = []
+    for case in results["cases"]:
+        key = (case["case"], case["fixture"], case["concurrency"])
+        old = previous.get(key)
+        if not old or not old.get("p50_ms"):
+            continue
+        delta = (case["p50_ms"] - old["p50_ms"]) / old["p50_ms"]
+        marker = " REGRESSION" if delta > fail_threshold else ""
+        print(f"{case['case']:<28} {case['fixture']:<13} c={case['concurrency']:<3} p50 {old['p50_ms']:>9.1f} -> {case['p50_ms']:>9.1f} ms ({delta:+.0%}){marker}")
+        if marker:
+            regressions.append(key)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", default="1,4,8", help="comma-separated concurrency levels")
+    parser.add_argument("--iterations", type=int, default=8, help="requests per (case, fixture, concurrency)")
+    parser.add_argument("--gemini-latency-ms", type=float, default=300, help="latency of the fake Gemini server")
+    parser.add_argument("--fixtures", default=",".join(FIXTURES), help="comma-separated fixture names")
+    parser.add_argument("--skip-browser", action="store_true", help="skip the cases that launch Chromium")
+    parser.add_argument("--output", help="write JSON results here (default: stdout)")
+    parser.add_argument("--baseline", help="previous results JSON to compare against")
+    parser.add_argument("--fail-threshold", type=float, default=0.2, help="allowed p50 regression (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    concurrency_levels = [int(c) for c in args.concurrency.split(",")]
+    fixture_names = [f for f in args.fixtures.split(",") if f in FIXTURES]
+
+    isolate_backend(concurrency_levels)
+    import app as backend_app
+    from agents.design_agent import analyze_design
+    from agents.workflow_agent import check_user_workflow
+    from agents.accessibility_agent import analyze_website_accessibility_and_responsive, analyze_accessibility_from_elements
+    from werkzeug.serving import make_server
+
+    results = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "gemini_latency_ms": args.gemini_latency_ms,
+        "iterations": args.iterations,
+        "cases": [],
+    }
+
+    with FixtureServer() as fixture_server, FakeGeminiServer(latency_ms=args.gemini_latency_ms) as fake_gemini:
+        fake_gemini.configure_genai()
+        api_server = make_server("127.0.0.1", 0, backend_app.app, threaded=True)
+        threading.Thread(target=api_server.serve_forever, daemon=True).start()
+        api_url = f"http://127.0.0.1:{api_server.server_port}/api/analyze-website"
+
+        payloads = collect_payloads(fixture_server, None if args.skip_browser else backend_app.get_page_data_with_playwright)
+
+        for fixture in fixture_names:
+            payload = payloads[fixture]
+            url, screenshot_base64, key_elements = payload["url"], payload["screenshot_base64"], payload["key_elements"]
+            screenshot_tiles = payload["screenshot_tiles"]
+            cases = {
+                "agent.design": lambda: analyze_design(url, screenshot_base64, key_elements, screenshot_tiles=screenshot_tiles),
+                "agent.design_fast": lambda: analyze_design(url, screenshot_base64, key_elements, use_llm=False),
+                "agent.workflow": lambda: check_user_workflow(url, screenshot_base64, key_elements),
+                "agent.accessibility_fast": lambda: analyze_accessibility_from_elements(url, screenshot_base64, key_elements),
+                "api.analyze_website_fast": lambda: post_json(api_url + "?mode=fast", {"url": url, "screenshot_base64": screenshot_base64, "key_elements": key_elements}),
+            }
+            if not args.skip_browser:
+                cases["browser.page_data"] = lambda: backend_app.get_page_data_with_playwright(url)
+                cases["agent.accessibility"] = lambda: analyze_website_accessibility_and_responsive(url, screenshot_base64, key_elements)
+                cases["api.analyze_website_full"] = lambda: post_json(api_url, {"url": url, "screenshot_base64": screenshot_base64, "key_elements": key_elements})
+
+            for case_name, fn in cases.items():
+                for concurrency in concurrency_levels:
+                    stats = measure(fn, concurrency, args.iterations)
+                    stats.update({"case": case_name, "fixture": fixture, "payload_source": payload["source"], "elements": len(key_elements)})
+                    results["cases"].append(stats)
+                    print(f"Benchmark: {case_name:<28} {fixture:<13} c={concurrency:<3} p50={stats['p50_ms']:.1f}ms p95={stats['p95_ms']:.1f}ms rps={stats['throughput_rps']} errors={stats['errors']}")
+
+        api_server.shutdown()
+        results["fake_gemini_calls"] = fake_gemini.calls
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_with_baseline(results, json.load(f), args.fail_threshold)
+        if regressions:
+            raise SystemExit(f"{len(regressions)} case(s) regressed by more than {args.fail_threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
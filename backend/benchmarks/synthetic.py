@@ -0,0 +1,62 @@
+import os
+import random
+import sys
+
+# Shared helpers for the benchmark scripts in this folder.
+# Benchmarks import backend modules the same way app.py does (backend/ on sys.path).
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+TAGS = ['DIV', 'SPAN', 'P', 'A', 'LI', 'H1', 'H2', 'H3', 'BUTTON', 'IMG', 'INPUT']
+FONTS = ['"Inter", sans-serif', 'Roboto, Arial, sans-serif', 'Georgia, serif', '-apple-system, "Segoe UI", Roboto']
+COLORS = ['rgb(33, 33, 33)', 'rgb(255, 255, 255)', 'rgb(0, 102, 204)', 'rgb(240, 240, 240)', 'rgba(0, 0, 0, 0)', 'rgb(220, 53, 69)']
+NAV_ITEMS = ['Home', 'About', 'Pricing', 'Blog', 'Contact', 'Sign in', 'Get started']
+
+
+def make_key_elements(count, seed=0):
+    """
+    Builds a synthetic key_elements list shaped like the extension's payload.
+    Nav/footer items repeat (as they do on real sites) and styles come from a small set.
+    """
+    rng = random.Random(seed)
+    elements = []
+    for i in range(count):
+        tag = rng.choice(TAGS)
+        y = rng.uniform(0, 12000)
+        if rng.random() < 0.2:
+            text = rng.choice(NAV_ITEMS)
+            tag = 'A'
+        else:
+            text = ' '.join(f"word{rng.randrange(500)}" for _ in range(rng.randrange(1, 30)))
+        elements.append({
+            "id": None,
+            "tag_name": tag,
+            "text_content": text,
+            "bounding_box": {
+                "x": rng.uniform(0, 1200), "y": y, "width": rng.uniform(10, 600), "height": rng.uniform(10, 120),
+                "top": y, "left": 0, "right": 0, "bottom": 0,
+            },
+            "computed_styles": {
+                "fontFamily": rng.choice(FONTS),
+                "fontSize": f"{rng.choice([12, 14, 16, 18, 24, 32, 48])}px",
+                "fontWeight": rng.choice(['400', '600', '700']),
+                "color": rng.choice(COLORS),
+                "backgroundColor": rng.choice(COLORS),
+                "lineHeight": "normal",
+            },
+            "src": "https://example.com/img.png" if tag == 'IMG' else None,
+            "alt": None,
+            "href": f"https://example.com/{text.split()[0].lower()}" if tag == 'A' else None,
+            "role": None,
+            "tabIndex": None,
+        })
+    return elements
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
@@ -0,0 +1,131 @@
+import os
+import socket
+import threading
+import urllib.request
+from contextlib import contextmanager
+
+from metrics import span
+import page_archive
+
+# One Chromium per worker process, shared by all request threads in that process.
+#
+# Playwright's sync API objects can only be used from the thread that created them, so the
+# process-wide browser is launched (and kept alive) by a dedicated owner thread with a
+# remote-debugging port. Request threads attach to it over CDP and get their own isolated
+# browser context, which is much cheaper than launching a new Chromium per agent call.
+# After a fork (serve.py pre-fork workers) each child lazily launches its own browser.
+# If Chromium crashes or is killed, its owner thread notices (endpoint health check) and exits,
+# and the next get_cdp_endpoint() launches a new one instead of handing out a dead endpoint.
+#
+# Set BROWSER_POOL=0 to go back to launching a fresh browser for every call.
+
+BROWSER_POOL_ENABLED = os.getenv("BROWSER_POOL", "1") != "0"
+BROWSER_LAUNCH_TIMEOUT_SECONDS = 30
+BROWSER_HEALTH_CHECK_SECONDS = 5 # how often the owner thread checks that Chromium is still there
+BROWSER_HEALTH_TIMEOUT_SECONDS = 2
+
+_lock = threading.Lock()
+_shared_browser = None # {"pid": ..., "endpoint": ..., "stop": Event, "thread": Thread}
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _endpoint_alive(endpoint):
+    """True if a browser answers on the CDP endpoint (a local HTTP round trip, ~1ms)."""
+    try:
+        with urllib.request.urlopen(f"{endpoint}/json/version", timeout=BROWSER_HEALTH_TIMEOUT_SECONDS) as response:
+            return response.status == 200
+    except Exception:
+        return False
+
+
+def _browser_owner_thread(port, ready, stop, errors):
+    from playwright.sync_api import sync_playwright # imported on first use: keeps app import fast
+    try:
+        with sync_playwright() as p:
+            browser = p.chromium.launch(headless=True, args=[f"--remote-debugging-port={port}"])
+            ready.set()
+            # The sync API only dispatches events (disconnected) inside Playwright calls, so poll instead
+            while not stop.wait(BROWSER_HEALTH_CHECK_SECONDS):
+                if not browser.is_connected() or not _endpoint_alive(f"http://127.0.0.1:{port}"):
+                    print(f"Browser pool: shared Chromium on port {port} went away; relaunching on next use")
+                    break
+            try:
+                browser.close()
+            except Exception:
+                pass # already gone
+    except Exception as e:
+        errors.append(e)
+        ready.set()
+
+
+def get_cdp_endpoint():
+    """Returns this process's shared browser CDP endpoint, launching the browser on first use."""
+    global _shared_browser
+    with _lock:
+        if _shared_browser is not None and _shared_browser["pid"] == os.getpid():
+            if _shared_browser["thread"].is_alive() and _endpoint_alive(_shared_browser["endpoint"]):
+                return _shared_browser["endpoint"]
+            # Crashed or killed: let the owner thread finish (it exits on its own once it notices)
+            _shared_browser["stop"].set()
+            _shared_browser = None
+
+        port = _free_port()
+        ready, stop, errors = threading.Event(), threading.Event(), []
+        thread = threading.Thread(target=_browser_owner_thread, args=(port, ready, stop, errors), name="browser-pool-owner", daemon=True)
+        with span("browser_pool.launch"):
+            thread.start()
+            ready.wait(BROWSER_LAUNCH_TIMEOUT_SECONDS)
+        if errors or not ready.is_set():
+            raise RuntimeError(f"Shared browser failed to launch: {errors[0] if errors else 'timeout'}")
+        print(f"Browser pool: launched shared Chromium for pid {os.getpid()} on port {port}")
+        _shared_browser = {"pid": os.getpid(), "endpoint": f"http://127.0.0.1:{port}", "stop": stop, "thread": thread}
+        return _shared_browser["endpoint"]
+
+
+def warm_up():
+    """Launches the shared browser ahead of the first request (no-op when the pool is disabled)."""
+    if BROWSER_POOL_ENABLED:
+        get_cdp_endpoint()
+
+
+def shutdown():
+    """Closes this process's shared browser, if any."""
+    global _shared_browser
+    with _lock:
+        if _shared_browser is not None and _shared_browser["pid"] == os.getpid():
+            _shared_browser["stop"].set()
+            _shared_browser["thread"].join(timeout=10)
+        _shared_browser = None
+
+
+@contextmanager
+def browser_page():
+    """
+    Yields a fresh Playwright page in its own browser context.
+    Must be used entirely from the calling thread (as with any sync Playwright object).
+    Under a page archive session (page_archive.py) the context records or replays its traffic.
+    """
+    from playwright.sync_api import sync_playwright
+    with sync_playwright() as p:
+        if BROWSER_POOL_ENABLED:
+            with span("browser_pool.connect"):
+                browser = p.chromium.connect_over_cdp(get_cdp_endpoint())
+                context = browser.new_context()
+        else:
+            with span("browser.launch"):
+                browser = p.chromium.launch(headless=True)
+                context = browser.new_context()
+        try:
+            archive_session = page_archive.current_session()
+            if archive_session is not None:
+                archive_session.attach(context)
+            yield context.new_page()
+        finally:
+            context.close()
+            # For a CDP connection this only disconnects; the shared browser keeps running
+            browser.close()
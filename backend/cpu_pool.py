@@ -0,0 +1,126 @@
+import json
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from metrics import span
+
+# Offload for CPU-bound agent stages (DOM heuristics, palette k-means, lxml parsing).
+#
+# Threads are fine for waiting on Gemini or the browser, but pure-Python loops compete for
+# one GIL when several requests are in flight. With CPU_POOL_WORKERS > 0 those stages run in
+# a persistent ProcessPoolExecutor instead. Large inputs (screenshot bytes, page HTML, the
+# element list) are handed over through shared memory rather than pickled into the task.
+#
+#   result = cpu_pool.run(compute_something, shared_bytes={"screenshot_bytes": data},
+#                         shared_json={"key_elements": elements}, num_colors=5)
+#
+# With CPU_POOL_WORKERS=0 (the default) run() simply calls the function in the current thread.
+
+CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", "0"))
+
+_lock = threading.Lock()
+_executor = None
+_executor_pid = None
+_configured_workers = CPU_POOL_WORKERS
+
+
+def configure(workers):
+    """Changes the pool size (0 = run inline). Mainly for benchmarks and tests."""
+    global _configured_workers, _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+        _configured_workers = workers
+
+
+def _worker_init(backend_dir):
+    # forkserver/spawn children start clean: make backend modules importable by name
+    if backend_dir not in sys.path:
+        sys.path.insert(0, backend_dir)
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    with _lock:
+        # A pre-fork worker (serve.py) must not reuse a pool created by its parent
+        if _executor is None or _executor_pid != os.getpid():
+            context = multiprocessing.get_context("forkserver" if sys.platform.startswith("linux") else "spawn")
+            _executor = ProcessPoolExecutor(
+                max_workers=_configured_workers,
+                mp_context=context,
+                initializer=_worker_init,
+                initargs=(os.path.dirname(os.path.abspath(__file__)),),
+            )
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _worker_ready():
+    return os.getpid()
+
+
+def warm_up():
+    """Starts the pool's worker processes ahead of the first request (no-op when disabled)."""
+    if _configured_workers <= 0:
+        return
+    executor = _get_executor()
+    for future in [executor.submit(_worker_ready) for _ in range(_configured_workers)]:
+        future.result()
+
+
+def _to_shared_memory(data):
+    block = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+    block.buf[:len(data)] = data
+    return block
+
+
+def _invoke_in_worker(fn, kwargs, byte_handles, json_handles):
+    """Runs inside the pool process: attaches to the shared blocks, rebuilds the inputs, calls fn."""
+    inputs = dict(kwargs)
+    for handles, decode in ((byte_handles, bytes), (json_handles, lambda raw: json.loads(bytes(raw)))):
+        for name, (block_name, size) in handles.items():
+            block = shared_memory.SharedMemory(name=block_name)
+            try:
+                inputs[name] = decode(block.buf[:size])
+            finally:
+                block.close()
+    return fn(**inputs)
+
+
+def run(fn, shared_bytes=None, shared_json=None, **kwargs):
+    """
+    Calls fn(**kwargs, **shared_bytes, **shared_json), in a pool process if enabled.
+    fn must be a module-level function (it is pickled by reference).
+    """
+    shared_bytes = shared_bytes or {}
+    shared_json = shared_json or {}
+    if _configured_workers <= 0:
+        return fn(**kwargs, **shared_bytes, **shared_json)
+
+    blocks = []
+    try:
+        with span("cpu_pool.share_inputs"):
+            byte_handles, json_handles = {}, {}
+            for name, data in shared_bytes.items():
+                if data is None:
+                    kwargs[name] = None
+                    continue
+                block = _to_shared_memory(data)
+                blocks.append(block)
+                byte_handles[name] = (block.name, len(data))
+            for name, value in shared_json.items():
+                encoded = json.dumps(value, separators=(",", ":")).encode("utf-8")
+                block = _to_shared_memory(encoded)
+                blocks.append(block)
+                json_handles[name] = (block.name, len(encoded))
+        future = _get_executor().submit(_invoke_in_worker, fn, kwargs, byte_handles, json_handles)
+        return future.result()
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
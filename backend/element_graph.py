@@ -0,0 +1,146 @@
+import time
+
+from metrics import span
+
+# Compact element payload ("element graph") produced by extension/content.js and the
+# Playwright collector in app.py, and the adapter that turns it back into key_elements.
+#
+# The old collectors sent element.textContent for every matched element, so text inside
+# nested div/span/li containers was repeated once per ancestor (up to 500 chars each), and
+# every element carried its own copy of the same handful of computed-style objects.
+# The graph instead sends:
+#   {
+#     "format": "element_graph/1",
+#     "styles": [{...computed styles...}, ...],        # each distinct style object once
+#     "nodes": [
+#       {"tag": "P", "parent": 3, "text": "own text only", "style": 0, "bbox": [x, y, w, h],
+#        "id": ..., "src": ..., "alt": ..., "href": ..., "role": ..., "tabIndex": ...},
+#       ...
+#     ]
+#   }
+# "parent" is the index of the nearest collected ancestor (or null); "text" is the element's
+# own direct text (not its descendants'), except for NAME_FROM_CONTENT_TAGS, which send their whole
+# textContent: their label often sits in a <span>/<strong>/<svg> that is not collected itself.
+# Optional attributes are omitted when empty.
+
+ELEMENT_GRAPH_FORMAT = "element_graph/1"
+MAX_TEXT_LENGTH = 500 # same cap the collectors always applied to text_content
+
+# Elements whose accessible name / visible label comes from their descendants' text. The collectors
+# send their full textContent; for nodes without text (graphs from older clients, which sent own text
+# only) the adapter rebuilds it from the collected subtree so link/button/heading checks still work.
+NAME_FROM_CONTENT_TAGS = {'A', 'BUTTON', 'LABEL', 'H1', 'H2', 'H3', 'H4', 'H5', 'H6', 'SUMMARY', 'OPTION'}
+# Generic containers whose text is dropped from legacy payloads when a later (descendant) element repeats it
+CONTAINER_TAGS = {'DIV', 'SPAN', 'LI', 'SECTION', 'ARTICLE', 'MAIN', 'HEADER', 'FOOTER', 'NAV'}
+OPTIONAL_ATTRIBUTES = ('id', 'src', 'alt', 'href', 'role', 'tabIndex')
+
+
+def is_element_graph(payload):
+    return isinstance(payload, dict) and payload.get("format") == ELEMENT_GRAPH_FORMAT
+
+
+def _subtree_texts(nodes, children):
+    """Returns, per node, its own text followed by its descendants' texts in document order (capped)."""
+    subtree_text = [None] * len(nodes)
+    # Children always come after their parent (document order), so one reverse pass builds every subtree
+    for index in range(len(nodes) - 1, -1, -1):
+        parts = [nodes[index].get("text")] + [subtree_text[child] for child in children[index]]
+        joined = " ".join(part for part in parts if part)
+        subtree_text[index] = joined[:MAX_TEXT_LENGTH] or None
+    return subtree_text
+
+
+def expand_element_graph(graph):
+    """
+    Adapter: element graph -> the key_elements list every agent already understands.
+    Containers keep only their own text, so agent loops no longer see the same sentence once per ancestor;
+    NAME_FROM_CONTENT_TAGS keep the full text the collector sent, or get it rebuilt from their subtree when
+    they arrive without text. Identical styles share one dict (treat as read-only).
+    Each element also gets "parent_index" (index into the returned list, or None).
+    """
+    nodes = graph.get("nodes") or []
+    styles = graph.get("styles") or []
+    children = [[] for _ in nodes]
+    for index, node in enumerate(nodes):
+        parent = node.get("parent")
+        if parent is not None and 0 <= parent < index:
+            children[parent].append(index)
+
+    needs_subtree = any(node.get("tag") in NAME_FROM_CONTENT_TAGS and not node.get("text") and children[index]
+                        for index, node in enumerate(nodes))
+    subtree_text = _subtree_texts(nodes, children) if needs_subtree else None
+
+    key_elements = []
+    for index, node in enumerate(nodes):
+        text = node.get("text") or None
+        if text is None and subtree_text is not None and node.get("tag") in NAME_FROM_CONTENT_TAGS:
+            text = subtree_text[index]
+        key_elements.append(node_to_element(node, styles, text, node.get("parent")))
+    return key_elements
+
+
+def node_to_element(node, styles, text, parent_index):
+    """One graph node -> a key_element dict (text and parent_index are resolved by the caller)."""
+    x, y, width, height = (node.get("bbox") or (0, 0, 0, 0))[:4]
+    style_index = node.get("style")
+    element = {
+        "tag_name": node.get("tag"),
+        "text_content": text,
+        "bounding_box": {
+            "x": x, "y": y, "width": width, "height": height,
+            "top": y, "right": x + width, "bottom": y + height, "left": x,
+        },
+        "computed_styles": styles[style_index] if style_index is not None and 0 <= style_index < len(styles) else {},
+        "parent_index": parent_index,
+    }
+    for attribute in OPTIONAL_ATTRIBUTES:
+        element[attribute] = node.get(attribute)
+    return element
+
+
+def normalize_legacy_elements(key_elements):
+    """
+    Backend-side normalization for old-style key_elements lists (older extension builds, API clients):
+    interns identical computed_styles dicts and drops a container's text when the next element
+    carrying text (its first descendant in document order) repeats it verbatim.
+    Returns (key_elements, duplicates_removed).
+    """
+    interned_styles = {}
+    duplicates_removed = 0
+    normalized = []
+    next_text = None
+    # Walk backwards so "the next element's text" is known without a second pass
+    for element in reversed(key_elements):
+        element = dict(element)
+        styles = element.get("computed_styles")
+        if isinstance(styles, dict):
+            style_key = tuple(sorted((k, str(v)) for k, v in styles.items()))
+            element["computed_styles"] = interned_styles.setdefault(style_key, styles)
+        text = element.get("text_content")
+        if text and text == next_text and element.get("tag_name") in CONTAINER_TAGS and not element.get("role"):
+            element["text_content"] = None
+            duplicates_removed += 1
+        elif text:
+            next_text = text
+        normalized.append(element)
+    normalized.reverse()
+    return normalized, duplicates_removed
+
+
+def load_key_elements(data):
+    """
+    Reads the elements from an /api/analyze-website body: an "element_graph" (new collectors)
+    or a legacy "key_elements" list. Returns (key_elements, stats).
+    """
+    start = time.perf_counter()
+    graph = data.get("element_graph")
+    with span("payload.normalize_elements"):
+        if is_element_graph(graph):
+            key_elements = expand_element_graph(graph)
+            stats = {"format": ELEMENT_GRAPH_FORMAT, "styles": len(graph.get("styles") or []), "duplicates_removed": None}
+        else:
+            key_elements, duplicates_removed = normalize_legacy_elements(data.get("key_elements") or [])
+            stats = {"format": "legacy", "styles": None, "duplicates_removed": duplicates_removed}
+    stats["elements"] = len(key_elements)
+    stats["normalize_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return key_elements, stats
@@ -0,0 +1,48 @@
+import os
+import threading
+
+# The one place that imports and configures google.generativeai.
+#
+# The SDK costs about a second to import, so it is loaded on the first Gemini call (or by the
+# warmup in warmup.py) instead of when app.py is imported, and it is configured exactly once:
+# from GEMINI_API_KEY unless configure() was called first (e.g. by benchmarks/fake_gemini.py).
+
+_lock = threading.Lock()
+_genai = None
+_configure_options = None # kwargs for genai.configure; None until configure() or first use
+
+
+def configure(**options):
+    """Sets the genai.configure() options (api_key, transport, client_options, ...)."""
+    global _configure_options
+    with _lock:
+        _configure_options = options
+        if _genai is not None:
+            _genai.configure(**options)
+
+
+def get_genai():
+    """Returns the configured google.generativeai module, importing it on first use."""
+    global _genai, _configure_options
+    if _genai is not None:
+        return _genai
+    with _lock:
+        if _genai is None:
+            import google.generativeai as genai
+            if _configure_options is None:
+                api_key = os.getenv("GEMINI_API_KEY")
+                if not api_key:
+                    print("WARNING: GEMINI_API_KEY environment variable not set. Gemini functions may fail.")
+                _configure_options = {"api_key": api_key}
+            genai.configure(**_configure_options)
+            _genai = genai
+    return _genai
+
+
+def generative_model(model_name):
+    return get_genai().GenerativeModel(model_name)
+
+
+def warm_up():
+    """Imports and configures the SDK and builds a model client ahead of the first request."""
+    generative_model('gemini-1.5-flash')
@@ -0,0 +1,198 @@
+import base64
+import io
+import re
+
+from lazy_imports import lazy_import
+
+np = lazy_import("numpy") # loaded on first use (see lazy_imports.py)
+Image = lazy_import("PIL.Image")
+
+# Helpers that work on the decoded screenshot pixels (rather than the DOM).
+# Everything here is vectorized with NumPy so it can run on every request.
+
+# Longest side (in px) the screenshot is downsampled to before quantization.
+# ~25k pixels keeps k-means in the tens of milliseconds even for full-page captures.
+PALETTE_SAMPLE_MAX_SIDE = 160
+
+_RGB_PATTERN = re.compile(r'rgba?\(\s*([\d.]+)\s*,\s*([\d.]+)\s*,\s*([\d.]+)\s*(?:,\s*([\d.]+)\s*)?\)')
+
+
+def decode_screenshot_to_image(screenshot_base64):
+    """Decodes a base64 screenshot into an RGB PIL image (or None on failure)."""
+    if not screenshot_base64:
+        return None
+    try:
+        image_bytes = base64.b64decode(screenshot_base64)
+    except Exception as e:
+        print(f"Error decoding screenshot for pixel analysis: {e}")
+        return None
+    return image_from_bytes(image_bytes)
+
+
+def image_from_bytes(image_bytes):
+    """Opens already-decoded PNG/JPEG bytes as an RGB PIL image (or None on failure)."""
+    if not image_bytes:
+        return None
+    try:
+        return Image.open(io.BytesIO(image_bytes)).convert('RGB')
+    except Exception as e:
+        print(f"Error decoding screenshot for pixel analysis: {e}")
+        return None
+
+
+def downsample_image(image, max_side=PALETTE_SAMPLE_MAX_SIDE):
+    """Shrinks an image so its longest side is at most max_side, cheaply."""
+    longest_side = max(image.size)
+    if longest_side <= max_side:
+        return image
+    # Integer box reduction first (very fast), then a final resize to the exact bound.
+    factor = longest_side // max_side
+    if factor > 1:
+        image = image.reduce(factor)
+    if max(image.size) > max_side:
+        image = image.copy()
+        image.thumbnail((max_side, max_side), Image.BILINEAR)
+    return image
+
+
+def parse_css_color(color_str):
+    """Parses 'rgb(r, g, b)', 'rgba(r, g, b, a)' or '#rrggbb' into an (r, g, b, a) tuple, or None."""
+    if not color_str:
+        return None
+    color_str = color_str.strip().lower()
+    match = _RGB_PATTERN.match(color_str)
+    if match:
+        r, g, b, a = match.groups()
+        return (int(float(r)), int(float(g)), int(float(b)), float(a) if a is not None else 1.0)
+    if color_str.startswith('#'):
+        hex_color = color_str[1:]
+        if len(hex_color) == 3:
+            hex_color = ''.join(c * 2 for c in hex_color)
+        if len(hex_color) == 6:
+            try:
+                return (int(hex_color[0:2], 16), int(hex_color[2:4], 16), int(hex_color[4:6], 16), 1.0)
+            except ValueError:
+                return None
+    return None
+
+
+def rgb_to_css(rgb):
+    """Formats an (r, g, b) triple the same way getComputedStyle does."""
+    return f"rgb({int(rgb[0])}, {int(rgb[1])}, {int(rgb[2])})"
+
+
+def _weighted_kmeans(points, weights, k, max_iterations=12, seed=0):
+    """
+    Weighted k-means over (n, 3) float points. Uses deterministic k-means++ seeding so
+    the same screenshot always produces the same palette.
+    Returns (centers, cluster_weights).
+    """
+    n = points.shape[0]
+    k = min(k, n)
+    rng = np.random.default_rng(seed)
+
+    # k-means++ seeding, weighted by pixel area
+    centers = np.empty((k, 3), dtype=np.float64)
+    centers[0] = points[np.argmax(weights)]
+    closest_sq = ((points - centers[0]) ** 2).sum(axis=1)
+    for i in range(1, k):
+        probabilities = closest_sq * weights
+        total = probabilities.sum()
+        if total <= 0:
+            centers = centers[:i]
+            break
+        centers[i] = points[rng.choice(n, p=probabilities / total)]
+        closest_sq = np.minimum(closest_sq, ((points - centers[i]) ** 2).sum(axis=1))
+
+    labels = None
+    for _ in range(max_iterations):
+        distances = ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        new_labels = distances.argmin(axis=1)
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        cluster_weights = np.bincount(labels, weights=weights, minlength=len(centers))
+        for channel in range(3):
+            sums = np.bincount(labels, weights=weights * points[:, channel], minlength=len(centers))
+            nonempty = cluster_weights > 0
+            centers[nonempty, channel] = sums[nonempty] / cluster_weights[nonempty]
+
+    cluster_weights = np.bincount(labels, weights=weights, minlength=len(centers))
+    return centers, cluster_weights
+
+
+def extract_colors_from_screenshot(screenshot_base64, num_colors=5, max_side=PALETTE_SAMPLE_MAX_SIDE, image=None):
+    """
+    Extracts a dominant color palette from the rendered screenshot pixels.
+    Unlike the DOM-based palette this sees images, gradients and the real rendered area.
+    Returns [{"color": "rgb(r, g, b)", "proportion": float}, ...] sorted by proportion.
+    """
+    if image is None:
+        image = decode_screenshot_to_image(screenshot_base64)
+    if image is None:
+        return []
+
+    pixels = np.asarray(downsample_image(image, max_side), dtype=np.uint8).reshape(-1, 3)
+    if pixels.size == 0:
+        return []
+
+    # Pre-quantize to 5 bits per channel and collapse duplicates so k-means works over
+    # unique colors weighted by how many pixels (area) they cover.
+    quantized = (pixels >> 3).astype(np.int32)
+    packed = (quantized[:, 0] << 10) | (quantized[:, 1] << 5) | quantized[:, 2]
+    unique_packed, inverse, counts = np.unique(packed, return_inverse=True, return_counts=True)
+    # Mean of the original pixels in each bin, so colors are not snapped to the 5-bit grid
+    inverse = inverse.ravel()
+    points = np.stack([
+        np.bincount(inverse, weights=pixels[:, channel], minlength=len(unique_packed))
+        for channel in range(3)
+    ], axis=1) / counts[:, None]
+
+    centers, cluster_weights = _weighted_kmeans(points, counts.astype(np.float64), num_colors)
+    total_weight = cluster_weights.sum()
+    if total_weight <= 0:
+        return []
+
+    order = np.argsort(-cluster_weights)
+    palette = []
+    for idx in order:
+        proportion = round(float(cluster_weights[idx] / total_weight), 2)
+        if proportion <= 0:
+            continue
+        palette.append({"color": rgb_to_css(np.rint(centers[idx])), "proportion": proportion})
+    return palette
+
+
+def merge_color_palettes(dom_palette, image_palette, num_colors=5, image_weight=0.5, merge_distance=24.0):
+    """
+    Merges the DOM-derived palette with the screenshot-derived one.
+    Colors closer than merge_distance (Euclidean RGB) are treated as the same swatch.
+    """
+    if not image_palette:
+        return dom_palette
+    if not dom_palette:
+        return image_palette[:num_colors]
+
+    merged = []  # [[rgb_array, weight, css_string]]
+    sources = ((dom_palette, 1.0 - image_weight), (image_palette, image_weight))
+    for palette, source_weight in sources:
+        for entry in palette:
+            parsed = parse_css_color(entry.get('color'))
+            if parsed is None:
+                continue
+            rgb = np.array(parsed[:3], dtype=np.float64)
+            weight = entry.get('proportion', 0) * source_weight
+            for existing in merged:
+                if np.sqrt(((existing[0] - rgb) ** 2).sum()) < merge_distance:
+                    existing[1] += weight
+                    break
+            else:
+                # DOM colors come first, so the original CSS strings are kept where they match
+                merged.append([rgb, weight, entry['color']])
+
+    merged.sort(key=lambda item: item[1], reverse=True)
+    selected = merged[:num_colors]
+    total = sum(item[1] for item in selected)
+    if total <= 0:
+        return []
+    return [{"color": item[2], "proportion": round(item[1] / total, 2)} for item in selected]
@@ -0,0 +1,235 @@
+from llm_context import FOLD_Y
+from metrics import span
+from spatial_index import SpatialIndex, element_box, box_area, box_gap, intersection_area, contains, inflate
+from style_memo import parse_color
+
+# Geometry checks over key_elements, built on spatial_index.SpatialIndex so each one is close to
+# linear in the number of elements (50k-element pages included):
+#   - overlapping text: two unrelated text elements partially covering each other;
+#   - occluded text: text mostly covered by a later, unrelated element with an opaque background;
+#   - touch targets: WCAG 2.5.8 (24px minimum unless spaced out) and 2.5.5 (44px, AAA) sizes;
+#   - reading order: consecutive focusable/heading elements whose DOM order runs upward within a column;
+#   - CTA ranking: buttons/links ranked by size, fold position and nearby competing CTAs.
+# "Related" elements (one is the other's ancestor via parent_index, or its box contains the other's)
+# are nesting, not overlap, and are never reported against each other.
+# Results are plain JSON-friendly dicts; the agents turn them into their own issue types.
+# The per-element checks take `only` (positions to report findings for; the default is all), so a
+# caller that re-checks part of a page (watch_session.py) can pass a neighbourhood sub-list.
+
+INTERACTIVE_TAGS = {'A', 'BUTTON', 'INPUT', 'SELECT', 'TEXTAREA', 'SUMMARY'}
+INTERACTIVE_ROLES = {'button', 'link', 'checkbox', 'radio', 'tab', 'menuitem', 'switch', 'option'}
+HEADING_TAGS = {'H1', 'H2', 'H3', 'H4', 'H5', 'H6'}
+CTA_TAGS = {'A', 'BUTTON'}
+# WCAG 2.5.8 exempts targets inside a sentence or block of text
+INLINE_TARGET_PARENT_TAGS = {'P', 'LI', 'SPAN', 'TD', 'DD', 'LABEL', 'BLOCKQUOTE', 'EM', 'STRONG'}
+MIN_TARGET_PX = 24 # WCAG 2.5.8 Target Size (Minimum), AA
+RECOMMENDED_TARGET_PX = 44 # WCAG 2.5.5 Target Size (Enhanced), AAA / platform touch guidelines
+OVERLAP_MIN_RATIO = 0.25 # share of the smaller text box that must be covered to count as overlapping
+OCCLUSION_MIN_RATIO = 0.5
+ORDER_TOLERANCE_PX = 4
+CTA_COMPETITION_RADIUS_PX = 48
+MAX_FINDINGS_PER_CHECK = 20
+
+
+def is_interactive(e):
+    return e.get('tag_name') in INTERACTIVE_TAGS or (e.get('role') or '').lower() in INTERACTIVE_ROLES
+
+
+def in_focus_sequence(e):
+    """Elements whose DOM order reading_order() compares: focusable targets and headings."""
+    return is_interactive(e) or e.get('tag_name') in HEADING_TAGS
+
+
+def has_text(e):
+    return bool((e.get('text_content') or '').strip())
+
+
+def has_opaque_background(e):
+    color = parse_color((e.get('computed_styles') or {}).get('backgroundColor'))
+    return color is not None and color[3] >= 1.0
+
+
+def describe(e):
+    text = ' '.join((e.get('text_content') or '').split())[:60]
+    return f"{e.get('tag_name')} '{text}'" if text else f"{e.get('tag_name')} {e.get('href') or e.get('src') or ''}".strip()
+
+
+class LayoutChecker:
+    """Shared boxes, ancestry and indexes for the checks below; build once per key_elements list."""
+
+    def __init__(self, key_elements, fold_y=FOLD_Y, has_parents=None):
+        self.elements = key_elements
+        self.fold_y = fold_y
+        self.boxes = [element_box(e) for e in key_elements]
+        # has_parents: whether the whole page has parent_index (a sub-list may not show it)
+        self.has_parents = any(e.get('parent_index') is not None for e in key_elements) if has_parents is None else has_parents
+        self.text_index = SpatialIndex([box if box and has_text(e) else None for e, box in zip(key_elements, self.boxes)])
+        self.target_index = SpatialIndex([box if box and is_interactive(e) else None for e, box in zip(key_elements, self.boxes)])
+
+    def _is_ancestor(self, ancestor, index):
+        parent = self.elements[index].get('parent_index')
+        steps = 0
+        while parent is not None and steps < len(self.elements):
+            if parent == ancestor:
+                return True
+            parent = self.elements[parent].get('parent_index') if 0 <= parent < len(self.elements) else None
+            steps += 1
+        return False
+
+    def related(self, a, b):
+        box_a, box_b = self.boxes[a], self.boxes[b]
+        if contains(box_a, box_b) or contains(box_b, box_a):
+            return True
+        return self.has_parents and (self._is_ancestor(a, b) or self._is_ancestor(b, a))
+
+    def _positions(self, only):
+        return range(len(self.elements)) if only is None else sorted(only)
+
+    def overlapping_text(self, only=None):
+        findings = []
+        for i in self._positions(only):
+            box = self.text_index.boxes[i]
+            if box is None:
+                continue
+            for j in self.text_index.query(box):
+                if j <= i or self.related(i, j):
+                    continue
+                other = self.boxes[j]
+                overlap = intersection_area(box, other)
+                if overlap and overlap >= OVERLAP_MIN_RATIO * min(box_area(box), box_area(other)):
+                    findings.append({"index": i, "other_index": j, "element": describe(self.elements[i]), "other": describe(self.elements[j]),
+                                     "overlap_px": round(overlap)})
+        return findings
+
+    def occluded_text(self, only=None):
+        # Without parent_index a covering element cannot be told apart from an un-collected card
+        # background, so legacy payloads only get the containment-free overlap check above.
+        if not self.has_parents:
+            return []
+        cover_index = SpatialIndex([box if box and has_opaque_background(e) else None for e, box in zip(self.elements, self.boxes)])
+        findings = []
+        for i in self._positions(only):
+            box = self.text_index.boxes[i]
+            if box is None:
+                continue
+            for j in cover_index.query(box):
+                # Later in the DOM paints on top (absent z-index); ancestors are backgrounds, not covers
+                if j <= i or self._is_ancestor(j, i) or self._is_ancestor(i, j):
+                    continue
+                covered = intersection_area(box, self.boxes[j])
+                if covered >= OCCLUSION_MIN_RATIO * box_area(box):
+                    findings.append({"index": i, "other_index": j, "element": describe(self.elements[i]), "other": describe(self.elements[j]),
+                                     "covered_ratio": round(covered / box_area(box), 2)})
+                    break
+        return findings
+
+    def _is_inline_target(self, index):
+        parent = self.elements[index].get('parent_index')
+        return (self.elements[index].get('tag_name') == 'A' and parent is not None and 0 <= parent < len(self.elements)
+                and self.elements[parent].get('tag_name') in INLINE_TARGET_PARENT_TAGS)
+
+    def touch_targets(self, only=None):
+        """WCAG 2.5.8 failures plus the number of targets under the 44px recommendation."""
+        findings = []
+        below_recommended = 0
+        radius = MIN_TARGET_PX / 2
+        for i in self._positions(only):
+            box = self.target_index.boxes[i]
+            if box is None:
+                continue
+            width, height = box[2] - box[0], box[3] - box[1]
+            if min(width, height) < RECOMMENDED_TARGET_PX:
+                below_recommended += 1
+            if min(width, height) >= MIN_TARGET_PX or self._is_inline_target(i):
+                continue
+            # Spacing exception: a 24px circle on the target's centre must not reach another target
+            # (or that target's own circle, when it is undersized too)
+            center = ((box[0] + box[2]) / 2, (box[1] + box[3]) / 2)
+            point = (center[0], center[1], center[0], center[1])
+            conflicts = []
+            for j in self.target_index.query(inflate(point, MIN_TARGET_PX)):
+                if j == i or self.related(i, j):
+                    continue
+                other = self.boxes[j]
+                other_small = min(other[2] - other[0], other[3] - other[1]) < MIN_TARGET_PX
+                if other_small:
+                    other_center = ((other[0] + other[2]) / 2, (other[1] + other[3]) / 2)
+                    too_close = ((center[0] - other_center[0]) ** 2 + (center[1] - other_center[1]) ** 2) ** 0.5 < MIN_TARGET_PX
+                else:
+                    too_close = box_gap(point, other) < radius
+                if too_close:
+                    conflicts.append(j)
+            if conflicts:
+                findings.append({"index": i, "element": describe(self.elements[i]), "size_px": [round(width), round(height)],
+                                 "nearest_target": describe(self.elements[conflicts[0]]), "conflicting_targets": len(conflicts)})
+        return findings, below_recommended
+
+    def reading_order(self, only=None):
+        """Consecutive focusable/heading elements that go back up the page within the same column (only: positions of the later one)."""
+        sequence = [i for i, e in enumerate(self.elements) if self.boxes[i] is not None and in_focus_sequence(e)]
+        findings = []
+        for previous, current in zip(sequence, sequence[1:]):
+            if only is not None and current not in only:
+                continue
+            a, b = self.boxes[previous], self.boxes[current]
+            if b[3] > a[1] - ORDER_TOLERANCE_PX or self.related(previous, current):
+                continue
+            # Same column: horizontal overlap of at least half the narrower box (new columns legitimately restart at the top)
+            shared = min(a[2], b[2]) - max(a[0], b[0])
+            if shared >= 0.5 * min(a[2] - a[0], b[2] - b[0]):
+                findings.append({"index": current, "previous_index": previous, "element": describe(self.elements[current]),
+                                 "previous": describe(self.elements[previous]), "rise_px": round(a[1] - b[3])})
+        return findings
+
+    def rank_ctas(self, limit=10):
+        """Buttons/links with text ranked by prominence: size, how many screens down, competing CTAs nearby."""
+        candidates = [i for i, e in enumerate(self.elements) if self.boxes[i] is not None and e.get('tag_name') in CTA_TAGS and has_text(e)]
+        ranked = []
+        for i in candidates:
+            box = self.boxes[i]
+            fold = int(box[1] // self.fold_y) if self.fold_y > 0 else 0 # 0 = first screen
+            competing = len(self.target_index.nearest(box, k=8, max_distance=CTA_COMPETITION_RADIUS_PX, exclude={i},
+                                                      predicate=lambda j: self.elements[j].get('tag_name') in CTA_TAGS))
+            score = box_area(box) ** 0.5 / (1 + fold) / (1 + 0.25 * competing)
+            if has_opaque_background(self.elements[i]):
+                score *= 1.5
+            ranked.append({"index": i, "element": describe(self.elements[i]), "fold": fold, "above_fold": box[1] < self.fold_y,
+                           "competing_ctas": competing, "score": round(score, 2)})
+        ranked.sort(key=lambda item: -item["score"])
+        for rank, item in enumerate(ranked, start=1):
+            item["rank"] = rank
+        return ranked[:limit]
+
+
+def run_layout_checks(key_elements, fold_y=FOLD_Y, cta_limit=10):
+    """
+    All layout checks for one page. Returns {"overlapping_text", "occluded_text", "small_targets",
+    "order_mismatches", "cta_ranking": [...], "stats": {...}}; each finding list is capped at
+    MAX_FINDINGS_PER_CHECK (stats has the full counts), the CTA ranking at cta_limit (None = all).
+    """
+    key_elements = key_elements or []
+    with span("layout.index"):
+        checker = LayoutChecker(key_elements, fold_y)
+    with span("layout.checks"):
+        overlapping = checker.overlapping_text()
+        occluded = checker.occluded_text()
+        small_targets, below_recommended = checker.touch_targets()
+        order_mismatches = checker.reading_order()
+        cta_ranking = checker.rank_ctas(limit=cta_limit)
+    return {
+        "overlapping_text": overlapping[:MAX_FINDINGS_PER_CHECK],
+        "occluded_text": occluded[:MAX_FINDINGS_PER_CHECK],
+        "small_targets": small_targets[:MAX_FINDINGS_PER_CHECK],
+        "order_mismatches": order_mismatches[:MAX_FINDINGS_PER_CHECK],
+        "cta_ranking": cta_ranking,
+        "stats": {
+            "elements": len(key_elements),
+            "text_elements": checker.text_index.size,
+            "targets": checker.target_index.size,
+            "overlapping_text": len(overlapping),
+            "occluded_text": len(occluded),
+            "small_targets": len(small_targets),
+            "targets_below_44px": below_recommended,
+            "order_mismatches": len(order_mismatches),
+        },
+    }
@@ -0,0 +1,54 @@
+import importlib
+import threading
+import time
+
+# Deferred imports for heavy dependencies (numpy, PIL, lxml, ...), so importing app.py stays cheap
+# and a worker can answer health checks before they are loaded (see warmup.py).
+#
+#   np = lazy_import("numpy")   # nothing imported yet
+#   np.array(...)               # first attribute access imports numpy, later ones go straight to it
+#
+# load(np) forces the import (warmup); load_times() reports which lazy modules have been loaded
+# and how long each import took. LazyModule keeps its own attributes underscored so it never
+# shadows an attribute of the real module.
+
+_load_lock = threading.RLock() # one lazy import may trigger another
+_load_times = {} # module name -> import time in ms
+
+
+class LazyModule:
+    """Stand-in for a module that is imported on first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        module = self._module
+        if module is None:
+            with _load_lock:
+                if self._module is None:
+                    start = time.perf_counter()
+                    self._module = importlib.import_module(self._name)
+                    _load_times[self._name] = round((time.perf_counter() - start) * 1000, 1)
+                module = self._module
+        return module
+
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+    def __repr__(self):
+        return f"<lazy module {self._name!r} ({'loaded' if self._module is not None else 'not loaded'})>"
+
+
+def lazy_import(name):
+    return LazyModule(name)
+
+
+def load(module):
+    """Imports a lazy module now and returns the real module (other modules are returned as is)."""
+    return module._load() if isinstance(module, LazyModule) else module
+
+
+def load_times():
+    return dict(_load_times)
@@ -0,0 +1,212 @@
+import time
+
+from browser_pool import browser_page
+from metrics import span, record_span
+from request_budget import budget_allows, budget_timeout_ms, VIEWPORT_CHECK_ESTIMATE_MS, CONTRAST_BELOW_FOLD_ESTIMATE_MS
+
+# One live-browser visit per full analysis, shared by the agents that need the real page
+# (analysis_stages.py registers it as the "live_page" stage): the accessibility agent scores the
+# HTML, contrast data and responsive probes, the performance agent the timing data. Everything is
+# collected in a single navigation and returned as plain data, because sync Playwright objects
+# cannot leave the thread that opened them.
+#
+# The performance observers are installed before navigation (add_init_script), so LCP, layout
+# shifts and long tasks are buffered from the first byte; they are read right after the page
+# settles, before the responsive checks resize the viewport (which shifts layout on its own).
+# That costs one init script and one page.evaluate on top of the existing visit.
+#
+# Budget stage names keep the "accessibility." prefix: skipping them makes the accessibility
+# result partial (request_budget.skipped_stages("accessibility.")).
+
+MAX_AUDITED_IMAGES = 200
+RESOURCE_TIMING_BUFFER_SIZE = 2000 # Chromium keeps only 250 resource entries by default
+
+# Common device viewports for the responsive checks
+RESPONSIVE_VIEWPORTS = {
+    "mobile_small": {"width": 320, "height": 568},  # iPhone 5/SE
+    "mobile_large": {"width": 414, "height": 896},  # iPhone Plus / modern large phone
+    "tablet": {"width": 768, "height": 1024},      # iPad portrait
+    "desktop_small": {"width": 1024, "height": 768}, # Small desktop/laptop
+}
+
+# --- Live-browser contrast data ---
+# Text elements with their color and the first opaque background up the tree.
+# With aboveFoldOnly, elements starting below the first viewport are left out.
+CONTRAST_COLLECTOR_JS = '''
+   (aboveFoldOnly) => {
+       const results = [];
+       const selectors = 'h1, h2, h3, h4, h5, h6, p, a, span, li, button, input[type="submit"], input[type="button"]';
+       document.querySelectorAll(selectors).forEach(el => {
+           const style = window.getComputedStyle(el);
+           const tagName = el.tagName;
+           const textContent = el.textContent ? el.textContent.trim().substring(0, 100) : '';
+
+           // Skip if element has no text or is invisible
+           if (!textContent || style.display === 'none' || style.visibility === 'hidden' || parseFloat(style.opacity) < 0.05) {
+               return;
+           }
+           if (aboveFoldOnly && el.getBoundingClientRect().top >= window.innerHeight) {
+               return;
+           }
+
+           // Get text color and computed background color
+           const textColor = style.color;
+           let bgColor = style.backgroundColor;
+
+           // Traverse up the DOM to find a non-transparent background
+           let currentEl = el;
+           while (currentEl && (bgColor === 'rgba(0, 0, 0, 0)' || bgColor === 'transparent')) {
+               currentEl = currentEl.parentElement;
+               if (currentEl) {
+                   bgColor = window.getComputedStyle(currentEl).backgroundColor;
+               }
+           }
+
+           results.push({
+               tagName: tagName,
+               textContent: textContent,
+               textColor: textColor,
+               bgColor: bgColor
+           });
+       });
+       return results;
+   }
+'''
+
+# --- Performance data (agents/performance_agent.py) ---
+# Runs before any page script: buffers the entries that are not kept in the performance timeline
+PERFORMANCE_OBSERVER_JS = '''
+(() => {
+    const perf = window.__pixelPalPerf = { lcp: null, layoutShifts: [], longTasks: [] };
+    try { performance.setResourceTimingBufferSize(%d); } catch (e) { /* older engines */ }
+    const observe = (type, callback) => {
+        try {
+            new PerformanceObserver(list => list.getEntries().forEach(callback)).observe({ type: type, buffered: true });
+        } catch (e) { /* entry type not supported */ }
+    };
+    observe('largest-contentful-paint', entry => {
+        const element = entry.element;
+        perf.lcp = {
+            time: entry.startTime, size: entry.size, url: entry.url || null,
+            tag: element ? element.tagName : null,
+            text: element && !entry.url ? (element.textContent || '').trim().substring(0, 80) : null
+        };
+    });
+    observe('layout-shift', entry => {
+        if (!entry.hadRecentInput) perf.layoutShifts.push({ time: entry.startTime, value: entry.value });
+    });
+    observe('longtask', entry => perf.longTasks.push({ time: entry.startTime, duration: entry.duration }));
+})();
+''' % RESOURCE_TIMING_BUFFER_SIZE
+
+# Navigation/Resource Timing, paint timings, the buffered observer entries and every <img> with
+# its intrinsic vs rendered size
+PERFORMANCE_COLLECTOR_JS = '''
+   (maxImages) => {
+       const perf = window.__pixelPalPerf || { lcp: null, layoutShifts: [], longTasks: [] };
+       const nav = performance.getEntriesByType('navigation')[0];
+       const fcp = performance.getEntriesByName('first-contentful-paint')[0];
+       const resources = performance.getEntriesByType('resource').map(r => ({
+           url: r.name, initiator: r.initiatorType, transfer: r.transferSize || 0, encoded: r.encodedBodySize || 0,
+           start: r.startTime, duration: r.duration, blocking: r.renderBlockingStatus || null
+       }));
+       // Fallback for engines without renderBlockingStatus: classic scripts in <head>, matching stylesheets
+       const blockingCandidates = [];
+       document.querySelectorAll('head script[src]').forEach(script => {
+           if (!script.async && !script.defer && script.type !== 'module') blockingCandidates.push(script.src);
+       });
+       document.querySelectorAll('link[rel="stylesheet"][href]').forEach(link => {
+           if (!link.disabled && (!link.media || window.matchMedia(link.media).matches)) blockingCandidates.push(link.href);
+       });
+       const images = Array.from(document.images).slice(0, maxImages).map(img => {
+           const rect = img.getBoundingClientRect();
+           return {
+               src: img.currentSrc || img.src, natural: [img.naturalWidth, img.naturalHeight],
+               rendered: [rect.width, rect.height], top: rect.top + window.scrollY,
+               loading: img.loading || 'auto', srcset: !!img.srcset,
+               sized: img.hasAttribute('width') && img.hasAttribute('height')
+           };
+       });
+       return {
+           navigation: nav ? {
+               ttfb: nav.responseStart, dom_content_loaded: nav.domContentLoadedEventEnd, load: nav.loadEventEnd,
+               transfer: nav.transferSize || 0, encoded: nav.encodedBodySize || 0
+           } : null,
+           fcp: fcp ? fcp.startTime : null,
+           lcp: perf.lcp,
+           layout_shifts: perf.layoutShifts,
+           long_tasks: perf.longTasks,
+           resources: resources,
+           render_blocking_candidates: blockingCandidates,
+           images: images,
+           image_count: document.images.length,
+           viewport: { width: window.innerWidth, height: window.innerHeight, dpr: window.devicePixelRatio }
+       };
+   }
+'''
+
+
+def collect_live_page(url):
+    """
+    Opens `url` once in the shared browser and returns plain data:
+    {"url", "page_content", "contrast_data", "contrast_error", "viewports": [{"device", "width", "height",
+    "scroll_width", "unscaled_images", "body_font_px"}], "performance", "performance_error", "error"}.
+    A failed visit comes back with "error" set (and whatever was collected before it) instead of raising.
+    """
+    live = {"url": url, "page_content": "", "contrast_data": None, "contrast_error": None, "viewports": [],
+            "performance": None, "performance_error": None, "error": None}
+    try:
+        # Fresh page in its own context on this worker's shared headless browser
+        with browser_page() as page:
+            page.add_init_script(PERFORMANCE_OBSERVER_JS)
+
+            print(f"DEBUG: live_page: Navigating Playwright to {url}")
+            with span("accessibility.goto"):
+                page.goto(url, wait_until="networkidle", timeout=budget_timeout_ms(60000)) # Wait for network idle, increased timeout
+
+            # Timing data first: the viewport changes below cause their own layout shifts
+            try:
+                with span("live_page.performance_collect"):
+                    live["performance"] = page.evaluate(PERFORMANCE_COLLECTOR_JS, MAX_AUDITED_IMAGES)
+            except Exception as e:
+                live["performance_error"] = str(e)
+
+            with span("accessibility.page_content"):
+                live["page_content"] = page.content() # Get the full HTML content
+            print(f"DEBUG: live_page: Playwright navigation successful for {url}.")
+
+            # --- Contrast data (WCAG 1.4.3, scored by the accessibility agent) ---
+            # Under a tight time budget only text in the first viewport is collected
+            above_fold_only = not budget_allows("accessibility.contrast_below_fold", CONTRAST_BELOW_FOLD_ESTIMATE_MS)
+            try:
+                with span("accessibility.contrast_collect"):
+                    live["contrast_data"] = page.evaluate(CONTRAST_COLLECTOR_JS, above_fold_only)
+            except Exception as e:
+                live["contrast_error"] = str(e)
+
+            # --- Responsive probes ---
+            viewports_start = time.perf_counter()
+            for position, (device_name, viewport) in enumerate(RESPONSIVE_VIEWPORTS.items()):
+                # The first viewport always runs; the others only while the time budget allows
+                if position > 0 and not budget_allows(f"accessibility.viewport.{device_name}", VIEWPORT_CHECK_ESTIMATE_MS):
+                    continue
+                page.set_viewport_size(viewport)
+                page.wait_for_timeout(500) # Give page time to reflow
+                probe = {"device": device_name, "width": viewport["width"], "height": viewport["height"],
+                         "scroll_width": page.evaluate("document.body.scrollWidth"), "unscaled_images": None, "body_font_px": None}
+                if "mobile" in device_name:
+                    # Images without max-width:100% or similar responsive properties (basic check)
+                    probe["unscaled_images"] = page.locator("img:not([style*='max-width:100%']):not([width=''])").count()
+                    probe["body_font_px"] = page.evaluate('() => parseFloat(window.getComputedStyle(document.body).fontSize)')
+                live["viewports"].append(probe)
+            record_span("accessibility.viewports", viewports_start)
+
+            print(f"DEBUG: live_page: Playwright browser closed.")
+
+    except Exception as e:
+        print(f"ERROR: live_page: Playwright operation failed for {url}: {e}")
+        # Print full traceback to stdout for debugging in the terminal
+        import sys, traceback
+        traceback.print_exc(file=sys.stdout)
+        live["error"] = str(e)
+    return live
@@ -0,0 +1,120 @@
+import os
+
+# Token-budgeted element context for LLM prompts.
+# Instead of "the first N elements in DOM order", elements are ranked by how much they
+# matter visually (size, font size, above the fold, unique text), repeated nav/footer
+# items are deduplicated, and rows are emitted in a compact table until the budget is used.
+
+# Per-agent budgets (approximate tokens for the element table), overridable via env vars
+DESIGN_CONTEXT_TOKEN_BUDGET = int(os.getenv("DESIGN_CONTEXT_TOKEN_BUDGET", "1500"))
+WORKFLOW_CONTEXT_TOKEN_BUDGET = int(os.getenv("WORKFLOW_CONTEXT_TOKEN_BUDGET", "2000"))
+
+FOLD_Y = 800              # same "above the fold" line the design agent uses for CTAs
+MAX_TEXT_CHARS = 80       # text is truncated per row; the screenshot carries the rest
+CHARS_PER_TOKEN = 4       # rough heuristic for English text / Gemini tokenizer
+
+TAG_WEIGHTS = {
+    'H1': 3.0, 'H2': 2.2, 'BUTTON': 2.5, 'INPUT': 1.8, 'FORM': 1.5, 'A': 1.4,
+    'IMG': 1.3, 'H3': 1.5, 'P': 1.0,
+}
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token)."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _font_size_px(styles):
+    try:
+        return float((styles.get('fontSize') or '0px').replace('px', ''))
+    except ValueError:
+        return 0.0
+
+
+def _compact_text(text):
+    text = ' '.join((text or '').split())
+    if len(text) > MAX_TEXT_CHARS:
+        text = text[:MAX_TEXT_CHARS - 1] + '…'
+    return text.replace('|', '/')
+
+
+def score_element(e, text_frequency):
+    """Visual prominence score: tag importance x size x font size x fold position x text uniqueness."""
+    bbox = e.get('bounding_box') or {}
+    styles = e.get('computed_styles') or {}
+    area = max(bbox.get('width', 0), 0) * max(bbox.get('height', 0), 0)
+    # Area saturates so one huge container does not dominate everything else
+    size_factor = min(area, 200000) ** 0.5 / 100.0 + 0.1
+    font_factor = max(_font_size_px(styles), 10.0) / 16.0
+    y = bbox.get('y', 0)
+    fold_factor = 2.0 if y < FOLD_Y else max(0.3, 1.0 - (y - FOLD_Y) / 4000.0)
+    text = (e.get('text_content') or '').strip()
+    uniqueness_factor = 1.0 / text_frequency.get((e.get('tag_name'), text), 1)
+    return TAG_WEIGHTS.get(e.get('tag_name'), 0.8) * size_factor * font_factor * fold_factor * uniqueness_factor
+
+
+def format_element_row(e, columns):
+    """One compact, pipe-separated row for an element."""
+    bbox = e.get('bounding_box') or {}
+    styles = e.get('computed_styles') or {}
+    values = {
+        'tag': e.get('tag_name', ''),
+        'text': _compact_text(e.get('text_content')),
+        'bbox': f"{int(bbox.get('x', 0))},{int(bbox.get('y', 0))},{int(bbox.get('width', 0))}x{int(bbox.get('height', 0))}",
+        'font': f"{styles.get('fontSize', '')}/{styles.get('fontWeight', '')}",
+        'color': styles.get('color', ''),
+        'bg': styles.get('backgroundColor', ''),
+        'href': (e.get('href') or '')[:60],
+        'src': (e.get('src') or '')[:50],
+    }
+    return '|'.join(str(values[c]) for c in columns)
+
+
+def build_element_context(key_elements, token_budget, tags=None, columns=('tag', 'text', 'bbox', 'font', 'color', 'bg'), include=None):
+    """
+    Builds a ranked, deduplicated, token-budgeted element table for an LLM prompt.
+    `tags` restricts which tag names are considered; `include` is an optional extra predicate.
+    Returns (context_text, stats) where stats reports tokens used and elements kept/dropped.
+    """
+    candidates = []
+    text_frequency = {}
+    for e in key_elements or []:
+        bbox = e.get('bounding_box') or {}
+        if bbox.get('width', 0) <= 0 or bbox.get('height', 0) <= 0:
+            continue
+        if (tags is None or e.get('tag_name') in tags) or (include is not None and include(e)):
+            candidates.append(e)
+            key = (e.get('tag_name'), (e.get('text_content') or '').strip())
+            text_frequency[key] = text_frequency.get(key, 0) + 1
+
+    ranked = sorted(candidates, key=lambda e: score_element(e, text_frequency), reverse=True)
+
+    header = '|'.join(columns)
+    lines = [header]
+    tokens_used = estimate_tokens(header) + 1
+    seen_rows = set()
+    duplicates_dropped = 0
+    for e in ranked:
+        # Repeated nav/footer items (same tag + text) appear once, at their most prominent position
+        dedupe_key = (e.get('tag_name'), _compact_text(e.get('text_content')), e.get('href'))
+        if dedupe_key in seen_rows:
+            duplicates_dropped += 1
+            continue
+        row = format_element_row(e, columns)
+        row_tokens = estimate_tokens(row) + 1  # +1 for the newline
+        if tokens_used + row_tokens > token_budget:
+            break
+        seen_rows.add(dedupe_key)
+        lines.append(row)
+        tokens_used += row_tokens
+
+    stats = {
+        "token_budget": token_budget,
+        "tokens_used": tokens_used,
+        "elements_considered": len(candidates),
+        "elements_included": len(lines) - 1,
+        "duplicates_dropped": duplicates_dropped,
+    }
+    if len(lines) == 1:
+        return "", stats
+    return "\n".join(lines), stats
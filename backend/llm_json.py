@@ -0,0 +1,379 @@
+import json
+import os
+import re
+import time
+
+from metrics import inc, observe
+
+# Tolerant parsing + schema validation for Gemini's structured (JSON) answers.
+#
+# A truncated or slightly malformed answer used to be thrown away (json.loads failed, the
+# agent fell back to placeholder text) even though most of it was usable. Here:
+#   1. parse_llm_json() tries plain json.loads, then a tolerant streaming parser that skips
+#      prose/code fences, fixes trailing commas, single quotes, Python literals and raw
+#      newlines in strings, and closes whatever was cut off at the last complete value;
+#   2. validate_response() checks the result against the agent's response schema and keeps
+#      only the valid parts, listing the fields that are missing;
+#   3. parse_structured_response() optionally asks the model again for *only* those fields.
+# For streamed answers, TolerantJSONParser(on_item=...) reports every element of a top-level
+# list field (e.g. each "design_feedback" entry) as soon as its closing bracket arrives;
+# stream_llm_json() wires that to a streamed Gemini call (time to first item is exported as
+# llm_time_to_first_item_seconds{agent}). LLM_STREAMING=0 falls back to one blocking call.
+# Outcomes are counted in llm_parse_total{agent, result} (clean / repaired / reprompted /
+# incomplete / failed); "repaired" means recovered without a second model call.
+#
+# Schemas are plain dicts, one entry per top-level field:
+#   {"vibe_analysis": {"type": dict, "fields": {"keywords": list, "description": str}},
+#    "design_feedback": {"type": list, "item_fields": {"issue": str, ...}, "min_items": 1}}
+
+LLM_STREAMING = os.getenv("LLM_STREAMING", "1") != "0"
+
+_NUMBER_PATTERN = re.compile(r'-?(0|[1-9]\d*)(\.\d+)?([eE][+-]?\d+)?$')
+_LITERALS = {'true': 'true', 'false': 'false', 'null': 'null', 'True': 'true', 'False': 'false', 'None': 'null'}
+_WHITESPACE = ' \t\r\n'
+
+
+def _closers(stack):
+    return ''.join('}' if entry[0] == '{' else ']' for entry in reversed(stack))
+
+
+def _normalize_string_body(raw, quote):
+    """Turns the raw characters between two quotes into a valid JSON string body."""
+    if raw.endswith('\\') and not raw.endswith('\\\\'):
+        raw = raw[:-1] # dangling escape from a truncated string
+    if quote == "'":
+        raw = raw.replace("\\'", "'").replace('"', '\\"')
+    return raw.replace('\n', '\\n').replace('\r', '\\r').replace('\t', '\\t')
+
+
+class TolerantJSONParser:
+    """
+    Incremental, forgiving JSON reader: feed() text as it arrives, value() returns the best
+    valid JSON value for everything received so far (closing any open strings/containers).
+    Internally it re-emits a normalized JSON text and remembers the last point at which that
+    text, once closed, is valid.
+    on_item(field, item) is called for each object/list element of a top-level list field
+    ({"field": [item, item, ...]}) as soon as that element is complete.
+    """
+
+    def __init__(self, on_item=None):
+        self.on_item = on_item
+        self._out = []
+        self._out_len = 0
+        # [kind, state, field, start, last_key]: kind '{' or '['; state key/colon/value/comma;
+        # field = key this container is the value of; start = its offset in the normalized text
+        self._stack = []
+        self._string = None # {"quote": ..., "is_key": bool, "chars": [...]} while inside a string
+        self._escape = False
+        self._token = None # chars of a number/literal being read
+        self._pending_comma = False
+        self._safe = (0, "") # (normalized length, closers) at the last complete value
+        self.started = False
+        self.done = False
+        self.repaired = False
+
+    # --- output helpers ---
+    def _emit(self, text):
+        self._out.append(text)
+        self._out_len += len(text)
+
+    def _mark_safe(self):
+        self._safe = (self._out_len, _closers(self._stack))
+
+    def _begin_value(self):
+        if self._pending_comma:
+            self._emit(',')
+            self._pending_comma = False
+
+    def _value_done(self):
+        if not self._stack:
+            self.done = True
+        else:
+            self._stack[-1][1] = 'comma'
+        self._mark_safe()
+
+    def _in_value_position(self):
+        if not self._stack:
+            return False
+        kind, state = self._stack[-1][:2]
+        if state == 'comma' and kind == '[':
+            self._pending_comma = True # tolerate a missing comma between array items
+            self._stack[-1][1] = 'value'
+            return True
+        return state == 'value'
+
+    # --- scanning ---
+    def feed(self, chunk):
+        for ch in chunk:
+            if self.done:
+                break
+            self._step(ch)
+        return self
+
+    def _finish_token(self):
+        text = ''.join(self._token)
+        self._token = None
+        if text in _LITERALS:
+            text = _LITERALS[text]
+        elif not _NUMBER_PATTERN.match(text):
+            text = json.dumps(text) # a bare word where a value belongs: keep it as a string
+        self._emit(text)
+        self._value_done()
+
+    def _step(self, ch):
+        string = self._string
+        if string is not None:
+            if self._escape:
+                string["chars"].append(ch)
+                self._escape = False
+            elif ch == '\\':
+                string["chars"].append(ch)
+                self._escape = True
+            elif ch == string["quote"]:
+                self._string = None
+                encoded = '"' + _normalize_string_body(''.join(string["chars"]), string["quote"]) + '"'
+                self._emit(encoded)
+                if string["is_key"]:
+                    self._stack[-1][1] = 'colon'
+                    if len(self._stack) == 1:
+                        self._stack[-1][4] = encoded # only top-level keys are needed for on_item
+                else:
+                    self._value_done()
+            else:
+                string["chars"].append(ch)
+            return
+
+        if self._token is not None:
+            if ch not in ',}]:' and ch not in _WHITESPACE:
+                self._token.append(ch)
+                return
+            self._finish_token()
+            if self.done:
+                return
+
+        if not self.started:
+            if ch not in '{[':
+                return # prose or a ```json fence before the payload
+            self.started = True
+
+        if ch in _WHITESPACE:
+            return
+        top = self._stack[-1] if self._stack else None
+
+        if ch in '{[':
+            if top is not None and not self._in_value_position():
+                return
+            self._begin_value()
+            field = top[4] if top is not None and top[0] == '{' else None
+            self._stack.append([ch, 'key' if ch == '{' else 'value', field, self._out_len, None])
+            self._emit(ch)
+            self._mark_safe()
+        elif ch in '}]':
+            if top is None:
+                return
+            if top[0] == '{' and top[1] in ('colon', 'value'):
+                return # a key without a value: cannot close here, let repair fall back to the safe point
+            self._pending_comma = False # drops trailing commas
+            self._stack.pop()
+            self._emit('}' if top[0] == '{' else ']')
+            self._value_done()
+            if self.on_item is not None and len(self._stack) == 2 and self._stack[0][0] == '{' and self._stack[1][0] == '[':
+                self._report_item(top[3])
+        elif ch == ',':
+            if top is not None and top[1] == 'comma':
+                self._pending_comma = True
+                top[1] = 'key' if top[0] == '{' else 'value'
+        elif ch == ':':
+            if top is not None and top[0] == '{' and top[1] == 'colon':
+                self._emit(':')
+                top[1] = 'value'
+        elif ch in '"\'':
+            if top is not None and top[0] == '{' and top[1] in ('key', 'comma'):
+                if top[1] == 'comma':
+                    self._pending_comma = True # missing comma between members
+                self._begin_value()
+                self._string = {"quote": ch, "is_key": True, "chars": []}
+            elif self._in_value_position():
+                self._begin_value()
+                self._string = {"quote": ch, "is_key": False, "chars": []}
+        elif self._in_value_position():
+            self._begin_value()
+            self._token = [ch]
+
+    def _report_item(self, start):
+        try:
+            item = json.loads(self.normalized_text()[start:])
+            field = json.loads(self._stack[1][2]) if self._stack[1][2] else None
+        except json.JSONDecodeError:
+            return
+        self.on_item(field, item)
+
+    # --- results ---
+    def normalized_text(self):
+        return ''.join(self._out)
+
+    def value(self):
+        """Best-effort value of everything fed so far (None if nothing usable)."""
+        if not self.started:
+            return None
+        text = self.normalized_text()
+        if self.done:
+            try:
+                return json.loads(text)
+            except json.JSONDecodeError:
+                pass
+        candidates = []
+        string = self._string
+        if string is not None and not string["is_key"]:
+            # Cut off inside a string value: keep the partial text
+            candidates.append(text + '"' + _normalize_string_body(''.join(string["chars"]), string["quote"]) + '"' + _closers(self._stack))
+        if self._token is not None and ''.join(self._token) in _LITERALS:
+            candidates.append(text + _LITERALS[''.join(self._token)] + _closers(self._stack))
+        safe_length, safe_closers = self._safe
+        candidates.append(text[:safe_length] + safe_closers)
+        for candidate in candidates:
+            try:
+                value = json.loads(candidate)
+                self.repaired = True
+                return value
+            except json.JSONDecodeError:
+                continue
+        return None
+
+
+def parse_llm_json(response_text):
+    """
+    Parses a model's JSON answer. Returns (value, status): status is "clean" (plain json.loads
+    after stripping code fences), "repaired" (tolerant parser needed) or "failed" (value is None).
+    """
+    if not response_text:
+        return None, "failed"
+    clean_text = response_text.replace('```json', '').replace('```', '').strip()
+    try:
+        return json.loads(clean_text), "clean"
+    except json.JSONDecodeError:
+        pass
+    parser = TolerantJSONParser().feed(response_text)
+    value = parser.value()
+    return (value, "repaired") if value is not None else (None, "failed")
+
+
+def _valid_fields(value, fields):
+    return isinstance(value, dict) and all(isinstance(value.get(name), expected) for name, expected in fields.items())
+
+
+def validate_response(data, schema):
+    """
+    Checks data against schema. Returns (cleaned, missing): cleaned holds the valid top-level
+    fields (list fields keep only their valid items), missing lists the fields that are absent or invalid.
+    """
+    cleaned, missing = {}, []
+    if not isinstance(data, dict):
+        return cleaned, list(schema)
+    for name, rule in schema.items():
+        value = data.get(name)
+        if not isinstance(value, rule["type"]):
+            missing.append(name)
+            continue
+        if rule["type"] is dict and not _valid_fields(value, rule.get("fields", {})):
+            missing.append(name)
+            continue
+        if rule["type"] is list:
+            item_fields = rule.get("item_fields")
+            if item_fields:
+                value = [item for item in value if _valid_fields(item, item_fields)]
+            if len(value) < rule.get("min_items", 0):
+                missing.append(name)
+                continue
+        cleaned[name] = value
+    return cleaned, missing
+
+
+def _describe_rule(rule):
+    if rule["type"] is dict:
+        return "an object with " + ", ".join(f'"{name}" ({expected.__name__})' for name, expected in rule.get("fields", {}).items())
+    if rule.get("item_fields"):
+        return "a list of objects with " + ", ".join(f'"{name}" ({expected.__name__})' for name, expected in rule["item_fields"].items())
+    return f"a {rule['type'].__name__}"
+
+
+def missing_fields_prompt(cleaned, missing, schema):
+    """Follow-up instruction asking the model for only the missing fields."""
+    lines = [
+        "\nYour previous answer was incomplete. You already provided:",
+        json.dumps(cleaned)[:2000],
+        "Return ONLY a JSON object with these missing keys (nothing else):",
+    ]
+    lines += [f'- "{name}": {_describe_rule(schema[name])}' for name in missing]
+    return "\n".join(lines)
+
+
+def parse_structured_response(response_text, schema, agent, reprompt=None):
+    """
+    Parses and validates an agent's JSON answer. If fields are missing and reprompt is given,
+    reprompt(instruction_text) -> response text is called once to fetch only those fields
+    (it may return None to skip the follow-up, e.g. when the time budget is spent).
+    Returns (cleaned, info) where info = {"parse": outcome, "missing_fields": [...]}.
+    """
+    data, status = parse_llm_json(response_text)
+    cleaned, missing = validate_response(data, schema)
+    if missing and reprompt is not None:
+        try:
+            followup_text = reprompt(missing_fields_prompt(cleaned, missing, schema))
+            if followup_text is not None:
+                extra, _ = parse_llm_json(followup_text)
+                extra_cleaned, _ = validate_response(extra, {name: schema[name] for name in missing})
+                cleaned.update(extra_cleaned)
+                missing = [name for name in missing if name not in extra_cleaned]
+                status = "reprompted"
+        except Exception as e:
+            print(f"Follow-up request for missing fields failed ({agent}): {e}")
+    if missing:
+        status = "failed" if not cleaned else "incomplete"
+    inc("llm_parse_total", agent=agent, result=status)
+    return cleaned, {"parse": status, "missing_fields": missing}
+
+
+def stream_llm_json(model, prompt_parts, agent, schema, on_item=None, **generate_kwargs):
+    """
+    Runs model.generate_content(prompt_parts, stream=True, **generate_kwargs) and parses the JSON
+    answer while it arrives: each complete, valid item of one of the schema's list fields is passed
+    to on_item(field, item) immediately. Returns (response, stream_info); once the stream is
+    consumed, response.text and response.usage_metadata hold the full answer as usual.
+    """
+    start = time.perf_counter()
+    stream_info = {"streamed": LLM_STREAMING, "chunks": 0, "items": 0, "time_to_first_chunk_ms": None, "time_to_first_item_ms": None, "total_ms": None}
+
+    def report_item(field, item):
+        rule = schema.get(field)
+        if rule is None or rule["type"] is not list:
+            return
+        if rule.get("item_fields") and not _valid_fields(item, rule["item_fields"]):
+            return # incomplete items are left to parse_structured_response's validation
+        if stream_info["items"] == 0:
+            elapsed = time.perf_counter() - start
+            stream_info["time_to_first_item_ms"] = round(elapsed * 1000, 1)
+            observe("llm_time_to_first_item_seconds", elapsed, agent=agent)
+        stream_info["items"] += 1
+        if on_item is not None:
+            on_item(field, item)
+
+    parser = TolerantJSONParser(on_item=report_item)
+    if not LLM_STREAMING:
+        response = model.generate_content(prompt_parts, **generate_kwargs)
+        stream_info["chunks"] = 1
+        stream_info["time_to_first_chunk_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        parser.feed(response.text or "")
+    else:
+        response = model.generate_content(prompt_parts, stream=True, **generate_kwargs)
+        for chunk in response:
+            if stream_info["chunks"] == 0:
+                stream_info["time_to_first_chunk_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            stream_info["chunks"] += 1
+            try:
+                text = chunk.text
+            except ValueError:
+                continue # a chunk without text (e.g. only a finish reason)
+            parser.feed(text)
+    stream_info["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return response, stream_info
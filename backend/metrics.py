@@ -0,0 +1,199 @@
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Lightweight, dependency-free metrics: timing spans + Prometheus-style histograms/counters.
+#
+#   with span("design.llm"):            # records stage latency (and a per-request breakdown)
+#       ...
+#   observe("payload_bytes", n, kind="screenshot")
+#   inc("cache_events_total", cache="palette", result="hit")
+#
+# Everything is exposed in Prometheus text format by render_prometheus() (served at /metrics).
+# Set METRICS_ENABLED=0 to turn spans and observations into near no-ops.
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 5e5, 1e6, 5e6, 1e7, 5e7)
+COUNT_BUCKETS = (10, 50, 100, 500, 1000, 5000, 10000, 50000)
+FANOUT_BUCKETS = (1, 2, 3, 5, 10, 20, 50)
+
+METRIC_DEFINITIONS = {
+    # name: (type, help, buckets)
+    "stage_latency_seconds": ("histogram", "Latency of each analysis stage.", LATENCY_BUCKETS),
+    "payload_bytes": ("histogram", "Size of request/response payloads and captured artifacts.", SIZE_BUCKETS),
+    "element_count": ("histogram", "Number of DOM elements handled per request.", COUNT_BUCKETS),
+    "llm_tokens": ("histogram", "Gemini tokens per call.", COUNT_BUCKETS),
+    "cache_events_total": ("counter", "Cache lookups by cache and result (hit/miss).", None),
+    "requests_total": ("counter", "Analysis requests by endpoint, mode and status.", None),
+    "llm_time_to_first_item_seconds": ("histogram", "Time from sending a Gemini request to the first complete streamed answer item.", LATENCY_BUCKETS),
+    "budget_skipped_stages_total": ("counter", "Optional analysis stages skipped to stay within the request's time budget.", None),
+    "page_archive_requests_total": ("counter", "Browser requests recorded into or replayed from page archives, by mode and result.", None),
+    "page_archive_bytes_total": ("counter", "Response bytes written to the page archive blob store (stored) or already present (deduplicated).", None),
+    "budget_overruns_total": ("counter", "Analyses that finished after their time budget, by mode.", None),
+    "history_writes_total": ("counter", "Analysis runs handed to the history store, by result (written, dropped, error).", None),
+    "history_queue_depth": ("gauge", "Analysis runs waiting for the history writer thread.", None),
+    "admission_wait_seconds": ("histogram", "Time full analyses waited for an admission slot, by lane and result (admitted/rejected).", LATENCY_BUCKETS),
+    "admission_rejections_total": ("counter", "Requests turned away with 429 by admission control, by lane and reason.", None),
+    "admission_queue_depth": ("gauge", "Full analyses waiting for an admission slot, by lane.", None),
+    "admission_in_flight": ("gauge", "Full analyses holding an admission slot, by lane.", None),
+    "llm_parse_total": ("counter", "Structured LLM answers by agent and outcome (clean, repaired, reprompted, incomplete, failed).", None),
+    "memo_events_total": ("counter", "Shared memo (style_memo.py) lookups by memo and result (hit/miss).", None),
+    "memo_entries": ("gauge", "Entries currently held by each shared memo.", None),
+    "watch_sessions": ("gauge", "Open watch-mode WebSocket sessions (watch_session.py).", None),
+    "watch_updates_total": ("counter", "Watch-mode messages handled, by result (start, delta, rejected).", None),
+    "watch_bytes_total": ("counter", "Watch-mode WebSocket payload bytes, by direction (in, out).", None),
+    "screenshot_store_bytes_total": ("counter", "Screenshot store bytes by result (stored, deduplicated, referenced, derivative_saved, collected).", None),
+    "screenshot_store_requests_total": ("counter", "Screenshot store lookups by hash, by result (hit/miss).", None),
+    "screenshot_store_disk_bytes": ("gauge", "Bytes on disk in the screenshot store (this worker's estimate).", None),
+    "coalesced_requests_total": ("counter", "Requests handled by in-flight coalescing (single_flight.py), by flight and role (leader, follower, follower_timeout).", None),
+    "coalesce_fanout": ("histogram", "Requests served by one coalesced run (1 = nobody attached), by flight.", FANOUT_BUCKETS),
+}
+
+_lock = threading.Lock()
+_histograms = {} # (name, labels) -> [bucket_counts, sum, count]
+_counters = {} # (name, labels) -> value (counters and gauges)
+_collectors = [] # callables run before each render to refresh values owned by other modules
+
+# Per-request timing breakdown; copied into worker threads via submit_with_context
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def observe(name, value, **labels):
+    """Records one observation into a histogram."""
+    if not METRICS_ENABLED:
+        return
+    buckets = METRIC_DEFINITIONS[name][2]
+    key = (name, _label_key(labels))
+    with _lock:
+        entry = _histograms.get(key)
+        if entry is None:
+            entry = _histograms[key] = [[0] * len(buckets), 0.0, 0]
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                entry[0][i] += 1
+                break
+        entry[1] += value
+        entry[2] += 1
+
+
+def inc(name, amount=1, **labels):
+    """Increments a counter."""
+    if not METRICS_ENABLED:
+        return
+    key = (name, _label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def set_value(name, value, **labels):
+    """Sets a gauge, or a counter mirrored from a cumulative source, to an absolute value."""
+    if not METRICS_ENABLED:
+        return
+    with _lock:
+        _counters[(name, _label_key(labels))] = value
+
+
+def register_collector(collector):
+    """Registers a no-argument callable that refreshes its metrics (via set_value) before every render."""
+    _collectors.append(collector)
+
+
+def record_span(stage, start):
+    """Records a span for `stage` that began at `start` (a time.perf_counter() value) and ends now."""
+    if not METRICS_ENABLED:
+        return
+    elapsed = time.perf_counter() - start
+    observe("stage_latency_seconds", elapsed, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, round(elapsed * 1000, 2)))
+
+
+@contextmanager
+def span(stage):
+    """Times a block as `stage`; feeds the latency histogram and the current request's breakdown."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(stage, start)
+
+
+def start_request_timings():
+    """Starts collecting a timing breakdown for the current request. Returns the (shared) list."""
+    timings = [] # list.append is atomic, so worker threads can share it
+    _request_timings.set(timings)
+    return timings
+
+
+def timing_breakdown(timings):
+    """Formats collected spans for inclusion in a JSON response."""
+    return [{"stage": stage, "ms": ms} for stage, ms in timings]
+
+
+def submit_with_context(executor, fn, *args, **kwargs):
+    """executor.submit that carries the current request's timing context into the worker thread."""
+    ctx = contextvars.copy_context()
+    return executor.submit(ctx.run, fn, *args, **kwargs)
+
+
+def record_llm_usage(response, agent):
+    """Records prompt/output token counts from a Gemini response, if it reports them."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_token_count", None)
+    output_tokens = getattr(usage, "candidates_token_count", None)
+    if prompt_tokens is not None:
+        observe("llm_tokens", prompt_tokens, agent=agent, kind="prompt")
+    if output_tokens is not None:
+        observe("llm_tokens", output_tokens, agent=agent, kind="output")
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + (list(extra.items()) if extra else [])
+    if not items:
+        return ""
+    escaped = (f'{k}="{str(v)}"'.replace("\n", " ") for k, v in items)
+    return "{" + ",".join(escaped) + "}"
+
+
+def render_prometheus():
+    """Renders all metrics in the Prometheus text exposition format."""
+    for collector in _collectors:
+        collector()
+    with _lock:
+        histograms = {key: (list(v[0]), v[1], v[2]) for key, v in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = []
+    for name, (metric_type, help_text, buckets) in METRIC_DEFINITIONS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        if metric_type == "histogram":
+            for (metric_name, labels), (bucket_counts, total, count) in sorted(histograms.items()):
+                if metric_name != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(buckets, bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_format_labels(labels, {'le': bound})} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels, {'le': '+Inf'})} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        else:
+            for (metric_name, labels), value in sorted(counters.items()):
+                if metric_name == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,301 @@
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlsplit, urlunsplit
+
+from metrics import inc
+from utils import write_atomic
+
+# Record-and-replay page archives, so an analysis can be re-run offline against exactly the same
+# page (reproducible results, A/B comparison of agent versions, benchmarks at local-disk speed).
+#
+#   POST /api/analyze-website?archive=record   live run; every request the agents' pages make is
+#                                              fetched through Playwright route interception and saved
+#   POST /api/analyze-website?archive=replay   no network: requests are answered from the archive,
+#                                              anything that was not recorded is aborted
+#
+# Layout under PAGE_ARCHIVE_DIR:
+#   blobs/ab/abcdef...      response bodies, stored once per SHA-256, so the shared CSS/JS/fonts/images
+#                           of a site's pages (and of repeated recordings) take disk space only once
+#   sites/<host>/<key>.har.json
+#                           HAR 1.2-style log per analysed URL; entries reference bodies by
+#                           response.content._sha256 instead of embedding them; headers are
+#                           [{"name", "value"}] pairs, so repeated ones (Set-Cookie) all survive
+#
+# Redirects are recorded hop by hop (fetch with max_redirects=0) so relative URLs resolve exactly as
+# they did live. Replay also seeds Math.random and pins Date to the recording time, which keeps
+# carousels, A/B scripts and "x minutes ago" text stable between runs. WebSocket traffic is not
+# recorded. The session lives in a contextvar (like request_budget.py), so every browser page the
+# agents open for one request shares it (see browser_pool.browser_page).
+
+PAGE_ARCHIVE_DIR = os.getenv("PAGE_ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "page_archives"))
+PAGE_ARCHIVE_MODE = os.getenv("PAGE_ARCHIVE_MODE", "off") # default for requests that do not pass ?archive=
+ARCHIVE_MODES = ("off", "record", "replay")
+MAX_ARCHIVED_BODY_BYTES = int(os.getenv("MAX_ARCHIVED_BODY_BYTES", str(20 * 1024 * 1024)))
+# Hop-by-hop or encoding headers that no longer describe the stored (decoded) body
+DROPPED_RESPONSE_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+REPLAY_DETERMINISM_JS = """
+(capturedAtMs) => {
+    let seed = 0x2545F491;
+    Math.random = () => {
+        seed = (Math.imul(seed, 1664525) + 1013904223) >>> 0;
+        return seed / 4294967296;
+    };
+    const RealDate = Date;
+    const offset = capturedAtMs - RealDate.now();
+    // A function, not a class: pages also call Date() without new, which returns a string
+    function ReplayDate(...args) {
+        if (!new.target) return new RealDate(RealDate.now() + offset).toString();
+        return Reflect.construct(RealDate, args.length ? args : [RealDate.now() + offset], new.target);
+    }
+    ReplayDate.prototype = RealDate.prototype;
+    Object.defineProperty(RealDate.prototype, "constructor", { value: ReplayDate, writable: true, configurable: true });
+    ReplayDate.parse = RealDate.parse;
+    ReplayDate.UTC = RealDate.UTC;
+    ReplayDate.now = () => RealDate.now() + offset;
+    window.Date = ReplayDate;
+}
+"""
+
+_current_session = contextvars.ContextVar("page_archive_session", default=None)
+
+
+class ArchiveNotFound(Exception):
+    pass
+
+
+def _url_without_query(url):
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, "", ""))
+
+
+def _fulfill_headers(header_list):
+    """
+    Recorded [{"name", "value"}] pairs -> the dict route.fulfill takes, without losing repeated headers:
+    Set-Cookie values are joined with newlines (Playwright splits them back into separate headers),
+    other repeated headers with ", " (equivalent per RFC 9110).
+    """
+    headers = {}
+    names = {}
+    for header in header_list:
+        name = names.setdefault(header["name"].lower(), header["name"])
+        if name in headers:
+            headers[name] += ("\n" if name.lower() == "set-cookie" else ", ") + header["value"]
+        else:
+            headers[name] = header["value"]
+    return headers
+
+
+class PageArchive:
+    """Content-addressed body store plus one HAR-style manifest per analysed URL."""
+
+    def __init__(self, root=PAGE_ARCHIVE_DIR):
+        self.root = root
+
+    def blob_path(self, digest):
+        return os.path.join(self.root, "blobs", digest[:2], digest)
+
+    def manifest_path(self, url):
+        host = (urlsplit(url).hostname or "unknown").lower()
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.root, "sites", host, f"{key}.har.json")
+
+    def put_blob(self, body):
+        """Stores a body once per content hash. Returns (sha256, newly_stored)."""
+        digest = hashlib.sha256(body).hexdigest()
+        path = self.blob_path(digest)
+        if os.path.exists(path):
+            inc("page_archive_bytes_total", len(body), result="deduplicated")
+            return digest, False
+        write_atomic(path, body)
+        inc("page_archive_bytes_total", len(body), result="stored")
+        return digest, True
+
+    def get_blob(self, digest):
+        with open(self.blob_path(digest), "rb") as f:
+            return f.read()
+
+    def save_manifest(self, url, har):
+        write_atomic(self.manifest_path(url), json.dumps(har, separators=(",", ":")).encode("utf-8"))
+
+    def load_manifest(self, url):
+        try:
+            with open(self.manifest_path(url), "rb") as f:
+                return json.loads(f.read())
+        except FileNotFoundError:
+            return None
+
+    def list_archives(self):
+        """One summary per recorded URL: {"url", "site", "recorded_at", "entries", "bytes"}."""
+        archives = []
+        sites_dir = os.path.join(self.root, "sites")
+        if not os.path.isdir(sites_dir):
+            return archives
+        for site in sorted(os.listdir(sites_dir)):
+            for name in sorted(os.listdir(os.path.join(sites_dir, site))):
+                if not name.endswith(".har.json"):
+                    continue
+                with open(os.path.join(sites_dir, site, name), "rb") as f:
+                    log = json.loads(f.read())["log"]
+                page = (log.get("pages") or [{}])[0]
+                entries = log.get("entries") or []
+                archives.append({
+                    "url": page.get("title"), "site": site, "recorded_at": page.get("startedDateTime"),
+                    "entries": len(entries), "bytes": sum(entry["response"]["content"].get("size", 0) for entry in entries),
+                })
+        return archives
+
+    def stats(self):
+        """Totals across all archives; dedup_ratio = bytes referenced by manifests / bytes on disk."""
+        archives = self.list_archives()
+        blob_count, blob_bytes = 0, 0
+        blobs_dir = os.path.join(self.root, "blobs")
+        if os.path.isdir(blobs_dir):
+            for prefix in os.listdir(blobs_dir):
+                for name in os.listdir(os.path.join(blobs_dir, prefix)):
+                    blob_count += 1
+                    blob_bytes += os.path.getsize(os.path.join(blobs_dir, prefix, name))
+        referenced_bytes = sum(archive["bytes"] for archive in archives)
+        return {
+            "pages": len(archives), "sites": len({archive["site"] for archive in archives}),
+            "blobs": blob_count, "blob_bytes": blob_bytes, "referenced_bytes": referenced_bytes,
+            "dedup_ratio": round(referenced_bytes / blob_bytes, 2) if blob_bytes else None,
+        }
+
+
+class ArchiveSession:
+    """Record or replay for one analysis; shared by every browser context the request opens."""
+
+    def __init__(self, mode, url, archive=None):
+        self.mode = mode
+        self.url = url
+        self.archive = archive or PageArchive()
+        self._lock = threading.Lock()
+        self.counts = {"recorded": 0, "new_blobs": 0, "hits": 0, "misses": 0, "errors": 0}
+        self.started = time.time()
+        self.entries = []
+        if mode == "replay":
+            har = self.archive.load_manifest(url)
+            if har is None:
+                raise ArchiveNotFound(f"No page archive recorded for {url}; run once with archive=record first.")
+            page = (har["log"].get("pages") or [{}])[0]
+            self.captured_at_ms = page.get("_startedEpochMs") or int(self.started * 1000)
+            # Exact method+URL first; then the same URL without its query string (cache busters, timestamps)
+            self._exact, self._loose = {}, {}
+            for entry in har["log"]["entries"]:
+                request = entry["request"]
+                self._exact.setdefault((request["method"], request["url"]), []).append(entry)
+                self._loose.setdefault((request["method"], _url_without_query(request["url"])), []).append(entry)
+            self._served = {} # key -> how many times served (repeated requests get later recordings in order)
+
+    def attach(self, context):
+        """Routes all of a Playwright browser context's requests through this session."""
+        if self.mode == "replay":
+            context.add_init_script(script=f"({REPLAY_DETERMINISM_JS})({int(self.captured_at_ms)})")
+            context.route("**/*", self._replay)
+        else:
+            context.route("**/*", self._record)
+
+    def _record(self, route):
+        request = route.request
+        started = time.time()
+        try:
+            response = route.fetch(max_redirects=0)
+            body = response.body()
+        except Exception as e:
+            with self._lock:
+                self.counts["errors"] += 1
+                self.entries.append(self._entry(request, started, None, None, None, error=str(e)))
+            inc("page_archive_requests_total", mode="record", result="error")
+            route.abort()
+            return
+        digest, new_blob, stored = None, False, True
+        if len(body) <= MAX_ARCHIVED_BODY_BYTES:
+            try:
+                digest, new_blob = self.archive.put_blob(body)
+            except Exception as e:
+                # Disk full / permissions: the page must still get its response, or it hangs until
+                # the navigation timeout. The entry has no body digest, so replay treats it as a miss.
+                print(f"Page archive: could not store the body of {request.url}: {e}")
+                stored = False
+        with self._lock:
+            self.counts["recorded" if stored else "errors"] += 1
+            self.counts["new_blobs"] += int(new_blob)
+            self.entries.append(self._entry(request, started, response, body, digest))
+        inc("page_archive_requests_total", mode="record", result="recorded" if stored else "error")
+        route.fulfill(response=response, body=body)
+
+    @staticmethod
+    def _entry(request, started, response, body, digest, error=None):
+        entry = {
+            "startedDateTime": datetime.fromtimestamp(started, timezone.utc).isoformat(),
+            "time": round((time.time() - started) * 1000, 1),
+            "request": {"method": request.method, "url": request.url, "headers": request.headers_array(), "_resourceType": request.resource_type},
+            "response": {"status": 0, "statusText": "", "headers": [], "content": {"size": 0, "mimeType": ""}},
+        }
+        if error is not None:
+            entry["response"]["_error"] = error
+            return entry
+        headers = [header for header in response.headers_array if header["name"].lower() not in DROPPED_RESPONSE_HEADERS]
+        entry["response"] = {
+            "status": response.status, "statusText": response.status_text, "headers": headers,
+            "content": {"size": len(body), "mimeType": response.headers.get("content-type", ""), "_sha256": digest},
+        }
+        return entry
+
+    def _lookup(self, method, url):
+        with self._lock:
+            for table, key in ((self._exact, (method, url)), (self._loose, (method, _url_without_query(url)))):
+                entries = table.get(key)
+                if entries:
+                    served = self._served.get((id(table), key), 0)
+                    self._served[(id(table), key)] = served + 1
+                    return entries[min(served, len(entries) - 1)]
+        return None
+
+    def _replay(self, route):
+        request = route.request
+        entry = self._lookup(request.method, request.url)
+        response = entry["response"] if entry else None
+        if response is None or response.get("_error") or (response["content"].get("size") and not response["content"].get("_sha256")):
+            with self._lock:
+                self.counts["misses"] += 1
+            inc("page_archive_requests_total", mode="replay", result="miss")
+            route.abort("internetdisconnected") # never falls through to the network
+            return
+        digest = response["content"].get("_sha256")
+        body = self.archive.get_blob(digest) if digest else b""
+        with self._lock:
+            self.counts["hits"] += 1
+        inc("page_archive_requests_total", mode="replay", result="hit")
+        route.fulfill(status=response["status"], headers=_fulfill_headers(response["headers"]), body=body)
+
+    def finish(self):
+        """Writes the manifest (record mode) and returns a summary for the response."""
+        if self.mode == "record":
+            with self._lock:
+                entries = list(self.entries)
+            self.archive.save_manifest(self.url, {"log": {
+                "version": "1.2",
+                "creator": {"name": "calhacks-ai page_archive", "version": "1"},
+                "pages": [{"id": "page_1", "title": self.url, "startedDateTime": datetime.fromtimestamp(self.started, timezone.utc).isoformat(),
+                           "_startedEpochMs": int(self.started * 1000), "pageTimings": {}}],
+                "entries": entries,
+            }})
+        return {"mode": self.mode, **self.counts}
+
+
+def start_session(mode, url, archive=None):
+    """Sets (or clears, for "off") this request's archive session. Raises ArchiveNotFound for a replay without a recording."""
+    session = ArchiveSession(mode, url, archive) if mode != "off" else None
+    _current_session.set(session)
+    return session
+
+
+def current_session():
+    return _current_session.get()
@@ -0,0 +1,175 @@
+import threading
+
+from lazy_imports import lazy_import
+from image_utils import parse_css_color
+
+np = lazy_import("numpy")
+
+# In-memory nearest-neighbour index over saved branding palettes.
+# Palettes are stored in CIELAB (perceptual color space) as fixed-size arrays of
+# swatches + proportions, so a query is a couple of vectorized NumPy passes:
+#   1. a cheap lower bound (distance between proportion-weighted Lab centroids) over all palettes
+#   2. an approximate earth mover's distance (Sinkhorn) on candidates in lower-bound order, batch by
+#      batch, until the next bound is at least the current k-th distance: no unscored palette can
+#      beat the results, so the search is exact (with respect to the Sinkhorn distance)
+
+MAX_SWATCHES = 6          # palettes are truncated to their 6 largest swatches
+CANDIDATE_POOL = 32       # palettes scored with the full EMD per batch
+SINKHORN_ITERATIONS = 20
+SINKHORN_EPSILON = 4.0    # entropic regularization, in Lab distance units
+
+
+def srgb_to_lab(rgb):
+    """Converts an (..., 3) array of sRGB values (0-255) to CIELAB (D65)."""
+    rgb = np.asarray(rgb, dtype=np.float64) / 255.0
+    linear = np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    xyz = linear @ np.array([
+        [0.4124564, 0.2126729, 0.0193339],
+        [0.3575761, 0.7151522, 0.1191920],
+        [0.1804375, 0.0721750, 0.9503041],
+    ])
+    xyz = xyz / np.array([0.95047, 1.0, 1.08883])
+    delta = 6.0 / 29.0
+    f = np.where(xyz > delta ** 3, np.cbrt(xyz), xyz / (3 * delta ** 2) + 4.0 / 29.0)
+    L = 116.0 * f[..., 1] - 16.0
+    a = 500.0 * (f[..., 0] - f[..., 1])
+    b = 200.0 * (f[..., 1] - f[..., 2])
+    return np.stack([L, a, b], axis=-1)
+
+
+def palette_to_lab(palette):
+    """
+    Normalizes a palette into (lab_colors (MAX_SWATCHES, 3), weights (MAX_SWATCHES,)).
+    Accepts either a list of color strings (equal proportions, as saved by the extension)
+    or a list of {"color": ..., "proportion": ...} dicts (as returned by analyze_design).
+    Returns None if no color could be parsed.
+    """
+    swatches = []
+    for entry in palette or []:
+        if isinstance(entry, dict):
+            color, proportion = entry.get('color'), entry.get('proportion', 1.0)
+        else:
+            color, proportion = entry, 1.0
+        parsed = parse_css_color(color) if isinstance(color, str) else None
+        if parsed is None:
+            continue
+        try:
+            proportion = float(proportion)
+        except (TypeError, ValueError):
+            proportion = 1.0
+        if proportion > 0:
+            swatches.append((parsed[:3], proportion))
+    if not swatches:
+        return None
+
+    swatches.sort(key=lambda item: item[1], reverse=True)
+    swatches = swatches[:MAX_SWATCHES]
+    lab = np.zeros((MAX_SWATCHES, 3))
+    weights = np.zeros(MAX_SWATCHES)
+    lab[:len(swatches)] = srgb_to_lab([rgb for rgb, _ in swatches])
+    weights[:len(swatches)] = [p for _, p in swatches]
+    weights /= weights.sum()
+    return lab, weights
+
+
+def _batched_sinkhorn_emd(query_lab, query_weights, lab, weights):
+    """
+    Approximate earth mover's distance between one query palette and a batch of palettes.
+    query_lab: (S, 3), query_weights: (S,), lab: (M, S, 3), weights: (M, S). Returns (M,).
+    The Sinkhorn plan is rounded onto the exact marginals (Altschuler et al., 2017), so each value is
+    the cost of a feasible transport plan: never below the true EMD, and so never below the
+    centroid lower bound that PaletteIndex.search prunes with.
+    """
+    cost = np.sqrt(((query_lab[None, :, None, :] - lab[:, None, :, :]) ** 2).sum(axis=-1))  # (M, S, S)
+    kernel = np.exp(-cost / SINKHORN_EPSILON)
+    u = np.ones((lab.shape[0], query_lab.shape[0]))
+    v = np.ones_like(weights)
+    for _ in range(SINKHORN_ITERATIONS):
+        u = query_weights[None, :] / np.maximum((kernel @ v[:, :, None])[:, :, 0], 1e-300)
+        v = weights / np.maximum((u[:, None, :] @ kernel)[:, 0, :], 1e-300)
+    # Far-apart palettes underflow the kernel and blow up u/v; rounding below restores the marginals
+    transport = np.nan_to_num(u[:, :, None] * kernel * v[:, None, :], nan=0.0, posinf=0.0)
+    # Rounding: scale rows, then columns, down to their marginals and spread what is missing
+    rows = transport.sum(axis=2)
+    transport = transport * np.minimum(query_weights[None, :] / np.maximum(rows, 1e-300), 1.0)[:, :, None]
+    columns = transport.sum(axis=1)
+    transport = transport * np.minimum(weights / np.maximum(columns, 1e-300), 1.0)[:, None, :]
+    row_missing = np.maximum(query_weights[None, :] - transport.sum(axis=2), 0.0)
+    column_missing = np.maximum(weights - transport.sum(axis=1), 0.0)
+    missing = row_missing.sum(axis=1)
+    spread = np.where(missing > 1e-12, 1.0 / np.maximum(missing, 1e-12), 0.0)
+    transport = transport + row_missing[:, :, None] * column_missing[:, None, :] * spread[:, None, None]
+    return (transport * cost).sum(axis=(1, 2))
+
+
+class PaletteIndex:
+    """Append-only palette index supporting k-nearest-neighbour search by palette EMD."""
+
+    def __init__(self, initial_capacity=1024):
+        self._lock = threading.Lock()
+        self._lab = np.zeros((initial_capacity, MAX_SWATCHES, 3))
+        self._weights = np.zeros((initial_capacity, MAX_SWATCHES))
+        self._centroids = np.zeros((initial_capacity, 3), dtype=np.float32)
+        self._centroid_sq_norms = np.zeros(initial_capacity, dtype=np.float32)
+        self._entries = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, name, palette):
+        """Adds a palette to the index. Returns False if the palette has no parseable colors."""
+        converted = palette_to_lab(palette)
+        if converted is None:
+            return False
+        lab, weights = converted
+        with self._lock:
+            n = len(self._entries)
+            if n == self._lab.shape[0]:
+                # Grow by doubling so appends stay amortized O(1)
+                self._lab = np.concatenate([self._lab, np.zeros_like(self._lab)])
+                self._weights = np.concatenate([self._weights, np.zeros_like(self._weights)])
+                self._centroids = np.concatenate([self._centroids, np.zeros_like(self._centroids)])
+                self._centroid_sq_norms = np.concatenate([self._centroid_sq_norms, np.zeros_like(self._centroid_sq_norms)])
+            self._lab[n] = lab
+            self._weights[n] = weights
+            centroid = weights @ lab
+            self._centroids[n] = centroid
+            self._centroid_sq_norms[n] = centroid @ centroid
+            self._entries.append({"name": name, "palette": palette})
+        return True
+
+    def search(self, palette, k=5):
+        """Returns the k saved palettes closest to `palette`, each with its EMD distance."""
+        converted = palette_to_lab(palette)
+        if converted is None:
+            return []
+        query_lab, query_weights = converted
+        query_centroid = query_weights @ query_lab
+
+        with self._lock:
+            n = len(self._entries)
+            if n == 0:
+                return []
+            # The distance between weighted centroids is a lower bound on EMD with a Euclidean
+            # ground distance: |c - q|^2 = |c|^2 - 2 c.q + |q|^2, a single matvec over all palettes.
+            squared = self._centroid_sq_norms[:n] - 2.0 * (self._centroids[:n] @ query_centroid.astype(np.float32)) + float(query_centroid @ query_centroid)
+            lower_bounds = np.sqrt(np.maximum(squared, 0.0))
+            by_bound = np.argsort(lower_bounds)
+            batch = max(CANDIDATE_POOL, k)
+            candidates, distances = [], []
+            scored = 0
+            while scored < n:
+                ids = by_bound[scored:scored + batch]
+                candidates.append(ids)
+                distances.append(_batched_sinkhorn_emd(query_lab, query_weights, self._lab[ids], self._weights[ids]))
+                scored += len(ids)
+                if scored >= k and scored < n:
+                    kth = np.partition(np.concatenate(distances), k - 1)[k - 1]
+                    if lower_bounds[by_bound[scored]] >= kth:
+                        break # every remaining palette is at least this far away
+            candidates, distances = np.concatenate(candidates), np.concatenate(distances)
+            order = np.argsort(distances)[:k]
+            return [
+                {**self._entries[candidates[i]], "distance": round(float(distances[i]), 3)}
+                for i in order
+            ]
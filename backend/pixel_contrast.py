@@ -0,0 +1,229 @@
+from image_utils import image_from_bytes
+from lazy_imports import lazy_import
+from metrics import span
+
+np = lazy_import("numpy") # loaded on first use (see lazy_imports.py)
+
+# Text contrast measured on the rendered screenshot instead of the computed styles.
+#
+# The DOM checks take the text's CSS color and the first opaque backgroundColor up the tree, which
+# is wrong for text over hero images, gradients and positioned layers (and gives "black" when no
+# ancestor has a background). Here every text box is sampled in the screenshot instead, all boxes
+# at once with NumPy:
+#   1. a fixed jittered grid of SAMPLE_COLUMNS x SAMPLE_ROWS points per box (same offsets for every
+#      box, so one fancy-indexing gather reads all samples);
+#   2. per box, a 2-means split of the samples' relative luminance into ink and background
+#      (the cluster closer to the CSS text color is the ink; without one, the smaller cluster);
+#   3. ink = the INK_QUANTILE of the ink cluster away from the background (anti-aliased edges are
+#      blends, the glyph cores carry the real color), worst background = the BACKGROUND_QUANTILE of
+#      the background cluster towards the ink (the darkest part of a gradient behind dark text...),
+#      or of the box's top and bottom pixel rows when those come closer (background as dark as the
+#      text itself ends up in the ink cluster, but glyphs rarely reach the box's edges).
+# The reported contrast is the worst case (ink vs worst background), next to the typical one
+# (ink vs median background). Where no ink separates from the background (text as light as what
+# is behind it, or too thin for the grid) the CSS text color, when given, is measured against the
+# box's median pixel; without one the box comes back as None rather than as a guess.
+#
+# Element boxes are CSS px relative to the viewport the screenshot shows; the device pixel ratio
+# is inferred from the screenshot width (screenshot_scale) unless the caller passes one.
+
+SAMPLE_COLUMNS = 32
+SAMPLE_ROWS = 8
+MIN_BOX_PX = 4 # boxes thinner than this (in screenshot px) are not sampled
+MIN_VISIBLE_RATIO = 0.5 # at least this much of the box must be inside the screenshot
+MIN_INK_SAMPLES = 3
+MIN_SEPARATION_RATIO = 1.15 # ink vs background contrast below this = no visible text was sampled
+INK_QUANTILE = 0.2
+BACKGROUND_QUANTILE = 0.1
+KMEANS_ITERATIONS = 6
+COMMON_DEVICE_PIXEL_RATIOS = (1.0, 1.25, 1.5, 1.75, 2.0, 2.5, 3.0, 4.0)
+
+_luminance_table = None
+_sample_offsets = None
+
+
+def _luminance_lut():
+    """sRGB channel value (0-255) -> linear light, the WCAG 2.x relative luminance transfer."""
+    global _luminance_table
+    if _luminance_table is None:
+        values = np.arange(256, dtype=np.float64) / 255.0
+        _luminance_table = np.where(values <= 0.03928, values / 12.92, ((values + 0.055) / 1.055) ** 2.4).astype(np.float32)
+    return _luminance_table
+
+
+def _offsets():
+    """(P, 2) sample positions inside a unit box: one jittered point per grid cell, fixed seed."""
+    global _sample_offsets
+    if _sample_offsets is None:
+        rng = np.random.default_rng(0)
+        columns, rows = np.meshgrid(np.arange(SAMPLE_COLUMNS), np.arange(SAMPLE_ROWS))
+        jitter = rng.random((SAMPLE_ROWS * SAMPLE_COLUMNS, 2))
+        _sample_offsets = np.stack([(columns.ravel() + jitter[:, 0]) / SAMPLE_COLUMNS,
+                                    (rows.ravel() + jitter[:, 1]) / SAMPLE_ROWS], axis=1)
+    return _sample_offsets
+
+
+def screenshot_scale(image_width, key_elements):
+    """
+    Screenshot px per CSS px. The widest element starting at the viewport's left edge spans the
+    viewport (minus a scrollbar), so image width / its width is the device pixel ratio; snapped to
+    a common ratio when within 5%, 1.0 when nothing spans from the left edge.
+    """
+    widest = 0.0
+    for e in key_elements or []:
+        box = e.get('bounding_box') or {}
+        x, width = box.get('x') or 0, box.get('width') or 0
+        if abs(x) <= 1 and width <= image_width:
+            widest = max(widest, x + width)
+    if widest < image_width / 8:
+        return 1.0
+    ratio = image_width / widest
+    nearest = min(COMMON_DEVICE_PIXEL_RATIOS, key=lambda common: abs(common - ratio))
+    return nearest if abs(nearest - ratio) <= 0.05 * nearest else ratio
+
+
+def _contrast(a, b):
+    return (np.maximum(a, b) + 0.05) / (np.minimum(a, b) + 0.05)
+
+
+def _masked_quantile(order, mask, quantile, descending):
+    """
+    Per row, the column of the given quantile among the entries where `mask` is set; `order` is the
+    row-wise ascending argsort of the values, shared by every call. descending: quantile from the top.
+    """
+    sorted_mask = np.take_along_axis(mask, order, axis=1)
+    seen = np.cumsum(sorted_mask, axis=1)
+    counts = seen[:, -1]
+    rank = np.floor(quantile * np.maximum(counts - 1, 0)).astype(np.int64)
+    rank = np.where(descending, counts - 1 - rank, rank)
+    position = np.argmax(seen > rank[:, None], axis=1)
+    return np.take_along_axis(order, position[:, None], axis=1)[:, 0]
+
+
+def measure_text_contrast(image, boxes, text_colors=None, scale=1.0):
+    """
+    Samples each text box (CSS px [x, y, width, height]) in the RGB screenshot `image` (PIL or
+    array). text_colors: optional (r, g, b) per box (None where unknown), used to tell ink from
+    background. Returns one entry per box: None when it could not be measured, else
+    {"foreground": (r, g, b), "background": (r, g, b) at the worst spot, "contrast": worst-case
+    ratio, "typical_contrast": ratio against the median background, "ink_ratio": share of samples}.
+    """
+    results = [None] * len(boxes)
+    if image is None or not len(boxes):
+        return results
+    with span("pixel_contrast.sample"):
+        pixels = np.asarray(image, dtype=np.uint8)
+        height, width = pixels.shape[:2]
+        css = np.asarray(boxes, dtype=np.float64).reshape(-1, 4) * scale
+        x0, y0 = css[:, 0], css[:, 1]
+        x1, y1 = x0 + css[:, 2], y0 + css[:, 3]
+        cx0, cy0 = np.clip(x0, 0, width), np.clip(y0, 0, height)
+        cx1, cy1 = np.clip(x1, 0, width), np.clip(y1, 0, height)
+        visible = (cx1 - cx0) * (cy1 - cy0)
+        area = np.maximum(css[:, 2] * css[:, 3], 1e-9)
+        usable = ((cx1 - cx0) >= MIN_BOX_PX) & ((cy1 - cy0) >= MIN_BOX_PX) & (visible >= MIN_VISIBLE_RATIO * area)
+        rows = np.flatnonzero(usable)
+        if not len(rows):
+            return results
+
+        offsets = _offsets()
+        xs = (cx0[rows, None] + offsets[None, :, 0] * (cx1 - cx0)[rows, None]).astype(np.int64)
+        ys = (cy0[rows, None] + offsets[None, :, 1] * (cy1 - cy0)[rows, None]).astype(np.int64)
+        samples = pixels[np.minimum(ys, height - 1), np.minimum(xs, width - 1)] # (N, P, 3)
+        # The box's first and last pixel rows: glyphs rarely reach them, so they are background
+        edge_xs = np.minimum(xs[:, :SAMPLE_COLUMNS], width - 1)
+        edge_ys = np.concatenate([np.repeat(cy0[rows, None], SAMPLE_COLUMNS, axis=1),
+                                  np.repeat(np.ceil(cy1[rows, None]) - 1, SAMPLE_COLUMNS, axis=1)], axis=1).astype(np.int64)
+        edge_samples = pixels[np.clip(edge_ys, 0, height - 1), np.concatenate([edge_xs, edge_xs], axis=1)] # (N, 2C, 3)
+        lut = _luminance_lut()
+        luminance = 0.2126 * lut[samples[..., 0]] + 0.7152 * lut[samples[..., 1]] + 0.0722 * lut[samples[..., 2]]
+        edge_luminance = 0.2126 * lut[edge_samples[..., 0]] + 0.7152 * lut[edge_samples[..., 1]] + 0.0722 * lut[edge_samples[..., 2]]
+
+    with span("pixel_contrast.cluster"):
+        # 2-means on luminance, all boxes at once: start from each box's darkest and lightest sample
+        low, high = luminance.min(axis=1), luminance.max(axis=1)
+        for _ in range(KMEANS_ITERATIONS):
+            light = luminance > ((low + high) / 2)[:, None]
+            light_count = light.sum(axis=1)
+            dark_count = light.shape[1] - light_count
+            light_sum = np.where(light, luminance, 0).sum(axis=1)
+            dark_sum = luminance.sum(axis=1) - light_sum
+            high = np.where(light_count > 0, light_sum / np.maximum(light_count, 1), high)
+            low = np.where(dark_count > 0, dark_sum / np.maximum(dark_count, 1), low)
+        light = luminance > ((low + high) / 2)[:, None]
+        light_count = light.sum(axis=1)
+
+        # Which cluster is the ink: the one nearer the CSS text color, else the smaller one
+        ink_is_light = light_count < light.shape[1] - light_count
+        text_luminance = np.full(len(rows), np.nan, dtype=np.float32)
+        if text_colors is not None:
+            known = np.array([text_colors[row] is not None for row in rows], dtype=bool)
+            if known.any():
+                text_rgb = np.array([text_colors[row][:3] for row in rows[known]], dtype=np.int64)
+                text_luminance[known] = 0.2126 * lut[text_rgb[:, 0]] + 0.7152 * lut[text_rgb[:, 1]] + 0.0722 * lut[text_rgb[:, 2]]
+                ink_is_light[known] = np.abs(text_luminance[known] - high[known]) < np.abs(text_luminance[known] - low[known])
+        ink = light == ink_is_light[:, None]
+        ink_count = ink.sum(axis=1)
+
+        # Ink core: away from the background; worst background: towards the ink
+        order = np.argsort(luminance, axis=1)
+        background = ~ink
+        ink_index = _masked_quantile(order, ink, INK_QUANTILE, descending=ink_is_light)
+        worst_index = _masked_quantile(order, background, BACKGROUND_QUANTILE, descending=ink_is_light)
+        median_index = _masked_quantile(order, background, 0.5, descending=False)
+        positions = np.arange(len(rows))
+        ink_luminance = luminance[positions, ink_index]
+        worst_luminance = luminance[positions, worst_index]
+        worst_rgb = samples[positions, worst_index]
+        # Background that looks like the ink (a gradient passing through the text color) is clustered
+        # with the ink; the edge rows still show it
+        edge_index = _masked_quantile(np.argsort(edge_luminance, axis=1), np.ones(edge_luminance.shape, dtype=bool),
+                                      BACKGROUND_QUANTILE, descending=ink_is_light)
+        edge_worst = edge_luminance[positions, edge_index]
+        use_edge = np.abs(edge_worst - ink_luminance) < np.abs(worst_luminance - ink_luminance)
+        worst_luminance = np.where(use_edge, edge_worst, worst_luminance)
+        worst_rgb = np.where(use_edge[:, None], edge_samples[positions, edge_index], worst_rgb)
+        contrast = _contrast(ink_luminance, worst_luminance)
+        typical = _contrast(ink_luminance, luminance[positions, median_index])
+        separated = _contrast(low, high) >= MIN_SEPARATION_RATIO
+        measured = separated & (ink_count >= MIN_INK_SAMPLES) & (ink_count < ink.shape[1])
+        # No ink stands out (text as light/dark as what is behind it, or too thin for the grid):
+        # with a CSS text color that color is the ink, measured against the median of the box
+        uniform = ~measured & ~np.isnan(text_luminance)
+        if uniform.any():
+            all_samples = np.ones_like(ink)
+            median_all = _masked_quantile(order, all_samples, 0.5, descending=False)
+            contrast = np.where(uniform, _contrast(text_luminance, luminance[positions, median_all]), contrast)
+            typical = np.where(uniform, contrast, typical)
+            worst_rgb = np.where(uniform[:, None], samples[positions, median_all], worst_rgb)
+
+    ink_rgb = samples[positions, ink_index]
+    ink_ratio = ink_count / ink.shape[1]
+    for position in np.flatnonzero(measured | uniform):
+        row = rows[position]
+        results[row] = {
+            "foreground": tuple(int(value) for value in (text_colors[row][:3] if uniform[position] else ink_rgb[position])),
+            "background": tuple(int(value) for value in worst_rgb[position]),
+            "contrast": round(float(contrast[position]), 2),
+            "typical_contrast": round(float(typical[position]), 2),
+            "ink_ratio": 0.0 if uniform[position] else round(float(ink_ratio[position]), 3),
+        }
+    return results
+
+
+def measure_elements_contrast(screenshot_bytes, key_elements, indices, text_colors=None, scale=None):
+    """measure_text_contrast() for key_elements[i], i in indices, on the decoded screenshot; {} without one."""
+    if not screenshot_bytes or not indices:
+        return {}
+    with span("pixel_contrast.decode"):
+        image = image_from_bytes(screenshot_bytes)
+    if image is None:
+        return {}
+    if scale is None:
+        scale = screenshot_scale(image.size[0], key_elements)
+    boxes = []
+    for i in indices:
+        box = key_elements[i].get('bounding_box') or {}
+        boxes.append([box.get('x') or 0, box.get('y') or 0, box.get('width') or 0, box.get('height') or 0])
+    measurements = measure_text_contrast(image, boxes, text_colors=text_colors, scale=scale)
+    return {i: measurement for i, measurement in zip(indices, measurements) if measurement is not None}
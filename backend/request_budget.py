@@ -0,0 +1,101 @@
+import contextvars
+import os
+import time
+
+from metrics import inc
+
+# Request-level latency budget (POST /api/analyze-website?budget_ms=5000), enforced cooperatively.
+#
+# app.py starts a budget for each full analysis; submit_with_context copies it into the agent
+# threads. Before an optional stage (extra viewports, Gemini calls, below-the-fold contrast) an
+# agent asks budget_allows(stage, estimated_ms): when less time than the estimate is left, the
+# stage is skipped and recorded, and the agent labels its result partial. A stage that has started
+# is never interrupted; its timeouts are capped via budget_timeout_ms() instead, and whatever time
+# is spent past the deadline is reported as an overrun (budget summary + budget_overruns_total).
+
+ANALYSIS_BUDGET_MS = int(os.getenv("ANALYSIS_BUDGET_MS", "90000")) # default for full analyses; 0 = unbounded
+BUDGET_GRACE_MS = int(os.getenv("BUDGET_GRACE_MS", "1000")) # how long app.py waits for an agent past the deadline
+
+# Time each optional stage is expected to need (the estimated_ms agents pass to budget_allows):
+# the stage only starts if at least this much of the budget is left.
+LLM_ESTIMATE_MS = 3000 # design / workflow Gemini analysis
+LLM_FOLLOWUP_ESTIMATE_MS = 2000 # follow-up call for fields missing from the first answer
+VIEWPORT_CHECK_ESTIMATE_MS = 800 # one extra device viewport in the responsive checks
+CONTRAST_BELOW_FOLD_ESTIMATE_MS = 1500 # contrast of elements below the first viewport
+
+_current_budget = contextvars.ContextVar("request_budget", default=None)
+
+
+class RequestBudget:
+    """Deadline for one request plus the stages skipped to meet it."""
+
+    def __init__(self, budget_ms):
+        self.budget_ms = budget_ms
+        self.start = time.perf_counter()
+        self.deadline = self.start + budget_ms / 1000.0
+        self.skipped_stages = [] # list.append is atomic, so agent threads can share it
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.start) * 1000
+
+    def remaining_ms(self):
+        return max(0.0, (self.deadline - time.perf_counter()) * 1000)
+
+    def skip(self, stage):
+        self.skipped_stages.append(stage)
+        inc("budget_skipped_stages_total", stage=stage)
+        print(f"Budget: skipping {stage} ({self.remaining_ms():.0f}ms of {self.budget_ms}ms left)")
+
+    def allows(self, stage, estimated_ms=0):
+        """True if `stage` (expected to take estimated_ms) still fits; otherwise records it as skipped."""
+        if self.remaining_ms() >= estimated_ms:
+            return True
+        self.skip(stage)
+        return False
+
+    def wait_timeout_seconds(self):
+        """How long a caller should wait for work started under this budget (remaining time + grace)."""
+        return (self.remaining_ms() + BUDGET_GRACE_MS) / 1000.0
+
+    def summary(self):
+        elapsed_ms = self.elapsed_ms()
+        return {
+            "budget_ms": self.budget_ms,
+            "elapsed_ms": round(elapsed_ms, 1),
+            "overrun_ms": round(max(0.0, elapsed_ms - self.budget_ms), 1),
+            "skipped_stages": list(self.skipped_stages),
+            "partial": bool(self.skipped_stages),
+        }
+
+
+def start_budget(budget_ms):
+    """Starts the current request's budget (None/0 = unbounded). Returns the RequestBudget or None."""
+    budget = RequestBudget(budget_ms) if budget_ms else None
+    _current_budget.set(budget)
+    return budget
+
+
+def current_budget():
+    return _current_budget.get()
+
+
+def budget_allows(stage, estimated_ms=0):
+    """Cooperative check before an optional stage; always True without a budget."""
+    budget = _current_budget.get()
+    return budget is None or budget.allows(stage, estimated_ms)
+
+
+def budget_timeout_ms(default_ms, minimum_ms=1000):
+    """A stage's timeout capped to the time left (but never below minimum_ms)."""
+    budget = _current_budget.get()
+    if budget is None:
+        return default_ms
+    return min(default_ms, max(minimum_ms, int(budget.remaining_ms())))
+
+
+def skipped_stages(prefix):
+    """Stages with the given prefix (e.g. "design.") skipped so far in the current request."""
+    budget = _current_budget.get()
+    if budget is None:
+        return []
+    return [stage for stage in budget.skipped_stages if stage.startswith(prefix)]
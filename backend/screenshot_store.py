@@ -0,0 +1,317 @@
+import base64
+import hashlib
+import io
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from lazy_imports import lazy_import
+from metrics import inc, span
+from screenshot_tiles import ScreenshotTiles
+from utils import image_format, write_atomic
+
+Image = lazy_import("PIL.Image")
+
+# Content-addressed store for screenshots and screenshot tiles.
+#
+#   screenshot_store/ab/abcdef....webp    one file per SHA-256 of the bytes the client uploaded
+#
+# The name is the hash of the original upload (what the extension hashes before sending), so an
+# identical capture is stored once however often it is analysed, and a client that already uploaded
+# it can send {"screenshot_sha256": ...} instead of the base64 (see app.analyze_website; an unknown
+# hash gets a 404 with "missing_screenshot" and the client re-sends the bytes).
+#
+# New blobs are written as uploaded; a background thread then replaces them with a derivative in
+# SCREENSHOT_STORE_FORMAT when that is smaller:
+#   webp      lossless WebP (default): pixel-identical, so pixel contrast and palettes are unchanged
+#   avif      lossy AVIF at SCREENSHOT_AVIF_QUALITY: smallest, but pixel measurements become approximate
+#   original  keep the uploaded bytes
+# The hash keeps naming the original bytes; a read returns the derivative (every consumer decodes
+# with Pillow, and utils.get_image_parts labels it with its real MIME type).
+#
+# Reads refresh the file's mtime (at most once per TOUCH_INTERVAL_SECONDS), which makes mtime the
+# LRU clock: when the store grows past SCREENSHOT_STORE_MAX_BYTES the least recently used blobs
+# are deleted until it is back under SCREENSHOT_STORE_GC_TARGET of the limit. Each worker process
+# tracks its own writes between collections; a collection re-measures the directory.
+#
+# Replaces the old backend/screenshots/ folder of PNGs named after sanitized URLs; import it with
+#   python backend/screenshot_store.py import backend/screenshots
+
+SCREENSHOT_STORE_ENABLED = os.getenv("SCREENSHOT_STORE_ENABLED", "1") != "0"
+SCREENSHOT_STORE_DIR = os.getenv("SCREENSHOT_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "screenshot_store"))
+SCREENSHOT_STORE_MAX_BYTES = int(os.getenv("SCREENSHOT_STORE_MAX_BYTES", str(512 * 1024 * 1024)))
+SCREENSHOT_STORE_GC_TARGET = 0.8 # a collection frees space down to this share of the limit
+SCREENSHOT_STORE_FORMAT = os.getenv("SCREENSHOT_STORE_FORMAT", "webp")
+SCREENSHOT_AVIF_QUALITY = int(os.getenv("SCREENSHOT_AVIF_QUALITY", "80"))
+STORE_FORMATS = ("webp", "avif", "original")
+TOUCH_INTERVAL_SECONDS = 60
+# Lookup order: derivatives first (they replace the original once written)
+BLOB_EXTENSIONS = ("webp", "avif", "png", "jpeg", "gif")
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+def is_digest(value):
+    return isinstance(value, str) and DIGEST_PATTERN.match(value) is not None
+
+
+class ScreenshotStore:
+    """Hash-named screenshot blobs with background derivatives and size-bounded LRU collection."""
+
+    def __init__(self, root=SCREENSHOT_STORE_DIR, max_bytes=SCREENSHOT_STORE_MAX_BYTES, store_format=SCREENSHOT_STORE_FORMAT):
+        if store_format not in STORE_FORMATS:
+            raise ValueError(f"Unknown screenshot store format '{store_format}'. Use one of: {', '.join(STORE_FORMATS)}")
+        self.root = root
+        self.max_bytes = max_bytes
+        self.store_format = store_format
+        self._lock = threading.Lock()
+        self._disk_bytes = None # measured on first write
+        self._executor = None
+        self._executor_pid = None
+
+    def blob_path(self, digest, extension):
+        return os.path.join(self.root, digest[:2], f"{digest}.{extension}")
+
+    def find(self, digest):
+        """Path of the stored blob for `digest`, or None."""
+        if not is_digest(digest):
+            return None
+        for extension in BLOB_EXTENSIONS:
+            path = self.blob_path(digest, extension)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def contains(self, digest):
+        return self.find(digest) is not None
+
+    @staticmethod
+    def _touch(path):
+        try:
+            if time.time() - os.stat(path).st_mtime > TOUCH_INTERVAL_SECONDS:
+                os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    # --- Writing ---
+    def put(self, data):
+        """Stores screenshot bytes once per content hash. Returns (sha256, newly_stored)."""
+        digest = hashlib.sha256(data).hexdigest()
+        existing = self.find(digest)
+        if existing is not None:
+            self._touch(existing)
+            inc("screenshot_store_bytes_total", len(data), result="deduplicated")
+            return digest, False
+        extension = image_format(data) or "png"
+        path = self.blob_path(digest, extension)
+        with span("screenshot_store.write"):
+            write_atomic(path, data)
+        inc("screenshot_store_bytes_total", len(data), result="stored")
+        self._add_disk_bytes(len(data))
+        if self.store_format != "original" and extension not in ("webp", "avif"):
+            self._submit(self._write_derivative, digest, path)
+        return digest, True
+
+    def put_base64(self, screenshot_base64):
+        """put() for the API's base64 screenshots; returns (sha256, newly_stored) or (None, False) if undecodable."""
+        try:
+            data = base64.b64decode(screenshot_base64)
+        except Exception as e:
+            print(f"Error decoding screenshot for the screenshot store: {e}")
+            return None, False
+        return self.put(data)
+
+    def _submit(self, fn, *args):
+        # One background thread per process: derivative encoding never runs on the request path
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="screenshot-store")
+                self._executor_pid = os.getpid()
+            executor = self._executor
+        return executor.submit(fn, *args)
+
+    def encode_derivative(self, data):
+        """The SCREENSHOT_STORE_FORMAT encoding of `data` as (extension, bytes)."""
+        image = Image.open(io.BytesIO(data))
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+        buffer = io.BytesIO()
+        if self.store_format == "avif":
+            image.save(buffer, "AVIF", quality=SCREENSHOT_AVIF_QUALITY)
+        else:
+            # method 4 is libwebp's default effort; higher methods save a few % for 2-3x the time
+            image.save(buffer, "WEBP", lossless=True, method=4)
+        return self.store_format, buffer.getvalue()
+
+    def _write_derivative(self, digest, path):
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            with span("screenshot_store.derivative"):
+                extension, derivative = self.encode_derivative(data)
+            if len(derivative) >= len(data):
+                return False
+            write_atomic(self.blob_path(digest, extension), derivative)
+            os.remove(path)
+            inc("screenshot_store_bytes_total", len(data) - len(derivative), result="derivative_saved")
+            self._add_disk_bytes(len(derivative) - len(data))
+            return True
+        except FileNotFoundError:
+            return False # collected before the derivative was written
+        except Exception as e:
+            print(f"Error writing screenshot derivative for {digest}: {e}")
+            return False
+
+    # --- Reading ---
+    def get(self, digest):
+        """Stored bytes for `digest` (the derivative once written), or None if unknown/collected."""
+        for _ in range(2): # the original can be swapped for its derivative between find() and open()
+            path = self.find(digest)
+            if path is None:
+                break
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+            self._touch(path)
+            inc("screenshot_store_requests_total", result="hit")
+            return data
+        inc("screenshot_store_requests_total", result="miss")
+        return None
+
+    def get_base64(self, digest):
+        data = self.get(digest)
+        return base64.b64encode(data).decode("ascii") if data is not None else None
+
+    # --- Tiles ---
+    def put_tiles(self, tiles):
+        """Stores every tile of a ScreenshotTiles; returns a manifest that load_tiles() turns back into one."""
+        return {
+            "width": tiles.width, "page_height": tiles.page_height, "captured_height": tiles.captured_height,
+            "tiles": [{"y": tile["y"], "height": tile["height"], "sha256": self.put(tile["png"])[0]} for tile in tiles.tiles],
+        }
+
+    def load_tiles(self, manifest):
+        """
+        ScreenshotTiles from a manifest whose tiles carry "sha256" or inline "png_base64" (stored on the way).
+        Returns (tiles, missing_digests); tiles is None when any referenced tile is unknown.
+        """
+        tiles = ScreenshotTiles(manifest["width"], manifest["page_height"], manifest["captured_height"])
+        missing = []
+        for tile in manifest.get("tiles") or []:
+            if tile.get("png_base64"):
+                data = base64.b64decode(tile["png_base64"])
+                digest = self.put(data)[0]
+            else:
+                digest = tile.get("sha256")
+                data = self.get(digest)
+                if data is None:
+                    missing.append(digest)
+                    continue
+            tiles.add(tile["y"], tile["height"], data, sha256=digest)
+        return (None, missing) if missing else (tiles, [])
+
+    # --- Garbage collection ---
+    def _blobs(self):
+        """[(mtime, size, path)] for every blob on disk."""
+        blobs = []
+        if not os.path.isdir(self.root):
+            return blobs
+        for prefix in os.scandir(self.root):
+            if not prefix.is_dir():
+                continue
+            for entry in os.scandir(prefix.path):
+                if entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                blobs.append((stat.st_mtime, stat.st_size, entry.path))
+        return blobs
+
+    def _add_disk_bytes(self, delta):
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._blobs())
+            else:
+                self._disk_bytes += delta
+            over_limit = self.max_bytes > 0 and self._disk_bytes > self.max_bytes
+        if over_limit:
+            self.collect_garbage()
+
+    def collect_garbage(self, target_bytes=None):
+        """Deletes least recently used blobs until the store is under target_bytes. Returns the number deleted."""
+        target_bytes = int(self.max_bytes * SCREENSHOT_STORE_GC_TARGET) if target_bytes is None else target_bytes
+        with self._lock, span("screenshot_store.gc"):
+            blobs = sorted(self._blobs())
+            total = sum(size for _, size, _ in blobs)
+            deleted = freed = 0
+            for _, size, path in blobs:
+                if total - freed <= target_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass # another worker collected it
+                deleted += 1
+                freed += size
+            self._disk_bytes = total - freed
+        if deleted:
+            inc("screenshot_store_bytes_total", freed, result="collected")
+            print(f"Screenshot store: collected {deleted} blobs ({freed} bytes), {self._disk_bytes} bytes left")
+        return deleted
+
+    def stats(self):
+        blobs = self._blobs()
+        by_format = {}
+        for _, size, path in blobs:
+            extension = path.rsplit(".", 1)[-1]
+            counts = by_format.setdefault(extension, {"blobs": 0, "bytes": 0})
+            counts["blobs"] += 1
+            counts["bytes"] += size
+        total = sum(size for _, size, _ in blobs)
+        with self._lock:
+            self._disk_bytes = total
+        return {"blobs": len(blobs), "bytes": total, "max_bytes": self.max_bytes, "format": self.store_format, "by_format": by_format}
+
+    def disk_bytes(self):
+        """This process's running estimate (measured on first use)."""
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._blobs())
+            return self._disk_bytes
+
+    def import_directory(self, path, remove=False):
+        """Stores every image file in `path` (e.g. the legacy screenshots/ folder). Returns {filename: sha256}."""
+        imported = {}
+        for name in sorted(os.listdir(path)):
+            file_path = os.path.join(path, name)
+            if not os.path.isfile(file_path):
+                continue
+            with open(file_path, "rb") as f:
+                data = f.read()
+            if image_format(data) is None:
+                continue
+            imported[name] = self.put(data)[0]
+            if remove:
+                os.remove(file_path)
+        return imported
+
+
+if __name__ == "__main__":
+    # python screenshot_store.py import <dir> [--remove]   |   python screenshot_store.py gc   |   python screenshot_store.py stats
+    import json
+    store = ScreenshotStore()
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if command == "import":
+        result = store.import_directory(sys.argv[2], remove="--remove" in sys.argv)
+        if store._executor is not None:
+            store._executor.shutdown(wait=True) # let the derivatives finish before exiting
+        print(json.dumps(result, indent=2))
+    elif command == "gc":
+        print(f"Deleted {store.collect_garbage()} blobs")
+    print(json.dumps(store.stats(), indent=2))
@@ -0,0 +1,121 @@
+import base64
+import hashlib
+import os
+
+from image_utils import image_from_bytes
+from metrics import span, observe
+
+# Viewport-tiled screenshot capture for the Playwright collector.
+#
+# page.screenshot(full_page=True) on an infinite-scroll or very long page produces one giant
+# image (tens of thousands of px tall) that is base64-encoded in memory and that no agent
+# needs in full. In "tiles" mode the page is instead captured as viewport-sized PNG tiles,
+# top to bottom, up to SCREENSHOT_MAX_PAGE_HEIGHT px and SCREENSHOT_MAX_TILES tiles.
+# Tiles stay PNG-encoded; a tile is only decoded to pixels when something asks for it.
+#
+# Set SCREENSHOT_CAPTURE_MODE=full_page to go back to a single full-page capture.
+
+SCREENSHOT_CAPTURE_MODE = os.getenv("SCREENSHOT_CAPTURE_MODE", "tiles")
+SCREENSHOT_MAX_PAGE_HEIGHT = int(os.getenv("SCREENSHOT_MAX_PAGE_HEIGHT", "8000"))
+SCREENSHOT_MAX_TILES = int(os.getenv("SCREENSHOT_MAX_TILES", "8"))
+DEFAULT_VIEWPORT = {"width": 1280, "height": 720} # Playwright's default when the page has none set
+
+# Tags whose position decides which tiles the design agent's prompt needs
+PROMINENT_TAGS = {'H1', 'H2', 'BUTTON', 'IMG'}
+
+
+class ScreenshotTiles:
+    """Encoded viewport tiles of one page, top to bottom. Decoding is lazy and per tile."""
+
+    def __init__(self, width, page_height, captured_height):
+        self.width = width
+        self.page_height = page_height
+        self.captured_height = captured_height
+        self.tiles = [] # [{"y": top px, "height": px, "png": bytes, "sha256": hex digest}]
+
+    def add(self, y, height, png_bytes, sha256=None):
+        """sha256 is the digest of the tile as captured/uploaded (its screenshot_store.py key), when
+        png_bytes may be a re-encoded copy of it; by default it is computed from png_bytes."""
+        self.tiles.append({"y": y, "height": height, "png": png_bytes, "sha256": sha256 or hashlib.sha256(png_bytes).hexdigest()})
+
+    def __len__(self):
+        return len(self.tiles)
+
+    @property
+    def truncated(self):
+        return self.captured_height < self.page_height
+
+    @property
+    def encoded_bytes(self):
+        return sum(len(tile["png"]) for tile in self.tiles)
+
+    def tile_bytes(self, index):
+        return self.tiles[index]["png"]
+
+    def tile_base64(self, index):
+        return base64.b64encode(self.tiles[index]["png"]).decode('utf-8')
+
+    def image(self, index):
+        """Decodes one tile to an RGB PIL image (not cached: callers keep it only as long as needed)."""
+        return image_from_bytes(self.tiles[index]["png"])
+
+    def tile_index_at(self, y):
+        """Index of the tile covering page coordinate y, or None if y is outside the captured area."""
+        for index, tile in enumerate(self.tiles):
+            if tile["y"] <= y < tile["y"] + tile["height"]:
+                return index
+        return None
+
+    def fingerprint(self):
+        # Over the tiles' content digests, not their bytes: tiles sent by hash come back from the
+        # screenshot store as WebP derivatives, and must fingerprint like the same tiles sent inline
+        digest = hashlib.sha256()
+        for tile in self.tiles:
+            digest.update(tile["sha256"].encode("ascii"))
+        return digest.hexdigest()
+
+    def summary(self):
+        return {
+            "tiles": len(self.tiles),
+            "tile_height": self.tiles[0]["height"] if self.tiles else 0,
+            "page_height": self.page_height,
+            "captured_height": self.captured_height,
+            "truncated": self.truncated,
+            "encoded_bytes": self.encoded_bytes,
+        }
+
+
+def capture_screenshot_tiles(page, max_page_height=SCREENSHOT_MAX_PAGE_HEIGHT, max_tiles=SCREENSHOT_MAX_TILES):
+    """Captures the page as viewport-sized tiles (see module comment) and returns a ScreenshotTiles."""
+    viewport = page.viewport_size or DEFAULT_VIEWPORT
+    tile_height = viewport["height"]
+    page_height = page.evaluate("() => Math.max(document.documentElement.scrollHeight, document.body ? document.body.scrollHeight : 0)")
+    captured_height = max(1, min(page_height, max_page_height, tile_height * max_tiles))
+
+    tiles = ScreenshotTiles(viewport["width"], page_height, captured_height)
+    for y in range(0, captured_height, tile_height):
+        height = min(tile_height, captured_height - y)
+        with span("browser.screenshot_tile"):
+            # full_page=True lets the clip address page coordinates below the current viewport
+            png_bytes = page.screenshot(clip={"x": 0, "y": y, "width": viewport["width"], "height": height}, full_page=True)
+        tiles.add(y, height, png_bytes)
+    observe("payload_bytes", tiles.encoded_bytes, kind="playwright_screenshot_tiles")
+    return tiles
+
+
+def select_prompt_tiles(tiles, key_elements, max_tiles=2):
+    """
+    Picks the tiles worth sending to the LLM: always the first (above the fold), then the tiles
+    holding the most prominent elements (headings, buttons, images). Returns sorted tile indices.
+    """
+    if not tiles:
+        return []
+    counts = {}
+    for e in key_elements or []:
+        if e.get('tag_name') not in PROMINENT_TAGS:
+            continue
+        index = tiles.tile_index_at((e.get('bounding_box') or {}).get('y', -1))
+        if index:
+            counts[index] = counts.get(index, 0) + 1
+    ranked = sorted(counts, key=lambda index: (-counts[index], index))
+    return sorted([0] + ranked[:max(0, max_tiles - 1)])
@@ -0,0 +1,110 @@
+"""
+Pre-fork multi-process launcher for the backend.
+
+    python backend/serve.py --workers 4 --port 5000
+
+The parent binds the listening socket once and forks N workers that all accept on it,
+so CPU-heavy work (lxml, base64/PIL, DOM heuristics) scales across cores instead of
+queueing behind one interpreter's GIL. Each worker imports the app after the fork, so it
+gets its own Playwright browser (browser_pool.py) and Gemini client; the result cache,
+saved palettes and rate limits live in the shared SQLite store (shared_store.py).
+Dead workers are restarted. Linux/macOS only (uses os.fork).
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def run_worker(listen_fd, host, port):
+    # Imported here, after the fork: no browser, grpc channel or thread is shared with the parent
+    from werkzeug.serving import make_server
+    import app as backend_app
+
+    server = make_server(host, port, backend_app.app, threaded=True, fd=listen_fd)
+    print(f"Worker {os.getpid()}: serving on http://{host}:{port}")
+    # Browser, Gemini client and heavy imports load in the background; requests are accepted right away
+    if backend_app.warmup.WARMUP_ON_START:
+        backend_app.warmup.start()
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        server.serve_forever()
+    finally:
+        from browser_pool import shutdown
+        shutdown()
+
+
+def spawn_worker(listen_fd, host, port):
+    pid = os.fork()
+    if pid == 0:
+        exit_code = 0
+        try:
+            run_worker(listen_fd, host, port)
+        except SystemExit:
+            pass
+        except Exception as e:
+            print(f"Worker {os.getpid()} crashed: {e}")
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--backlog", type=int, default=256)
+    args = parser.parse_args()
+
+    listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listen_socket.bind((args.host, args.port))
+    listen_socket.listen(args.backlog)
+    listen_socket.set_inheritable(True)
+    listen_fd = listen_socket.fileno()
+
+    # Workers size their admission control (admission.py) from their share of the machine's memory
+    os.environ["SERVE_WORKERS"] = str(args.workers)
+    workers = {spawn_worker(listen_fd, args.host, args.port) for _ in range(args.workers)}
+    print(f"Pre-fork server: {args.workers} workers on http://{args.host}:{args.port} (pids {sorted(workers)})")
+
+    shutting_down = False
+
+    def stop(signum, frame):
+        nonlocal shutting_down
+        shutting_down = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        workers.discard(pid)
+        if not shutting_down:
+            print(f"Worker {pid} exited (status {status}); restarting.")
+            time.sleep(0.5) # avoid a hot restart loop if workers crash on startup
+            workers.add(spawn_worker(listen_fd, args.host, args.port))
+
+    listen_socket.close()
+
+
+if __name__ == "__main__":
+    main()
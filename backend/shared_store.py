@@ -0,0 +1,110 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+
+# Small SQLite-backed store shared by every worker process on the box (see serve.py).
+# Holds the analysis result cache, saved branding palettes and rate-limit counters, so
+# running several workers behaves the same as running one.
+# WAL mode lets readers proceed while another process writes.
+
+SHARED_STORE_PATH = os.getenv(
+    "SHARED_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "shared_store.sqlite3"),
+)
+EXPIRED_CLEANUP_PROBABILITY = 0.01 # fraction of writes that also purge expired rows
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL
+);
+CREATE TABLE IF NOT EXISTS counters (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS palettes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    palette TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+class SharedStore:
+    """Process- and thread-safe key/value cache, window counters and palette storage."""
+
+    def __init__(self, path=SHARED_STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self):
+        # sqlite3 connections must not cross threads or forks: one per (thread, pid)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _maybe_purge_expired(self, conn, now):
+        if random.random() < EXPIRED_CLEANUP_PROBABILITY:
+            conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at < ?", (now,))
+            conn.execute("DELETE FROM counters WHERE expires_at < ?", (now,))
+
+    # --- Key/value cache ---
+    def get_json(self, key):
+        """Returns the cached JSON value for key, or None if missing/expired."""
+        row = self._conn().execute("SELECT value, expires_at FROM kv WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return json.loads(row[0])
+
+    def set_json(self, key, value, ttl_seconds=None):
+        now = time.time()
+        expires_at = now + ttl_seconds if ttl_seconds else None
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (key, json.dumps(value), expires_at),
+        )
+        self._maybe_purge_expired(conn, now)
+
+    # --- Fixed-window counters (rate limiting) ---
+    def incr_window(self, key, window_seconds):
+        """Increments the counter for key in the current time window and returns its new value."""
+        now = time.time()
+        window_start = int(now // window_seconds) * window_seconds
+        window_key = f"{key}:{window_start}"
+        conn = self._conn()
+        row = conn.execute(
+            "INSERT INTO counters (key, value, expires_at) VALUES (?, 1, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = value + 1 RETURNING value",
+            (window_key, window_start + window_seconds),
+        ).fetchone()
+        self._maybe_purge_expired(conn, now)
+        return row[0]
+
+    # --- Branding palettes ---
+    def add_palette(self, name, palette):
+        cursor = self._conn().execute(
+            "INSERT INTO palettes (name, palette, created_at) VALUES (?, ?, ?)",
+            (name, json.dumps(palette), time.time()),
+        )
+        return cursor.lastrowid
+
+    def list_palettes(self, after_id=0):
+        """Returns [(id, name, palette)] for palettes with id > after_id, oldest first."""
+        rows = self._conn().execute(
+            "SELECT id, name, palette FROM palettes WHERE id > ? ORDER BY id", (after_id,)
+        ).fetchall()
+        return [(row_id, name, json.loads(palette)) for row_id, name, palette in rows]
@@ -0,0 +1,115 @@
+import copy
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from metrics import inc, observe
+
+# In-flight request coalescing ("single flight"): while an analysis for a key is running, identical
+# requests attach to it instead of starting their own pipeline (browser visit, Gemini calls), and
+# all of them get its result.
+#
+#   results, info = flights.run(key, lambda on_item: analyse(..., on_item=on_item), on_item=my_on_item)
+#
+# The first caller ("leader") runs the function; callers that arrive while it runs ("followers")
+# wait for it. Streamed items (on_item events) are fanned out to every attached caller, and a late
+# follower first gets the items published before it joined, so a ?stream=1 request sees the same
+# events whenever it attaches. Each follower receives its own deep copy of the result (callers add
+# per-request fields to it). An exception in the leader is raised in every follower.
+#
+# Coalescing is per process: with several workers (serve.py) identical requests on different
+# workers each run once there, and the later ones usually hit the shared result cache instead.
+
+
+class Flight:
+    """One running computation: its result future plus the on_item events published so far."""
+
+    def __init__(self):
+        self.future = Future()
+        self.started = time.perf_counter()
+        self.followers = 0
+        self._lock = threading.Lock()
+        self._items = []
+        self._subscribers = []
+
+    def publish(self, *event):
+        with self._lock:
+            self._items.append(event)
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(*event)
+            except Exception as e:
+                print(f"Single flight: on_item subscriber failed: {e}")
+
+    def subscribe(self, callback):
+        """Replays the events published so far to callback, then delivers new ones as they come."""
+        with self._lock:
+            replay = list(self._items)
+            self._subscribers.append(callback)
+        for event in replay:
+            callback(*event)
+
+
+class SingleFlight:
+    """Per-process registry of running computations by key."""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._flights
+
+    def run(self, key, fn, on_item=None, timeout=None):
+        """
+        Runs fn(publish) once per key at a time. Returns (result, info): info is {"role": "leader",
+        "shared_with": followers} or {"role": "follower", "waited_ms": ...}.
+        publish(*event) fans an on_item event out to every attached caller's on_item.
+        A follower waits at most `timeout` seconds (None = until the leader finishes) and then
+        raises concurrent.futures.TimeoutError; the leader keeps running.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+            else:
+                flight.followers += 1
+        if on_item is not None:
+            flight.subscribe(on_item)
+
+        if not leader:
+            joined = time.perf_counter()
+            inc("coalesced_requests_total", flight=self.name, role="follower")
+            try:
+                shared = flight.future.result(timeout=timeout)
+            except FutureTimeoutError:
+                inc("coalesced_requests_total", flight=self.name, role="follower_timeout")
+                raise
+            return copy.deepcopy(shared), {"role": "follower", "waited_ms": round((time.perf_counter() - joined) * 1000, 1)}
+
+        inc("coalesced_requests_total", flight=self.name, role="leader")
+        try:
+            result = fn(flight.publish)
+        except BaseException as e:
+            self._finish(key, flight)
+            flight.future.set_exception(e)
+            raise
+        followers = self._finish(key, flight)
+        # Followers copy from a snapshot: the leader's caller keeps adding per-request fields to its own result
+        flight.future.set_result(copy.deepcopy(result) if followers else None)
+        return result, {"role": "leader", "shared_with": followers}
+
+    def _finish(self, key, flight):
+        """Closes the flight to new followers; returns how many attached, and records the fan-out."""
+        with self._lock:
+            del self._flights[key]
+            followers = flight.followers
+        observe("coalesce_fanout", 1 + followers, flight=self.name)
+        if followers:
+            print(f"Single flight ({self.name}): {followers} identical request(s) shared one run "
+                  f"({(time.perf_counter() - flight.started) * 1000:.0f}ms)")
+        return followers
@@ -0,0 +1,178 @@
+import math
+
+# Grid spatial index over element bounding boxes, so geometry checks (overlap, target spacing,
+# nearest neighbours) cost ~O(n) on big pages instead of comparing every pair of key_elements.
+#
+# Boxes are (x0, y0, x1, y1) in page CSS px; element_box() converts a key_element's bounding_box.
+# Each box is stored in every grid cell it touches. Cells are DEFAULT_CELL_SIZE px; a box that would
+# touch more than MAX_FINE_CELLS fine cells goes into a coarse grid (COARSE_FACTOR x bigger cells),
+# and one bigger than MAX_COARSE_CELLS coarse cells (page-sized wrappers) into a plain list, so a
+# few huge containers never fill thousands of cells.
+#
+#   index = SpatialIndex.from_elements(key_elements)
+#   index.query((0, 0, 1280, 800))            # indices of elements intersecting the first screen
+#   index.nearest(index.boxes[i], k=3, exclude={i})   # [(gap_px, index), ...], closest first
+#
+# Built from a dict {id: box} instead of a list, the index can also be updated in place with
+# add()/discard() (watch_session.py keeps one per watched page, keyed by element key).
+
+DEFAULT_CELL_SIZE = 256
+COARSE_FACTOR = 16
+MAX_FINE_CELLS = 16
+MAX_COARSE_CELLS = 64
+
+
+def element_box(e):
+    """(x0, y0, x1, y1) for a key_element, or None when it has no visible area."""
+    bbox = e.get('bounding_box') or {}
+    width = bbox.get('width') or 0
+    height = bbox.get('height') or 0
+    if width <= 0 or height <= 0:
+        return None
+    x = bbox.get('x') or 0
+    y = bbox.get('y') or 0
+    return (x, y, x + width, y + height)
+
+
+def box_area(box):
+    return (box[2] - box[0]) * (box[3] - box[1])
+
+
+def intersection_area(a, b):
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    return width * height if width > 0 and height > 0 else 0
+
+
+def contains(outer, inner):
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and outer[2] >= inner[2] and outer[3] >= inner[3]
+
+
+def box_gap(a, b):
+    """Shortest distance between two boxes (0 when they touch or overlap)."""
+    dx = max(a[0] - b[2], b[0] - a[2], 0)
+    dy = max(a[1] - b[3], b[1] - a[3], 0)
+    return math.hypot(dx, dy)
+
+
+def inflate(box, margin):
+    return (box[0] - margin, box[1] - margin, box[2] + margin, box[3] + margin)
+
+
+class SpatialIndex:
+    """Two-level uniform grid over a list of boxes (None entries are skipped; ids are list positions) or a dict {id: box}."""
+
+    def __init__(self, boxes, cell_size=DEFAULT_CELL_SIZE):
+        self.boxes = boxes
+        self.cell_size = cell_size
+        self.coarse_size = cell_size * COARSE_FACTOR
+        self._fine = {} # (cx, cy) -> [index, ...]
+        self._coarse = {}
+        self._huge = []
+        self.size = 0
+        for index, box in (boxes.items() if isinstance(boxes, dict) else enumerate(boxes)):
+            if box is not None:
+                self._insert(index, box)
+
+    @classmethod
+    def from_elements(cls, key_elements, include=None, cell_size=DEFAULT_CELL_SIZE):
+        """Index over key_elements (ids = positions in key_elements); `include` filters which are indexed."""
+        boxes = [element_box(e) if include is None or include(e) else None for e in key_elements]
+        return cls(boxes, cell_size)
+
+    @staticmethod
+    def _cell_range(box, size):
+        return (math.floor(box[0] / size), math.floor(box[1] / size), math.floor(box[2] / size), math.floor(box[3] / size))
+
+    def _placement(self, box):
+        """(grid, cell range) the box is stored in, or (None, None) for the huge list."""
+        for grid, size, max_cells in ((self._fine, self.cell_size, MAX_FINE_CELLS), (self._coarse, self.coarse_size, MAX_COARSE_CELLS)):
+            cx0, cy0, cx1, cy1 = self._cell_range(box, size)
+            if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) <= max_cells:
+                return grid, (cx0, cy0, cx1, cy1)
+        return None, None
+
+    def _insert(self, index, box):
+        self.size += 1
+        grid, cells = self._placement(box)
+        if grid is None:
+            self._huge.append(index)
+            return
+        cx0, cy0, cx1, cy1 = cells
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                grid.setdefault((cx, cy), []).append(index)
+
+    def add(self, index, box):
+        """Indexes a new id (dict-backed indexes only); discard() it first to move an existing one."""
+        self.boxes[index] = box
+        if box is not None:
+            self._insert(index, box)
+
+    def discard(self, index):
+        """Removes an id, if present (dict-backed indexes only)."""
+        box = self.boxes.pop(index, None)
+        if box is None:
+            return
+        self.size -= 1
+        grid, cells = self._placement(box)
+        if grid is None:
+            self._huge.remove(index)
+            return
+        cx0, cy0, cx1, cy1 = cells
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                indices = grid[(cx, cy)]
+                indices.remove(index)
+                if not indices:
+                    del grid[(cx, cy)]
+
+    @staticmethod
+    def _grid_candidates(grid, size, box, found):
+        cx0, cy0, cx1, cy1 = SpatialIndex._cell_range(box, size)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(grid):
+            # Query wider than the populated grid: walk the occupied cells instead of the empty ones
+            for (cx, cy), indices in grid.items():
+                if cx0 <= cx <= cx1 and cy0 <= cy <= cy1:
+                    found.update(indices)
+        else:
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    indices = grid.get((cx, cy))
+                    if indices:
+                        found.update(indices)
+
+    def query(self, box, exclude=None):
+        """Sorted ids whose boxes intersect (or touch) `box`."""
+        found = set(self._huge)
+        self._grid_candidates(self._fine, self.cell_size, box, found)
+        self._grid_candidates(self._coarse, self.coarse_size, box, found)
+        boxes = self.boxes
+        return sorted(
+            index for index in found
+            if (exclude is None or index not in exclude)
+            and boxes[index][0] <= box[2] and box[0] <= boxes[index][2] and boxes[index][1] <= box[3] and box[1] <= boxes[index][3]
+        )
+
+    def nearest(self, box, k=1, max_distance=None, exclude=None, predicate=None):
+        """
+        Up to k (gap_px, id) pairs closest to `box` (a point is a zero-size box), nearest first.
+        Searches a growing window, so the cost depends on local density, not on the page size.
+        """
+        if not self.size:
+            return []
+        limit = max_distance if max_distance is not None else float('inf')
+        radius = self.cell_size / 2
+        while True:
+            radius = min(radius, limit)
+            matches = []
+            for index in self.query(inflate(box, radius), exclude):
+                if predicate is not None and not predicate(index):
+                    continue
+                gap = box_gap(box, self.boxes[index])
+                if gap <= radius:
+                    matches.append((gap, index))
+            # Everything within `radius` has been seen, so k matches inside it are the true k nearest
+            if len(matches) >= k or radius >= limit or radius > self.cell_size * 4096:
+                return sorted(matches)[:k]
+            radius *= 2
@@ -0,0 +1,116 @@
+import functools
+import os
+
+from image_utils import parse_css_color
+import metrics
+
+# Process-wide, bounded memo for the small per-element parsing steps the agents repeat.
+#
+# A real page has thousands of elements but only a handful of distinct font stacks, colors and
+# style combinations, and the same values come back on every request for the same site. Each
+# helper below is an LRU cache (functools.lru_cache: thread-safe, bounded) registered by name so
+# hit/miss/size stats show up in memo_stats() and on /metrics. Memoized helpers must be pure and
+# take hashable arguments (strings, numbers, tuples).
+
+MEMO_MAX_ENTRIES = int(os.getenv("MEMO_MAX_ENTRIES", "4096")) # per memo
+
+_memos = {} # name -> lru_cache-wrapped function
+
+
+def memoized(name, maxsize=MEMO_MAX_ENTRIES):
+    """Decorator: bounded LRU memo registered under `name` for stats."""
+    def decorator(fn):
+        cached = functools.lru_cache(maxsize=maxsize)(fn)
+        _memos[name] = cached
+        return cached
+    return decorator
+
+
+def memo_stats():
+    """{name: {"hits", "misses", "entries", "max_entries", "hit_rate"}} for every registered memo."""
+    stats = {}
+    for name, cached in _memos.items():
+        info = cached.cache_info()
+        lookups = info.hits + info.misses
+        stats[name] = {
+            "hits": info.hits,
+            "misses": info.misses,
+            "entries": info.currsize,
+            "max_entries": info.maxsize,
+            "hit_rate": round(info.hits / lookups, 4) if lookups else None,
+        }
+    return stats
+
+
+def clear_memos():
+    for cached in _memos.values():
+        cached.cache_clear()
+
+
+def _export_memo_metrics():
+    for name, stats in memo_stats().items():
+        metrics.set_value("memo_events_total", stats["hits"], memo=name, result="hit")
+        metrics.set_value("memo_events_total", stats["misses"], memo=name, result="miss")
+        metrics.set_value("memo_entries", stats["entries"], memo=name)
+
+
+metrics.register_collector(_export_memo_metrics)
+
+
+# --- Colors ---
+# 'rgb(...)' / 'rgba(...)' / '#hex' -> (r, g, b, a) tuple or None (see image_utils.parse_css_color)
+parse_color = memoized("css_color")(parse_css_color)
+
+
+# --- Lengths ---
+@memoized("css_px")
+def parse_px(value):
+    """'16px' -> 16.0; None for missing or non-px values."""
+    if not value:
+        return None
+    try:
+        return float(value.replace('px', ''))
+    except (ValueError, AttributeError):
+        return None
+
+
+# --- Font families ---
+# Generic and platform fallback families: never reported as the page's brand fonts
+SYSTEM_FONTS = frozenset([
+    'sans-serif', 'serif', 'monospace', 'cursive', 'fantasy',
+    '-apple-system', 'BlinkMacSystemFont', 'system-ui',
+    'Segoe UI Symbol', 'Segoe UI Emoji', 'Twemoji Mozilla',
+    'Roboto', 'Noto Sans',
+    'Arial', 'Helvetica', 'Verdana', 'Tahoma', 'Trebuchet MS', 'Georgia', 'Times New Roman', 'Courier New',
+    'Meiryo', 'Yu Gothic', 'Microsoft YaHei', 'Apple Color Emoji'
+])
+
+
+@memoized("font_family")
+def normalize_font_family(font_family_raw):
+    """
+    Returns the brand font name(s) declared in a CSS font-family stack, as a tuple:
+    the first non-system family, with all "Segoe UI" variants folded into "Segoe UI".
+    """
+    if not font_family_raw:
+        return ()
+    individual_fonts = [f.strip().strip("'\"") for f in font_family_raw.split(',') if f.strip().strip("'\"")]
+    fonts = []
+    found_primary_font = False
+    for font in individual_fonts:
+        font_lower = font.lower()
+        if font in SYSTEM_FONTS: continue
+        if "segoe ui" in font_lower:
+            if "segoe ui emoji" in font_lower or "segoe ui symbol" in font_lower:
+                if "segoe ui" in [f.lower() for f in individual_fonts if f not in SYSTEM_FONTS]: continue
+                else: fonts.append("Segoe UI"); found_primary_font = True; break
+            else: fonts.append("Segoe UI"); found_primary_font = True; break
+        if not found_primary_font: fonts.append(font); found_primary_font = True
+    return tuple(fonts)
+
+
+# --- Style fingerprints ---
+@memoized("style_fingerprint")
+def style_fingerprint(*values):
+    """Joins style values into one key ("16px_700_Inter"); repeated combinations share one string."""
+    return "_".join(str(value) for value in values)
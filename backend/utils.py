@@ -1,44 +1,67 @@
-import os
-import google.generativeai as genai
 import base64
-from PIL import Image
-import io
 import json
+import os
+import threading
+from llm_json import parse_llm_json
 
-# Configure Gemini API (make sure GEMINI_API_KEY is set as an environment variable)
-# It's best practice to load this from an environment variable or a secure configuration system.
-# For quick hackathon setup, you might temporarily hardcode it here, but remove before production.
-# Example: os.environ.get("GEMINI_API_KEY")
-gemini_api_key = os.getenv("GEMINI_API_KEY")
-if not gemini_api_key:
-    print("WARNING: GEMINI_API_KEY environment variable not set. Gemini functions may fail.")
-    # You might want to raise an error or exit in a production app.
-
-genai.configure(api_key=gemini_api_key)
+# Gemini is configured once, lazily, in gemini_client.py (from the GEMINI_API_KEY environment variable)
 
-# Helper Function: Prepare image for Gemini Vision API
-def get_image_parts(screenshot_base64):
+# Helper Function: Decode the base64 screenshot once (None if missing/invalid)
+def decode_screenshot_bytes(screenshot_base64):
     if not screenshot_base64:
-        return []
+        return None
     try:
-        image_bytes = base64.b64decode(screenshot_base64)
-        return [{"mime_type": "image/png", "data": image_bytes}]
+        return base64.b64decode(screenshot_base64)
     except Exception as e:
         print(f"Error decoding screenshot for Gemini: {e}")
+        return None
+
+# Helper Function: Image format from the file signature ("png", "jpeg", "webp", "avif", "gif" or None)
+# Screenshots referenced from screenshot_store.py may come back as WebP/AVIF derivatives.
+def image_format(image_bytes):
+    if not image_bytes:
+        return None
+    if image_bytes.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if image_bytes.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP":
+        return "webp"
+    if image_bytes[4:8] == b"ftyp" and image_bytes[8:12] in (b"avif", b"avis"):
+        return "avif"
+    if image_bytes[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    return None
+
+# Helper Function: Write a file via a temp file + rename (page_archive.py, screenshot_store.py)
+# Concurrent writers of the same content-addressed file never leave a torn file behind.
+def write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+# Helper Function: Prepare image for Gemini Vision API
+# Pass image_bytes when the screenshot has already been decoded, to avoid decoding it twice.
+def get_image_parts(screenshot_base64, image_bytes=None):
+    if image_bytes is None:
+        image_bytes = decode_screenshot_bytes(screenshot_base64)
+    if not image_bytes:
         return []
+    return [{"mime_type": f"image/{image_format(image_bytes) or 'png'}", "data": image_bytes}]
 
 # Helper Function: Safely parse Gemini's JSON output
+# Tolerates code fences, trailing commas and truncated output (see llm_json.py);
+# agents with a response schema should use llm_json.parse_structured_response instead.
 def parse_gemini_json_response(response_text):
-    try:
-        # Gemini often wraps JSON in ```json\n...\n```, so we need to clean it
-        clean_text = response_text.replace('```json', '').replace('```', '').strip()
-        return json.loads(clean_text)
-    except json.JSONDecodeError as e:
-        print(f"Failed to decode JSON from Gemini: {e}")
+    value, status = parse_llm_json(response_text)
+    if value is None:
+        print("Failed to decode JSON from Gemini")
         print(f"Gemini raw response: {response_text}")
-        return {"error": f"Failed to parse AI response: {e}", "raw_response": response_text}
-    except Exception as e:
-        print(f"An unexpected error occurred while parsing Gemini response: {e}")
-        return {"error": f"An unexpected error occurred: {e}", "raw_response": response_text}
+        return {"error": "Failed to parse AI response", "raw_response": response_text}
+    if status == "repaired":
+        print("Gemini JSON response was malformed or truncated; recovered what was parseable.")
+    return value
 
 # You can add other utility functions here if needed by multiple agents
\ No newline at end of file
@@ -0,0 +1,94 @@
+import os
+import threading
+import time
+
+from lazy_imports import load
+from metrics import span
+
+# Background warmup for a freshly started worker.
+#
+# Importing app.py only loads what routing needs; the heavy pieces (Gemini SDK, numpy/PIL, lxml,
+# the shared Chromium, CPU pool processes) load on first use. start() loads them on a background
+# thread right after startup instead, so the server accepts connections (and answers GET /healthz)
+# immediately while the first real request usually finds everything ready. GET /readyz reports
+# 503 until the warmup has finished. Set WARMUP_ON_START=0 to skip it (everything stays lazy).
+
+WARMUP_ON_START = os.getenv("WARMUP_ON_START", "1") != "0"
+
+_lock = threading.Lock()
+_state = {"pid": None, "status": "not_started", "steps": {}, "started_at": None, "finished_at": None}
+
+
+def _warm_gemini():
+    import gemini_client
+    gemini_client.warm_up()
+
+
+def _warm_image_stack():
+    import image_utils
+    load(image_utils.np)
+    load(image_utils.Image)
+
+
+def _warm_lxml():
+    from agents import accessibility_agent
+    load(accessibility_agent.html)
+
+
+def _warm_browser_pool():
+    import browser_pool
+    browser_pool.warm_up()
+
+
+def _warm_cpu_pool():
+    import cpu_pool
+    cpu_pool.warm_up()
+
+
+# Cheapest and most widely needed first; a failing step is reported and the rest still run
+WARMUP_STEPS = (
+    ("image_stack", _warm_image_stack),
+    ("lxml", _warm_lxml),
+    ("gemini_client", _warm_gemini),
+    ("cpu_pool", _warm_cpu_pool),
+    ("browser_pool", _warm_browser_pool),
+)
+
+
+def _run_warmup():
+    for name, step in WARMUP_STEPS:
+        start = time.perf_counter()
+        try:
+            with span(f"warmup.{name}"):
+                step()
+            result = {"status": "ok"}
+        except Exception as e:
+            print(f"Warmup step {name} failed: {e}")
+            result = {"status": "error", "error": str(e)}
+        result["ms"] = round((time.perf_counter() - start) * 1000, 1)
+        _state["steps"][name] = result
+    _state["finished_at"] = time.time()
+    _state["status"] = "done"
+    print(f"Warmup finished for pid {os.getpid()} in {(_state['finished_at'] - _state['started_at']) * 1000:.0f}ms")
+
+
+def start():
+    """Starts the background warmup once per process (a forked worker starts its own)."""
+    with _lock:
+        if _state["pid"] == os.getpid():
+            return
+        _state.update({"pid": os.getpid(), "status": "running", "steps": {}, "started_at": time.time(), "finished_at": None})
+    threading.Thread(target=_run_warmup, name="warmup", daemon=True).start()
+
+
+def status():
+    """{"status": not_started/running/done, "steps": {name: {"status", "ms"}}, ...} for this process."""
+    state = dict(_state, steps=dict(_state["steps"]))
+    if state["pid"] != os.getpid():
+        state.update({"status": "not_started", "steps": {}})
+    return state
+
+
+def is_ready():
+    state = status()
+    return state["status"] == "done" or (state["status"] == "not_started" and not WARMUP_ON_START)
@@ -0,0 +1,338 @@
+import json
+import os
+import threading
+import time
+import uuid
+from dataclasses import asdict
+
+from element_graph import node_to_element
+from layout_checks import LayoutChecker, MIN_TARGET_PX, in_focus_sequence, has_text, is_interactive
+from spatial_index import SpatialIndex, element_box, inflate
+from metrics import span, inc, observe, set_value, register_collector
+from websocket_server import WebSocketClosed, CLOSE_NORMAL
+from agents.accessibility_agent import element_issues, LAYOUT_ISSUE_BUILDERS
+
+# Live "watch" mode: the extension keeps a WebSocket open (GET /api/watch, see websocket_server.py)
+# while the designer edits the page, and the backend keeps that page's elements and findings per
+# connection, so every update only costs the changed elements instead of a whole analysis.
+#
+# Client -> server (JSON text messages):
+#   {"type": "start", "url": ..., "element_graph": {"format": "element_graph/1", "styles": [...],
+#        "nodes": [{"key": 7, "parent": 3, "tag": ..., "text": ..., "style": 0, "bbox": [...], ...}]}}
+#   {"type": "delta", "seq": 12, "styles": [...appended to the session's style table...],
+#        "upsert": [{"key": 7, "bbox": [...]}, {"key": 99, "prev": 7, "tag": "P", ...}], "remove": [8]}
+#   {"type": "stop"}
+# Nodes are the element graph's (element_graph.py), except that every element has a stable integer
+# "key" the content script assigned, "parent" is the parent's key, and a NAME_FROM_CONTENT_TAGS element's "text"
+# is already its full subtree text. An upsert of a known key is a patch (only the changed fields);
+# a new key carries "prev", the key of the element before it in document order (null = first).
+#
+# Server -> client: {"type": "findings", "seq": ..., "added": [finding, ...], "removed": [finding id, ...],
+# "total": n, "stats": {...}} after every start/delta ("added" includes findings whose text changed),
+# and {"type": "error", "message": ...} for a message that could not be applied.
+# A finding is the accessibility agent's WCAG issue plus "id" (stable across updates), "check" and "key".
+#
+# Per update the per-element checks (alt text, accessible name, contrast) only run on the upserted
+# elements. The layout checks (overlap, occlusion, target size, focus order) depend on neighbours:
+# they re-run for the elements within a target-spacing radius of a changed box (old and new
+# position) and the focus-order successors of changed elements, on a sub-page holding just those,
+# their neighbours and ancestors; a persistent SpatialIndex finds them. The result is what a full
+# run over the page gives, without the per-check caps of the one-shot analyses (bench_watch.py
+# checks this). Design/LLM feedback stays with the explicit analyses.
+
+WATCH_MAX_SESSIONS = int(os.getenv("WATCH_MAX_SESSIONS", "32")) # per worker; each holds a server thread
+WATCH_IDLE_TIMEOUT_SECONDS = float(os.getenv("WATCH_IDLE_TIMEOUT_SECONDS", "600"))
+# Upsert fields that can change a layout finding (position, text, background, nesting, interactivity)
+LAYOUT_FIELDS = {"bbox", "text", "style", "parent", "tag", "role", "href", "src"}
+
+_END = object() # "prev" unknown: append at the end
+_active_sessions = 0
+_sessions_lock = threading.Lock()
+
+
+class WatchError(Exception):
+    pass
+
+
+def try_open_session():
+    """Reserves one of WATCH_MAX_SESSIONS; False when the worker is full."""
+    global _active_sessions
+    with _sessions_lock:
+        if _active_sessions >= WATCH_MAX_SESSIONS:
+            return False
+        _active_sessions += 1
+        return True
+
+
+def close_session():
+    global _active_sessions
+    with _sessions_lock:
+        _active_sessions -= 1
+
+
+def active_sessions():
+    return _active_sessions
+
+
+register_collector(lambda: set_value("watch_sessions", _active_sessions))
+
+
+def _valid_key(key):
+    return isinstance(key, int) and not isinstance(key, bool)
+
+
+class WatchSession:
+    """One watched page: its elements by key, in document order, and the findings last sent to the client."""
+
+    def __init__(self, url):
+        self.id = uuid.uuid4().hex[:12]
+        self.url = url
+        self.styles = []
+        self.nodes = {} # key -> merged node fields
+        self.order = [] # keys in document order
+        self.position = {} # key -> index in self.order
+        self.elements = {} # key -> key_element dict (rebuilt when the element is upserted)
+        self.index = SpatialIndex({}) # every element's box, by key; updated in place
+        self.sequence = [] # keys of focusable/heading elements in document order (reading_order)
+        self.sequence_position = {}
+        self.element_findings = {} # key -> {finding id: finding} from the per-element checks
+        self.area_findings = {} # key -> {finding id: finding} from the overlap/occlusion/target checks, by the finding's element
+        self.order_findings = {} # key -> {finding id: finding} from the focus order check, by the later element
+        self.findings = {} # finding id -> finding, as last sent to the client
+        self.updates = 0
+
+    def load_snapshot(self, graph):
+        """Replaces the session's page with a full keyed element graph; returns the findings diff."""
+        if not isinstance(graph, dict) or not isinstance(graph.get("nodes"), list):
+            raise WatchError("start needs an element_graph with a nodes list")
+        self.__init__(self.url)
+        self.styles = list(graph.get("styles") or [])
+        for node in graph["nodes"]:
+            key = node.get("key") if isinstance(node, dict) else None
+            if not _valid_key(key):
+                raise WatchError("every watched node needs an integer \"key\"")
+            if key not in self.nodes:
+                self.order.append(key)
+            self.nodes[key] = {field: value for field, value in node.items() if field not in ("key", "prev")}
+        self.position = {key: index for index, key in enumerate(self.order)}
+        return self._update(set(self.nodes), set(self.nodes), {}, set(), upserts=len(self.nodes), full=True)
+
+    def apply_delta(self, styles=None, upserts=None, removes=None):
+        """Applies one delta message; returns the findings diff."""
+        self.styles.extend(styles or [])
+        patches = []
+        for patch in upserts or []:
+            key = patch.get("key") if isinstance(patch, dict) else None
+            if not _valid_key(key):
+                raise WatchError("every upsert needs an integer \"key\"")
+            patches.append((key, patch))
+        removed = {key for key in removes or [] if _valid_key(key) and key in self.nodes}
+        layout_dirty = {key for key, patch in patches if key not in self.nodes or LAYOUT_FIELDS.intersection(patch)}
+        # Focus-order neighbours that follow a removed or changed element get a new predecessor
+        order_recheck = self._sequence_successors(removed | layout_dirty)
+        old_boxes = {key: self.index.boxes[key] for key in removed | layout_dirty if self.index.boxes.get(key) is not None}
+
+        for key in removed:
+            del self.nodes[key]
+            self.elements.pop(key, None)
+            self.element_findings.pop(key, None)
+            self.area_findings.pop(key, None)
+            self.order_findings.pop(key, None)
+            self.index.discard(key)
+        dirty, inserted = set(), []
+        for key, patch in patches:
+            node = self.nodes.get(key)
+            if node is None:
+                node = self.nodes[key] = {}
+                inserted.append((patch.get("prev"), key))
+            node.update((field, value) for field, value in patch.items() if field not in ("key", "prev"))
+            dirty.add(key)
+        if removed or inserted:
+            self._reorder(removed, inserted)
+        return self._update(dirty, layout_dirty, old_boxes, order_recheck, upserts=len(patches), removed=len(removed))
+
+    def _reorder(self, removed, inserted):
+        """Drops removed keys and places each new key right after its "prev" (chains of new keys included), in one pass."""
+        after = {} # prev key -> new keys that follow it
+        for prev, key in inserted:
+            after.setdefault(prev if prev is None or prev in self.nodes else _END, []).append(key)
+        order, placed = [], set()
+
+        def place(keys):
+            stack = list(reversed(keys))
+            while stack:
+                key = stack.pop()
+                if key in placed:
+                    continue
+                placed.add(key)
+                order.append(key)
+                stack.extend(reversed(after.pop(key, [])))
+
+        new_keys = {key for _, key in inserted}
+        place(after.pop(None, []))
+        for key in self.order:
+            if key not in removed and key not in new_keys:
+                place([key])
+        place(after.pop(_END, []))
+        for keys in list(after.values()): # only left for "prev" cycles in a malformed delta
+            place(keys)
+        self.order = order
+        self.position = {key: index for index, key in enumerate(order)}
+
+    def _sequence_successors(self, keys):
+        """For each key in the focus sequence, the next sequence member that is not itself in `keys`."""
+        successors = set()
+        for key in keys:
+            position = self.sequence_position.get(key)
+            if position is None:
+                continue
+            for following in self.sequence[position + 1:]:
+                if following not in keys:
+                    successors.add(following)
+                    break
+        return successors
+
+    def _update(self, dirty, layout_dirty, old_boxes, order_recheck, upserts, removed=0, full=False):
+        start = time.perf_counter()
+        with span("watch.elements"):
+            for key in dirty:
+                node = self.nodes[key]
+                element = node_to_element(node, self.styles, node.get("text") or None, None)
+                self.elements[key] = element
+                self.index.discard(key)
+                self.index.add(key, element_box(element))
+                findings = {}
+                for check, issue in element_issues(element):
+                    finding_id = f"{check}:{key}"
+                    findings[finding_id] = {"id": finding_id, "check": check, "key": key, **asdict(issue)}
+                self.element_findings[key] = findings
+        checked = 0
+        if layout_dirty or old_boxes or order_recheck:
+            with span("watch.layout"):
+                checked = self._recheck_layout(layout_dirty, old_boxes, order_recheck, full)
+        current = {}
+        for findings_by_key in (self.area_findings, self.order_findings, self.element_findings):
+            for findings in findings_by_key.values():
+                current.update(findings)
+        added = [finding for finding_id, finding in current.items() if self.findings.get(finding_id) != finding]
+        removed_ids = [finding_id for finding_id in self.findings if finding_id not in current]
+        self.findings = current
+        self.updates += 1
+        elapsed = time.perf_counter() - start
+        observe("stage_latency_seconds", elapsed, stage="watch.update")
+        return {
+            "added": added, "removed": removed_ids, "total": len(current),
+            "stats": {"elements": len(self.order), "upserts": upserts, "removed": removed,
+                      "layout_checked": checked, "process_ms": round(elapsed * 1000, 2)},
+        }
+
+    def _recheck_layout(self, layout_dirty, old_boxes, order_recheck, full):
+        """
+        Re-runs the layout checks for the elements a change can affect and replaces their findings.
+        Returns how many elements were re-checked (the whole page for a snapshot).
+        """
+        boxes = self.index.boxes
+        in_sequence = lambda key: boxes.get(key) is not None and in_focus_sequence(self.elements[key])
+        # Rebuilt only when membership changes (reorders only ever insert or remove keys)
+        if full or old_boxes.keys() - layout_dirty or any(in_sequence(key) != (key in self.sequence_position) for key in layout_dirty):
+            self.sequence = [key for key in self.order if in_sequence(key)]
+            self.sequence_position = {key: index for index, key in enumerate(self.sequence)}
+        if full:
+            affected = set(self.order)
+            order_affected = set(self.order)
+            page = list(self.order)
+        else:
+            # Anything within a target's spacing radius of a changed box (old or new position) can gain or lose a finding
+            affected = set(layout_dirty)
+            for box in list(old_boxes.values()) + [boxes[key] for key in layout_dirty if boxes.get(key) is not None]:
+                affected.update(self.index.query(inflate(box, MIN_TARGET_PX)))
+            order_affected = (affected | order_recheck | self._sequence_successors(affected)) & self.sequence_position.keys()
+            # Their findings depend on everything near them, their ancestors (nesting) and their focus-order predecessor
+            neighbourhood = set(affected) | order_affected
+            # (containers that are neither text nor targets have no findings of their own, and their
+            # usually page-sized boxes would pull in everything)
+            for key in affected:
+                if boxes.get(key) is not None and (has_text(self.elements[key]) or is_interactive(self.elements[key])):
+                    neighbourhood.update(self.index.query(inflate(boxes[key], MIN_TARGET_PX)))
+            for key in order_affected:
+                position = self.sequence_position[key]
+                if position > 0:
+                    neighbourhood.add(self.sequence[position - 1])
+            for key in list(neighbourhood):
+                parent = self.nodes[key].get("parent")
+                while parent in self.nodes and parent not in neighbourhood:
+                    neighbourhood.add(parent)
+                    parent = self.nodes[parent].get("parent")
+            page = sorted(neighbourhood, key=self.position.__getitem__)
+
+        sub_position = {key: index for index, key in enumerate(page)}
+        key_elements = []
+        for key in page:
+            element = self.elements[key]
+            element["parent_index"] = sub_position.get(self.nodes[key].get("parent"))
+            key_elements.append(element)
+        has_parents = any(node.get("parent") is not None for node in self.nodes.values())
+        checker = LayoutChecker(key_elements, has_parents=has_parents)
+        only = {sub_position[key] for key in affected}
+        small_targets, _ = checker.touch_targets(only)
+        for key in affected:
+            self.area_findings.pop(key, None)
+        for key in order_affected:
+            self.order_findings.pop(key, None)
+        builders = dict(LAYOUT_ISSUE_BUILDERS)
+        for check, results, findings_by_key in (
+                ("overlapping_text", checker.overlapping_text(only), self.area_findings),
+                ("occluded_text", checker.occluded_text(only), self.area_findings),
+                ("small_targets", small_targets, self.area_findings),
+                ("order_mismatches", checker.reading_order({sub_position[key] for key in order_affected}), self.order_findings)):
+            for result in results:
+                key = page[result["index"]]
+                other = result.get("other_index", result.get("previous_index"))
+                finding_id = f"{check}:{key}" + (f":{page[other]}" if other is not None else "")
+                findings_by_key.setdefault(key, {})[finding_id] = {"id": finding_id, "check": check, "key": key, **asdict(builders[check](result))}
+        return len(affected)
+
+
+def _send(ws, message):
+    inc("watch_bytes_total", ws.send(json.dumps(message, separators=(",", ":"))), direction="out")
+
+
+def serve(ws):
+    """Runs one watch connection until the client stops or disconnects."""
+    session = None
+    try:
+        while True:
+            raw = ws.receive()
+            inc("watch_bytes_total", len(raw), direction="in")
+            message = None
+            try:
+                message = json.loads(raw)
+                if not isinstance(message, dict):
+                    raise WatchError("messages must be JSON objects")
+                kind = message.get("type")
+                if kind == "start":
+                    session = WatchSession(message.get("url"))
+                    print(f"Watch session {session.id} started for {session.url}")
+                    result = session.load_snapshot(message.get("element_graph"))
+                elif kind == "delta":
+                    if session is None:
+                        raise WatchError("send a start message before deltas")
+                    result = session.apply_delta(message.get("styles"), message.get("upsert"), message.get("remove"))
+                elif kind == "stop":
+                    ws.close(CLOSE_NORMAL)
+                    return
+                else:
+                    raise WatchError(f"unknown message type {kind!r}")
+            except Exception as e: # bad JSON or message shape: report it and keep the session
+                if not isinstance(e, (ValueError, WatchError)):
+                    print(f"Watch session update failed: {e}")
+                inc("watch_updates_total", result="rejected")
+                _send(ws, {"type": "error", "seq": message.get("seq") if isinstance(message, dict) else None, "message": str(e)})
+                continue
+            inc("watch_updates_total", result=message["type"])
+            _send(ws, {"type": "findings", "seq": message.get("seq"), **result})
+    except WebSocketClosed:
+        pass
+    finally:
+        if session is not None:
+            print(f"Watch session {session.id} ended after {session.updates} updates")
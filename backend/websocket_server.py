@@ -0,0 +1,210 @@
+import base64
+import hashlib
+import os
+import socket
+import struct
+import threading
+
+from flask import Response
+
+# Minimal server side of RFC 6455 WebSockets for the Werkzeug server app.py/serve.py already run,
+# so watch mode (watch_session.py) needs no extra dependency or async server.
+#
+#   @app.route("/api/watch")
+#   def watch():
+#       ws = WebSocket.accept(request.environ)   # 101 Switching Protocols on the raw socket
+#       ... ws.receive() / ws.send(text) ...
+#       return ClosedResponse()                  # tells Werkzeug not to write an HTTP response
+#
+# Each connection occupies one server thread for its lifetime (Werkzeug runs threaded=True).
+# Text and binary messages, fragmentation, ping/pong and the close handshake are supported;
+# extensions (permessage-deflate) and subprotocols are not negotiated.
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+MAX_MESSAGE_BYTES = int(os.getenv("WEBSOCKET_MAX_MESSAGE_BYTES", str(16 * 1024 * 1024)))
+
+OPCODE_CONTINUATION = 0x0
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+CLOSE_NORMAL = 1000
+CLOSE_GOING_AWAY = 1001
+CLOSE_PROTOCOL_ERROR = 1002
+CLOSE_UNSUPPORTED_DATA = 1003
+CLOSE_POLICY_VIOLATION = 1008
+CLOSE_MESSAGE_TOO_BIG = 1009
+CLOSE_INTERNAL_ERROR = 1011
+
+
+class WebSocketClosed(Exception):
+    """The peer closed the connection (or it dropped); `code` is the close code, if one was received."""
+
+    def __init__(self, code=None, reason=""):
+        super().__init__(f"WebSocket closed ({code}): {reason}" if code else "WebSocket closed")
+        self.code = code
+        self.reason = reason
+
+
+class ClosedResponse(Response):
+    """Returned by a view after its WebSocket session: the socket is done, so no HTTP response is written."""
+
+    def __call__(self, environ, start_response):
+        # Werkzeug treats ConnectionError from the app as a dropped connection and stops quietly
+        raise ConnectionError("WebSocket session finished")
+
+
+def is_websocket_request(environ):
+    return (environ.get("HTTP_UPGRADE", "").lower() == "websocket"
+            and "upgrade" in environ.get("HTTP_CONNECTION", "").lower())
+
+
+def accept_key(key):
+    return base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode("ascii")).digest()).decode("ascii")
+
+
+class WebSocket:
+    def __init__(self, sock):
+        self.sock = sock
+        self.closed = False
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self._send_lock = threading.Lock() # send() may be called from another thread than receive()
+
+    @classmethod
+    def accept(cls, environ, idle_timeout=None):
+        """Completes the opening handshake on the request's socket. Raises ValueError for a bad request."""
+        sock = environ.get("werkzeug.socket")
+        if sock is None:
+            raise RuntimeError("WebSockets need the Werkzeug server (python app.py / serve.py)")
+        key = environ.get("HTTP_SEC_WEBSOCKET_KEY")
+        if not is_websocket_request(environ) or not key or environ.get("HTTP_SEC_WEBSOCKET_VERSION") != "13":
+            raise ValueError("Not a WebSocket (version 13) upgrade request")
+        sock.sendall(("HTTP/1.1 101 Switching Protocols\r\n"
+                      "Upgrade: websocket\r\n"
+                      "Connection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept_key(key)}\r\n\r\n").encode("ascii"))
+        sock.settimeout(idle_timeout)
+        return cls(sock)
+
+    def _recv_exact(self, size):
+        chunks = []
+        while size:
+            try:
+                chunk = self.sock.recv(min(size, 1 << 16))
+            except socket.timeout:
+                raise WebSocketClosed(CLOSE_GOING_AWAY, "idle timeout")
+            except OSError as e:
+                raise WebSocketClosed(None, str(e))
+            if not chunk:
+                raise WebSocketClosed(None, "connection dropped")
+            chunks.append(chunk)
+            size -= len(chunk)
+            self.bytes_received += len(chunk)
+        return b"".join(chunks)
+
+    def _read_frame(self):
+        first, second = self._recv_exact(2)
+        fin, opcode = bool(first & 0x80), first & 0x0F
+        masked, length = bool(second & 0x80), second & 0x7F
+        if first & 0x70:
+            self.close(CLOSE_PROTOCOL_ERROR, "extensions are not supported")
+            raise WebSocketClosed(CLOSE_PROTOCOL_ERROR, "reserved bits set")
+        if length == 126:
+            length = struct.unpack("!H", self._recv_exact(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", self._recv_exact(8))[0]
+        if not masked:
+            # RFC 6455 5.1: a server must close the connection on an unmasked client frame
+            self.close(CLOSE_PROTOCOL_ERROR, "client frames must be masked")
+            raise WebSocketClosed(CLOSE_PROTOCOL_ERROR, "unmasked client frame")
+        if length > MAX_MESSAGE_BYTES:
+            self.close(CLOSE_MESSAGE_TOO_BIG, "message too big")
+            raise WebSocketClosed(CLOSE_MESSAGE_TOO_BIG, "message too big")
+        mask = self._recv_exact(4)
+        payload = self._recv_exact(length) if length else b""
+        if payload:
+            # XOR with the repeating 4-byte mask, done on whole integers instead of byte by byte
+            repeated = (mask * (length // 4 + 1))[:length]
+            payload = (int.from_bytes(payload, "little") ^ int.from_bytes(repeated, "little")).to_bytes(length, "little")
+        return fin, opcode, payload
+
+    def receive(self):
+        """Next text (str) or binary (bytes) message; answers pings. Raises WebSocketClosed when the peer is gone."""
+        message_opcode, parts, size = None, [], 0
+        while True:
+            fin, opcode, payload = self._read_frame()
+            if opcode == OPCODE_PING:
+                self._send_frame(OPCODE_PONG, payload)
+                continue
+            if opcode == OPCODE_PONG:
+                continue
+            if opcode == OPCODE_CLOSE:
+                code = struct.unpack("!H", payload[:2])[0] if len(payload) >= 2 else None
+                self.close(code or CLOSE_NORMAL)
+                raise WebSocketClosed(code, payload[2:].decode("utf-8", errors="replace"))
+            if opcode in (OPCODE_TEXT, OPCODE_BINARY):
+                if message_opcode is not None:
+                    self.close(CLOSE_PROTOCOL_ERROR, "expected a continuation frame")
+                    raise WebSocketClosed(CLOSE_PROTOCOL_ERROR, "interleaved message")
+                message_opcode = opcode
+            elif opcode != OPCODE_CONTINUATION or message_opcode is None:
+                self.close(CLOSE_PROTOCOL_ERROR, "unexpected opcode")
+                raise WebSocketClosed(CLOSE_PROTOCOL_ERROR, f"unexpected opcode {opcode}")
+            size += len(payload)
+            if size > MAX_MESSAGE_BYTES:
+                self.close(CLOSE_MESSAGE_TOO_BIG, "message too big")
+                raise WebSocketClosed(CLOSE_MESSAGE_TOO_BIG, "message too big")
+            parts.append(payload)
+            if fin:
+                data = b"".join(parts)
+                if message_opcode == OPCODE_TEXT:
+                    try:
+                        return data.decode("utf-8")
+                    except UnicodeDecodeError:
+                        self.close(CLOSE_UNSUPPORTED_DATA, "invalid UTF-8")
+                        raise WebSocketClosed(CLOSE_UNSUPPORTED_DATA, "invalid UTF-8")
+                return data
+
+    def _send_frame(self, opcode, payload):
+        length = len(payload)
+        if length < 126:
+            header = struct.pack("!BB", 0x80 | opcode, length)
+        elif length < 1 << 16:
+            header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+        with self._send_lock:
+            if self.closed and opcode != OPCODE_CLOSE:
+                raise WebSocketClosed(None, "already closed")
+            try:
+                self.sock.sendall(header + payload)
+            except OSError as e:
+                raise WebSocketClosed(None, str(e))
+            self.bytes_sent += len(header) + length
+
+    def send(self, message):
+        """Sends a str as a text message, bytes as a binary message. Returns the bytes put on the wire."""
+        before = self.bytes_sent
+        if isinstance(message, str):
+            self._send_frame(OPCODE_TEXT, message.encode("utf-8"))
+        else:
+            self._send_frame(OPCODE_BINARY, bytes(message))
+        return self.bytes_sent - before
+
+    def close(self, code=CLOSE_NORMAL, reason=""):
+        """Sends a close frame (once) and closes the socket; the server does not wait for the peer's reply."""
+        if self.closed:
+            return
+        try:
+            self._send_frame(OPCODE_CLOSE, struct.pack("!H", code) + reason.encode("utf-8")[:120])
+        except WebSocketClosed:
+            pass
+        self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
@@ -1,6 +1,85 @@
 // extension/background.js
 // It handles messages from popup.js (and content.js), and makes network requests.
 
+// Watch mode: content.js streams the page's element changes over a "watch" port, and this worker
+// relays them to the backend's WebSocket (backend/watch_session.py). The socket lives here rather
+// than in the page so the page's Content-Security-Policy cannot block it.
+const WATCH_SOCKET_URL = 'ws://127.0.0.1:5000/api/watch';
+let activeWatch = null; // { port, socket, findings: Map(id -> finding) }
+
+// Screenshots the backend already stores (backend/screenshot_store.py), by SHA-256 of the PNG bytes.
+// An unchanged page then costs a 64-character hash instead of re-uploading the capture.
+const uploadedScreenshots = new Set();
+
+async function sha256Hex(base64) {
+    const bytes = Uint8Array.from(atob(base64), c => c.charCodeAt(0));
+    const digest = await crypto.subtle.digest('SHA-256', bytes);
+    return Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+}
+
+// POSTs an analysis, sending the screenshot by hash when the backend should have it; falls back to
+// the bytes if it answers 404 "missing_screenshot" (never uploaded by this worker, or collected since).
+// Without a screenshot (the capture failed) the payload goes as is; the backend accepts that.
+async function postAnalysis(url, payload, screenshotBase64) {
+    const post = body => fetch(url, { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(body) });
+    if (!screenshotBase64) return post(payload);
+    const screenshotHash = await sha256Hex(screenshotBase64);
+    let response = null;
+    if (uploadedScreenshots.has(screenshotHash)) {
+        response = await post({ ...payload, screenshot_sha256: screenshotHash });
+        if (response.status === 404) {
+            uploadedScreenshots.delete(screenshotHash);
+            response = null;
+        }
+    }
+    if (!response) response = await post({ ...payload, screenshot_base64: screenshotBase64 });
+    if (response.ok) uploadedScreenshots.add(screenshotHash);
+    return response;
+}
+
+chrome.runtime.onConnect.addListener((port) => {
+    if (port.name !== 'watch') return;
+    if (activeWatch) activeWatch.port.postMessage({ type: 'stop' }); // one watched tab at a time
+    const watch = { port, socket: new WebSocket(WATCH_SOCKET_URL), findings: new Map(), queued: [] };
+    activeWatch = watch;
+
+    // The snapshot usually arrives before the socket is open
+    watch.socket.onopen = () => {
+        watch.queued.forEach(message => watch.socket.send(message));
+        watch.queued = [];
+    };
+    port.onMessage.addListener((message) => {
+        const text = JSON.stringify(message);
+        if (watch.socket.readyState === WebSocket.OPEN) watch.socket.send(text);
+        else if (watch.socket.readyState === WebSocket.CONNECTING) watch.queued.push(text);
+    });
+    watch.socket.onmessage = (event) => {
+        const message = JSON.parse(event.data);
+        if (message.type === 'findings') {
+            message.removed.forEach(id => watch.findings.delete(id));
+            message.added.forEach(finding => watch.findings.set(finding.id, finding));
+            chrome.action.setBadgeText({ text: watch.findings.size ? String(watch.findings.size) : '' });
+        } else if (message.type === 'error') {
+            console.error('Background script - Watch update rejected:', message.message);
+        }
+        // The popup may be closed; nobody listening is fine
+        chrome.runtime.sendMessage({ action: "watchFindings", findings: [...watch.findings.values()], error: message.type === 'error' ? message.message : null })
+            .catch(() => {});
+    };
+    watch.socket.onclose = () => {
+        // Backend went away (or refused: too many sessions): stop observing the page
+        try { port.postMessage({ type: 'stop' }); } catch (e) { /* port already gone */ }
+    };
+    port.onDisconnect.addListener(() => {
+        watch.socket.close();
+        if (activeWatch === watch) {
+            activeWatch = null;
+            chrome.action.setBadgeText({ text: '' });
+            chrome.runtime.sendMessage({ action: "watchFindings", findings: [], stopped: true }).catch(() => {});
+        }
+    });
+});
+
 chrome.runtime.onMessage.addListener((request, sender, sendResponse) => {
     // Must return true to indicate that sendResponse will be called asynchronously
     // This is crucial for async operations like fetch requests.
@@ -53,26 +132,20 @@ chrome.runtime.onMessage.addListener((request, sender, sendResponse) => {
                 }
 
                 console.log('Background script: Received pageDataFromContent from content.js:', pageDataFromContent);
-                console.log('data', pageDataFromContent.key_elements);
+                console.log('data', pageDataFromContent.element_graph);
 
                 // 5. Combine all data into a single comprehensive payload for the backend
+                // (the screenshot is added by postAnalysis: as a hash when the backend already has it)
                 const comprehensivePayload = {
                     url: currentUrl,
                     title: currentTitle,
-                    screenshot_base64: cleanScreenshotBase64,
-                    key_elements: pageDataFromContent.key_elements // This is the detailed DOM data from content.js
+                    element_graph: pageDataFromContent.element_graph // Compact DOM data from content.js (backend/element_graph.py)
                 };
                 
                 console.log('Background script: Sending comprehensive payload to backend.'); 
 
                 // 6. Send combined payload to your Flask backend
-                const response = await fetch(`${API_BASE_URL}/analyze-website`, {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json',
-                    },
-                    body: JSON.stringify(comprehensivePayload),
-                });
+                const response = await postAnalysis(`${API_BASE_URL}/analyze-website`, comprehensivePayload, cleanScreenshotBase64);
                 
                 if (!response.ok) {
                     const errorText = await response.text(); // Get raw error text
@@ -88,6 +161,27 @@ chrome.runtime.onMessage.addListener((request, sender, sendResponse) => {
                 sendResponse({ success: false, error: error.message || "An unknown error occurred during website analysis." });
             }
         }
+        else if (request.action === "startWatch") {
+            try {
+                const [tab] = await chrome.tabs.query({ active: true, currentWindow: true });
+                if (tab.url.startsWith('chrome://') || tab.url.startsWith('chrome-extension://') || tab.url === 'about:blank') {
+                    sendResponse({ success: false, error: "Cannot watch internal Chrome pages, extension pages, or blank tabs." });
+                    return;
+                }
+                // content.js connects back with a "watch" port (handled in onConnect below)
+                await chrome.scripting.executeScript({ target: { tabId: tab.id }, files: ['content.js'] });
+                await chrome.tabs.sendMessage(tab.id, { action: "startWatch" });
+                sendResponse({ success: true });
+            } catch (error) {
+                console.error('Background script - Error starting watch mode:', error);
+                sendResponse({ success: false, error: error.message || "Could not start watch mode." });
+            }
+        } else if (request.action === "stopWatch") {
+            if (activeWatch) activeWatch.port.postMessage({ type: 'stop' });
+            sendResponse({ success: true });
+        } else if (request.action === "watchStatus") {
+            sendResponse({ success: true, watching: !!activeWatch, findings: activeWatch ? [...activeWatch.findings.values()] : [] });
+        }
         // Keep your other request actions ('fetchPalettes', 'savePalette')
         else if (request.action === "fetchPalettes") {
             try {
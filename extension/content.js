@@ -1,16 +1,83 @@
 // extension/content.js
 
-// This function will be called by background.js to collect data from the DOM
+// This function will be called by background.js to collect data from the DOM.
+// It returns a compact "element graph" (see backend/element_graph.py): each element keeps only
+// its own text (links, buttons, labels and headings: their whole text, which is their accessible
+// name) plus the index of its nearest collected ancestor, and identical computed-style
+// objects are sent once in a shared table. Keep in sync with the Playwright collector in backend/app.py.
+//
+// Watch mode (createPageWatcher below) reuses the same element selection and fields, but keys every
+// element and sends only what changed; see backend/watch_session.py.
+
+// Select common, relevant elements for analysis. Expand this list as needed.
+// Ensure you select elements that will be useful for all three agents.
+// (var, not const: background.js may inject this file into the same page more than once)
+var PAGE_DATA_SELECTORS = 'h1, h2, h3, h4, h5, h6, p, a, button, img, input, select, textarea, label, li, [role], [tabindex], div:not([id^="s_"])'; // Added role, tabindex, and general divs
+
+// Collect relevant computed styles
+var RELEVANT_CSS_PROPS = [
+    'fontFamily', 'fontSize', 'color', 'backgroundColor', 'paddingTop', 'paddingBottom',
+    'marginLeft', 'marginRight', 'lineHeight', 'textAlign', 'display',
+    'position', // Important for layout
+    'zIndex',   // Important for layering
+    'opacity',  // Important for visibility
+    'border', 'boxSizing', 'fontWeight', 'textDecoration',
+    'cursor'    // Useful for interactive elements
+    // Add more CSS properties as your agents might need them
+];
+
+function readStyles(element) {
+    const computedStyle = window.getComputedStyle(element);
+    const styles = {};
+    RELEVANT_CSS_PROPS.forEach(prop => { styles[prop] = computedStyle[prop]; });
+    return styles;
+}
+
+// Own (direct) text only: descendants send their own text, so nothing is repeated per ancestor
+function readOwnText(element) {
+    let ownText = '';
+    element.childNodes.forEach(child => {
+        if (child.nodeType === Node.TEXT_NODE) ownText += child.nodeValue;
+    });
+    return ownText.replace(/\s+/g, ' ').trim().substring(0, 500);
+}
+
+// Elements named by their content send the whole subtree's text: the <span>/<strong>/<svg> that
+// usually holds a link or button label is not collected, so its own text would be lost
+var NAME_FROM_CONTENT_TAGS = new Set(['A', 'BUTTON', 'LABEL', 'H1', 'H2', 'H3', 'H4', 'H5', 'H6', 'SUMMARY', 'OPTION']);
+
+function readText(element) {
+    if (NAME_FROM_CONTENT_TAGS.has(element.tagName)) {
+        return (element.textContent || '').replace(/\s+/g, ' ').trim().substring(0, 500);
+    }
+    return readOwnText(element);
+}
+
+// Optional fields are omitted when empty to keep the payload small
+function readAttributes(element, node) {
+    if (element.id) node.id = element.id;
+    if (element.tagName === 'IMG') {
+        node.src = element.src;
+        node.alt = element.alt;
+    }
+    if ((element.tagName === 'A' || element.tagName === 'AREA') && element.href) node.href = element.href;
+    if (element.getAttribute('role')) node.role = element.getAttribute('role');
+    if (element.getAttribute('tabindex')) node.tabIndex = element.getAttribute('tabindex');
+    return node;
+}
+
 function collectPageData() {
-    const data = {
-        key_elements: []
+    const graph = {
+        format: 'element_graph/1',
+        styles: [],
+        nodes: []
     };
+    const styleIndex = new Map(); // JSON of a style object -> index in graph.styles
+    const nodeIndex = new Map();  // collected element -> index in graph.nodes
 
-    // Select common, relevant elements for analysis. Expand this list as needed.
-    // Ensure you select elements that will be useful for all three agents.
-    const selectors = 'h1, h2, h3, h4, h5, h6, p, a, button, img, input, select, textarea, label, li, [role], [tabindex], div:not([id^="s_"])'; // Added role, tabindex, and general divs
+    const round = value => Math.round(value * 10) / 10;
 
-    document.querySelectorAll(selectors).forEach(element => {
+    document.querySelectorAll(PAGE_DATA_SELECTORS).forEach(element => {
         try {
             const boundingBox = element.getBoundingClientRect();
             // Filter out elements that are not visible or have zero dimensions
@@ -18,60 +85,254 @@ function collectPageData() {
                 return; // Skip invisible or off-screen elements
             }
 
-            const computedStyle = window.getComputedStyle(element);
-
-            // Collect relevant computed styles
-            const styles = {
-                fontFamily: computedStyle.fontFamily,
-                fontSize: computedStyle.fontSize,
-                color: computedStyle.color,
-                backgroundColor: computedStyle.backgroundColor,
-                paddingTop: computedStyle.paddingTop,
-                paddingBottom: computedStyle.paddingBottom,
-                marginLeft: computedStyle.marginLeft,
-                marginRight: computedStyle.marginRight,
-                lineHeight: computedStyle.lineHeight,
-                textAlign: computedStyle.textAlign,
-                display: computedStyle.display,
-                position: computedStyle.position, // Important for layout
-                zIndex: computedStyle.zIndex,      // Important for layering
-                opacity: computedStyle.opacity,    // Important for visibility
-                border: computedStyle.border,
-                boxSizing: computedStyle.boxSizing,
-                fontWeight: computedStyle.fontWeight,
-                textDecoration: computedStyle.textDecoration,
-                cursor: computedStyle.cursor // Useful for interactive elements
-                // Add more CSS properties as your agents might need them
+            const styles = readStyles(element);
+
+            // Intern the style object: most elements share one of a few dozen styles
+            const styleKey = JSON.stringify(styles);
+            let style = styleIndex.get(styleKey);
+            if (style === undefined) {
+                style = graph.styles.length;
+                graph.styles.push(styles);
+                styleIndex.set(styleKey, style);
+            }
+
+            const text = readText(element);
+
+            // Nearest ancestor that was collected too (querySelectorAll is in document order)
+            let parent = null;
+            for (let ancestor = element.parentElement; ancestor; ancestor = ancestor.parentElement) {
+                if (nodeIndex.has(ancestor)) {
+                    parent = nodeIndex.get(ancestor);
+                    break;
+                }
+            }
+
+            const node = {
+                tag: element.tagName,
+                parent: parent,
+                style: style,
+                bbox: [round(boundingBox.x), round(boundingBox.y), round(boundingBox.width), round(boundingBox.height)]
             };
+            if (text) node.text = text;
+            readAttributes(element, node);
+
+            nodeIndex.set(element, graph.nodes.length);
+            graph.nodes.push(node);
 
-            data.key_elements.push({
-                id: element.id || null,
-                tag_name: element.tagName,
-                text_content: element.textContent ? element.textContent.trim().substring(0, 500) : null, // Limit text length to avoid huge payloads
-                bounding_box: {
-                    x: boundingBox.x,
-                    y: boundingBox.y,
-                    width: boundingBox.width,
-                    height: boundingBox.height,
-                    top: boundingBox.top,
-                    right: boundingBox.right,
-                    bottom: boundingBox.bottom,
-                    left: boundingBox.left
-                },
-                computed_styles: styles,
-                src: element.tagName === 'IMG' ? element.src : null,
-                alt: element.tagName === 'IMG' ? element.alt : null,
-                href: element.tagName === 'A' || element.tagName === 'AREA' ? element.href : null,
-                role: element.getAttribute('role') || null,
-                tabIndex: element.getAttribute('tabindex') || null
-            });
-            
         } catch (e) {
             console.warn("Could not collect data for element:", element, e);
         }
     });
 
-    return data;
+    return { element_graph: graph };
+}
+
+// --- Watch mode: keyed elements, MutationObserver, debounced deltas (backend/watch_session.py) ---
+var WATCH_DEBOUNCE_MS = 300;   // send once the page has been quiet this long...
+var WATCH_MAX_WAIT_MS = 1500;  // ...but at least this often while it keeps changing
+
+function createPageWatcher(send) {
+    const keys = new WeakMap();  // element -> stable key
+    const tracked = new Map();   // key -> {element, node}, node = fields as last sent
+    const styles = [];
+    const styleIndex = new Map();
+    let sentStyles = 0;
+    let nextKey = 1;
+    let seq = 0;
+    let dirtyRoots = new Set();
+    let restyleAll = false;
+    let timer = null;
+    let firstDirtyAt = 0;
+    let observer = null;
+    const round = value => Math.round(value * 10) / 10;
+
+    function keyFor(element) {
+        let key = keys.get(element);
+        if (key === undefined) {
+            key = nextKey++;
+            keys.set(element, key);
+        }
+        return key;
+    }
+
+    function internStyle(elementStyles) {
+        const styleKey = JSON.stringify(elementStyles);
+        let style = styleIndex.get(styleKey);
+        if (style === undefined) {
+            style = styles.length;
+            styles.push(elementStyles);
+            styleIndex.set(styleKey, style);
+        }
+        return style;
+    }
+
+    // Page (not viewport) coordinates, so scrolling does not turn into a delta for every element
+    function measure(element) {
+        const box = element.getBoundingClientRect();
+        if (box.width === 0 || box.height === 0) return null;
+        return [round(box.x + window.scrollX), round(box.y + window.scrollY), round(box.width), round(box.height)];
+    }
+
+    function parentKey(element) {
+        for (let ancestor = element.parentElement; ancestor; ancestor = ancestor.parentElement) {
+            const key = keys.get(ancestor);
+            if (key !== undefined && tracked.has(key)) return key;
+        }
+        return null;
+    }
+
+    function describe(element, bbox) {
+        const node = { tag: element.tagName, parent: parentKey(element), style: internStyle(readStyles(element)), bbox: bbox };
+        const text = readText(element);
+        if (text) node.text = text;
+        return readAttributes(element, node);
+    }
+
+    // Fields of `node` that differ from `previous`; fields that disappeared are sent as null
+    function patch(previous, node) {
+        const changes = {};
+        let changed = false;
+        for (const field of new Set([...Object.keys(previous), ...Object.keys(node)])) {
+            const before = previous[field], after = node[field];
+            const same = Array.isArray(after) ? Array.isArray(before) && after.every((value, i) => value === before[i]) : before === after;
+            if (!same) {
+                changes[field] = after === undefined ? null : after;
+                changed = true;
+            }
+        }
+        return changed ? changes : null;
+    }
+
+    function snapshot() {
+        const nodes = [];
+        document.querySelectorAll(PAGE_DATA_SELECTORS).forEach(element => {
+            const bbox = measure(element);
+            if (!bbox) return;
+            const key = keyFor(element);
+            const node = describe(element, bbox);
+            tracked.set(key, { element, node });
+            nodes.push({ key, ...node });
+        });
+        sentStyles = styles.length;
+        return { format: 'element_graph/1', styles: styles.slice(), nodes };
+    }
+
+    function flush() {
+        clearTimeout(timer);
+        timer = null;
+        const upsert = [], remove = [];
+        // 1. Elements that are gone or no longer visible
+        for (const [key, entry] of tracked) {
+            if (!entry.element.isConnected || !entry.element.matches(PAGE_DATA_SELECTORS) || !measure(entry.element)) {
+                tracked.delete(key);
+                remove.push(key);
+            }
+        }
+        // 2. Elements inside changed subtrees (plus label-like ancestors whose text includes them) are re-described;
+        //    a stylesheet change re-describes everything
+        const redescribe = new Set();
+        const added = [];
+        const roots = restyleAll ? [document.documentElement] : [...dirtyRoots];
+        for (const root of roots) {
+            if (!root.isConnected) continue;
+            const candidates = root.matches(PAGE_DATA_SELECTORS) ? [root] : [];
+            candidates.push(...root.querySelectorAll(PAGE_DATA_SELECTORS));
+            for (let ancestor = root.parentElement; ancestor; ancestor = ancestor.parentElement) {
+                if (NAME_FROM_CONTENT_TAGS.has(ancestor.tagName)) candidates.push(ancestor);
+            }
+            for (const element of candidates) {
+                const key = keys.get(element);
+                if (key !== undefined && tracked.has(key)) redescribe.add(key);
+                else if (measure(element)) added.push(element);
+            }
+        }
+        dirtyRoots = new Set();
+        restyleAll = false;
+        // New elements enter in document order, each right after the tracked element before it
+        if (added.length) {
+            const addedSet = new Set(added);
+            let prev = null;
+            document.querySelectorAll(PAGE_DATA_SELECTORS).forEach(element => {
+                if (addedSet.has(element)) {
+                    addedSet.delete(element);
+                    const key = keyFor(element);
+                    const node = describe(element, measure(element));
+                    tracked.set(key, { element, node });
+                    upsert.push({ key, prev, ...node });
+                }
+                const key = keys.get(element);
+                if (key !== undefined && tracked.has(key)) prev = key;
+            });
+        }
+        // 3. Everything else is only re-measured: a change elsewhere can move it without touching its subtree
+        for (const [key, entry] of tracked) {
+            const node = redescribe.has(key) ? describe(entry.element, measure(entry.element)) : { ...entry.node, bbox: measure(entry.element) };
+            const changes = patch(entry.node, node);
+            if (changes) {
+                entry.node = node;
+                upsert.push({ key, ...changes });
+            }
+        }
+        if (!upsert.length && !remove.length) return;
+        const newStyles = styles.slice(sentStyles);
+        sentStyles = styles.length;
+        send({ type: 'delta', seq: ++seq, styles: newStyles, upsert, remove });
+    }
+
+    function schedule() {
+        const now = Date.now();
+        if (timer === null) firstDirtyAt = now;
+        clearTimeout(timer);
+        timer = setTimeout(flush, now - firstDirtyAt >= WATCH_MAX_WAIT_MS ? 0 : WATCH_DEBOUNCE_MS);
+    }
+
+    function onMutations(mutations) {
+        for (const mutation of mutations) {
+            const target = mutation.type === 'characterData' ? mutation.target.parentElement : mutation.target;
+            if (!target) continue;
+            // <style>/<link> edits (e.g. from DevTools) can restyle any element
+            if (target.closest && target.closest('style, link, head')) restyleAll = true;
+            else dirtyRoots.add(target);
+        }
+        schedule();
+    }
+
+    return {
+        start() {
+            if (observer) return;
+            send({ type: 'start', url: location.href, element_graph: snapshot() });
+            observer = new MutationObserver(onMutations);
+            observer.observe(document.documentElement, { subtree: true, childList: true, attributes: true, characterData: true });
+            window.addEventListener('resize', schedule);
+        },
+        stop() {
+            if (!observer) return;
+            observer.disconnect();
+            observer = null;
+            clearTimeout(timer);
+            window.removeEventListener('resize', schedule);
+        }
+    };
+}
+
+function startWatching() {
+    if (window.pixelPalWatch) return;
+    const port = chrome.runtime.connect({ name: 'watch' });
+    const watcher = createPageWatcher(message => port.postMessage(message));
+    window.pixelPalWatch = { port, watcher };
+    port.onMessage.addListener(message => {
+        if (message.type === 'stop') stopWatching();
+    });
+    port.onDisconnect.addListener(() => stopWatching());
+    watcher.start();
+}
+
+function stopWatching() {
+    const watch = window.pixelPalWatch;
+    if (!watch) return;
+    window.pixelPalWatch = null;
+    watch.watcher.stop();
+    try { watch.port.disconnect(); } catch (e) { /* already disconnected */ }
 }
 
 // Listen for messages from the background script
@@ -81,4 +342,11 @@ chrome.runtime.onMessage.addListener((request, sender, sendResponse) => {
         sendResponse(pageData);
         return true; // Keep the message channel open for sendResponse
     }
+    if (request.action === "startWatch") {
+        startWatching();
+        sendResponse({ watching: true });
+    } else if (request.action === "stopWatch") {
+        stopWatching();
+        sendResponse({ watching: false });
+    }
 });
\ No newline at end of file
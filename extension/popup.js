@@ -15,7 +15,11 @@ document.addEventListener('DOMContentLoaded', () => {
     const savePaletteButton = document.getElementById('savePaletteButton');
     const paletteListDiv = document.getElementById('paletteList');
 
+    const watchButton = document.getElementById('watchButton');
+    const watchFindingsDiv = document.getElementById('watchFindings');
+
     let currentAnalyzedPalette = null; // To hold the palette for saving (array of hex codes)
+    let watching = false; // Watch mode: background.js streams page changes to the backend
 
     // Get current tab URL
     chrome.tabs.query({ active: true, currentWindow: true }, (tabs) => {
@@ -142,6 +146,27 @@ document.addEventListener('DOMContentLoaded', () => {
         resultsDiv.appendChild(workflowSuggestions); // Append the workflow section to main results
 
 
+        // --- Performance (full mode only; fast mode reports it as skipped) ---
+        const performanceResults = analysisData.performance_results;
+        if (performanceResults && performanceResults.performance_issues) {
+            const performanceDiv = document.createElement('div');
+            const metrics = performanceResults.metrics || {};
+            let perfHtml = `<h4>Performance</h4><p>${performanceResults.summary}</p>`;
+            perfHtml += `<p><strong>LCP:</strong> ${metrics.lcp_ms ?? 'N/A'}ms · <strong>CLS:</strong> ${metrics.cls ?? 'N/A'} · <strong>TBT:</strong> ${metrics.tbt_ms ?? 'N/A'}ms</p>`;
+            if (performanceResults.performance_issues.length > 0) {
+                perfHtml += `<ul>`;
+                performanceResults.performance_issues.slice(0, 8).forEach(item => {
+                    perfHtml += `<li><strong>${item.severity}:</strong> ${item.issue}<br><em>${item.suggestion}</em></li>`;
+                });
+                perfHtml += `</ul>`;
+            }
+            performanceDiv.innerHTML = perfHtml;
+            resultsDiv.appendChild(performanceDiv);
+        } else if (performanceResults && performanceResults.status === "error") {
+            resultsDiv.innerHTML += `<h4>Performance</h4><p>${performanceResults.message}</p>`;
+        }
+
+
         // // --- Accessibility & Responsiveness Details ---
         // resultsDiv.innerHTML += `<h4>Accessibility & Responsiveness Details</h4>`;
         // const accessibilityResults = analysisData.accessibility_results?.data;
@@ -297,6 +322,52 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    // --- Watch mode: live accessibility/layout findings while the page is being edited ---
+    const displayWatchFindings = (findings, error) => {
+        watchButton.textContent = watching ? 'Stop Watching' : 'Watch for Changes';
+        watchFindingsDiv.style.display = watching ? 'block' : 'none';
+        if (!watching) return;
+        watchFindingsDiv.innerHTML = `<h4>Live Findings (${findings.length})</h4>`;
+        if (error) watchFindingsDiv.innerHTML += `<p style="color: red;">${error}</p>`;
+        const ul = document.createElement('ul');
+        findings.forEach(item => {
+            const li = document.createElement('li');
+            li.innerHTML = `<strong>${item.issue || 'N/A'}</strong> (${item.severity || 'N/A'})<br>${item.element_description || ''}<br><em>Suggestion:</em> ${item.suggestion || 'N/A'}`;
+            ul.appendChild(li);
+        });
+        watchFindingsDiv.appendChild(ul);
+    };
+
+    watchButton.addEventListener('click', async () => {
+        errorDiv.style.display = 'none';
+        if (watching) {
+            await chrome.runtime.sendMessage({ action: "stopWatch" });
+            watching = false;
+            displayWatchFindings([]);
+            return;
+        }
+        const response = await chrome.runtime.sendMessage({ action: "startWatch" });
+        if (!response.success) {
+            errorDiv.textContent = `Watch mode failed: ${response.error || 'Unknown error'}`;
+            errorDiv.style.display = 'block';
+            return;
+        }
+        watching = true;
+        displayWatchFindings([]);
+    });
+
+    chrome.runtime.onMessage.addListener((message) => {
+        if (message.action !== "watchFindings") return;
+        if (message.stopped) watching = false;
+        displayWatchFindings(message.findings || [], message.error);
+    });
+
+    // The watch keeps running while the popup is closed; pick it up again on open
+    chrome.runtime.sendMessage({ action: "watchStatus" }).then(response => {
+        watching = !!(response && response.watching);
+        displayWatchFindings(response ? response.findings : []);
+    });
+
     // Fetch saved palettes on popup load
     fetchAndDisplaySavedPalettes();
 });
\ No newline at end of file